@@ -15,8 +15,8 @@ try:
 except ImportError:
     print("python-dotenv not installed, skipping .env file loading")
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (set LOG_LEVEL=DEBUG for verbose local troubleshooting)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 def create_app():
@@ -32,7 +32,13 @@ def create_app():
         static_url_path='/static'
     )
     app.secret_key = os.environ.get("SESSION_SECRET", "development_key")
-    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    # Reverse proxies in front of the app whose X-Forwarded-* headers are
+    # trusted (1 behind nginx); X-Forwarded-For gives anonymous clients their
+    # own rate limit. None by default: a client talking to the app directly
+    # could otherwise spoof its address and host
+    trusted_proxies = int(os.environ.get("TRUSTED_PROXIES", "0"))
+    if trusted_proxies > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies, x_host=trusted_proxies)
 
     # Enable CORS
     CORS(app)
@@ -58,6 +64,72 @@ def create_app():
     # Base URL for the application (used for QR codes and verification)
     app.config["BASE_URL"] = os.environ.get("BASE_URL", "http://localhost:5000")
 
+    # Structured request events (one JSON line per request on hot API paths)
+    app.config["EVENT_LOG_SAMPLE_RATE"] = float(os.environ.get("EVENT_LOG_SAMPLE_RATE", "1.0"))
+    app.config["EVENT_LOG_QUEUE_SIZE"] = int(os.environ.get("EVENT_LOG_QUEUE_SIZE", "10000"))
+    app.config["EVENT_LOG_FILE"] = os.environ.get("EVENT_LOG_FILE")
+
+    # Rate limiting for the analysis APIs (see utils/rate_limiter.py)
+    app.config["RATE_LIMIT_ENABLED"] = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    app.config["RATE_LIMIT_BACKEND"] = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+    app.config["RATE_LIMIT_SQLITE_PATH"] = os.environ.get("RATE_LIMIT_SQLITE_PATH")
+    app.config["RATE_LIMIT_PER_MINUTE"] = float(os.environ.get("RATE_LIMIT_PER_MINUTE", "30"))
+    app.config["RATE_LIMIT_BURST"] = int(os.environ.get("RATE_LIMIT_BURST", "10"))
+    app.config["RATE_LIMIT_MAX_CONCURRENT"] = int(os.environ.get("RATE_LIMIT_MAX_CONCURRENT", "8"))
+
+    # Thread pool for blocking work in async views, and the cap on in-flight LLM calls
+    app.config["CPU_EXECUTOR_WORKERS"] = int(os.environ.get("CPU_EXECUTOR_WORKERS", "4"))
+    app.config["LLM_MAX_CONCURRENT_CALLS"] = int(os.environ.get("LLM_MAX_CONCURRENT_CALLS", "4"))
+
+    # Evidence derivatives (thumbnails, previews) and their ffmpeg binary
+    app.config["EVIDENCE_DERIVATIVE_WORKERS"] = int(os.environ.get("EVIDENCE_DERIVATIVE_WORKERS", "2"))
+    app.config["FFMPEG_BINARY"] = os.environ.get("FFMPEG_BINARY")
+    # Evidence downloads: hand the body to the front server (x-accel-redirect or x-sendfile)
+    app.config["EVIDENCE_SENDFILE"] = os.environ.get("EVIDENCE_SENDFILE", "")
+    app.config["EVIDENCE_ACCEL_PREFIX"] = os.environ.get("EVIDENCE_ACCEL_PREFIX", "/protected-static/")
+    # Background evidence analysis: process pool size (0 = no dispatcher) and results per commit
+    app.config["EVIDENCE_ANALYSIS_WORKERS"] = int(os.environ.get("EVIDENCE_ANALYSIS_WORKERS", "2"))
+    app.config["EVIDENCE_ANALYSIS_BATCH_SIZE"] = int(os.environ.get("EVIDENCE_ANALYSIS_BATCH_SIZE", "25"))
+    # Hash-chain custody events so later edits to the trail can be detected
+    app.config["CUSTODY_HASH_CHAIN"] = os.environ.get("CUSTODY_HASH_CHAIN", "true").lower() == "true"
+    # Resumable chunked uploads for evidence too large for one request
+    app.config["EVIDENCE_UPLOAD_MAX_BYTES"] = int(os.environ.get("EVIDENCE_UPLOAD_MAX_BYTES", str(10 * 1024 ** 3)))
+    app.config["EVIDENCE_UPLOAD_CHUNK_SIZE"] = int(os.environ.get("EVIDENCE_UPLOAD_CHUNK_SIZE", str(8 * 1024 ** 2)))
+
+    # Seconds a chatbot conversation may reuse a case lookup (0 disables the cache)
+    app.config["CHATBOT_CASE_CACHE_TTL"] = int(os.environ.get("CHATBOT_CASE_CACHE_TTL", "300"))
+
+    # Background FIR submission jobs (0 workers disables processing in this process)
+    app.config["FIR_JOB_WORKERS"] = int(os.environ.get("FIR_JOB_WORKERS", "2"))
+    app.config["FIR_JOB_POLL_INTERVAL"] = float(os.environ.get("FIR_JOB_POLL_INTERVAL", "2"))
+    app.config["FIR_JOB_STALE_AFTER"] = int(os.environ.get("FIR_JOB_STALE_AFTER", "900"))
+    app.config["FIR_JOB_MAX_ATTEMPTS"] = int(os.environ.get("FIR_JOB_MAX_ATTEMPTS", "3"))
+    app.config["FIR_JOB_SSE_TIMEOUT"] = int(os.environ.get("FIR_JOB_SSE_TIMEOUT", "120"))
+
+    # Dashboard counters: read cache lifetime and background reconciliation (0 disables)
+    app.config["STATS_CACHE_TTL"] = float(os.environ.get("STATS_CACHE_TTL", "5"))
+    app.config["STATS_RECONCILE_INTERVAL"] = float(os.environ.get("STATS_RECONCILE_INTERVAL", "3600"))
+
+    # Whisper transcription pool (0 workers disables server-side transcription)
+    app.config["WHISPER_MODEL"] = os.environ.get("WHISPER_MODEL", "base")
+    app.config["TRANSCRIBE_MODEL_LOADER"] = os.environ.get("TRANSCRIBE_MODEL_LOADER")
+    app.config["TRANSCRIBE_WORKERS"] = int(os.environ.get("TRANSCRIBE_WORKERS", "1"))
+    app.config["TRANSCRIBE_QUEUE_SIZE"] = int(os.environ.get("TRANSCRIBE_QUEUE_SIZE", "8"))
+    app.config["TRANSCRIBE_MAX_WAIT"] = float(os.environ.get("TRANSCRIBE_MAX_WAIT", "30"))
+    app.config["TRANSCRIBE_JOB_TTL"] = int(os.environ.get("TRANSCRIBE_JOB_TTL", "600"))
+    app.config["TRANSCRIBE_STREAM_STEP"] = float(os.environ.get("TRANSCRIBE_STREAM_STEP", "4"))
+    app.config["TRANSCRIBE_STREAM_HOLDBACK"] = float(os.environ.get("TRANSCRIBE_STREAM_HOLDBACK", "2"))
+    app.config["TRANSCRIBE_STREAM_MAX_BYTES"] = int(os.environ.get("TRANSCRIBE_STREAM_MAX_BYTES", str(50 * 1024 * 1024)))
+    app.config["TRANSCRIBE_STREAM_IDLE_TTL"] = int(os.environ.get("TRANSCRIBE_STREAM_IDLE_TTL", "900"))
+
+    # FIR numbers: FIR<yyyymmdd><station><sequence>, sequence reserved in blocks per process
+    app.config["FIR_STATION_CODE"] = os.environ.get("FIR_STATION_CODE", "HQ").upper()
+    app.config["FIR_NUMBER_BLOCK_SIZE"] = int(os.environ.get("FIR_NUMBER_BLOCK_SIZE", "50"))
+
+    # Fail requests that exceed their view's SQL query budget (unset: only under app.testing)
+    enforce_budget = os.environ.get("QUERY_BUDGET_ENFORCE")
+    app.config["QUERY_BUDGET_ENFORCE"] = enforce_budget.lower() == "true" if enforce_budget else None
+
     # ensure upload directory exists
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
     os.makedirs(os.path.join(app.config["UPLOAD_FOLDER"], "images"), exist_ok=True)
@@ -65,6 +137,18 @@ def create_app():
     # initialize the app with the extensions
     db.init_app(app)
     login_manager.init_app(app)
+    from utils.request_events import init_event_logging
+    init_event_logging(app)
+    from utils.rate_limiter import init_rate_limiter
+    init_rate_limiter(app)
+    from utils.executors import init_executors
+    init_executors(app)
+    from utils.evidence_derivatives import init_derivatives
+    init_derivatives(app)
+    from utils.evidence_delivery import init_evidence_delivery
+    init_evidence_delivery(app)
+    from utils.query_budget import init_query_budget
+    init_query_budget(app)
     # Mongo configuration
     app.config['MONGO_URI'] = os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
     app.config['MONGO_DB_NAME'] = os.environ.get('MONGO_DB_NAME', 'intelligent_fir')
@@ -118,6 +202,25 @@ def create_app():
         # Create all tables
         db.create_all()
 
+        # Add columns and indexes that create_all() won't add to existing tables
+        from utils.migrations import ensure_schema, register_commands
+        ensure_schema()
+        register_commands(app)
+        from utils.bulk_import import register_import_commands
+        register_import_commands(app)
+        from utils.exports import register_export_commands
+        register_export_commands(app)
+        from utils.evidence_store import register_evidence_store_commands
+        register_evidence_store_commands(app)
+        from utils.custody import register_custody_commands
+        register_custody_commands(app)
+        from utils.evidence_analysis import register_analysis_commands
+        register_analysis_commands(app)
+
+        # Full-text search index and its sync triggers
+        from utils.search import init_search
+        init_search(app)
+
         # Seed demo users for testing if they don't exist (SQL)
         try:
             from models import User, Role
@@ -185,6 +288,18 @@ def create_app():
         # Start ML model initialization in background
         threading.Thread(target=init_ml_model, daemon=True).start()
 
+        # Fill the dashboard counters if needed and start their reconciler
+        from utils.stats import init_stats
+        init_stats(app)
+
+        # Start the background workers for FIR submission jobs
+        from utils.fir_jobs import start_job_workers
+        start_job_workers(app)
+
+        # And the dispatcher for background evidence analysis
+        from utils.evidence_analysis import start_analysis_workers
+        start_analysis_workers(app)
+
     return app
 
 # Note: Do not create or run the app at import time.
@@ -0,0 +1,150 @@
+"""
+Load test for the chatbot endpoint.
+
+Starts a local fake LLM server that answers chat completions after a fixed
+delay, points the OpenAI client at it, and drives N concurrent chat sessions
+through /chatbot/api/query. Prints throughput, latency percentiles and how
+the requests were answered.
+
+Usage:
+    python benchmark_chatbot.py --sessions 200 --turns 3 --llm-delay 1.5
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Queries cycled through by every session: small talk, a described crime, and
+# a vague incident that the local analyzers are unlikely to match
+SESSION_QUERIES = [
+    "hello",
+    "someone stole my phone and threatened me with a knife",
+    "there was an accident and my shop window got damaged last night",
+    "what is ipc section 420",
+]
+
+FAKE_COMPLETION = {
+    "sections": [
+        {
+            "section_code": "427",
+            "section_name": "Mischief causing damage",
+            "section_description": "Mischief causing damage to the amount of fifty rupees",
+            "relevance": "The complaint describes damage to property",
+            "confidence": 0.6
+        }
+    ]
+}
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the chat completions API."""
+
+    delay = 1.0
+    calls = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with FakeLLMHandler.lock:
+            FakeLLMHandler.calls += 1
+        time.sleep(self.delay)
+
+        body = json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o",
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps(FAKE_COMPLETION)}
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_llm(delay):
+    FakeLLMHandler.delay = delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeLLMHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chatbot endpoint load test")
+    parser.add_argument('--sessions', type=int, default=200, help="Concurrent chat sessions")
+    parser.add_argument('--turns', type=int, default=3, help="Queries per session")
+    parser.add_argument('--llm-delay', type=float, default=1.0, help="Fake LLM response time in seconds")
+    args = parser.parse_args()
+
+    server = start_fake_llm(args.llm_delay)
+
+    # Configure before the app (and openai_helper) is imported
+    os.environ['OPENAI_API_KEY'] = 'benchmark'
+    os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    os.environ.setdefault('EVENT_LOG_SAMPLE_RATE', '0')
+    os.environ.setdefault('FIR_JOB_WORKERS', '0')
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import create_app
+    app = create_app()
+
+    latencies = []
+    statuses = Counter()
+    results_lock = threading.Lock()
+
+    def run_session(session_number):
+        client = app.test_client()
+        for turn in range(args.turns):
+            query = SESSION_QUERIES[(session_number + turn) % len(SESSION_QUERIES)]
+            started = time.perf_counter()
+            response = client.post('/chatbot/api/query', json={'query': query})
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        list(pool.map(run_session, range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    total = len(latencies)
+    print(f"sessions:        {args.sessions} x {args.turns} turns")
+    print(f"requests:        {total} in {elapsed:.2f}s ({total / elapsed:.1f} req/s)")
+    print(f"latency p50:     {percentile(latencies, 0.50) * 1000:.0f} ms")
+    print(f"latency p95:     {percentile(latencies, 0.95) * 1000:.0f} ms")
+    print(f"latency p99:     {percentile(latencies, 0.99) * 1000:.0f} ms")
+    print(f"status codes:    {dict(statuses)}")
+    print(f"fake LLM calls:  {FakeLLMHandler.calls}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
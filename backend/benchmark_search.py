@@ -0,0 +1,138 @@
+"""
+Query latency benchmark for FIR full-text search.
+
+Builds a synthetic corpus of FIRs in a scratch database (the search triggers
+index them as they are inserted), then runs a mix of search queries with and
+without filters through search_firs() and prints latency percentiles.
+
+Usage:
+    python benchmark_search.py --rows 1000000 --queries 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+CRIME_PHRASES = [
+    "my motorcycle was stolen", "a gold chain was snatched", "someone broke into the house",
+    "the shopkeeper was threatened with a knife", "my wallet and phone were stolen",
+    "a car hit the scooter and drove away", "neighbours assaulted my brother",
+    "fraud through a fake bank call", "cheated in a land sale", "harassed on the way to college",
+    "cattle were stolen from the farm", "the office laptop went missing", "a fire damaged the shop",
+]
+PLACES = [
+    "near the railway station", "at the vegetable market", "outside the bus stand", "on the highway",
+    "behind the temple", "in the parking lot", "near the school gate", "at the ATM kiosk",
+]
+LOCATIONS = ["Sector 12", "MG Road", "Old City", "Civil Lines", "Industrial Area", "Gandhi Nagar", "Station Road"]
+FILLER = ("the a at around night morning evening yesterday today after before when while police "
+          "complaint reported immediately unknown person two men woman family").split()
+NOTES = [
+    "CCTV footage requested from the shop owner", "witness statement recorded",
+    "suspect identified from the call records", "vehicle traced to a nearby district",
+]
+QUERIES = [
+    "motorcycle stolen", "gold chain", "knife", "railway station", "fraud bank", "laptop",
+    "CCTV footage", "harassed college", "fire shop", "cattle farm", "MG Road", "stealing",
+]
+STATUSES = ['draft', 'filed', 'under_investigation', 'closed']
+URGENCIES = ['low', 'normal', 'high', 'critical']
+
+
+def synthetic_description(rng):
+    words = rng.sample(FILLER, 8)
+    return f"{rng.choice(CRIME_PHRASES)} {rng.choice(PLACES)} {' '.join(words)}. {rng.choice(CRIME_PHRASES)}."
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FIR full-text search benchmark")
+    parser.add_argument('--rows', type=int, default=1000000, help="Synthetic FIRs to index")
+    parser.add_argument('--queries', type=int, default=200, help="Search queries to time")
+    parser.add_argument('--batch', type=int, default=10000, help="Rows per insert batch")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ['FIR_JOB_WORKERS'] = '0'
+    os.environ['STATS_RECONCILE_INTERVAL'] = '0'
+    os.environ.setdefault('EVENT_LOG_SAMPLE_RATE', '0')
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'search_benchmark.db'))
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import create_app
+    from extensions import db
+    from models import FIR, InvestigationNote, User
+    from utils.search import search_firs
+
+    app = create_app()
+    rng = random.Random(args.seed)
+    base = datetime(2020, 1, 1)
+
+    with app.app_context():
+        complainant_id = User.query.first().id
+
+        started = time.perf_counter()
+        first_id = (db.session.query(db.func.max(FIR.id)).scalar() or 0) + 1
+        for offset in range(0, args.rows, args.batch):
+            count = min(args.batch, args.rows - offset)
+            rows = []
+            for i in range(count):
+                filed_at = base + timedelta(minutes=rng.randrange(60 * 24 * 365 * 4))
+                rows.append({
+                    'id': first_id + offset + i,
+                    'fir_number': f"BENCH{first_id + offset + i:08d}",
+                    'complainant_id': complainant_id,
+                    'status': rng.choice(STATUSES),
+                    'urgency_level': rng.choice(URGENCIES),
+                    'incident_description': synthetic_description(rng),
+                    'incident_location': rng.choice(LOCATIONS),
+                    'transcription': synthetic_description(rng) if rng.random() < 0.2 else None,
+                    'filed_at': filed_at,
+                    'created_at': filed_at,
+                })
+            db.session.execute(FIR.__table__.insert(), rows)
+            notes = [
+                {'fir_id': row['id'], 'officer_id': complainant_id, 'content': rng.choice(NOTES), 'created_at': row['filed_at']}
+                for row in rows if rng.random() < 0.1
+            ]
+            if notes:
+                db.session.execute(InvestigationNote.__table__.insert(), notes)
+            db.session.commit()
+        elapsed = time.perf_counter() - started
+        print(f"indexed:         {args.rows} FIRs in {elapsed:.1f}s ({args.rows / elapsed:.0f} rows/s)")
+
+        scenarios = {
+            'text only': lambda: {},
+            'text + status': lambda: {'status': rng.choice(STATUSES)},
+            'text + urgency + dates': lambda: {
+                'urgency': rng.choice(URGENCIES),
+                'date_from': base + timedelta(days=rng.randrange(0, 1000)),
+                'date_to': base + timedelta(days=rng.randrange(1000, 1460)),
+            },
+        }
+        for name, make_filters in scenarios.items():
+            latencies = []
+            for _ in range(args.queries):
+                query_text = rng.choice(QUERIES)
+                page = rng.choice([1, 1, 1, 2, 5])
+                started = time.perf_counter()
+                search_firs(query_text, make_filters(), page=page)
+                latencies.append(time.perf_counter() - started)
+                db.session.remove()
+            print(f"{name + ':':<24} p50 {percentile(latencies, 0.50) * 1000:.1f} ms  "
+                  f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms  "
+                  f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Throughput benchmark for the transcription worker pool.
+
+Runs offline with a stand-in model: loading it sleeps --load-seconds (the
+cost of reading Whisper weights) and transcribing burns --cpu-seconds of CPU.
+Compares loading the model for every recording, as the old endpoint did,
+with the resident-model pool in utils/transcription.py, and shows how the
+bounded queue pushes back when jobs arrive faster than the pool drains them.
+
+Usage:
+    python benchmark_transcription.py --jobs 40 --workers 4 --queue-size 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+
+class StandinModel:
+    """Whisper-shaped model that burns CPU instead of decoding audio."""
+
+    def __init__(self, cpu_seconds):
+        self.cpu_seconds = cpu_seconds
+
+    # Stand-in audio rate: every this many bytes is one second of "speech"
+    bytes_per_second = 1000
+
+    def transcribe(self, audio_path, **options):
+        deadline = time.process_time() + self.cpu_seconds
+        while time.process_time() < deadline:
+            pass
+        # One segment per second of audio, from clip_timestamps on, like Whisper's output
+        start = int(float(options.get('clip_timestamps') or 0))
+        end = os.path.getsize(audio_path) // self.bytes_per_second
+        segments = [{'start': t, 'end': t + 1, 'text': f"s{t}"} for t in range(start, end)]
+        text = ' '.join(s['text'] for s in segments) or f"transcript of {os.path.basename(audio_path)}"
+        return {'text': text, 'language': options.get('language', 'en'), 'segments': segments}
+
+
+def load_standin_model(model_name):
+    """TRANSCRIBE_MODEL_LOADER-compatible loader; model_name is 'load_seconds/cpu_seconds'."""
+    load_seconds, cpu_seconds = (float(value) for value in model_name.split('/'))
+    time.sleep(load_seconds)
+    return StandinModel(cpu_seconds)
+
+
+def make_audio_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"recording_{i}.webm")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(1024))
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcription pool benchmark")
+    parser.add_argument('--jobs', type=int, default=40, help="Recordings to transcribe")
+    parser.add_argument('--workers', type=int, default=4, help="Pool worker processes")
+    parser.add_argument('--queue-size', type=int, default=8, help="Jobs queued or running before submit pushes back")
+    parser.add_argument('--load-seconds', type=float, default=1.5, help="Stand-in model load time")
+    parser.add_argument('--cpu-seconds', type=float, default=0.2, help="Stand-in CPU time per recording")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from utils.transcription import TranscriptionQueueFull, TranscriptionService
+
+    model_name = f"{args.load_seconds}/{args.cpu_seconds}"
+    workdir = tempfile.mkdtemp()
+
+    # Old behaviour: every request loads the model, then transcribes
+    reload_jobs = min(args.jobs, 5)
+    started = time.perf_counter()
+    for path in make_audio_files(workdir, reload_jobs):
+        load_standin_model(model_name).transcribe(path)
+    elapsed = time.perf_counter() - started
+    print(f"load per request:  {reload_jobs / elapsed:.2f} jobs/s ({elapsed / reload_jobs:.2f}s per job, one request thread)")
+
+    service = TranscriptionService(
+        args.workers, args.queue_size, model_name=model_name, loader='benchmark_transcription:load_standin_model'
+    )
+    try:
+        # Warm the pool so the steady-state rate is measured, not process start-up
+        service.wait(service.submit(make_audio_files(workdir, 1)[0]), timeout=60)
+
+        jobs = []
+        rejected = 0
+        max_depth = 0
+        started = time.perf_counter()
+        for path in make_audio_files(workdir, args.jobs):
+            while True:
+                try:
+                    jobs.append(service.submit(path))
+                    break
+                except TranscriptionQueueFull:
+                    rejected += 1
+                    time.sleep(0.01)
+            max_depth = max(max_depth, service.stats()['depth'])
+        for job in jobs:
+            service.wait(job, timeout=60)
+        elapsed = time.perf_counter() - started
+
+        failed = sum(1 for job in jobs if job.error)
+        print(f"resident pool:     {args.jobs / elapsed:.2f} jobs/s with {args.workers} workers "
+              f"({failed} failed, max queue depth {max_depth}/{args.queue_size}, {rejected} submits pushed back)")
+    finally:
+        service.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,12 +7,6 @@ from werkzeug.security import generate_password_hash, check_password_hash
 # Import db from extensions to avoid circular imports
 from extensions import db
 
-# Many-to-many relationship between FIR and LegalSection
-fir_legal_sections = db.Table('fir_legal_sections',
-    db.Column('fir_id', db.Integer, db.ForeignKey('firs.id'), primary_key=True),
-    db.Column('legal_section_id', db.Integer, db.ForeignKey('legal_sections.id'), primary_key=True)
-)
-
 # Define user roles
 class Role:
     PUBLIC = "public"
@@ -53,6 +47,14 @@ class User(db.Model, UserMixin):
 
 class FIR(db.Model):
     __tablename__ = 'firs'
+    __table_args__ = (
+        # Keyset-paginated listings, newest first (see utils/pagination.py)
+        db.Index('ix_firs_filed_at_id', 'filed_at', 'id'),
+        db.Index('ix_firs_status_filed_at_id', 'status', 'filed_at', 'id'),
+        db.Index('ix_firs_urgency_filed_at_id', 'urgency_level', 'filed_at', 'id'),
+        db.Index('ix_firs_officer_filed_at_id', 'processing_officer_id', 'filed_at', 'id'),
+        db.Index('ix_firs_complainant_filed_at_id', 'complainant_id', 'filed_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     fir_number = db.Column(db.String(50), unique=True)
@@ -66,11 +68,15 @@ class FIR(db.Model):
     filed_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
+    transcription = db.Column(db.Text, nullable=True)
     legal_sections = db.Column(db.Text, nullable=True)  # JSON string of legal sections with metadata
 
     # Relationships
     processing_officer = db.relationship('User', foreign_keys=[processing_officer_id])
     evidence = db.relationship('Evidence', backref='fir', lazy=True, cascade="all, delete-orphan")
+    investigation_notes = db.relationship(
+        'InvestigationNote', backref='fir', lazy=True, cascade="all, delete-orphan", order_by="desc(InvestigationNote.created_at)"
+    )
 
     def get_status_label(self):
         status_labels = {
@@ -90,6 +96,164 @@ class FIR(db.Model):
         }
         return urgency_labels.get(self.urgency_level, self.urgency_level)
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'fir_number': self.fir_number,
+            'status': self.status,
+            'status_label': self.get_status_label(),
+            'urgency_level': self.urgency_level,
+            'urgency_label': self.get_urgency_label(),
+            'incident_location': self.incident_location,
+            'incident_date': self.incident_date.isoformat() if self.incident_date else None,
+            'filed_at': self.filed_at.isoformat() if self.filed_at else None,
+            'complainant_id': self.complainant_id,
+            'processing_officer_id': self.processing_officer_id
+        }
+
+    def set_legal_sections(self, sections):
+        """
+        Store mapped legal sections on the FIR.
+
+        sections is the list of dicts produced by get_legal_sections_for_fir()
+        (code, name, description, relevance, confidence). The JSON copy is kept
+        for display; the FIRLegalSection rows are what queries should use.
+        """
+        self.legal_sections = json.dumps(sections) if sections is not None else None
+
+        codes = {s.get('code') for s in sections or [] if s.get('code') not in (None, 'N/A', 'ERR')}
+        section_ids = dict(
+            db.session.query(LegalSection.code, LegalSection.id)
+            .filter(LegalSection.code.in_(codes))
+            .all()
+        ) if codes else {}
+
+        links = {}
+        for s in sections or []:
+            section_id = section_ids.get(s.get('code'))
+            if section_id is not None and section_id not in links:
+                links[section_id] = FIRLegalSection(
+                    legal_section_id=section_id,
+                    confidence=float(s.get('confidence') or 0),
+                    relevance=s.get('relevance') or None
+                )
+        self.section_links = list(links.values())
+
+class FIRLegalSection(db.Model):
+    """Indexed association between a FIR and a legal section it cites."""
+    __tablename__ = 'fir_legal_sections'
+    __table_args__ = (
+        # "FIRs citing section X, best matches first" is an index range scan,
+        # and fir_id breaks ties for keyset paging (utils/pagination.py)
+        db.Index('ix_fir_legal_sections_section_confidence_fir', 'legal_section_id', 'confidence', 'fir_id'),
+    )
+
+    fir_id = db.Column(db.Integer, db.ForeignKey('firs.id'), primary_key=True)
+    legal_section_id = db.Column(db.Integer, db.ForeignKey('legal_sections.id'), primary_key=True)
+    confidence = db.Column(db.Float, default=0)
+    relevance = db.Column(db.Text, nullable=True)
+
+    fir = db.relationship('FIR', backref=db.backref('section_links', lazy=True, cascade="all, delete-orphan"))
+    legal_section = db.relationship('LegalSection')
+
+class InvestigationNote(db.Model):
+    __tablename__ = 'investigation_notes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    fir_id = db.Column(db.Integer, db.ForeignKey('firs.id'), nullable=False, index=True)
+    officer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    officer = db.relationship('User', foreign_keys=[officer_id])
+
+class StatCounter(db.Model):
+    """
+    Materialized count for one dashboard dimension value, e.g.
+    ('status', 'filed') or ('officer', '12'). Maintained by utils/stats.py.
+    """
+    __tablename__ = 'stat_counters'
+
+    dimension = db.Column(db.String(32), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class FIRSequence(db.Model):
+    """
+    Next unallocated FIR sequence number for one station and day, e.g.
+    ('HQ:20260101', 201). Allocated in blocks by utils/fir_numbers.py.
+    """
+    __tablename__ = 'fir_sequences'
+
+    scope = db.Column(db.String(40), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False, default=1)
+
+class ImportCheckpoint(db.Model):
+    """How many records of a bulk import source are committed (utils/bulk_import.py)."""
+    __tablename__ = 'import_checkpoints'
+
+    source = db.Column(db.String(255), primary_key=True)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class FIRJob(db.Model):
+    """Durable background job for the slow steps of FIR submission."""
+    __tablename__ = 'fir_jobs'
+
+    # Stages run in this order by utils.fir_jobs
+    STAGES = ('legal_sections', 'urgency', 'pdf')
+
+    id = db.Column(db.Integer, primary_key=True)
+    fir_id = db.Column(db.Integer, db.ForeignKey('firs.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, succeeded, failed
+    language_code = db.Column(db.String(10), nullable=True)
+    stages = db.Column(db.Text, nullable=True)  # JSON object of stage name -> status details
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    fir = db.relationship('FIR', backref=db.backref('jobs', lazy=True, cascade="all, delete-orphan"))
+
+    def get_stages(self):
+        """Get per-stage status as a dictionary"""
+        if not self.stages:
+            return {stage: {'status': 'pending'} for stage in self.STAGES}
+        try:
+            return json.loads(self.stages)
+        except:
+            return {}
+
+    def set_stage(self, stage, status, **details):
+        """Record the status of one stage"""
+        stages = self.get_stages()
+        entry = stages.get(stage, {})
+        entry.update(details)
+        entry['status'] = status
+        stages[stage] = entry
+        self.stages = json.dumps(stages)
+        self.updated_at = datetime.now(timezone.utc)
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'fir_id': self.fir_id,
+            'status': self.status,
+            'stages': self.get_stages(),
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
 class Evidence(db.Model):
     __tablename__ = 'evidence'
 
@@ -107,8 +271,16 @@ class Evidence(db.Model):
     file_metadata = db.Column(db.Text, nullable=True)  # JSON with metadata (e.g., EXIF for images)
     location = db.Column(db.String(255), nullable=True)  # Where the evidence was collected
     collected_at = db.Column(db.DateTime, nullable=True)  # When the evidence was collected
-    chain_of_custody = db.Column(db.Text, nullable=True)  # JSON array of custody events
+    chain_of_custody = db.Column(db.Text, nullable=True)  # Legacy JSON array of custody events; see CustodyEvent
     is_verified = db.Column(db.Boolean, default=False)  # Whether the evidence has been verified
+    # SHA-256 of the file in the evidence store (NULL for files saved before it)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    # Hash of the latest chained custody event, so a removed tail shows (utils/custody.py)
+    custody_head = db.Column(db.String(64), nullable=True)
+
+    # Never loaded whole: appended to, and read a page at a time (utils/custody.py)
+    custody_events = db.relationship('CustodyEvent', lazy='write_only', passive_deletes='all',
+                                     order_by='CustodyEvent.id')
 
     def get_tags(self):
         """Get tags as a list"""
@@ -159,30 +331,162 @@ class Evidence(db.Model):
             self.file_metadata = json.dumps(metadata_dict)
 
     def get_chain_of_custody(self):
-        """Get chain of custody as a list"""
+        """
+        Get the whole chain of custody as a list of dicts, oldest first.
+
+        Reads every event; pages should use utils.custody.custody_page().
+        """
+        events = self.get_legacy_custody()
+        if self.id is not None:
+            query = CustodyEvent.query.filter_by(evidence_id=self.id).order_by(CustodyEvent.timestamp, CustodyEvent.id)
+            events += [event.to_dict() for event in query]
+        return events
+
+    def get_legacy_custody(self):
+        """Events still in the legacy chain_of_custody JSON column, not yet moved to custody_events"""
         if not self.chain_of_custody:
             return []
         try:
-            return json.loads(self.chain_of_custody)
+            events = json.loads(self.chain_of_custody)
         except:
             return []
+        return [event for event in events if isinstance(event, dict)] if isinstance(events, list) else []
+
+    def move_legacy_custody(self):
+        """
+        Move the events of the legacy chain_of_custody column into custody_events.
+
+        Returns:
+            int: Number of events moved
+        """
+        events = self.get_legacy_custody()
+        for event in events:
+            try:
+                timestamp = datetime.fromisoformat(str(event.get('timestamp')))
+            except ValueError:
+                timestamp = None
+            if timestamp is not None and timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            self.custody_events.add(CustodyEvent(
+                user_id=event.get('user_id'),
+                action=str(event.get('action') or '')[:255],
+                notes=event.get('notes'),
+                timestamp=timestamp or datetime.now(timezone.utc).replace(tzinfo=None),
+            ))
+        self.chain_of_custody = None
+        return len(events)
 
     def add_custody_event(self, user_id, action, notes=None):
-        """Add a custody event to the chain"""
-        events = self.get_chain_of_custody()
-        events.append({
-            'user_id': user_id,
-            'action': action,
-            'timestamp': datetime.now(timezone.utc).isoformat(),
-            'notes': notes
-        })
-        self.chain_of_custody = json.dumps(events)
+        """Add a custody event to the chain: a single-row insert into custody_events"""
+        if self.chain_of_custody is not None:
+            # Older events go first, so the table stays in chronological order
+            self.move_legacy_custody()
+        self.custody_events.add(CustodyEvent(
+            user_id=user_id,
+            action=action,
+            notes=notes,
+            timestamp=datetime.now(timezone.utc).replace(tzinfo=None),
+        ))
+
+class CustodyEvent(db.Model):
+    """
+    One entry in an evidence item's chain of custody. Rows are only ever
+    inserted. With hash chaining on, each row's hash covers its content and
+    the previous row's hash (utils/custody.py).
+    """
+    __tablename__ = 'custody_events'
+    __table_args__ = (
+        # An evidence item's trail in order, a page at a time
+        db.Index('ix_custody_events_evidence_timestamp', 'evidence_id', 'timestamp', 'id'),
+        # Two appends racing for the same predecessor: one of them fails instead of forking the chain
+        db.UniqueConstraint('evidence_id', 'prev_hash', name='uq_custody_events_evidence_prev_hash'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    evidence_id = db.Column(db.Integer, db.ForeignKey('evidence.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    action = db.Column(db.String(255), nullable=False)
+    notes = db.Column(db.Text, nullable=True)
+    timestamp = db.Column(db.DateTime, nullable=False)  # UTC
+    prev_hash = db.Column(db.String(64), nullable=True)  # NULL when chaining is off
+    hash = db.Column(db.String(64), nullable=True)
+
+    def to_dict(self):
+        """The event in the shape of the legacy JSON entries"""
+        return {
+            'user_id': self.user_id,
+            'action': self.action,
+            'timestamp': self.timestamp.replace(tzinfo=timezone.utc).isoformat() if self.timestamp else None,
+            'notes': self.notes,
+        }
+
+class EvidenceBlob(db.Model):
+    """
+    One file in the content-addressed evidence store, keyed by its SHA-256
+    (utils/evidence_store.py). ref_count is the number of Evidence rows with
+    this content_hash.
+    """
+    __tablename__ = 'evidence_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False)  # Relative to the store directory
+    size = db.Column(db.BigInteger, nullable=False)
+    mime_type = db.Column(db.String(100), nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    released_at = db.Column(db.DateTime, nullable=True)  # When ref_count last dropped or an upload reused it
+
+class EvidenceUpload(db.Model):
+    """A resumable evidence upload in progress (utils/evidence_uploads.py)."""
+    __tablename__ = 'evidence_uploads'
+
+    id = db.Column(db.String(32), primary_key=True)
+    fir_id = db.Column(db.Integer, db.ForeignKey('firs.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    file_name = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)  # Bytes written and checked so far
+    fields = db.Column(db.Text, nullable=True)  # JSON of the upload form: description, tags, ...
+    sha256 = db.Column(db.String(64), nullable=True)  # Blob the assembled file went to
+    evidence_id = db.Column(db.Integer, nullable=True)  # Set once the evidence row exists
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class EvidenceAnalysisJob(db.Model):
+    """Background analysis of a set of evidence items of one FIR (utils/evidence_analysis.py)."""
+    __tablename__ = 'evidence_analysis_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    fir_id = db.Column(db.Integer, db.ForeignKey('firs.id'), nullable=False, index=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, succeeded, failed
+    evidence_ids = db.Column(db.Text, nullable=False)  # JSON array of the evidence to analyze
+    total = db.Column(db.Integer, default=0)
+    completed = db.Column(db.Integer, default=0)  # Analyzed, reused or skipped so far
+    reused = db.Column(db.Integer, default=0)  # Of those, results reused for identical content
+    failed = db.Column(db.Integer, default=0)
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    fir = db.relationship('FIR', backref=db.backref('evidence_analysis_jobs', lazy=True, cascade="all, delete-orphan"))
+
+    def get_evidence_ids(self):
+        """Get the evidence IDs as a list"""
+        try:
+            return json.loads(self.evidence_ids or '[]')
+        except:
+            return []
 
 class LegalSection(db.Model):
     __tablename__ = 'legal_sections'
 
     id = db.Column(db.Integer, primary_key=True)
-    code = db.Column(db.String(50))
+    code = db.Column(db.String(50), index=True)
     name = db.Column(db.String(100))
     description = db.Column(db.Text)
 
@@ -1,14 +1,24 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from extensions import db
 from models import User, FIR, Role
+from utils.exports import EXPORT_FORMATS, export_chunks, export_filename
 from utils.legal_mapper import initialize_legal_sections
+from utils.pagination import decode_cursor, page_size, paginate_firs
+from utils.queries import filter_cases, fir_list_query
+from utils.query_budget import query_budget
+from utils.search import search_firs
+from utils.stats import get_counters
 import os
+from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 import pandas as pd
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+URGENT_LEVELS = ('high', 'critical')
+URGENT_OPEN_STATUSES = ('filed', 'under_investigation')
+
 @admin_bp.before_request
 def check_admin():
     """Ensure only admin and police can access admin routes"""
@@ -18,26 +28,36 @@ def check_admin():
 
 @admin_bp.route('/')
 @login_required
+@query_budget(8)
 def dashboard():
     """Admin dashboard with summary statistics"""
     # Initialize legal sections if needed
     initialize_legal_sections()
 
-    # Get statistics
-    total_firs = FIR.query.count()
-    pending_firs = FIR.query.filter_by(status='filed').count()
-    investigating_firs = FIR.query.filter_by(status='under_investigation').count()
-    closed_firs = FIR.query.filter_by(status='closed').count()
-    total_users = User.query.filter_by(role=Role.PUBLIC).count()
+    # Get statistics from the materialized counters (one cached query)
+    counters = get_counters()
+    status_counts = counters.get('status', {})
+    status_urgency_counts = counters.get('status_urgency', {})
+    total_firs = counters.get('total', {}).get('all', 0)
+    pending_firs = status_counts.get('filed', 0)
+    investigating_firs = status_counts.get('under_investigation', 0)
+    closed_firs = status_counts.get('closed', 0)
+    total_users = counters.get('user_role', {}).get(Role.PUBLIC, 0)
+    urgency_counts = counters.get('urgency', {})
+    urgent_count = sum(
+        status_urgency_counts.get(f"{status}:{urgency}", 0)
+        for status in URGENT_OPEN_STATUSES
+        for urgency in URGENT_LEVELS
+    )
 
     # Get recent FIRs
-    recent_firs = FIR.query.order_by(FIR.filed_at.desc()).limit(5).all()
+    recent_firs = fir_list_query().order_by(FIR.filed_at.desc()).limit(5).all()
 
-    # Get urgent cases
-    urgent_cases = FIR.query.filter(
-        FIR.urgency_level.in_(['high', 'critical']),
-        FIR.status.in_(['filed', 'under_investigation'])
-    ).all()
+    # Get the most recent urgent cases; the total comes from the counters
+    urgent_cases = fir_list_query().filter(
+        FIR.urgency_level.in_(URGENT_LEVELS),
+        FIR.status.in_(URGENT_OPEN_STATUSES)
+    ).order_by(FIR.filed_at.desc()).limit(10).all()
 
     return render_template(
         'admin/dashboard.html',
@@ -47,40 +67,168 @@ def dashboard():
         closed_firs=closed_firs,
         total_users=total_users,
         recent_firs=recent_firs,
-        urgent_cases=urgent_cases
+        urgent_cases=urgent_cases,
+        urgent_count=urgent_count,
+        urgency_counts=urgency_counts
     )
 
+def _case_officer_id():
+    """Police users who are not admins only see their assigned cases."""
+    if current_user.is_police() and not current_user.is_admin():
+        return current_user.id
+    return None
+
+def _cases_query(status_filter, urgency_filter):
+    return filter_cases(fir_list_query(), status_filter, urgency_filter, _case_officer_id())
+
 @admin_bp.route('/cases')
 @login_required
+@query_budget(4)
 def cases():
     """List all FIR cases with filtering options"""
     status_filter = request.args.get('status', '')
     urgency_filter = request.args.get('urgency', '')
 
-    # Build the query
-    query = FIR.query
-
-    # Apply filters
-    if status_filter:
-        query = query.filter_by(status=status_filter)
-
-    if urgency_filter:
-        query = query.filter_by(urgency_level=urgency_filter)
-
-    # For police users who are not admins, only show assigned cases
-    if current_user.is_police() and not current_user.is_admin():
-        query = query.filter_by(processing_officer_id=current_user.id)
-
-    # Get sorted results
-    firs = query.order_by(FIR.filed_at.desc()).all()
+    # First page, newest first; the rest is loaded from api_cases
+    firs, next_cursor = paginate_firs(_cases_query(status_filter, urgency_filter))
 
     return render_template(
         'admin/cases.html',
         firs=firs,
+        next_cursor=next_cursor,
         status_filter=status_filter,
         urgency_filter=urgency_filter
     )
 
+@admin_bp.route('/api/cases')
+@login_required
+@query_budget(4)
+def api_cases():
+    """
+    Page through FIR cases with the same filters as the cases page.
+
+    Query args: status, urgency, cursor (from the previous page's
+    next_cursor), limit, and format=html to also get the rendered table rows.
+    """
+    try:
+        cursor = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    query = _cases_query(request.args.get('status', ''), request.args.get('urgency', ''))
+    firs, next_cursor = paginate_firs(query, cursor, page_size(request.args.get('limit')))
+
+    data = {'firs': [fir.to_dict() for fir in firs], 'next_cursor': next_cursor}
+    if request.args.get('format') == 'html':
+        data['html'] = render_template('admin/case_rows.html', firs=firs)
+    return jsonify(data)
+
+@admin_bp.route('/export')
+@login_required
+@query_budget(2)
+def export_cases():
+    """
+    Download FIR cases as CSV or JSONL, streamed as it is generated.
+
+    Query args: status and urgency (as on the cases page), format=csv|jsonl,
+    and gzip=1 to compress the download.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format; use {' or '.join(EXPORT_FORMATS)}"}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true')
+    status_filter = request.args.get('status', '')
+    urgency_filter = request.args.get('urgency', '')
+
+    chunks = export_chunks(export_format, compress, status_filter, urgency_filter, _case_officer_id())
+    filename = export_filename(export_format, compress, status_filter, urgency_filter)
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if compress else EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            # Let nginx pass chunks through instead of buffering the whole export
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+def _search_args(skip_invalid_dates=False):
+    """
+    Read the search text, filters and page from the query string.
+
+    An invalid date raises ValueError, or with skip_invalid_dates is
+    flashed and left out. Either way the officer scope is never dropped.
+    """
+    filters = {
+        'status': request.args.get('status', ''),
+        'urgency': request.args.get('urgency', ''),
+    }
+
+    # Dates are YYYY-MM-DD on filed_at; the end date is inclusive
+    for name in ('date_from', 'date_to'):
+        value = request.args.get(name, '')
+        if value:
+            try:
+                filters[name] = datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                message = f"Invalid {name.replace('_', ' ')}: use YYYY-MM-DD"
+                if not skip_invalid_dates:
+                    raise ValueError(message)
+                flash(message, 'warning')
+    if 'date_to' in filters:
+        filters['date_to'] += timedelta(days=1)
+
+    officer_id = _case_officer_id()
+    if officer_id is not None:
+        filters['officer_id'] = officer_id
+
+    query_text = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    return query_text, filters, page
+
+@admin_bp.route('/search')
+@login_required
+@query_budget(5)
+def search():
+    """Full-text search over FIR descriptions, transcriptions, locations and notes"""
+    query_text, filters, page = _search_args(skip_invalid_dates=True)
+
+    results = search_firs(query_text, filters, page=page)
+
+    return render_template(
+        'admin/search.html',
+        query=query_text,
+        results=results,
+        status_filter=request.args.get('status', ''),
+        urgency_filter=request.args.get('urgency', ''),
+        date_from=request.args.get('date_from', ''),
+        date_to=request.args.get('date_to', '')
+    )
+
+@admin_bp.route('/api/search')
+@login_required
+@query_budget(5)
+def api_search():
+    """
+    JSON search. Query args: q, status, urgency, date_from, date_to
+    (YYYY-MM-DD, inclusive), page and limit.
+    """
+    try:
+        query_text, filters, page = _search_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = search_firs(query_text, filters, page=page, per_page=page_size(request.args.get('limit'), 20))
+
+    return jsonify({
+        'results': [
+            dict(hit.fir.to_dict(), rank=hit.rank, snippet=str(hit.snippet))
+            for hit in results.hits
+        ],
+        'page': results.page,
+        'has_next': results.has_next
+    })
+
 @admin_bp.route('/users')
 @login_required
 def users():
@@ -4,73 +4,322 @@ Chatbot routes for the Intelligent FIR System.
 
 import sys
 import os
+import re
 import json
+import logging
 from datetime import datetime
+from functools import lru_cache
 from flask import Blueprint, request, jsonify, render_template, current_app
 from flask_login import login_required, current_user
 
 # Add the parent directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.chatbot import get_response
+from utils.request_events import start_event
+from utils.rate_limiter import rate_limited
+from utils.executors import run_cpu_bound, try_acquire_llm_slot, release_llm_slot
+from utils.openai_helper import map_legal_sections_llm_async
+
+# Configure logging
+logger = logging.getLogger(__name__)
 
 # Create blueprint
 chatbot_bp = Blueprint('chatbot', __name__, url_prefix='/chatbot')
 
+# Common crime keywords and their corresponding IPC sections
+COMMON_CRIMES = {
+    # Murder and homicide
+    "murder": "302",
+    "murdered": "302",
+    "murderer": "302",
+    "murderd": "302",
+    "murdred": "302",
+    "killed": "302",
+    "killing": "302",
+    "homicide": "302",
+    "manslaughter": "304",
+
+    # Assault and physical harm
+    "assault": "323",
+    "assaulted": "323",
+    "assaulting": "323",
+    "asault": "323",
+    "asaulted": "323",
+    "attacked": "323",
+    "beat": "323",
+    "beaten": "323",
+    "hit": "323",
+    "slapped": "323",
+    "punched": "323",
+    "kicked": "323",
+    "hurt": "323",
+    "injury": "323",
+    "injured": "323",
+    "wound": "323",
+    "wounded": "323",
+
+    # Stabbing (specific type of assault)
+    "stab": "324",
+    "stabbed": "324",
+    "stabbing": "324",
+    "stabing": "324",
+    "stabed": "324",
+    "stabd": "324",
+    "knife": "324",
+
+    # Theft
+    "theft": "379",
+    "thief": "379",
+    "theif": "379",
+    "theift": "379",
+    "stole": "379",
+    "stolen": "379",
+    "stealing": "379",
+
+    # Robbery
+    "robbery": "392",
+    "robbed": "392",
+    "robbing": "392",
+    "roberry": "392",
+    "robed": "392",
+
+    # Sexual crimes
+    "rape": "376",
+    "raped": "376",
+    "raping": "376",
+    "sexual": "376",
+    "molest": "376",
+    "molested": "376",
+
+    # Fraud and cheating
+    "cheat": "420",
+    "cheated": "420",
+    "cheating": "420",
+    "cheeted": "420",
+    "cheeting": "420",
+    "fraud": "420",
+    "fraudulent": "420",
+    "scam": "420",
+    "scammed": "420",
+
+    # Kidnapping
+    "kidnap": "363",
+    "kidnapped": "363",
+    "kidnapping": "363",
+    "kidnaped": "363",
+    "kidnapin": "363",
+    "abduct": "363",
+    "abducted": "363",
+
+    # Defamation
+    "defame": "499",
+    "defamed": "499",
+    "defaming": "499",
+    "slander": "499",
+    "slandered": "499",
+
+    # Harassment
+    "harass": "354D",
+    "harassed": "354D",
+    "harassing": "354D",
+    "harasment": "354D",
+    "harased": "354D",
+    "stalking": "354D",
+    "stalked": "354D",
+
+    # Threats and intimidation
+    "threat": "506",
+    "threatened": "506",
+    "threatening": "506",
+    "blackmail": "506",
+    "intimidate": "506",
+    "intimidated": "506"
+}
+
+# Words never fuzzy-matched against COMMON_CRIMES
+FUZZY_SKIP_WORDS = frozenset([
+    'with', 'this', 'that', 'then', 'than', 'they', 'them', 'their', 'there', 'these', 'those',
+    'some', 'from', 'have', 'what', 'when', 'where', 'which', 'while', 'about', 'after', 'before',
+    'during', 'under', 'above', 'below', 'between', 'through', 'today', 'tomorrow', 'yesterday',
+    'medium', 'media', 'online', 'person', 'people', 'neighbor'
+])
+
+@lru_cache(maxsize=4096)
+def _levenshtein_distance(s1, s2):
+    """Edit distance between two words."""
+    if len(s1) < len(s2):
+        return _levenshtein_distance(s2, s1)
+    if len(s2) == 0:
+        return len(s1)
+    previous_row = range(len(s2) + 1)
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        previous_row = current_row
+    return previous_row[-1]
+
+def _analyze_case_description(query, query_lower, event):
+    """
+    Match a case description against IPC sections with the keyword shortcuts
+    and the ML analyzer. Blocking (CPU and database); async views run it via
+    run_cpu_bound().
+    """
+    from utils.ml_analyzer import analyze_complaint, AnalysisContext
+
+    # Tokenize, preprocess and keyword-match the query once; the ML
+    # analyzer below reuses the same context
+    with event.stage('preprocess'):
+        context = AnalysisContext(query)
+
+        # Special case for "harrasing" which is a common misspelling
+        if "harrasing" in query_lower:
+            context.add_keyword_token("harassing")
+
+    query_words = context.keyword_token_set
+
+    # Direct keyword matching for common crimes
+    direct_matches = []
+
+    # Check for direct matches in the preprocessed query
+    with event.stage('keyword_match'):
+        for keyword, section_code in COMMON_CRIMES.items():
+            # Check for exact word matches
+            if keyword in query_words:
+                # Get the section details
+                section = context.get_section(section_code)
+                if section:
+                    # Add to direct matches with high confidence
+                    direct_matches.append({
+                        'section_code': section_code,
+                        'section_name': section.name,
+                        'section_description': section.description,
+                        'confidence': 0.85,  # High confidence for direct matches
+                        'keywords_matched': [keyword],
+                        'relevance': f"This section applies because your description contains '{keyword}', which is directly related to {section.name}."
+                    })
+            # Also check for partial matches for longer words (like "harrasing" -> "harassing")
+            elif len(keyword) > 5:
+                # For longer keywords, check if any word in the query is similar to the keyword
+                for word in context.keyword_tokens:
+                    # Skip short words and common words
+                    if len(word) < 5 or word in FUZZY_SKIP_WORDS:
+                        continue
+
+                    # Calculate similarity as 1 - (edit_distance / max_length)
+                    max_length = max(len(word), len(keyword))
+                    edit_distance = _levenshtein_distance(word, keyword)
+                    similarity = 1 - (edit_distance / max_length)
+
+                    # Only consider words with high similarity (at least 70%)
+                    if similarity >= 0.7:
+                        # Get the section details
+                        section = context.get_section(section_code)
+                        if section:
+                            # Add to direct matches with slightly lower confidence
+                            direct_matches.append({
+                                'section_code': section_code,
+                                'section_name': section.name,
+                                'section_description': section.description,
+                                'confidence': 0.75,  # Slightly lower confidence for partial matches
+                                'keywords_matched': [word],
+                                'relevance': f"This section applies because your description contains '{word}', which is similar to '{keyword}' and related to {section.name}."
+                            })
+                        break
+
+    # Analyze the complaint using the ML model
+    with event.stage('ml_analysis'):
+        analysis_result = analyze_complaint(query, context=context)
+
+    event.cache_hit(context.section_hits)
+    event.cache_miss(context.section_misses)
+
+    # Combine direct matches with ML results
+    if direct_matches:
+        if not analysis_result:
+            analysis_result = {'sections': []}
+
+        # Add direct matches to the analysis result
+        for match in direct_matches:
+            # Check if this section is already in the results
+            existing = next((s for s in analysis_result.get('sections', []) if s.get('section_code') == match['section_code']), None)
+
+            if existing:
+                # Update the existing entry with higher confidence if direct match has higher confidence
+                if match['confidence'] > existing.get('confidence', 0):
+                    existing['confidence'] = match['confidence']
+                    existing['keywords_matched'] = match['keywords_matched']
+                    existing['relevance'] = match['relevance']
+            else:
+                # Add the new match
+                analysis_result['sections'].append(match)
+
+    return analysis_result
+
+async def _llm_sections(query, event):
+    """
+    Ask the LLM for sections when the local analyzers found none. Skipped (None)
+    when every LLM call slot is busy, so a slow upstream cannot pile up requests.
+    """
+    if not try_acquire_llm_slot():
+        event.set(llm_fallback='skipped_busy')
+        return None
+    try:
+        with event.stage('llm_fallback'):
+            result = await map_legal_sections_llm_async(query)
+    except Exception as e:
+        logger.warning(f"LLM fallback failed: {str(e)}")
+        event.set(llm_fallback='error')
+        return None
+    finally:
+        release_llm_slot()
+
+    # Placeholder answers (no API key, quota exhausted) carry no real sections
+    sections = [s for s in (result or {}).get('sections', []) if s.get('section_code') not in (None, 'N/A')]
+    event.set(llm_fallback='used' if sections else 'empty')
+    return {'sections': sections} if sections else None
+
 @chatbot_bp.route('/')
 def chatbot_interface():
     """Render the chatbot interface."""
     return render_template('chatbot/index.html')
 
 @chatbot_bp.route('/api/query', methods=['POST'])
-def chatbot_query():
-    """API endpoint for chatbot queries."""
+@rate_limited('chatbot')
+async def chatbot_query():
+    """
+    API endpoint for chatbot queries.
+
+    Async so the LLM fallback is awaited rather than slept on; blocking
+    analysis runs on the shared CPU executor.
+    """
+    # One structured event per request replaces the per-step log lines
+    event = start_event('chatbot.query')
     try:
-        # Set up logging
-        import logging
-        logger = logging.getLogger(__name__)
-
-        # Log request details
-        logger.info(f"Received chatbot query request: {request.method}")
-        logger.info(f"Request headers: {request.headers}")
-        logger.info(f"Request data: {request.data}")
-        current_app.logger.info(f"Received chatbot query request: {request.method}")
-        current_app.logger.info(f"Request headers: {request.headers}")
-        current_app.logger.info(f"Request data: {request.data}")
-
         # Parse JSON data
-        data = request.get_json()
-        logger.info(f"Parsed JSON data: {data}")
-        current_app.logger.info(f"Parsed JSON data: {data}")
+        data = request.get_json(silent=True)
 
         # Validate query
         if not data or 'query' not in data:
-            logger.warning("No query provided in request")
-            current_app.logger.warning("No query provided in request")
+            event.set(outcome='bad_request', reason='missing_query')
+            event.emit(logging.WARNING)
             return jsonify({'error': 'No query provided'}), 400
 
         # Extract query
         query = data.get('query', '').strip()
-        logger.info(f"Query: {query}")
-        logger.info(f"Query type: {type(query)}")
-        logger.info(f"Query length: {len(query)}")
-        current_app.logger.info(f"Query: {query}")
-        current_app.logger.info(f"Query type: {type(query)}")
-        current_app.logger.info(f"Query length: {len(query)}")
 
         # Check for empty query
         if not query:
-            logger.warning("Empty query")
-            current_app.logger.warning("Empty query")
+            event.set(outcome='bad_request', reason='empty_query')
+            event.emit(logging.WARNING)
             return jsonify({'error': 'Empty query'}), 400
 
         # Get user ID if authenticated
         user_id = current_user.id if current_user.is_authenticated else None
-        logger.info(f"User ID: {user_id}")
-        current_app.logger.info(f"User ID: {user_id}")
-
-        # Get response from chatbot
-        logger.info("Getting response from chatbot")
-        current_app.logger.info("Getting response from chatbot")
+        event.set(user_id=user_id, query_length=len(query))
 
         # Check if this is a case description that should be analyzed
         case_keywords = [
@@ -126,257 +375,41 @@ def chatbot_query():
             "metaphorically", "figuratively", "not literally"
         ]
 
-        # Check if the query contains figurative expressions
-        contains_figurative = False
-        for expression in figurative_expressions:
-            if expression in query.lower():
-                contains_figurative = True
-                logger.info(f"Detected figurative expression: {expression}")
-                current_app.logger.info(f"Detected figurative expression: {expression}")
-                break
-
-        # Check if the query contains crime keywords
-        is_case_description = False
-        if not contains_figurative:  # Only check for crime keywords if no figurative expressions were found
-            # Special case for "harrasing" which is a common misspelling
-            if "harrasing" in query.lower():
-                is_case_description = True
-                logger.info("Detected case description with keyword: harrasing (misspelled)")
-                current_app.logger.info("Detected case description with keyword: harrasing (misspelled)")
-            else:
-                for keyword in case_keywords:
-                    if keyword in query.lower():
-                        # Check if the keyword is part of a larger word (e.g., "kill" in "skill")
-                        # by looking for word boundaries
-                        import re
-                        if re.search(r'\b' + re.escape(keyword) + r'\b', query.lower()):
-                            is_case_description = True
-                            logger.info(f"Detected case description with keyword: {keyword}")
-                            current_app.logger.info(f"Detected case description with keyword: {keyword}")
-                            break
+        with event.stage('classify'):
+            query_lower = query.lower()
+
+            # Check if the query contains figurative expressions
+            contains_figurative = any(expression in query_lower for expression in figurative_expressions)
+
+            # Check if the query contains crime keywords
+            is_case_description = False
+            trigger_keyword = None
+            if not contains_figurative:  # Only check for crime keywords if no figurative expressions were found
+                # Special case for "harrasing" which is a common misspelling
+                if "harrasing" in query_lower:
+                    is_case_description = True
+                    trigger_keyword = "harrasing"
+                else:
+                    for keyword in case_keywords:
+                        if keyword in query_lower:
+                            # Check if the keyword is part of a larger word (e.g., "kill" in "skill")
+                            # by looking for word boundaries
+                            if re.search(r'\b' + re.escape(keyword) + r'\b', query_lower):
+                                is_case_description = True
+                                trigger_keyword = keyword
+                                break
+
+        event.set(figurative=contains_figurative, trigger_keyword=trigger_keyword)
 
         # Process as a case description if it contains crime keywords and no figurative expressions
         if is_case_description and not contains_figurative:
-            logger.info("Detected case description for analysis")
-            current_app.logger.info("Detected case description for analysis")
-
-            # Import analyze_complaint directly
-            from utils.ml_analyzer import analyze_complaint, preprocess_text
-            from models import LegalSection
-
-            # Preprocess the query to handle misspellings
-            preprocessed_query = preprocess_text(query)
-            logger.info(f"Preprocessed query: {preprocessed_query}")
-            current_app.logger.info(f"Preprocessed query: {preprocessed_query}")
-
-            # Special case for "harrasing" which is a common misspelling
-            if "harrasing" in query.lower():
-                # Add "harassing" to the preprocessed query
-                preprocessed_query = preprocessed_query + " harassing"
-                logger.info(f"Added 'harassing' to preprocessed query: {preprocessed_query}")
-                current_app.logger.info(f"Added 'harassing' to preprocessed query: {preprocessed_query}")
-
-            # Direct keyword matching for common crimes
-            direct_matches = []
-
-            # Common crime keywords and their corresponding IPC sections
-            common_crimes = {
-                # Murder and homicide
-                "murder": "302",
-                "murdered": "302",
-                "murderer": "302",
-                "murderd": "302",
-                "murdred": "302",
-                "killed": "302",
-                "killing": "302",
-                "homicide": "302",
-                "manslaughter": "304",
-
-                # Assault and physical harm
-                "assault": "323",
-                "assaulted": "323",
-                "assaulting": "323",
-                "asault": "323",
-                "asaulted": "323",
-                "attacked": "323",
-                "beat": "323",
-                "beaten": "323",
-                "hit": "323",
-                "slapped": "323",
-                "punched": "323",
-                "kicked": "323",
-                "hurt": "323",
-                "injury": "323",
-                "injured": "323",
-                "wound": "323",
-                "wounded": "323",
-
-                # Stabbing (specific type of assault)
-                "stab": "324",
-                "stabbed": "324",
-                "stabbing": "324",
-                "stabing": "324",
-                "stabed": "324",
-                "stabd": "324",
-                "knife": "324",
-
-                # Theft
-                "theft": "379",
-                "thief": "379",
-                "theif": "379",
-                "theift": "379",
-                "stole": "379",
-                "stolen": "379",
-                "stealing": "379",
-
-                # Robbery
-                "robbery": "392",
-                "robbed": "392",
-                "robbing": "392",
-                "roberry": "392",
-                "robed": "392",
-
-                # Sexual crimes
-                "rape": "376",
-                "raped": "376",
-                "raping": "376",
-                "sexual": "376",
-                "molest": "376",
-                "molested": "376",
-
-                # Fraud and cheating
-                "cheat": "420",
-                "cheated": "420",
-                "cheating": "420",
-                "cheeted": "420",
-                "cheeting": "420",
-                "fraud": "420",
-                "fraudulent": "420",
-                "scam": "420",
-                "scammed": "420",
-
-                # Kidnapping
-                "kidnap": "363",
-                "kidnapped": "363",
-                "kidnapping": "363",
-                "kidnaped": "363",
-                "kidnapin": "363",
-                "abduct": "363",
-                "abducted": "363",
-
-                # Defamation
-                "defame": "499",
-                "defamed": "499",
-                "defaming": "499",
-                "slander": "499",
-                "slandered": "499",
-
-                # Harassment
-                "harass": "354D",
-                "harassed": "354D",
-                "harassing": "354D",
-                "harasment": "354D",
-                "harased": "354D",
-                "stalking": "354D",
-                "stalked": "354D",
-
-                # Threats and intimidation
-                "threat": "506",
-                "threatened": "506",
-                "threatening": "506",
-                "blackmail": "506",
-                "intimidate": "506",
-                "intimidated": "506"
-            }
-
-            # Check for direct matches in the preprocessed query
-            for keyword, section_code in common_crimes.items():
-                # Check for exact word matches
-                if keyword in preprocessed_query.split():
-                    # Get the section details
-                    section = LegalSection.query.filter_by(code=section_code).first()
-                    if section:
-                        # Add to direct matches with high confidence
-                        direct_matches.append({
-                            'section_code': section_code,
-                            'section_name': section.name,
-                            'section_description': section.description,
-                            'confidence': 0.85,  # High confidence for direct matches
-                            'keywords_matched': [keyword],
-                            'relevance': f"This section applies because your description contains '{keyword}', which is directly related to {section.name}."
-                        })
-                # Also check for partial matches for longer words (like "harrasing" -> "harassing")
-                elif len(keyword) > 5 and keyword not in preprocessed_query.split():
-                    # For longer keywords, check if any word in the query is similar to the keyword
-                    for word in preprocessed_query.split():
-                        # Skip short words and common words
-                        if len(word) < 5 or word in ['with', 'this', 'that', 'then', 'than', 'they', 'them', 'their', 'there', 'these', 'those', 'some', 'from', 'have', 'what', 'when', 'where', 'which', 'while', 'about', 'after', 'before', 'during', 'under', 'above', 'below', 'between', 'through', 'today', 'tomorrow', 'yesterday', 'medium', 'media', 'online', 'person', 'people', 'neighbor']:
-                            continue
-
-                        # Calculate Levenshtein distance (edit distance)
-                        def levenshtein_distance(s1, s2):
-                            if len(s1) < len(s2):
-                                return levenshtein_distance(s2, s1)
-                            if len(s2) == 0:
-                                return len(s1)
-                            previous_row = range(len(s2) + 1)
-                            for i, c1 in enumerate(s1):
-                                current_row = [i + 1]
-                                for j, c2 in enumerate(s2):
-                                    insertions = previous_row[j + 1] + 1
-                                    deletions = current_row[j] + 1
-                                    substitutions = previous_row[j] + (c1 != c2)
-                                    current_row.append(min(insertions, deletions, substitutions))
-                                previous_row = current_row
-                            return previous_row[-1]
-
-                        # Calculate similarity as 1 - (edit_distance / max_length)
-                        max_length = max(len(word), len(keyword))
-                        edit_distance = levenshtein_distance(word, keyword)
-                        similarity = 1 - (edit_distance / max_length)
-
-                        # Only consider words with high similarity (at least 70%)
-                        if similarity >= 0.7:
-                            # Get the section details
-                            section = LegalSection.query.filter_by(code=section_code).first()
-                            if section:
-                                # Add to direct matches with slightly lower confidence
-                                direct_matches.append({
-                                    'section_code': section_code,
-                                    'section_name': section.name,
-                                    'section_description': section.description,
-                                    'confidence': 0.75,  # Slightly lower confidence for partial matches
-                                    'keywords_matched': [word],
-                                    'relevance': f"This section applies because your description contains '{word}', which is similar to '{keyword}' and related to {section.name}."
-                                })
-                            break
-
-            # Analyze the complaint using the ML model
-            logger.info("Analyzing complaint directly")
-            current_app.logger.info("Analyzing complaint directly")
-            analysis_result = analyze_complaint(query)
-            logger.info(f"Analysis result: {analysis_result}")
-            current_app.logger.info(f"Analysis result: {analysis_result}")
-
-            # Combine direct matches with ML results
-            if direct_matches:
-                if not analysis_result:
-                    analysis_result = {'sections': []}
-
-                # Add direct matches to the analysis result
-                for match in direct_matches:
-                    # Check if this section is already in the results
-                    existing = next((s for s in analysis_result.get('sections', []) if s.get('section_code') == match['section_code']), None)
-
-                    if existing:
-                        # Update the existing entry with higher confidence if direct match has higher confidence
-                        if match['confidence'] > existing.get('confidence', 0):
-                            existing['confidence'] = match['confidence']
-                            existing['keywords_matched'] = match['keywords_matched']
-                            existing['relevance'] = match['relevance']
-                    else:
-                        # Add the new match
-                        analysis_result['sections'].append(match)
+            event.set(intent='analyze_complaint')
+
+            analysis_result = await run_cpu_bound(_analyze_case_description, query, query_lower, event)
+
+            # Nothing matched locally: fall back to the LLM without holding a thread
+            if not (analysis_result and analysis_result.get('sections')):
+                analysis_result = await _llm_sections(query, event) or analysis_result
 
             # Format the response
             if analysis_result and analysis_result.get('sections'):
@@ -430,8 +463,7 @@ def chatbot_query():
                     highest_confidence = max([s.get('confidence', 0) for s in filtered_sections]) if filtered_sections else 0
 
                     if highest_confidence < 0.30:  # Less than 30% confidence for the best match - increased threshold
-                        logger.info(f"Likely false positive - highest confidence: {highest_confidence}")
-                        current_app.logger.info(f"Likely false positive - highest confidence: {highest_confidence}")
+                        event.set(outcome='low_confidence')
 
                         response = {
                             'text': "I don't think this describes a crime situation with enough detail. If you're trying to report a crime, please provide more specific details about the incident.",
@@ -485,18 +517,20 @@ def chatbot_query():
                     'timestamp': datetime.now().isoformat()
                 }
         else:
-            # Get response from chatbot
-            response = get_response(query, user_id)
+            # Get response from chatbot (records its own intent on the event)
+            with event.stage('chatbot'):
+                response = await run_cpu_bound(get_response, query, user_id)
 
-        logger.info(f"Chatbot response: {response}")
-        current_app.logger.info(f"Chatbot response: {response}")
+        analysis = response.get('data', {}).get('analysis') or {}
+        event.set(sections=[s.get('section_code') for s in analysis.get('sections', [])])
+        event.emit()
 
         return jsonify(response)
 
     except Exception as e:
-        import traceback
-        current_app.logger.error(f"Error processing chatbot query: {str(e)}")
-        current_app.logger.error(traceback.format_exc())
+        logger.exception("Error processing chatbot query")
+        event.set(outcome='error', error=str(e))
+        event.emit(logging.ERROR)
         return jsonify({'error': f'An error occurred while processing your query: {str(e)}'}), 500
 
 @chatbot_bp.route('/api/history', methods=['GET'])
@@ -2,16 +2,25 @@
 Routes for evidence management
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort, send_file
 from flask_login import login_required, current_user
 import os
 import json
 from datetime import datetime, timezone
-from werkzeug.utils import secure_filename
-import uuid
 
-from models import db, FIR, Evidence, User
-from utils.evidence_analyzer import extract_metadata, analyze_evidence, get_file_type, suggest_evidence_category, EVIDENCE_TYPES, CATEGORIES
+from models import db, FIR, Evidence, EvidenceAnalysisJob, EvidenceBlob, User
+from utils.custody import custody_page, page_size as custody_page_size, verify_chain
+from utils.evidence_analysis import active_job, enqueue_analysis, job_state, notify_analysis_workers
+from utils.evidence_analyzer import suggest_evidence_category, EVIDENCE_TYPES, CATEGORIES
+from utils.evidence_delivery import send_evidence_file
+from utils.evidence_derivatives import (
+    VARIANTS as DERIVATIVE_VARIANTS, ensure_derivative, evidence_file_path, schedule_evidence_derivatives
+)
+from utils.evidence_store import store_upload, verify_blob
+from utils.evidence_uploads import (
+    UploadError, assemble_upload, cancel_upload, claim_upload, create_upload, get_upload, upload_fields, upload_state,
+    write_chunk
+)
 
 # Configure logging
 import logging
@@ -20,6 +29,9 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 evidence_bp = Blueprint('evidence', __name__, url_prefix='/evidence')
 
+# Derivatives are addressed by content hash, so they never change under a URL
+DERIVATIVE_MAX_AGE = 365 * 24 * 3600
+
 def allowed_file(filename):
     """Check if the file extension is allowed"""
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'tiff',  # Images
@@ -50,7 +62,8 @@ def manage_evidence(fir_id):
     # Get all evidence for this FIR
     evidence_items = Evidence.query.filter_by(fir_id=fir.id).all()
 
-    return render_template('evidence/manage.html', fir=fir, evidence_items=evidence_items)
+    return render_template('evidence/manage.html', fir=fir, evidence_items=evidence_items,
+                           analysis_job=active_job(fir.id))
 
 @evidence_bp.route('/view/<int:evidence_id>')
 @login_required
@@ -74,7 +87,166 @@ def view_evidence(evidence_id):
         flash('You do not have permission to view this evidence.', 'danger')
         return redirect(url_for('fir.dashboard'))
 
-    return render_template('evidence/view.html', evidence=evidence, fir=fir)
+    # One page of the chain of custody; events not yet moved out of the JSON column come first
+    after = request.args.get('custody_after', type=int)
+    custody_events, custody_next = custody_page(evidence.id, after)
+    legacy_custody = evidence.get_legacy_custody() if after is None else []
+
+    return render_template('evidence/view.html', evidence=evidence, fir=fir,
+                           custody_events=custody_events, custody_next=custody_next,
+                           legacy_custody=legacy_custody, analysis_job=active_job(fir.id, evidence.id))
+
+@evidence_bp.route('/custody/<int:evidence_id>')
+@login_required
+def custody(evidence_id):
+    """
+    Chain of custody of an evidence item as JSON, a page at a time
+
+    Args:
+        evidence_id: The ID of the evidence
+    """
+    evidence = Evidence.query.get_or_404(evidence_id)
+    fir = FIR.query.get_or_404(evidence.fir_id)
+    if not (current_user.is_admin() or current_user.is_police() or
+            fir.complainant_id == current_user.id or
+            fir.processing_officer_id == current_user.id):
+        return jsonify({'error': 'Permission denied'}), 403
+
+    after = request.args.get('after', type=int)
+    events, next_after = custody_page(evidence.id, after, custody_page_size(request.args.get('limit')))
+    items = evidence.get_legacy_custody() if after is None else []
+    for event in events:
+        item = event.to_dict()
+        item['id'] = event.id
+        item['hash'] = event.hash
+        items.append(item)
+    return jsonify({'events': items, 'next_after': next_after})
+
+@evidence_bp.route('/file/<int:evidence_id>')
+@login_required
+def serve_file(evidence_id):
+    """
+    Stream an evidence file, with Range support for seeking in media
+
+    Args:
+        evidence_id: The ID of the evidence
+
+    Query parameters:
+        download: 1 to save the file instead of displaying it
+    """
+    evidence = Evidence.query.get_or_404(evidence_id)
+    fir = FIR.query.get_or_404(evidence.fir_id)
+
+    # Same permission as viewing the evidence itself
+    if not (current_user.is_admin() or current_user.is_police() or
+            fir.complainant_id == current_user.id or
+            fir.processing_officer_id == current_user.id):
+        abort(403)
+
+    path = evidence_file_path(evidence)
+    if not evidence.file_path or not os.path.isfile(path):
+        abort(404)
+
+    blob = db.session.get(EvidenceBlob, evidence.content_hash) if evidence.content_hash else None
+    download_name = evidence.get_metadata().get('file_name') or os.path.basename(path)
+    return send_evidence_file(
+        path,
+        mime_type=blob.mime_type if blob else None,
+        etag=evidence.content_hash,
+        download_name=download_name,
+        as_attachment=request.args.get('download') == '1'
+    )
+
+@evidence_bp.route('/derived/<int:evidence_id>/<variant>.webp')
+@login_required
+def derived(evidence_id, variant):
+    """
+    Serve a WebP thumbnail, preview or video poster of an evidence file
+
+    Args:
+        evidence_id: The ID of the evidence
+        variant: thumb, preview or poster
+    """
+    if variant not in DERIVATIVE_VARIANTS:
+        abort(404)
+
+    evidence = Evidence.query.get_or_404(evidence_id)
+    fir = FIR.query.get_or_404(evidence.fir_id)
+
+    # Same permission as viewing the evidence itself
+    if not (current_user.is_admin() or current_user.is_police() or
+            fir.complainant_id == current_user.id or
+            fir.processing_officer_id == current_user.id):
+        abort(403)
+
+    path = ensure_derivative(evidence, variant)
+    if path is None:
+        abort(404)
+
+    # The URL carries the content hash, so the browser may keep it for good
+    response = send_file(path, mimetype='image/webp', max_age=DERIVATIVE_MAX_AGE, conditional=True)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+def _new_evidence(fir, stored, fields, user_id):
+    """
+    Evidence row for a file placed in the store, from the upload form fields.
+
+    Args:
+        fir: FIR the evidence belongs to
+        stored: StoredFile from the evidence store
+        fields: Mapping with description, category, tags, location, collected_at
+        user_id: Uploading user, recorded in the chain of custody
+    """
+    file_type = stored.ingest.file_type
+    description = fields.get('description', '')
+    category = fields.get('category', '')
+    tags = fields.get('tags', '')
+    location = fields.get('location', '')
+    collected_at_str = fields.get('collected_at', '')
+
+    # Parse collected_at if provided
+    collected_at = None
+    if collected_at_str:
+        try:
+            collected_at = datetime.fromisoformat(collected_at_str)
+        except ValueError:
+            logger.warning(f"Invalid collected_at format: {collected_at_str}")
+
+    # Parse tags
+    tags_list = []
+    if tags:
+        tags_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
+
+    # If no category provided, suggest one
+    if not category:
+        category = suggest_evidence_category(file_type)
+
+    evidence = Evidence()
+    evidence.fir_id = fir.id
+    evidence.type = file_type
+    evidence.file_path = stored.file_path
+    evidence.content_hash = stored.blob.sha256
+    evidence.description = description
+    evidence.category = category
+    evidence.set_tags(tags_list)
+    evidence.set_metadata(stored.metadata)
+    evidence.location = location
+    evidence.collected_at = collected_at
+    evidence.add_custody_event(
+        user_id=user_id,
+        action="Evidence uploaded",
+        notes=f"SHA-256 {stored.blob.sha256}"
+    )
+    return evidence
+
+def _can_upload(fir):
+    """Whether the current user may add evidence to the FIR."""
+    return (current_user.is_admin() or current_user.is_police() or
+            fir.complainant_id == current_user.id or
+            fir.processing_officer_id == current_user.id)
 
 @evidence_bp.route('/upload/<int:fir_id>', methods=['POST'])
 @login_required
@@ -89,9 +261,7 @@ def upload_evidence(fir_id):
     fir = FIR.query.get_or_404(fir_id)
 
     # Check if the user has permission to upload evidence for this FIR
-    if not (current_user.is_admin() or current_user.is_police() or
-            fir.complainant_id == current_user.id or
-            fir.processing_officer_id == current_user.id):
+    if not _can_upload(fir):
         flash('You do not have permission to upload evidence for this FIR.', 'danger')
         return redirect(url_for('fir.dashboard'))
 
@@ -110,66 +280,25 @@ def upload_evidence(fir_id):
     # Check if the file is allowed
     if file and allowed_file(file.filename):
         try:
-            # Secure the filename
-            original_filename = secure_filename(file.filename)
-
-            # Generate a unique filename
-            unique_filename = f"{uuid.uuid4()}_{original_filename}"
-
-            # Create the upload directory if it doesn't exist
-            static_folder = current_app.static_folder or 'static'
-            upload_dir = os.path.join(static_folder, 'uploads', 'evidence')
-            os.makedirs(upload_dir, exist_ok=True)
-
-            # Save the file
-            file_path = os.path.join(upload_dir, unique_filename)
-            file.save(file_path)
-
-            # Determine the file type
-            file_type = get_file_type(file_path)
-
-            # Extract metadata
-            metadata = extract_metadata(file_path)
-
-            # Get form data
-            description = request.form.get('description', '')
-            category = request.form.get('category', '')
-            tags = request.form.get('tags', '')
-            location = request.form.get('location', '')
-            collected_at_str = request.form.get('collected_at', '')
-            analyze = 'analyze' in request.form
-
-            # Parse collected_at if provided
-            collected_at = None
-            if collected_at_str:
-                try:
-                    collected_at = datetime.fromisoformat(collected_at_str)
-                except ValueError:
-                    logger.warning(f"Invalid collected_at format: {collected_at_str}")
-
-            # Parse tags
-            tags_list = []
-            if tags:
-                tags_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-
-            # If no category provided, suggest one
-            if not category:
-                category = suggest_evidence_category(file_type)
+            # Save the file into the content-addressed store, hashing it and
+            # detecting its type in the same pass; identical content is kept once
+            stored = store_upload(file)
 
-            # Create a new evidence record
-            # Store file path with forward slashes for web compatibility
-            web_file_path = f"uploads/evidence/{unique_filename}"
-            evidence = Evidence()
-            evidence.fir_id = fir.id
-            evidence.type = file_type
-            evidence.file_path = web_file_path
-            evidence.description = description
-
-            # Note: Extended evidence features (tags, metadata, custody) are not available in the simple model
+            # Create a new evidence record from the form data
+            evidence = _new_evidence(fir, stored, request.form, current_user.id)
 
             # Save to database
             db.session.add(evidence)
+            analyze = 'analyze' in request.form
+            if analyze:
+                db.session.flush()
+                enqueue_analysis(fir, [evidence.id], current_user.id)
             db.session.commit()
+            if analyze:
+                notify_analysis_workers()
+
+            # Thumbnails and previews are made in the background
+            schedule_evidence_derivatives([evidence])
 
             # Note: Evidence analysis is not available with the simple model
 
@@ -183,6 +312,139 @@ def upload_evidence(fir_id):
         flash('File type not allowed', 'danger')
         return redirect(url_for('evidence.manage_evidence', fir_id=fir.id))
 
+# Resumable chunked uploads (utils/evidence_uploads.py)
+
+def _upload_error(error):
+    return jsonify({'success': False, 'error': str(error), **error.details}), error.status
+
+def _upload_response(upload, status=200):
+    state = upload_state(upload)
+    state['success'] = True
+    state['upload_url'] = url_for('evidence.upload_chunk', upload_id=upload.id)
+    state['complete_url'] = url_for('evidence.complete_upload', upload_id=upload.id)
+    response = jsonify(state)
+    response.status_code = status
+    response.headers['Upload-Offset'] = str(upload.received)
+    response.headers['Upload-Length'] = str(upload.size)
+    response.cache_control.no_store = True
+    return response
+
+@evidence_bp.route('/uploads/<int:fir_id>', methods=['POST'])
+@login_required
+def start_upload(fir_id):
+    """
+    Start a resumable upload of a large evidence file
+
+    Args:
+        fir_id: The ID of the FIR
+    """
+    fir = FIR.query.get_or_404(fir_id)
+    if not _can_upload(fir):
+        return jsonify({'success': False, 'error': 'You do not have permission to upload evidence for this FIR.'}), 403
+
+    data = request.get_json(silent=True) or {}
+    file_name = str(data.get('filename') or '')
+    if not file_name or not allowed_file(file_name):
+        return jsonify({'success': False, 'error': 'File type not allowed'}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'The file size is required.'}), 400
+
+    fields = {name: str(data.get(name) or '') for name in ('description', 'category', 'tags', 'location', 'collected_at')}
+    fields['analyze'] = bool(data.get('analyze'))
+    try:
+        upload = create_upload(fir, current_user.id, file_name, size, fields)
+    except UploadError as e:
+        return _upload_error(e)
+    return _upload_response(upload, 201)
+
+@evidence_bp.route('/uploads/<upload_id>', methods=['GET', 'HEAD', 'PATCH', 'DELETE'])
+@login_required
+def upload_chunk(upload_id):
+    """
+    Offset of a resumable upload (GET/HEAD), its next chunk (PATCH), or
+    cancelling it (DELETE)
+
+    Args:
+        upload_id: The upload ID returned when it was started
+    """
+    upload = get_upload(upload_id, current_user.id)
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+
+    try:
+        if request.method == 'PATCH':
+            offset = request.args.get('offset', type=int)
+            if offset is None:
+                offset = request.headers.get('Upload-Offset', type=int)
+            if offset is None:
+                return jsonify({'success': False, 'error': 'The chunk offset is required.'}), 400
+            write_chunk(upload, offset, request.stream, request.headers.get('X-Chunk-SHA256'))
+        elif request.method == 'DELETE':
+            if upload.evidence_id is not None:
+                raise UploadError('The upload is already complete.', 409, evidence_id=upload.evidence_id)
+            cancel_upload(upload)
+            return jsonify({'success': True})
+    except UploadError as e:
+        return _upload_error(e)
+    return _upload_response(upload)
+
+@evidence_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """
+    Assemble a fully received upload into an evidence record
+
+    Args:
+        upload_id: The upload ID returned when it was started
+    """
+    upload = get_upload(upload_id, current_user.id)
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    fir = FIR.query.get_or_404(upload.fir_id)
+
+    # Completing twice (e.g. a retry after a lost response) gives the same evidence
+    if upload.evidence_id is None:
+        try:
+            stored = assemble_upload(upload)
+        except UploadError as e:
+            return _upload_error(e)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error assembling upload {upload.id}: {str(e)}")
+            return jsonify({'success': False, 'error': f"Error uploading evidence: {str(e)}"}), 500
+
+        # The file is in the store and upload.sha256 is committed: if this
+        # fails, a retry creates the evidence from the blob
+        fields = upload_fields(upload)
+        try:
+            evidence = _new_evidence(fir, stored, fields, current_user.id)
+            db.session.add(evidence)
+            db.session.flush()
+            if not claim_upload(upload, evidence.id):
+                # A concurrent retry created the evidence first
+                db.session.rollback()
+                evidence = None
+            else:
+                if fields.get('analyze'):
+                    enqueue_analysis(fir, [evidence.id], current_user.id)
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error creating evidence for upload {upload_id}: {str(e)}")
+            return jsonify({'success': False, 'error': f"Error uploading evidence: {str(e)}"}), 500
+
+        if evidence is not None:
+            if fields.get('analyze'):
+                notify_analysis_workers()
+            schedule_evidence_derivatives([evidence])
+            flash('Evidence uploaded successfully', 'success')
+
+    response = _upload_response(upload)
+    response.headers['Location'] = url_for('evidence.view_evidence', evidence_id=upload.evidence_id)
+    return response
+
 @evidence_bp.route('/delete/<int:evidence_id>', methods=['POST'])
 @login_required
 def delete_evidence(evidence_id):
@@ -205,9 +467,12 @@ def delete_evidence(evidence_id):
         return redirect(url_for('evidence.manage_evidence', fir_id=fir.id))
 
     try:
-        # Delete the file if it exists
-        if evidence.file_path and os.path.exists(evidence.file_path):
-            os.remove(evidence.file_path)
+        # Files in the evidence store may be shared with other evidence; they are
+        # released with the row and removed by `flask gc-evidence` once unused
+        if not evidence.content_hash and evidence.file_path:
+            file_path = os.path.join(current_app.static_folder, evidence.file_path)
+            if os.path.exists(file_path):
+                os.remove(file_path)
 
         # Delete the evidence record
         db.session.delete(evidence)
@@ -309,43 +574,61 @@ def analyze_evidence_route(evidence_id):
         flash('You do not have permission to analyze this evidence.', 'danger')
         return redirect(url_for('evidence.manage_evidence', fir_id=fir.id))
 
-    try:
-        # Check if the file exists
-        if not evidence.file_path or not os.path.exists(evidence.file_path):
-            flash('Evidence file not found', 'danger')
-            return redirect(url_for('evidence.view_evidence', evidence_id=evidence.id))
+    # Analysis runs in the background; the evidence page shows its progress
+    enqueue_analysis(fir, [evidence.id], current_user.id)
+    db.session.commit()
+    notify_analysis_workers()
+    flash('Evidence analysis has been queued.', 'info')
 
-        # Analyze the evidence
-        analysis_result = analyze_evidence(evidence.file_path, evidence.type)
-        evidence.set_analysis(analysis_result)
-
-        # Extract tags from analysis
-        if analysis_result and 'tags' in analysis_result:
-            new_tags = analysis_result['tags']
-            if new_tags:
-                current_tags = evidence.get_tags()
-                # Add new tags that aren't already in the list
-                for tag in new_tags:
-                    if tag not in current_tags:
-                        current_tags.append(tag)
-                evidence.set_tags(current_tags)
+    return redirect(url_for('evidence.view_evidence', evidence_id=evidence.id))
 
-        # Add custody event
-        evidence.add_custody_event(
-            user_id=current_user.id,
-            action="Evidence analyzed",
-            notes=f"Analyzed by {current_user.username}"
-        )
+@evidence_bp.route('/analyze_all/<int:fir_id>', methods=['POST'])
+@login_required
+def analyze_all_evidence(fir_id):
+    """
+    Queue analysis of every evidence item of a FIR
 
-        # Save changes
-        db.session.commit()
+    Args:
+        fir_id: The ID of the FIR
+    """
+    fir = FIR.query.get_or_404(fir_id)
+    if not (current_user.is_admin() or current_user.is_police() or
+            fir.complainant_id == current_user.id or
+            fir.processing_officer_id == current_user.id):
+        flash('You do not have permission to analyze evidence for this FIR.', 'danger')
+        return redirect(url_for('fir.dashboard'))
 
-        flash('Evidence analyzed successfully', 'success')
-    except Exception as e:
-        logger.error(f"Error analyzing evidence: {str(e)}")
-        flash(f"Error analyzing evidence: {str(e)}", 'danger')
+    evidence_ids = [evidence_id for (evidence_id,) in db.session.query(Evidence.id).filter(Evidence.fir_id == fir.id)]
+    if not evidence_ids:
+        flash('There is no evidence to analyze.', 'warning')
+        return redirect(url_for('evidence.manage_evidence', fir_id=fir.id))
 
-    return redirect(url_for('evidence.view_evidence', evidence_id=evidence.id))
+    enqueue_analysis(fir, evidence_ids, current_user.id)
+    db.session.commit()
+    notify_analysis_workers()
+    flash(f'Analysis of {len(evidence_ids)} evidence item(s) has been queued.', 'info')
+    return redirect(url_for('evidence.manage_evidence', fir_id=fir.id))
+
+@evidence_bp.route('/analysis_jobs/<int:job_id>')
+@login_required
+def analysis_job_status(job_id):
+    """
+    Progress of a background analysis job
+
+    Args:
+        job_id: The ID of the analysis job
+    """
+    job = db.session.get(EvidenceAnalysisJob, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    fir = db.session.get(FIR, job.fir_id)
+    if fir is None or not (current_user.is_admin() or current_user.is_police() or
+                           fir.complainant_id == current_user.id or
+                           fir.processing_officer_id == current_user.id):
+        return jsonify({'error': 'Job not found'}), 404
+    response = jsonify(job_state(job))
+    response.cache_control.no_store = True
+    return response
 
 @evidence_bp.route('/verify/<int:evidence_id>')
 @login_required
@@ -368,6 +651,37 @@ def verify_evidence(evidence_id):
         return redirect(url_for('evidence.view_evidence', evidence_id=evidence.id))
 
     try:
+        notes = None
+        if not evidence.is_verified and evidence.content_hash:
+            # The stored file must still be byte-for-byte what was uploaded
+            blob = db.session.get(EvidenceBlob, evidence.content_hash)
+            intact = verify_blob(blob) if blob else None
+            if not intact:
+                problem = 'is missing' if intact is None else 'does not match its recorded SHA-256'
+                evidence.add_custody_event(
+                    user_id=current_user.id,
+                    action="Evidence integrity check failed",
+                    notes=f"Stored file {problem}"
+                )
+                db.session.commit()
+                flash(f'Evidence cannot be verified: the stored file {problem}.', 'danger')
+                return redirect(url_for('evidence.view_evidence', evidence_id=evidence.id))
+            notes = f"SHA-256 {evidence.content_hash} checked"
+
+        if not evidence.is_verified:
+            # Nor may the custody trail have been edited since it was written
+            intact, _, bad_event = verify_chain(evidence.id)
+            if not intact:
+                evidence.add_custody_event(
+                    user_id=current_user.id,
+                    action="Custody chain check failed",
+                    notes=f"Event {bad_event} does not match the hash chain" if bad_event is not None
+                    else "Events are missing from the end of the hash chain"
+                )
+                db.session.commit()
+                flash('Evidence cannot be verified: its chain of custody has been altered.', 'danger')
+                return redirect(url_for('evidence.view_evidence', evidence_id=evidence.id))
+
         # Toggle verification status
         evidence.is_verified = not evidence.is_verified
 
@@ -376,7 +690,7 @@ def verify_evidence(evidence_id):
         evidence.add_custody_event(
             user_id=current_user.id,
             action=action,
-            notes=f"{action} by {current_user.username}"
+            notes=f"{action} by {current_user.username}" + (f"; {notes}" if notes else "")
         )
 
         # Save changes
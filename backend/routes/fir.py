@@ -2,72 +2,25 @@ import os
 import json
 import uuid
 from datetime import datetime, timezone
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file, session, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from extensions import db
-from models import FIR, Evidence, User, Role
+from models import FIR, FIRJob, Evidence, User, Role
 from models import __dict__ as models_dict
 import models
 from utils.openai_helper import map_legal_sections, analyze_image
-from utils.ml_analyzer import analyze_complaint
-from utils.legal_mapper import get_legal_sections_for_fir
-from utils.pdf_generator import generate_fir_pdf, generate_fir_pdf_simple, generate_and_store_fir_pdf
-import tempfile
-import logging
-import queue
-import threading
-import time
-
-logger = logging.getLogger(__name__)
-
-fir_bp = Blueprint('fir', __name__, url_prefix='/fir')
-
-# ...existing code...
-
-@fir_bp.route('/transcribe_whisper', methods=['POST'])
-@login_required
-def transcribe_whisper():
-    """Accepts an audio file upload, transcribes it using OpenAI Whisper, and returns the text."""
-    try:
-        import whisper
-        audio = request.files.get('audio')
-        if not audio:
-            return jsonify({'success': False, 'error': 'No audio file uploaded.'}), 400
-        # Save to a temp file
-        temp_dir = tempfile.mkdtemp()
-        audio_path = os.path.join(temp_dir, secure_filename(audio.filename or 'audio.webm'))
-        audio.save(audio_path)
-        # Get language from form (optional)
-        language = request.form.get('language', 'auto')
-        model = whisper.load_model('base')
-        transcribe_args = {'task': 'transcribe'}
-        if language and language != 'auto':
-            transcribe_args['language'] = language
-        result = model.transcribe(audio_path, **transcribe_args)
-        text = result.get('text', '')
-        # Clean up temp file
-        try:
-            os.remove(audio_path)
-            os.rmdir(temp_dir)
-        except Exception:
-            pass
-        return jsonify({'success': True, 'text': text})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-import os
-import json
-import uuid
-from datetime import datetime, timezone
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file, session
-from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from extensions import db
-from models import FIR, Evidence, User, Role
-from models import __dict__ as models_dict
-import models
-from utils.openai_helper import map_legal_sections, analyze_image
-from utils.ml_analyzer import analyze_complaint
+from utils.ml_analyzer import analyze_complaint, AnalysisContext
+from utils.rate_limiter import rate_limited
+from utils.fir_jobs import enqueue_submit_job, notify_workers
+from utils.pagination import decode_cursor, page_size, paginate_firs
+from utils.evidence_derivatives import schedule_evidence_derivatives
+from utils.evidence_store import store_uploads
+from utils.fir_numbers import next_fir_number
+from utils.queries import fir_detail_query, fir_list_query
+from utils.query_budget import query_budget
+from utils.transcription import TranscriptionQueueFull, TranscriptionUnavailable, get_transcription_service
+from utils.transcription_stream import StreamError, get_stream, start_stream
 from utils.legal_mapper import get_legal_sections_for_fir
 from utils.pdf_generator import generate_fir_pdf, generate_fir_pdf_simple, generate_and_store_fir_pdf
 import tempfile
@@ -86,27 +39,52 @@ def index():
         return redirect(url_for('fir.dashboard'))
     return render_template('index.html')
 
+def _dashboard_query():
+    # For police users, show assigned cases
+    if current_user.is_police():
+        return fir_list_query().filter_by(processing_officer_id=current_user.id)
+    # For regular users, show their complaints
+    return fir_list_query().filter_by(complainant_id=current_user.id)
+
 @fir_bp.route('/dashboard')
 @login_required
+@query_budget(4)
 def dashboard():
     try:
         if current_user.is_admin():
             return redirect(url_for('admin.dashboard'))
 
-        # For police users, show assigned cases
-        if current_user.is_police():
-            firs = FIR.query.filter_by(processing_officer_id=current_user.id).all()
-        else:
-            # For regular users, show their complaints
-            firs = FIR.query.filter_by(complainant_id=current_user.id).all()
+        firs, next_cursor = paginate_firs(_dashboard_query())
 
         logger.info(f"Retrieved {len(firs)} FIRs for user {current_user.id}")
-        return render_template('fir/dashboard.html', firs=firs)
+        return render_template('fir/dashboard.html', firs=firs, next_cursor=next_cursor)
 
     except Exception as e:
         logger.error(f"Dashboard error: {str(e)}", exc_info=True)
         return render_template('error.html', error="An error occurred while loading the dashboard. Please try again later."), 500
 
+@fir_bp.route('/api/list')
+@login_required
+@query_budget(4)
+def api_list():
+    """
+    Page through the current user's dashboard FIRs, newest first.
+
+    Query args: cursor (from the previous page's next_cursor), limit, and
+    format=html to also get the rendered dashboard cards.
+    """
+    try:
+        cursor = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    firs, next_cursor = paginate_firs(_dashboard_query(), cursor, page_size(request.args.get('limit')))
+
+    data = {'firs': [fir.to_dict() for fir in firs], 'next_cursor': next_cursor}
+    if request.args.get('format') == 'html':
+        data['html'] = render_template('fir/dashboard_cards.html', firs=firs)
+    return jsonify(data)
+
 @fir_bp.route('/new', methods=['GET', 'POST'])
 @login_required
 def new_fir():
@@ -136,7 +114,7 @@ def new_fir():
                 fir.incident_date = incident_date
                 fir.incident_location = incident_location
                 fir.status = "draft"
-                fir.fir_number = f"FIR{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+                fir.fir_number = next_fir_number()
 
                 db.session.add(fir)
                 db.session.flush()  # Get the FIR ID without committing
@@ -171,8 +149,8 @@ def new_fir():
                     try:
                         legal_mapping = map_legal_sections(incident_description)
                         legal_sections = get_legal_sections_for_fir(legal_mapping)
-                        # Store the legal sections as JSON
-                        fir.legal_sections = json.dumps(legal_sections)
+                        # Store the legal sections (JSON copy plus indexed links)
+                        fir.set_legal_sections(legal_sections)
                     except Exception as e:
                         error_msg = str(e)
                         if "quota" in error_msg.lower() or "insufficient" in error_msg.lower():
@@ -182,22 +160,28 @@ def new_fir():
 
                 # Handle evidence uploads
                 if 'evidence' in request.files:
-                    evidence_files = request.files.getlist('evidence')
-                    for file in evidence_files:
-                        if file and file.filename:
-                            filename = secure_filename(f"{uuid.uuid4()}_{file.filename}")
-                            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'images', filename)
-                            file.save(file_path)
-
-                            # Create evidence record
-                            evidence = Evidence()
-                            evidence.fir_id = fir.id
-                            evidence.type = 'image'
-                            evidence.file_path = f"uploads/images/{filename}"  # Store web-compatible path
-                            evidence.description = request.form.get('evidence_description', '')
-                            db.session.add(evidence)
+                    evidence_files = [file for file in request.files.getlist('evidence') if file and file.filename]
+                    # Hashed and examined in parallel; see store_uploads()
+                    evidence_items = []
+                    for stored in store_uploads(evidence_files):
+                        evidence = Evidence()
+                        evidence.fir_id = fir.id
+                        evidence.type = stored.ingest.file_type
+                        evidence.file_path = stored.file_path  # Web-compatible path in the evidence store
+                        evidence.content_hash = stored.blob.sha256
+                        evidence.set_metadata(stored.metadata)
+                        evidence.description = request.form.get('evidence_description', '')
+                        evidence.add_custody_event(
+                            user_id=current_user.id,
+                            action="Evidence uploaded",
+                            notes=f"SHA-256 {stored.blob.sha256}"
+                        )
+                        evidence_items.append(evidence)
+                    # Inserted in one flush; a single multi-row INSERT on PostgreSQL
+                    db.session.add_all(evidence_items)
 
                 db.session.commit()
+                schedule_evidence_derivatives(fir.evidence)
                 flash('FIR created successfully!', 'success')
                 return redirect(url_for('fir.view_fir', fir_id=fir.id))
             except Exception as e:
@@ -208,8 +192,9 @@ def new_fir():
 
 @fir_bp.route('/view/<int:fir_id>')
 @login_required
+@query_budget(8)
 def view_fir(fir_id):
-    fir = FIR.query.get_or_404(fir_id)
+    fir = fir_detail_query().filter(FIR.id == fir_id).first_or_404()
 
     # Check if the user has permission to view this FIR
     if not (current_user.is_admin() or current_user.is_police() or
@@ -218,7 +203,10 @@ def view_fir(fir_id):
         flash('You do not have permission to view this FIR.', 'danger')
         return redirect(url_for('fir.dashboard'))
 
-    return render_template('fir/view.html', fir=fir)
+    # Latest background submission job, so the page can show its progress
+    job = FIRJob.query.filter_by(fir_id=fir.id).order_by(FIRJob.id.desc()).first()
+
+    return render_template('fir/view.html', fir=fir, job=job)
 
 @fir_bp.route('/update/<int:fir_id>', methods=['POST'])
 @login_required
@@ -296,63 +284,81 @@ def submit_fir(fir_id):
         fir.status = "filed"
         fir.filed_at = datetime.now(timezone.utc)
 
-        # Analyze the complaint if not already done
-        if not fir.legal_sections and fir.incident_description:
-            # Map legal sections - using separate try/except blocks for each AI feature
-            try:
-                legal_mapping = map_legal_sections(fir.incident_description)
-                legal_sections = get_legal_sections_for_fir(legal_mapping)
-                # Store the legal sections as JSON
-                fir.legal_sections = json.dumps(legal_sections)
-            except Exception as e:
-                error_msg = str(e)
-                if "quota" in error_msg.lower() or "insufficient" in error_msg.lower():
-                    flash('Unable to map legal sections due to API quota limitations. The FIR will still be filed, but you may need to manually add relevant legal sections.', 'warning')
-                else:
-                    flash(f'Error mapping legal sections: {str(e)}', 'warning')
-
-            # Get the user's language preference
-            language_code = None
-            try:
-                from utils.language_utils import get_user_language
-                language_code = get_user_language()
-                logger.info(f"Using language from session for urgency analysis: {language_code}")
-            except ImportError:
-                language_code = "en-IN"  # Default to Indian English
-                logger.info(f"Using default language for urgency analysis: {language_code}")
-
-            # Get complaint analysis for urgency - separate try/except to allow partial success
-            try:
-                complaint_analysis = analyze_complaint(fir.incident_description, language_code)
-                if complaint_analysis and 'urgency_level' in complaint_analysis:
-                    fir.urgency_level = complaint_analysis['urgency_level']
-            except Exception as e:
-                error_msg = str(e)
-                if "quota" in error_msg.lower() or "insufficient" in error_msg.lower():
-                    flash('Unable to analyze complaint for urgency due to API quota limitations. Using default urgency level.', 'warning')
-                else:
-                    flash(f'Error during urgency analysis: {str(e)}', 'warning')
+        # Get the user's language preference (needs the request, so resolve it now)
+        language_code = None
+        try:
+            from utils.language_utils import get_user_language
+            language_code = get_user_language()
+        except ImportError:
+            language_code = "en-IN"  # Default to Indian English
 
+        # Legal section mapping, urgency analysis and the PDF run in the background
+        enqueue_submit_job(fir, language_code)
         db.session.commit()
+        notify_workers()
 
-        # Generate and store PDF for the FIR
-        try:
-            pdf_path = generate_and_store_fir_pdf(fir.id)
-            if pdf_path:
-                logger.info(f"Generated and stored PDF for FIR {fir.fir_number}: {pdf_path}")
-            else:
-                logger.warning(f"Failed to generate PDF for FIR {fir.fir_number}")
-        except Exception as pdf_error:
-            logger.error(f"Error generating PDF for FIR {fir.fir_number}: {str(pdf_error)}")
-            # Don't stop the process if PDF generation fails
-
-        flash('FIR submitted successfully!', 'success')
+        flash('FIR submitted successfully! Legal analysis and the PDF are being prepared.', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Error submitting FIR: {str(e)}', 'danger')
 
     return redirect(url_for('fir.view_fir', fir_id=fir.id))
 
+def _get_job_for_user(job_id):
+    """Return the job if the current user may see its FIR, else None."""
+    job = FIRJob.query.get(job_id)
+    if job is None:
+        return None
+    fir = job.fir
+    if not (current_user.is_admin() or current_user.is_police() or
+            fir.complainant_id == current_user.id or
+            fir.processing_officer_id == current_user.id):
+        return None
+    return job
+
+@fir_bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Poll the status of a background FIR job"""
+    job = _get_job_for_user(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@fir_bp.route('/jobs/<int:job_id>/events')
+@login_required
+def job_events(job_id):
+    """Stream job status changes as server-sent events until the job finishes"""
+    job = _get_job_for_user(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    poll_interval = float(current_app.config.get('FIR_JOB_POLL_INTERVAL', 2.0))
+    timeout = float(current_app.config.get('FIR_JOB_SSE_TIMEOUT', 120))
+
+    @stream_with_context
+    def generate():
+        last_payload = None
+        deadline = time.monotonic() + timeout
+        while True:
+            db.session.expire_all()
+            current = db.session.get(FIRJob, job_id)
+            payload = json.dumps(current.to_dict())
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            if current.is_finished or time.monotonic() > deadline:
+                # The client can reconnect, or fall back to polling
+                break
+            # Don't hold a pooled connection while sleeping
+            db.session.rollback()
+            time.sleep(poll_interval)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @fir_bp.route('/generate_pdf/<int:fir_id>')
 @login_required
 def generate_pdf(fir_id):
@@ -417,6 +423,7 @@ def generate_pdf(fir_id):
 # API endpoint for analyzing legal sections
 @fir_bp.route('/analyze_legal_sections', methods=['POST'])
 @login_required
+@rate_limited('analyze')
 def analyze_legal_sections():
     try:
         # Get the text from the request
@@ -441,14 +448,18 @@ def analyze_legal_sections():
                 language_code = "en-IN"  # Default to Indian English
                 logger.info(f"Using default language for legal analysis: {language_code}")
 
+        # Share one analysis pass between the legal mapper and the ML model
+        context = AnalysisContext(text)
+
         # Map legal sections with language code
-        legal_mapping = map_legal_sections(text)
+        legal_mapping = map_legal_sections(text, context=context)
         legal_sections = get_legal_sections_for_fir(legal_mapping)
 
         # Also analyze the complaint with our ML model
         try:
-            # analyze_complaint is already imported at the top
-            ml_analysis = analyze_complaint(text, language_code)
+            # analyze_complaint is already imported at the top; the context
+            # already holds its predictions, so this does not re-run the model
+            ml_analysis = analyze_complaint(text, language_code, context=context)
             ml_sections = ml_analysis.get('sections', [])
 
             # Combine the results (add ML sections that aren't already in the list)
@@ -608,4 +619,168 @@ def delete_investigation_note(fir_id):
         db.session.rollback()
         return jsonify(success=False, message=f'Error deleting note: {str(e)}'), 500
 
+@fir_bp.route('/transcribe_whisper', methods=['POST'])
+@login_required
+def transcribe_whisper():
+    """
+    Queue an uploaded recording for Whisper transcription.
+
+    Form fields: audio (the file), language (optional, default auto) and
+    wait (optional seconds, capped at TRANSCRIBE_MAX_WAIT). Returns the text
+    if the job finishes within wait, otherwise 202 with a job id to poll at
+    transcription_status. Answers 429 with Retry-After when the queue is full.
+    """
+    audio = request.files.get('audio')
+    if not audio:
+        return jsonify({'success': False, 'error': 'No audio file uploaded.'}), 400
+
+    try:
+        service = get_transcription_service()
+    except TranscriptionUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+    # The service deletes the file when the job finishes
+    suffix = os.path.splitext(secure_filename(audio.filename or ''))[1] or '.webm'
+    fd, audio_path = tempfile.mkstemp(prefix='transcribe_', suffix=suffix)
+    with os.fdopen(fd, 'wb') as f:
+        audio.save(f)
+
+    try:
+        job = service.submit(audio_path, current_user.id, request.form.get('language', 'auto'))
+    except TranscriptionQueueFull as e:
+        os.remove(audio_path)
+        response = jsonify({
+            'success': False,
+            'error': 'The transcription queue is full. Please try again shortly.',
+            'queue': service.stats()
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+    wait = min(request.form.get('wait', 0, type=float), current_app.config.get('TRANSCRIBE_MAX_WAIT', 30))
+    if wait > 0 and service.wait(job, wait):
+        data = job.to_dict()
+        if job.error:
+            return jsonify({'success': False, **data}), 500
+        return jsonify({'success': True, **data})
+
+    return jsonify({
+        'success': True,
+        **job.to_dict(),
+        'status_url': url_for('fir.transcription_status', job_id=job.id),
+        'queue': service.stats()
+    }), 202
+
+@fir_bp.route('/transcribe_whisper/<job_id>')
+@login_required
+def transcription_status(job_id):
+    """Status of a transcription job, with the text once it has finished."""
+    try:
+        service = get_transcription_service()
+    except TranscriptionUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
 
+    job = service.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({'success': False, 'error': 'Transcription job not found.'}), 404
+
+    wait = min(request.args.get('wait', 0, type=float), current_app.config.get('TRANSCRIBE_MAX_WAIT', 30))
+    if wait > 0:
+        service.wait(job, wait)
+    return jsonify({'success': job.status != 'failed', **job.to_dict(), 'queue': service.stats()})
+
+@fir_bp.route('/transcribe_whisper/queue')
+@login_required
+def transcription_queue():
+    """Transcription queue depth and capacity."""
+    try:
+        service = get_transcription_service()
+    except TranscriptionUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    return jsonify({'success': True, **service.stats()})
+
+def _stream_response(stream, status=200):
+    return jsonify({
+        'success': not stream.error,
+        **stream.state(),
+        'chunk_url': url_for('fir.transcribe_stream_chunk', session_id=stream.id),
+        'finish_url': url_for('fir.transcribe_stream_finish', session_id=stream.id),
+        'status_url': url_for('fir.transcribe_stream_status', session_id=stream.id),
+    }), status
+
+def _stream_wait():
+    return min(request.args.get('wait', 0, type=float), current_app.config.get('TRANSCRIBE_MAX_WAIT', 30))
+
+@fir_bp.route('/transcribe_stream', methods=['POST'])
+@login_required
+def transcribe_stream_start():
+    """
+    Start an incremental transcription session for a recording in progress.
+
+    JSON or form fields: language (optional, default auto) and mime_type (the
+    MediaRecorder type). Chunks then go to chunk_url as they are recorded.
+    """
+    try:
+        service = get_transcription_service()
+    except TranscriptionUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+    data = request.get_json(silent=True) or request.form
+    stream = start_stream(
+        service, current_app.config, current_user.id, data.get('language', 'auto'), data.get('mime_type')
+    )
+    return _stream_response(stream, 201)
+
+@fir_bp.route('/transcribe_stream/<session_id>/chunks', methods=['POST'])
+@login_required
+def transcribe_stream_chunk(session_id):
+    """
+    Append one recorded chunk, sent as the raw request body.
+
+    Query parameters: seq (0, 1, 2, ... in recording order) and duration
+    (seconds recorded up to the end of this chunk). Re-sending a stored chunk
+    is harmless; skipping one answers 409 with the expected seq.
+    """
+    stream = get_stream(current_app.config, session_id, current_user.id)
+    if stream is None:
+        return jsonify({'success': False, 'error': 'Transcription session not found.'}), 404
+
+    seq = request.args.get('seq', type=int)
+    if seq is None:
+        return jsonify({'success': False, 'error': 'seq is required.'}), 400
+    try:
+        stream.append(seq, request.get_data(cache=False), request.args.get('duration', type=float))
+    except StreamError as e:
+        return jsonify({'success': False, 'error': str(e), **e.details}), e.status
+    return _stream_response(stream)
+
+@fir_bp.route('/transcribe_stream/<session_id>')
+@login_required
+def transcribe_stream_status(session_id):
+    """Current transcript; with wait, long-polls until it changes past version `since`."""
+    stream = get_stream(current_app.config, session_id, current_user.id)
+    if stream is None:
+        return jsonify({'success': False, 'error': 'Transcription session not found.'}), 404
+
+    # Also retries a window the full queue turned away
+    stream.schedule()
+    wait = _stream_wait()
+    if wait > 0:
+        stream.wait(request.args.get('since', -1, type=int), wait)
+    return _stream_response(stream)
+
+@fir_bp.route('/transcribe_stream/<session_id>/finish', methods=['POST'])
+@login_required
+def transcribe_stream_finish(session_id):
+    """Mark the recording complete; with wait, returns the final transcript once ready."""
+    stream = get_stream(current_app.config, session_id, current_user.id)
+    if stream is None:
+        return jsonify({'success': False, 'error': 'Transcription session not found.'}), 404
+
+    stream.finish()
+    wait = _stream_wait()
+    deadline = time.monotonic() + wait
+    while not stream.state()['final'] and time.monotonic() < deadline:
+        stream.wait(stream.version, deadline - time.monotonic())
+    return _stream_response(stream, 200 if stream.finished else 202)
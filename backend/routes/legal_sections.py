@@ -2,14 +2,15 @@
 Routes for legal section management
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required, current_user
-import json
 import logging
 
-from models import db, LegalSection, FIR
+from models import db, LegalSection, FIR, FIRLegalSection
 from utils.legal_mapper import initialize_legal_sections
 from utils.ml_analyzer import train_model, analyze_complaint
+from utils.pagination import decode_link_cursor, paginate_section_links
+from utils.rate_limiter import rate_limited
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -47,28 +48,30 @@ def view(section_id):
     # Get the section
     section = LegalSection.query.get_or_404(section_id)
 
-    # Get FIRs that reference this section
-    firs_with_section = []
-    all_firs = FIR.query.filter(FIR.legal_sections.isnot(None)).all()
-
-    for fir in all_firs:
-        try:
-            sections = json.loads(fir.legal_sections)
-            for s in sections:
-                if s.get('code') == section.code:
-                    firs_with_section.append({
-                        'fir': fir,
-                        'confidence': s.get('confidence', 0),
-                        'relevance': s.get('relevance', '')
-                    })
-                    break
-        except (json.JSONDecodeError, AttributeError):
-            continue
-
-    # Sort by confidence (descending)
-    firs_with_section.sort(key=lambda x: x['confidence'], reverse=True)
-
-    return render_template('legal_sections/view.html', section=section, firs=firs_with_section)
+    # Get FIRs that reference this section, best matches first, seeking
+    # through the (legal_section_id, confidence, fir_id) index
+    try:
+        cursor = decode_link_cursor(request.args.get('cursor'))
+    except ValueError:
+        abort(400)
+    query = (
+        db.session.query(FIRLegalSection, FIR)
+        .join(FIR, FIR.id == FIRLegalSection.fir_id)
+        .filter(FIRLegalSection.legal_section_id == section.id)
+    )
+    links, next_cursor = paginate_section_links(query, cursor, limit=50)
+
+    firs_with_section = [
+        {
+            'fir': fir,
+            'confidence': link.confidence or 0,
+            'relevance': link.relevance or ''
+        }
+        for link, fir in links
+    ]
+
+    return render_template('legal_sections/view.html', section=section, firs=firs_with_section,
+                           first_page=cursor is None, next_cursor=next_cursor)
 
 @legal_sections_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -297,6 +300,7 @@ def analyze():
 
 @legal_sections_bp.route('/api/analyze', methods=['POST'])
 @login_required
+@rate_limited('analyze')
 def api_analyze():
     """
     API endpoint to analyze a complaint text
@@ -0,0 +1,84 @@
+"""
+Shared fixtures: one app on a throwaway SQLite database, with background
+workers off and the static (evidence) folder in a temporary directory.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_TEMP_DIR = tempfile.mkdtemp(prefix='fir-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TEMP_DIR, 'test.db')
+# Fail fast instead of waiting for a MongoDB that is not there
+os.environ.setdefault('MONGO_URI', 'mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=50&connectTimeoutMS=50')
+for _name in ('FIR_JOB_WORKERS', 'EVIDENCE_DERIVATIVE_WORKERS', 'EVIDENCE_ANALYSIS_WORKERS',
+              'STATS_RECONCILE_INTERVAL', 'TRANSCRIBE_WORKERS'):
+    os.environ[_name] = '0'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+_fir_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    # Keep evidence written by the tests out of the source tree
+    app.static_folder = os.path.join(_TEMP_DIR, 'static')
+    app.config['UPLOAD_FOLDER'] = os.path.join(app.static_folder, 'uploads')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def user_id(app, username):
+    from models import User
+
+    with app.app_context():
+        return User.query.filter_by(username=username).one().id
+
+
+def login(client, username):
+    """Sign the test client in as one of the demo users (user, police, admin)."""
+    uid = user_id(client.application, username)
+    with client.session_transaction() as session:
+        session['_user_id'] = str(uid)
+        session['_fresh'] = True
+    return uid
+
+
+def make_fir(app, complainant='user', **fields):
+    """Insert a FIR directly, without running the complaint analysis."""
+    from extensions import db
+    from models import FIR
+
+    # The new-FIR form always sends a location, and the dashboard cards expect one
+    fields.setdefault('incident_location', 'Test location')
+    with app.app_context():
+        fir = FIR(
+            fir_number=f"TEST{next(_fir_numbers):06d}",
+            complainant_id=user_id(app, complainant),
+            status=fields.pop('status', 'filed'),
+            **fields
+        )
+        db.session.add(fir)
+        db.session.commit()
+        return fir.id
@@ -0,0 +1,15 @@
+"""AnalysisContext keeps keyword-only tokens away from the classifier input."""
+
+from utils.ml_analyzer import AnalysisContext
+
+
+def test_keyword_token_does_not_change_classifier_input(app_context):
+    context = AnalysisContext("My neighbour keeps shouting at me at night")
+    before = context.preprocessed
+
+    context.add_keyword_token("harassing")
+
+    assert "harassing" in context.keyword_token_set
+    assert "harassing" in context.keyword_tokens
+    assert context.preprocessed == before
+    assert "harassing" not in context.preprocessed_token_set
@@ -0,0 +1,61 @@
+"""Chunked bulk FIR import and its resume checkpoint."""
+
+import json
+import os
+
+import pytest
+
+from conftest import user_id
+
+
+@pytest.fixture
+def source(tmp_path):
+    lines = [json.dumps({'fir_number': f'imp{n:04d}', 'incident_description': f'Imported complaint {n}'})
+             for n in range(1, 6)]
+    # Malformed records keep their position, so the checkpoint still counts them
+    lines.insert(3, '{not json')
+    path = tmp_path / 'complaints.jsonl'
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def _imported_numbers():
+    from extensions import db
+    from models import FIR
+
+    db.session.expire_all()
+    return sorted(number for (number,) in db.session.query(FIR.fir_number).filter(FIR.fir_number.like('IMP%')))
+
+
+def test_interrupted_import_resumes_after_the_last_committed_chunk(app, app_context, source, monkeypatch):
+    import utils.bulk_import
+    from extensions import db
+    from models import ImportCheckpoint
+    from utils.bulk_import import import_firs
+
+    complainant = user_id(app, 'user')
+    original = utils.bulk_import._import_chunk
+    chunks = []
+
+    def failing_second_chunk(chunk, *args):
+        chunks.append(chunk)
+        result = original(chunk, *args)
+        if len(chunks) == 2:
+            # Its FIRs are inserted but the transaction never commits
+            raise RuntimeError('connection lost')
+        return result
+
+    monkeypatch.setattr(utils.bulk_import, '_import_chunk', failing_second_chunk)
+    with pytest.raises(RuntimeError):
+        import_firs(source, complainant, chunk_size=2, analyze=False)
+    assert _imported_numbers() == ['IMP0001', 'IMP0002']
+    assert db.session.get(ImportCheckpoint, os.path.realpath(source)).rows_done == 2
+
+    monkeypatch.setattr(utils.bulk_import, '_import_chunk', original)
+    assert import_firs(source, complainant, chunk_size=2, analyze=False) == (4, 3, 1, 0)
+    assert _imported_numbers() == ['IMP0001', 'IMP0002', 'IMP0003', 'IMP0004', 'IMP0005']
+
+    # Finished: nothing left to read, and a restart skips the numbers already imported
+    assert import_firs(source, complainant, chunk_size=2, analyze=False) == (0, 0, 0, 0)
+    assert import_firs(source, complainant, chunk_size=2, analyze=False, restart=True) == (6, 0, 6, 0)
+    assert len(_imported_numbers()) == 5
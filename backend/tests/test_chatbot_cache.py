@@ -0,0 +1,20 @@
+"""The chatbot's case cache drops FIRs rewritten by bulk UPDATEs."""
+
+import utils.ml_analyzer
+from conftest import make_fir
+from extensions import db
+from models import FIR
+from utils.bulk_import import analyze_firs
+from utils.chatbot import CaseSnapshot, case_cache
+
+
+def test_bulk_reanalysis_invalidates_cached_case(app, app_context, monkeypatch):
+    fir = db.session.get(FIR, make_fir(app, incident_description='Wallet stolen from a bus'))
+    case_cache.put(1, fir.fir_number, CaseSnapshot(fir), True)
+    assert case_cache.get(1, fir.fir_number) is not None
+
+    monkeypatch.setattr(utils.ml_analyzer, 'predict_ipc_sections_batch', lambda descriptions: [[] for _ in descriptions])
+    analyze_firs([fir.id], [fir.incident_description], replace=True)
+    db.session.commit()
+
+    assert case_cache.get(1, fir.fir_number) is None
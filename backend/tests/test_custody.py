@@ -0,0 +1,119 @@
+"""Hash-chained chain of custody."""
+
+import pytest
+from sqlalchemy import update
+
+from conftest import make_fir, user_id
+
+
+@pytest.fixture
+def evidence_id(app):
+    from extensions import db
+    from models import Evidence
+
+    fir_id = make_fir(app, incident_description='Custody case')
+    officer = user_id(app, 'police')
+    with app.app_context():
+        evidence = Evidence(fir_id=fir_id, type='document', file_path='uploads/exhibit.txt')
+        evidence.add_custody_event(user_id=officer, action='Evidence uploaded', notes='SHA-256 abc')
+        db.session.add(evidence)
+        db.session.commit()
+        for action in ('Evidence viewed', 'Evidence transferred'):
+            evidence.add_custody_event(user_id=officer, action=action)
+            db.session.commit()
+        return evidence.id
+
+
+def _events(evidence_id):
+    from extensions import db
+    from models import CustodyEvent
+
+    return db.session.scalars(
+        db.select(CustodyEvent).filter_by(evidence_id=evidence_id).order_by(CustodyEvent.id)
+    ).all()
+
+
+def test_chain_links_each_event_to_the_previous(app, evidence_id):
+    from utils.custody import GENESIS_HASH, verify_chain
+
+    with app.app_context():
+        events = _events(evidence_id)
+        assert [event.action for event in events] == ['Evidence uploaded', 'Evidence viewed', 'Evidence transferred']
+        assert events[0].prev_hash == GENESIS_HASH
+        assert [event.prev_hash for event in events[1:]] == [event.hash for event in events[:-1]]
+        assert verify_chain(evidence_id) == (True, 3, None)
+
+
+def test_edited_event_breaks_the_chain(app, evidence_id):
+    from extensions import db
+    from models import CustodyEvent
+    from utils.custody import verify_chain
+
+    with app.app_context():
+        tampered = _events(evidence_id)[1]
+        table = CustodyEvent.__table__
+        db.session.execute(update(table).where(table.c.id == tampered.id).values(notes='Nothing to see'))
+        db.session.commit()
+        intact, _, bad_id = verify_chain(evidence_id)
+        assert not intact
+        assert bad_id == tampered.id
+
+
+def test_removed_event_breaks_the_chain(app, evidence_id):
+    from extensions import db
+    from models import CustodyEvent
+    from utils.custody import verify_chain
+
+    with app.app_context():
+        events = _events(evidence_id)
+        table = CustodyEvent.__table__
+        db.session.execute(table.delete().where(table.c.id == events[1].id))
+        db.session.commit()
+        intact, _, bad_id = verify_chain(evidence_id)
+        assert not intact
+        assert bad_id == events[2].id
+
+
+def test_events_cannot_be_edited_through_the_orm(app, evidence_id):
+    from extensions import db
+
+    with app.app_context():
+        event = _events(evidence_id)[0]
+        event.notes = 'Rewritten'
+        with pytest.raises(Exception):
+            db.session.commit()
+        db.session.rollback()
+
+
+def test_removed_tail_is_detected(app, evidence_id):
+    from extensions import db
+    from models import CustodyEvent, Evidence
+    from utils.custody import verify_chain
+
+    with app.app_context():
+        events = _events(evidence_id)
+        assert db.session.get(Evidence, evidence_id).custody_head == events[-1].hash
+        table = CustodyEvent.__table__
+        db.session.execute(table.delete().where(table.c.id == events[-1].id))
+        db.session.commit()
+        assert verify_chain(evidence_id) == (False, 2, None)
+
+        # A later event links to the recorded head, so the cut stays visible
+        evidence = db.session.get(Evidence, evidence_id)
+        evidence.add_custody_event(user_id=None, action='Evidence viewed')
+        db.session.commit()
+        intact, _, bad_id = verify_chain(evidence_id)
+        assert not intact
+        assert bad_id == _events(evidence_id)[-1].id
+
+
+def test_removing_every_event_is_detected(app, evidence_id):
+    from extensions import db
+    from models import CustodyEvent
+    from utils.custody import verify_chain
+
+    with app.app_context():
+        table = CustodyEvent.__table__
+        db.session.execute(table.delete().where(table.c.evidence_id == evidence_id))
+        db.session.commit()
+        assert verify_chain(evidence_id) == (False, 0, None)
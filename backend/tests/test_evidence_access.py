@@ -0,0 +1,31 @@
+"""Evidence is only reachable through the login-checked evidence routes."""
+
+import os
+
+import pytest
+
+
+@pytest.fixture
+def static_files(app):
+    blob = os.path.join(app.config['UPLOAD_FOLDER'], 'evidence', 'blobs', 'ab', 'cd', 'secret.txt')
+    public = os.path.join(app.static_folder, 'css', 'site.css')
+    for path in (blob, public):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('content')
+    return blob, public
+
+
+@pytest.mark.parametrize('url', [
+    '/static/uploads/evidence/blobs/ab/cd/secret.txt',
+    '/static/css/../uploads/evidence/blobs/ab/cd/secret.txt',
+    '/static/./uploads/evidence/blobs/ab/cd/secret.txt',
+])
+def test_static_route_refuses_uploads(client, static_files, url):
+    assert client.get(url).status_code == 404
+
+
+def test_static_route_still_serves_assets(client, static_files):
+    response = client.get('/static/css/site.css')
+    assert response.status_code == 200
+    response.close()
@@ -0,0 +1,166 @@
+"""Claiming, progress and failure handling of background evidence analysis jobs."""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import utils.evidence_analysis as evidence_analysis
+from conftest import make_fir
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    """Stand-in for analyze_evidence_file: records each file it is given; files named bad* fail."""
+    calls = []
+
+    def analyze(file_path, file_type, expected_hash=None):
+        calls.append(os.path.basename(file_path))
+        if os.path.basename(file_path).startswith('bad'):
+            raise ValueError('unreadable file')
+        analysis = {'summary': f"{file_type} analyzed", 'tags': ['analyzed'], 'sha256': expected_hash}
+        return {'sha256': expected_hash, 'analysis': analysis, 'metadata': {'file_size': 1}}
+
+    monkeypatch.setattr(evidence_analysis, 'analyze_evidence_file', analyze)
+    return calls
+
+
+@pytest.fixture
+def fir_id(app, app_context):
+    from extensions import db
+    from models import EvidenceAnalysisJob
+
+    fir_id = make_fir(app, incident_description='Analysis case')
+    yield fir_id
+    db.session.rollback()
+    EvidenceAnalysisJob.query.delete()
+    db.session.commit()
+
+
+def _add_evidence(fir_id, *items):
+    """Evidence rows from (file name, content hash) pairs."""
+    from extensions import db
+    from models import Evidence
+
+    rows = [Evidence(fir_id=fir_id, type='document', file_path=f"uploads/{name}", content_hash=content_hash)
+            for name, content_hash in items]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+def _queue(fir_id, evidence_ids):
+    from extensions import db
+    from models import FIR
+    from utils.evidence_analysis import enqueue_analysis
+
+    job = enqueue_analysis(db.session.get(FIR, fir_id), evidence_ids, None)
+    db.session.commit()
+    return job.id
+
+
+def _job(job_id):
+    from extensions import db
+    from models import EvidenceAnalysisJob
+
+    db.session.expire_all()
+    return db.session.get(EvidenceAnalysisJob, job_id)
+
+
+def test_claims_oldest_queued_job_once(fir_id):
+    from utils.evidence_analysis import claim_next_job
+
+    first_ids, second_ids = _add_evidence(fir_id, ('a.txt', 'a' * 64)), _add_evidence(fir_id, ('b.txt', 'b' * 64))
+    first, second = _queue(fir_id, first_ids), _queue(fir_id, second_ids)
+    # Asking again for items a queued job covers returns that job
+    assert _queue(fir_id, first_ids) == first
+
+    claimed = claim_next_job('worker-a')
+    assert claimed.id == first
+    assert (claimed.status, claimed.locked_by, claimed.attempts) == ('running', 'worker-a', 1)
+    assert claim_next_job('worker-b').id == second
+    assert claim_next_job('worker-c') is None
+
+
+def test_progress_is_committed_per_batch_and_shared_results_reused(fir_id, analyzer, monkeypatch):
+    from models import CustodyEvent
+    from utils.evidence_analysis import claim_next_job, run_analysis_job
+
+    ids = _add_evidence(fir_id, ('one.txt', 'c' * 64), ('copy.txt', 'c' * 64), ('two.txt', 'd' * 64))
+    job_id = _queue(fir_id, ids)
+
+    progress = []
+    original_flush = evidence_analysis._flush
+
+    def recording_flush(job, results, failures):
+        original_flush(job, results, failures)
+        progress.append(_job(job.id).completed)
+
+    monkeypatch.setattr(evidence_analysis, '_flush', recording_flush)
+    run_analysis_job(claim_next_job('worker-a'), workers=0, batch_size=1)
+
+    job = _job(job_id)
+    assert (job.status, job.total, job.completed, job.reused, job.failed) == ('succeeded', 3, 3, 1, 0)
+    assert job.locked_by is None and job.finished_at is not None
+    # One run per distinct content, and the committed progress only goes up
+    assert sorted(analyzer) == ['one.txt', 'two.txt']
+    assert progress[0] == 0 and progress[-1] == 3 and progress == sorted(progress)
+
+    notes = [event.notes for event in CustodyEvent.query.filter(CustodyEvent.evidence_id.in_(ids))]
+    assert notes.count('Result reused from identical content') == 1
+
+    # Analyzing again finds every result current and runs nothing
+    analyzer.clear()
+    again_id = _queue(fir_id, ids)
+    assert again_id != job_id
+    run_analysis_job(claim_next_job('worker-a'), workers=0)
+    assert analyzer == []
+    again = _job(again_id)
+    assert (again.completed, again.reused) == (3, 3)
+
+
+def test_failed_items_are_counted_and_recorded(fir_id, analyzer):
+    from utils.evidence_analysis import claim_next_job, run_analysis_job
+
+    ids = _add_evidence(fir_id, ('good.txt', 'e' * 64), ('bad.txt', 'f' * 64))
+    job_id = _queue(fir_id, ids)
+    run_analysis_job(claim_next_job('worker-a'), workers=0)
+    job = _job(job_id)
+    # Some items analyzed: the job succeeds, with the failure recorded
+    assert (job.status, job.completed, job.failed) == ('succeeded', 2, 1)
+    assert job.error == f"Evidence {ids[1]}: unreadable file"
+
+    job_id = _queue(fir_id, _add_evidence(fir_id, ('bad-too.txt', '0' * 64)))
+    run_analysis_job(claim_next_job('worker-a'), workers=0)
+    assert _job(job_id).status == 'failed'
+
+
+def test_crashed_job_is_marked_failed(fir_id, monkeypatch):
+    from utils.evidence_analysis import _run_claimed, claim_next_job
+
+    def crash(job, workers, batch_size):
+        raise RuntimeError('database went away')
+
+    job_id = _queue(fir_id, _add_evidence(fir_id, ('crash.txt', '1' * 64)))
+    monkeypatch.setattr(evidence_analysis, 'run_analysis_job', crash)
+    _run_claimed(claim_next_job('worker-a'), 0, 1)
+    job = _job(job_id)
+    assert (job.status, job.error) == ('failed', 'database went away')
+    assert job.finished_at is not None
+
+
+def test_stale_running_job_is_requeued(fir_id):
+    from extensions import db
+    from utils.evidence_analysis import claim_next_job, requeue_stale_jobs
+
+    stale_id = _queue(fir_id, _add_evidence(fir_id, ('stale.txt', '2' * 64)))
+    fresh_id = _queue(fir_id, _add_evidence(fir_id, ('fresh.txt', '3' * 64)))
+    claim_next_job('dead-worker')
+    claim_next_job('live-worker')
+    _job(stale_id).locked_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    db.session.commit()
+
+    assert requeue_stale_jobs(900) == 1
+    assert (_job(stale_id).status, _job(stale_id).locked_by) == ('queued', None)
+    assert _job(fresh_id).status == 'running'
+    assert claim_next_job('worker-b').id == stale_id
@@ -0,0 +1,101 @@
+"""Thumbnails and previews stored beside their blob and shared by its content hash."""
+
+import io
+import os
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import utils.evidence_derivatives as evidence_derivatives
+from conftest import login, make_fir
+from utils.evidence_derivatives import PREVIEW_SIZE, THUMBNAIL_SIZE, derivative_path, generate_derivatives
+
+
+def _photo(width=2000, height=1000, color=None):
+    data = io.BytesIO()
+    Image.new('RGB', (width, height), color or (40, 90, 160)).save(data, format='JPEG')
+    return data.getvalue()
+
+
+@pytest.fixture
+def shared_photo(app, app_context):
+    """Two evidence rows, on two FIRs, for the same stored photo."""
+    from extensions import db
+    from models import Evidence
+    from utils.evidence_store import store_upload
+
+    content = _photo(color=tuple(os.urandom(3)))
+    evidence = []
+    for fir_id, name in ((make_fir(app), 'front.jpg'), (make_fir(app), 'copy.jpg')):
+        stored = store_upload(FileStorage(stream=io.BytesIO(content), filename=name))
+        evidence.append(Evidence(fir_id=fir_id, type='image', file_path=stored.file_path,
+                                 content_hash=stored.ingest.sha256))
+    db.session.add_all(evidence)
+    db.session.commit()
+    return evidence
+
+
+def test_generates_preview_and_thumbnail_once(tmp_path):
+    original = str(tmp_path / 'photo.jpg')
+    with open(original, 'wb') as f:
+        f.write(_photo())
+
+    created = generate_derivatives(original, 'image')
+    assert created == [derivative_path(original, 'preview'), derivative_path(original, 'thumb')]
+    with Image.open(derivative_path(original, 'preview')) as preview:
+        assert (preview.format, preview.size) == ('WEBP', (PREVIEW_SIZE, PREVIEW_SIZE // 2))
+    with Image.open(derivative_path(original, 'thumb')) as thumb:
+        assert thumb.size == (THUMBNAIL_SIZE, THUMBNAIL_SIZE // 2)
+    assert generate_derivatives(original, 'image') == []
+
+
+def test_evidence_with_the_same_content_shares_its_derivatives(shared_photo, monkeypatch):
+    from utils.evidence_derivatives import ensure_derivative, evidence_file_path
+
+    first, second = shared_photo
+    assert evidence_file_path(first) == evidence_file_path(second)
+    thumb = ensure_derivative(first, 'thumb')
+    assert thumb == derivative_path(evidence_file_path(first), 'thumb')
+    assert os.path.basename(thumb) == f"{first.content_hash}.thumb.webp"
+
+    def regenerate(*args):
+        raise AssertionError('derivative made again')
+
+    monkeypatch.setattr(evidence_derivatives, 'generate_derivatives', regenerate)
+    assert ensure_derivative(second, 'thumb') == thumb
+    assert ensure_derivative(second, 'preview') == derivative_path(evidence_file_path(first), 'preview')
+
+
+def test_derived_route_serves_by_content_hash(app, client, shared_photo):
+    from utils.evidence_derivatives import derivative_url
+
+    first, _ = shared_photo
+    with app.test_request_context():
+        url = derivative_url(first)
+    assert f"v={first.content_hash[:16]}" in url
+
+    login(client, 'user')
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'immutable' in response.headers['Cache-Control']
+    response.close()
+
+
+def test_no_derivative_without_a_source(app, app_context, shared_photo, monkeypatch):
+    from models import Evidence
+    from utils.evidence_derivatives import ensure_derivative
+
+    document = Evidence(fir_id=shared_photo[0].fir_id, type='document', file_path=shared_photo[0].file_path)
+    assert ensure_derivative(document, 'thumb') is None
+
+    # A video needs ffmpeg for its poster frame
+    monkeypatch.setitem(app.config, 'FFMPEG_BINARY', None)
+    monkeypatch.setattr(evidence_derivatives.shutil, 'which', lambda name: None)
+    video_path = shared_photo[0].file_path.replace('.jpg', '.mp4')
+    video = Evidence(fir_id=shared_photo[0].fir_id, type='video', file_path=video_path)
+    with open(evidence_derivatives.evidence_file_path(video), 'wb') as f:
+        f.write(b'not really a video')
+    assert ensure_derivative(video, 'poster') is None
+    assert ensure_derivative(video, 'thumb') is None
@@ -0,0 +1,92 @@
+"""Single-pass evidence ingest: hash, type and size from one read of the upload."""
+
+import hashlib
+import io
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import utils.evidence_analyzer
+from utils.evidence_ingest import ingest_file, ingest_stream, ingest_upload
+
+TEXT = ''.join(f"Statement line {n}: the witness saw a grey van.\n" for n in range(400)).encode()
+
+
+class CountingStream(io.BytesIO):
+    """Counts the bytes handed out, and refuses to be rewound."""
+
+    bytes_read = 0
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        self.bytes_read += count
+        return count
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, *args):
+        raise AssertionError('the upload stream was rewound')
+
+
+@pytest.fixture
+def no_rereads(monkeypatch):
+    """Fail if the written file is hashed or type-sniffed again from disk."""
+    def reread(*args, **kwargs):
+        raise AssertionError('the file was read back from disk')
+
+    monkeypatch.setattr(utils.evidence_analyzer, 'calculate_file_hash', reread)
+    monkeypatch.setattr(utils.evidence_analyzer, 'get_file_type', reread)
+
+
+def test_upload_is_hashed_sniffed_and_sized_in_one_pass(tmp_path, no_rereads):
+    stream = CountingStream(TEXT)
+    path = str(tmp_path / 'statement.txt')
+
+    result, metadata = ingest_upload(FileStorage(stream=stream, filename='statement.txt'), path, buffer_size=1024)
+
+    assert stream.bytes_read == len(TEXT)
+    assert result.sha256 == hashlib.sha256(TEXT).hexdigest()
+    assert result.size == len(TEXT)
+    assert (result.mime_type, result.file_type) == ('text/plain', 'document')
+    assert (metadata['hash'], metadata['file_size'], metadata['mime_type']) == (result.sha256, len(TEXT), 'text/plain')
+    with open(path, 'rb') as f:
+        assert f.read() == TEXT
+
+
+def test_image_type_comes_from_the_leading_bytes(tmp_path, no_rereads):
+    image = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(image, format='PNG')
+    content = image.getvalue()
+
+    # The name says text; the bytes say PNG
+    result = ingest_stream(CountingStream(content), str(tmp_path / 'upload'), 'notes.txt', buffer_size=16)
+    assert (result.mime_type, result.file_type) == ('image/png', 'image')
+    assert result.sha256 == hashlib.sha256(content).hexdigest()
+    assert result.size == len(content)
+
+
+def test_failed_copy_removes_the_partial_file(tmp_path):
+    class DroppedConnection(io.BytesIO):
+        def readinto(self, buffer):
+            if self.tell():
+                raise ConnectionResetError('client went away')
+            return super().readinto(buffer)
+
+    path = tmp_path / 'partial.txt'
+    with pytest.raises(ConnectionResetError):
+        ingest_stream(DroppedConnection(TEXT), str(path), buffer_size=1024)
+    assert not path.exists()
+
+
+def test_file_on_disk_matches_the_streamed_ingest(tmp_path):
+    path = tmp_path / 'assembled.txt'
+    path.write_bytes(TEXT)
+    streamed = ingest_stream(io.BytesIO(TEXT), str(tmp_path / 'streamed.txt'), 'assembled.txt')
+
+    result, metadata = ingest_file(str(path), 'assembled.txt')
+    assert result._replace(path=None) == streamed._replace(path=None)
+    assert metadata['hash'] == streamed.sha256
@@ -0,0 +1,142 @@
+"""Blob reference counting and garbage collection in the evidence store."""
+
+import io
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from conftest import make_fir
+
+
+@pytest.fixture
+def fir_id(app):
+    return make_fir(app, incident_description='Evidence store case')
+
+
+def _content():
+    return f"Exhibit {uuid.uuid4().hex}\n".encode() * 50
+
+
+def _store(content, file_name='exhibit.txt'):
+    from utils.evidence_store import store_upload
+
+    return store_upload(FileStorage(stream=io.BytesIO(content), filename=file_name))
+
+
+def _attach(fir_id, stored):
+    from extensions import db
+    from models import Evidence
+
+    evidence = Evidence(fir_id=fir_id, type='document', file_path=stored.file_path, content_hash=stored.ingest.sha256)
+    db.session.add(evidence)
+    db.session.commit()
+    return evidence
+
+
+def _blob(sha256):
+    from extensions import db
+    from models import EvidenceBlob
+
+    db.session.expire_all()
+    return db.session.get(EvidenceBlob, sha256)
+
+
+def _blob_file(blob):
+    from utils.evidence_store import store_root
+
+    return os.path.join(store_root(), blob.path)
+
+
+def _release_long_ago(sha256, hours=2):
+    from extensions import db
+    from models import EvidenceBlob
+
+    table = EvidenceBlob.__table__
+    released = datetime.now(timezone.utc) - timedelta(hours=hours)
+    db.session.execute(table.update().where(table.c.sha256 == sha256).values(released_at=released))
+    db.session.commit()
+
+
+def test_identical_uploads_share_one_counted_blob(app_context, fir_id):
+    content = _content()
+    first = _store(content)
+    _attach(fir_id, first)
+    second = _store(content, 'copy.txt')
+    _attach(fir_id, second)
+
+    assert not first.deduplicated and second.deduplicated
+    assert second.file_path == first.file_path
+    blob = _blob(first.ingest.sha256)
+    assert blob.ref_count == 2
+    assert os.listdir(os.path.dirname(_blob_file(blob))) == [os.path.basename(blob.path)]
+
+
+def test_deleting_evidence_releases_its_blob(app_context, fir_id):
+    from extensions import db
+
+    stored = _store(_content())
+    evidence = _attach(fir_id, stored)
+    _attach(fir_id, stored)
+
+    db.session.delete(evidence)
+    db.session.commit()
+    blob = _blob(stored.ingest.sha256)
+    assert blob.ref_count == 1
+    assert blob.released_at is not None
+
+
+def test_changing_content_hash_moves_the_reference(app_context, fir_id):
+    from extensions import db
+
+    old, new = _store(_content()), _store(_content())
+    evidence = _attach(fir_id, old)
+
+    # After a commit, so the old hash has to be loaded before it is overwritten
+    evidence.content_hash = new.ingest.sha256
+    evidence.file_path = new.file_path
+    db.session.commit()
+    assert _blob(old.ingest.sha256).ref_count == 0
+    assert _blob(new.ingest.sha256).ref_count == 1
+
+
+def test_gc_keeps_unreferenced_blobs_for_the_grace_period(app_context, fir_id):
+    from extensions import db
+    from utils.evidence_store import collect_garbage
+
+    recent, old = _store(_content()), _store(_content())
+    db.session.commit()
+    _release_long_ago(old.ingest.sha256)
+    old_file = _blob_file(old.blob)
+
+    collect_garbage(grace_seconds=3600)
+    assert _blob(recent.ingest.sha256) is not None
+    assert os.path.exists(_blob_file(recent.blob))
+    assert _blob(old.ingest.sha256) is None
+    assert not os.path.exists(old_file)
+
+
+def test_reusing_a_released_blob_restarts_its_grace_period(app_context, fir_id):
+    from extensions import db
+    from utils.evidence_store import collect_garbage
+
+    content = _content()
+    first = _store(content)
+    evidence = _attach(fir_id, first)
+    db.session.delete(evidence)
+    db.session.commit()
+    _release_long_ago(first.ingest.sha256)
+
+    # An upload of the same content is placed, and the collector runs before
+    # its evidence row is committed
+    again = _store(content)
+    assert again.deduplicated
+    db.session.commit()
+    collect_garbage(grace_seconds=3600)
+
+    _attach(fir_id, again)
+    blob = _blob(first.ingest.sha256)
+    assert blob.ref_count == 1
+    assert os.path.exists(_blob_file(blob))
@@ -0,0 +1,129 @@
+"""Resumable chunked evidence uploads."""
+
+import hashlib
+import os
+
+import pytest
+
+from conftest import login, make_fir
+
+CONTENT = b'Station log, 14 March.\n' * 400
+
+
+@pytest.fixture
+def fir_id(app):
+    return make_fir(app, incident_description='Chunked upload case')
+
+
+def _start(client, fir_id, content=CONTENT, **fields):
+    response = client.post(f'/evidence/uploads/{fir_id}',
+                           json={'filename': 'log.txt', 'size': len(content), **fields})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def _send(client, upload, offset, chunk, checksum=None):
+    headers = {'X-Chunk-SHA256': checksum} if checksum else {}
+    return client.patch(f"{upload['upload_url']}?offset={offset}", data=chunk, headers=headers)
+
+
+def _send_all(client, upload, content=CONTENT):
+    half = len(content) // 2
+    for offset, chunk in ((0, content[:half]), (half, content[half:])):
+        assert _send(client, upload, offset, chunk).status_code == 200
+
+
+def test_retry_after_evidence_failure_finishes_from_the_blob(app, client, fir_id, monkeypatch):
+    import routes.evidence
+    from extensions import db
+    from models import Evidence, EvidenceUpload
+
+    login(client, 'user')
+    upload = _start(client, fir_id)
+    _send_all(client, upload)
+
+    original = routes.evidence._new_evidence
+
+    def failing_new_evidence(*args, **kwargs):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(routes.evidence, '_new_evidence', failing_new_evidence)
+    assert client.post(upload['complete_url']).status_code == 500
+    with app.app_context():
+        assert Evidence.query.filter_by(fir_id=fir_id).count() == 0
+        stored = db.session.get(EvidenceUpload, upload['upload_id'])
+        assert stored.sha256 == hashlib.sha256(CONTENT).hexdigest()
+
+    monkeypatch.setattr(routes.evidence, '_new_evidence', original)
+    response = client.post(upload['complete_url'])
+    assert response.status_code == 200
+    state = response.get_json()
+    assert state['complete']
+    with app.app_context():
+        evidence = db.session.get(Evidence, state['evidence_id'])
+        assert evidence.fir_id == fir_id
+        assert evidence.content_hash == hashlib.sha256(CONTENT).hexdigest()
+
+    # Completing again gives the same evidence
+    again = client.post(upload['complete_url']).get_json()
+    assert again['evidence_id'] == state['evidence_id']
+
+
+def test_offset_checksum_and_complete(app, client, fir_id):
+    from extensions import db
+    from models import Evidence, EvidenceBlob
+    from utils.evidence_store import store_root
+
+    login(client, 'user')
+    upload = _start(client, fir_id, description='Station log')
+    assert upload['offset'] == 0
+    half = len(CONTENT) // 2
+    first, second = CONTENT[:half], CONTENT[half:]
+
+    # A chunk must start at the stored offset
+    response = _send(client, upload, half, second)
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 0
+
+    # A chunk whose checksum does not match is discarded
+    response = _send(client, upload, 0, first, checksum=hashlib.sha256(b'other').hexdigest())
+    assert response.status_code == 400
+    assert client.head(upload['upload_url']).headers['Upload-Offset'] == '0'
+
+    response = _send(client, upload, 0, first, checksum=hashlib.sha256(first).hexdigest())
+    assert response.status_code == 200
+    assert response.get_json()['offset'] == half
+    assert client.head(upload['upload_url']).headers['Upload-Offset'] == str(half)
+
+    # Not complete until every byte has arrived
+    assert client.post(upload['complete_url']).status_code == 409
+
+    # Re-sending a chunk that was already stored is refused, not appended
+    assert _send(client, upload, 0, first).status_code == 409
+    assert _send(client, upload, half, second, checksum=hashlib.sha256(second).hexdigest()).status_code == 200
+
+    response = client.post(upload['complete_url'])
+    assert response.status_code == 200
+    state = response.get_json()
+    assert state['complete'] and state['offset'] == len(CONTENT)
+
+    sha256 = hashlib.sha256(CONTENT).hexdigest()
+    with app.app_context():
+        evidence = db.session.get(Evidence, state['evidence_id'])
+        assert evidence.content_hash == sha256
+        assert evidence.description == 'Station log'
+        blob = db.session.get(EvidenceBlob, sha256)
+        assert blob.ref_count >= 1
+        with open(os.path.join(store_root(), blob.path), 'rb') as f:
+            assert f.read() == CONTENT
+
+    # Chunks after completion are refused
+    assert _send(client, upload, len(CONTENT), b'x').status_code == 409
+
+
+def test_uploads_belong_to_their_user(client, fir_id):
+    login(client, 'user')
+    upload = _start(client, fir_id)
+    login(client, 'police')
+    assert client.head(upload['upload_url']).status_code == 404
+    assert client.post(upload['complete_url']).status_code == 404
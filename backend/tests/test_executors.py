@@ -0,0 +1,14 @@
+"""The shared executors survive init_executors() being called again."""
+
+from utils import executors
+
+
+def test_reinit_keeps_llm_slots(app):
+    assert executors.try_acquire_llm_slot()
+    executors.init_executors(app)
+    # Released into the same semaphore it was taken from
+    executors.release_llm_slot()
+
+
+def test_submit_cpu_bound_runs_on_the_pool(app):
+    assert executors.submit_cpu_bound(sum, [1, 2, 3]).result(timeout=5) == 6
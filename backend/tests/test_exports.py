@@ -0,0 +1,66 @@
+"""Streaming CSV and JSONL case exports."""
+
+import csv
+import gzip
+import io
+import json
+
+from conftest import make_fir, user_id
+
+
+def _rows(export_format, compress=False, **options):
+    from utils.exports import export_chunks
+
+    chunks = list(export_chunks(export_format, compress, **options))
+    data = b''.join(chunks)
+    if compress:
+        data = gzip.decompress(data)
+    text = data.decode('utf-8')
+    if export_format == 'csv':
+        return chunks, list(csv.DictReader(io.StringIO(text, newline='')))
+    return chunks, [json.loads(line) for line in text.splitlines()]
+
+
+def test_export_streams_every_matching_row_in_batches(app, app_context):
+    from utils.exports import EXPORT_COLUMNS
+
+    fir_ids = [make_fir(app, status='exported', urgency_level='stream') for _ in range(5)]
+    make_fir(app, status='exported', urgency_level='other')
+
+    chunks, rows = _rows('csv', status='exported', urgency='stream', batch_size=2)
+    # The header rides with the first batch; one chunk per batch of two rows
+    assert len(chunks) == 3
+    assert [int(row['id']) for row in rows] == fir_ids
+    assert tuple(rows[0]) == EXPORT_COLUMNS
+
+    _, records = _rows('jsonl', status='exported', urgency='stream', batch_size=2)
+    assert [record['id'] for record in records] == fir_ids
+
+    _, gzipped = _rows('csv', compress=True, status='exported', urgency='stream', batch_size=2)
+    assert gzipped == rows
+
+
+def test_csv_cells_are_quoted_and_defused(app, app_context):
+    description = 'He said, "hand it over"\nand left.'
+    fir_id = make_fir(
+        app,
+        status='escaped',
+        incident_location='=HYPERLINK("http://example.com","Station")',
+        incident_description=description,
+        processing_officer_id=user_id(app, 'police'),
+        legal_sections=json.dumps([{'code': '302'}, {'code': 'N/A'}, {'code': '34'}]),
+    )
+
+    _, rows = _rows('csv', status='escaped')
+    assert len(rows) == 1
+    row = rows[0]
+    assert int(row['id']) == fir_id
+    assert row['incident_description'] == description
+    # Spreadsheet apps would run a cell starting with '=' as a formula
+    assert row['incident_location'] == '\'=HYPERLINK("http://example.com","Station")'
+    assert row['legal_sections'] == '302; 34'
+    assert (row['complainant'], row['processing_officer']) == ('user', 'police')
+
+    _, records = _rows('jsonl', status='escaped')
+    assert records[0]['incident_location'].startswith('=')
+    assert records[0]['legal_sections'] == ['302', '34']
@@ -0,0 +1,25 @@
+"""Magic-number sniffing of evidence files."""
+
+import struct
+
+import pytest
+
+from utils.file_types import sniff_signature
+
+
+def _bmp(dib_header_size):
+    return b'BM' + struct.pack('<IHHI', 70, 0, 0, 54) + struct.pack('<I', dib_header_size) + b'\x00' * 40
+
+
+@pytest.mark.parametrize('size', [12, 40, 108, 124])
+def test_bmp_with_known_dib_header(size):
+    assert sniff_signature(_bmp(size), 'scene.bmp') == 'image/bmp'
+
+
+@pytest.mark.parametrize('head', [
+    b'BMW accident on the highway near exit 12, two injured.\n',
+    _bmp(41),
+    b'BM',
+])
+def test_text_starting_with_bm_is_not_bmp(head):
+    assert sniff_signature(head, 'statement.txt') != 'image/bmp'
@@ -0,0 +1,110 @@
+"""Claiming, stale requeue and the attempts cap of the FIR job queue."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event as sa_event, update
+
+from conftest import make_fir
+
+
+@pytest.fixture
+def jobs(app, app_context):
+    """Two queued jobs, oldest first, on an otherwise empty queue."""
+    from extensions import db
+    from models import FIR, FIRJob
+    from utils.fir_jobs import enqueue_submit_job
+
+    fir_ids = [make_fir(app), make_fir(app)]
+    FIRJob.query.delete()
+    created = [enqueue_submit_job(db.session.get(FIR, fir_id)) for fir_id in fir_ids]
+    db.session.commit()
+    yield [job.id for job in created]
+    db.session.rollback()
+    FIRJob.query.delete()
+    db.session.commit()
+
+
+def _job(job_id):
+    from extensions import db
+    from models import FIRJob
+
+    db.session.expire_all()
+    return db.session.get(FIRJob, job_id)
+
+
+def test_claims_oldest_queued_job_once(jobs):
+    from utils.fir_jobs import claim_next_job
+
+    first = claim_next_job('worker-a')
+    assert first.id == jobs[0]
+    assert (first.status, first.locked_by, first.attempts) == ('running', 'worker-a', 1)
+    assert claim_next_job('worker-b').id == jobs[1]
+    assert claim_next_job('worker-c') is None
+
+
+def test_claim_skips_a_job_another_worker_took_first(jobs):
+    from extensions import db
+    from models import FIRJob
+    from utils.fir_jobs import claim_next_job
+
+    table = FIRJob.__table__
+    raced = []
+
+    # Another worker claims the oldest job between the candidate read and our UPDATE
+    def other_worker_wins(orm_execute_state):
+        if orm_execute_state.is_update and not raced:
+            raced.append(True)
+            orm_execute_state.session.connection().execute(
+                update(table).where(table.c.id == jobs[0]).values(status='running', locked_by='worker-b')
+            )
+
+    sa_event.listen(db.session, 'do_orm_execute', other_worker_wins)
+    try:
+        claimed = claim_next_job('worker-a')
+    finally:
+        sa_event.remove(db.session, 'do_orm_execute', other_worker_wins)
+
+    assert raced
+    assert claimed.id == jobs[1]
+    assert _job(jobs[0]).locked_by == 'worker-b'
+
+
+def _mark_running(job_id, minutes_ago, attempts):
+    from extensions import db
+
+    job = _job(job_id)
+    job.status = 'running'
+    job.locked_by = 'dead-worker'
+    job.locked_at = datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)
+    job.attempts = attempts
+    db.session.commit()
+
+
+def test_requeues_only_stale_jobs(jobs):
+    from utils.fir_jobs import requeue_stale_jobs
+
+    _mark_running(jobs[0], minutes_ago=30, attempts=1)
+    _mark_running(jobs[1], minutes_ago=1, attempts=1)
+
+    assert requeue_stale_jobs(stale_after_seconds=600) == 1
+    stale, live = _job(jobs[0]), _job(jobs[1])
+    assert (stale.status, stale.locked_by, stale.locked_at) == ('queued', None, None)
+    assert (live.status, live.locked_by) == ('running', 'dead-worker')
+
+
+def test_fails_jobs_that_used_up_their_attempts(jobs):
+    from utils.fir_jobs import claim_next_job, requeue_stale_jobs
+
+    _mark_running(jobs[0], minutes_ago=30, attempts=3)
+    _mark_running(jobs[1], minutes_ago=30, attempts=2)
+
+    assert requeue_stale_jobs(stale_after_seconds=600, max_attempts=3) == 1
+    poisoned = _job(jobs[0])
+    assert poisoned.status == 'failed'
+    assert '3 attempts' in poisoned.error
+    assert poisoned.finished_at is not None
+    assert _job(jobs[1]).status == 'queued'
+    # The failed job is never claimed again
+    assert claim_next_job('worker-a').id == jobs[1]
+    assert claim_next_job('worker-a') is None
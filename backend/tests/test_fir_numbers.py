@@ -0,0 +1,116 @@
+"""Block allocation of FIR numbers from the fir_sequences table."""
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+DAY = datetime(2001, 2, 3, 10, 30, tzinfo=timezone.utc)
+NEXT_DAY = datetime(2001, 2, 4, 0, 5, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def settings(app, app_context, monkeypatch):
+    from extensions import db
+    from models import FIRSequence
+
+    monkeypatch.setitem(app.config, 'FIR_STATION_CODE', 'HQ')
+    monkeypatch.setitem(app.config, 'FIR_NUMBER_BLOCK_SIZE', 3)
+    FIRSequence.query.filter(FIRSequence.scope.like('%:2001%')).delete(synchronize_session=False)
+    db.session.commit()
+    yield app.config
+    db.session.rollback()
+
+
+def _allocator():
+    from utils.fir_numbers import FIRNumberAllocator, _reserve_sql
+
+    return FIRNumberAllocator(_reserve_sql)
+
+
+def _next_value(scope):
+    from extensions import db
+    from models import FIRSequence
+
+    db.session.expire_all()
+    row = db.session.get(FIRSequence, scope)
+    return row.next_value if row else None
+
+
+def test_numbers_come_from_blocks_reserved_in_the_table(settings):
+    first, second = _allocator(), _allocator()
+
+    assert first.allocate(DAY) == 'FIR20010203HQ000001'
+    assert _next_value('HQ:20010203') == 4
+    # Another process reserves the next block
+    assert second.allocate(DAY) == 'FIR20010203HQ000004'
+    assert [first.allocate(DAY) for _ in range(3)] == [
+        'FIR20010203HQ000002', 'FIR20010203HQ000003', 'FIR20010203HQ000007'
+    ]
+    assert _next_value('HQ:20010203') == 10
+
+
+def test_another_process_creating_the_scope_row_first(settings, monkeypatch):
+    from sqlalchemy import insert
+
+    import utils.fir_numbers
+    from extensions import db
+
+    raced = []
+
+    # The other process inserts the day's row between our UPDATE and INSERT
+    def racing_insert(table):
+        if not raced:
+            raced.append(True)
+            with db.engine.begin() as conn:
+                conn.execute(insert(table).values(scope='HQ:20010203', next_value=11))
+        return insert(table)
+
+    monkeypatch.setattr(utils.fir_numbers, 'insert', racing_insert)
+    assert _allocator().allocate(DAY) == 'FIR20010203HQ000011'
+    assert raced
+    assert _next_value('HQ:20010203') == 14
+
+
+def test_new_day_and_station_start_their_own_sequence(settings):
+    allocator = _allocator()
+
+    assert allocator.allocate(DAY) == 'FIR20010203HQ000001'
+    assert allocator.allocate(NEXT_DAY) == 'FIR20010204HQ000001'
+    settings['FIR_STATION_CODE'] = 'n7'
+    assert allocator.allocate(NEXT_DAY) == 'FIR20010204N7000001'
+    settings['FIR_STATION_CODE'] = 'HQ'
+    # Going back to a day carries on from its block
+    assert allocator.allocate(DAY) == 'FIR20010203HQ000002'
+    assert _next_value('N7:20010204') == 4
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_reserves_its_own_block(settings):
+    from utils.fir_numbers import FIRNumberAllocator
+
+    reserved = []
+
+    def reserve(scope, size):
+        reserved.append(scope)
+        start = len(reserved) * 100
+        return start, start + size
+
+    allocator = FIRNumberAllocator(reserve)
+    assert allocator.allocate(DAY) == 'FIR20010203HQ000100'
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.write(write_fd, allocator.allocate(DAY).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        child_number = pipe.read()
+    os.waitpid(pid, 0)
+
+    # The parent's block is not handed out again in the child
+    assert child_number == 'FIR20010203HQ000200'
+    assert allocator.allocate(DAY) == 'FIR20010203HQ000101'
@@ -0,0 +1,47 @@
+"""Keyset paging of the FIRs citing a legal section."""
+
+from conftest import login, make_fir
+
+
+def test_section_links_page_every_fir_once(app):
+    from extensions import db
+    from models import FIR, FIRLegalSection, LegalSection
+    from utils.pagination import decode_link_cursor, paginate_section_links
+
+    with app.app_context():
+        section = LegalSection(code='TEST 379', name='Theft', description='Test section')
+        db.session.add(section)
+        db.session.commit()
+        section_id = section.id
+
+    # Ties on confidence straddle the page boundaries
+    expected = []
+    for i in range(12):
+        fir_id = make_fir(app, incident_description=f'Paging case {i}')
+        expected.append(fir_id)
+        with app.app_context():
+            db.session.add(FIRLegalSection(fir_id=fir_id, legal_section_id=section_id,
+                                           confidence=0.5 if i % 2 else 0.9))
+            db.session.commit()
+
+    with app.app_context():
+        query = (
+            db.session.query(FIRLegalSection, FIR)
+            .join(FIR, FIR.id == FIRLegalSection.fir_id)
+            .filter(FIRLegalSection.legal_section_id == section_id)
+        )
+        seen, token, pages = [], None, 0
+        while True:
+            rows, token = paginate_section_links(query, decode_link_cursor(token), limit=5)
+            seen += [fir.id for link, fir in rows]
+            pages += 1
+            if token is None:
+                break
+
+    assert pages == 3
+    assert seen == sorted(expected[0::2], reverse=True) + sorted(expected[1::2], reverse=True)
+
+
+def test_section_view_rejects_bad_cursor(client):
+    login(client, 'police')
+    assert client.get('/legal-sections/view/1?cursor=not-a-cursor').status_code == 400
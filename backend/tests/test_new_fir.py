@@ -0,0 +1,30 @@
+"""Filing a FIR with evidence attached."""
+
+import hashlib
+import io
+
+from conftest import login
+
+
+def test_new_fir_evidence_starts_its_custody_chain(app, client):
+    from extensions import db
+    from models import Evidence
+    from utils.custody import verify_chain
+
+    content = b'Photo of the broken window, taken at 9am.\n'
+    uid = login(client, 'user')
+    response = client.post('/fir/new', data={
+        'incident_location': 'Main road',
+        'evidence': (io.BytesIO(content), 'window.txt'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+
+    with app.app_context():
+        evidence = (Evidence.query.filter_by(content_hash=hashlib.sha256(content).hexdigest())
+                    .order_by(Evidence.id.desc()).first())
+        assert evidence is not None
+        events = db.session.scalars(evidence.custody_events.select()).all()
+        assert [event.action for event in events] == ['Evidence uploaded']
+        assert events[0].user_id == uid
+        assert events[0].notes == f'SHA-256 {evidence.content_hash}'
+        assert verify_chain(evidence.id)[:2] == (True, 1)
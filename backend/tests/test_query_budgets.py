@@ -0,0 +1,71 @@
+"""List and detail pages stay within their SQL query budgets as data grows."""
+
+import pytest
+
+from conftest import login, make_fir, user_id
+
+# Enough rows that a per-row query would blow every budget
+FIR_COUNT = 12
+
+
+@pytest.fixture(scope='module')
+def busy_firs(app):
+    from extensions import db
+    from models import Evidence, FIRLegalSection, LegalSection
+
+    officer = user_id(app, 'police')
+    with app.app_context():
+        section = LegalSection(code='TEST 420', name='Cheating', description='Test section')
+        db.session.add(section)
+        db.session.commit()
+        section_id = section.id
+
+    fir_ids = []
+    for i in range(FIR_COUNT):
+        fir_id = make_fir(app, incident_description=f'Budget case {i}', processing_officer_id=officer,
+                          urgency_level='high' if i % 3 else 'medium')
+        fir_ids.append(fir_id)
+        with app.app_context():
+            db.session.add(FIRLegalSection(fir_id=fir_id, legal_section_id=section_id, confidence=0.8))
+            for n in range(2):
+                evidence = Evidence(fir_id=fir_id, type='document', file_path=f'uploads/missing-{i}-{n}.txt',
+                                    description=f'Exhibit {n}')
+                evidence.add_custody_event(user_id=officer, action='Evidence uploaded')
+                db.session.add(evidence)
+            db.session.commit()
+    return fir_ids
+
+
+def _within_budget(client, url):
+    response = client.get(url)
+    # Over budget raises QueryBudgetExceeded under app.testing
+    assert response.status_code == 200, url
+    assert 'X-Query-Count' in response.headers
+    return int(response.headers['X-Query-Count'])
+
+
+@pytest.mark.parametrize('username, url', [
+    ('user', '/fir/dashboard'),
+    ('police', '/fir/dashboard'),
+    ('user', '/fir/api/list?format=html'),
+    ('admin', '/admin/'),
+    ('admin', '/admin/cases'),
+    ('police', '/admin/cases'),
+    ('admin', '/admin/api/cases?format=html'),
+])
+def test_list_pages_within_budget(client, busy_firs, username, url):
+    login(client, username)
+    _within_budget(client, url)
+
+
+@pytest.mark.parametrize('username', ['user', 'police', 'admin'])
+def test_detail_page_within_budget(client, busy_firs, username):
+    login(client, username)
+    _within_budget(client, f'/fir/view/{busy_firs[0]}')
+
+
+def test_list_query_count_does_not_grow_with_rows(app, client, busy_firs):
+    login(client, 'admin')
+    before = _within_budget(client, '/admin/api/cases?limit=5')
+    after = _within_budget(client, f'/admin/api/cases?limit={FIR_COUNT}')
+    assert after == before
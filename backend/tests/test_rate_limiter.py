@@ -0,0 +1,111 @@
+"""Token buckets, load shedding and rejection events of @rate_limited."""
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager
+
+from utils.rate_limiter import MemoryBucketStore, RateLimiter, SQLiteBucketStore, rate_limited
+from utils.request_events import RequestEvent
+
+
+@pytest.fixture
+def limited():
+    app = Flask(__name__)
+    LoginManager(app).user_loader(lambda user_id: None)
+    # Two requests per client and no refill, one request at a time
+    limiter = RateLimiter(MemoryBucketStore(), capacity=2, per_minute=0, max_concurrent=1)
+    app.extensions['rate_limiter'] = limiter
+
+    @app.route('/ping')
+    @rate_limited('ping')
+    def ping():
+        return 'ok'
+
+    return app, limiter
+
+
+@pytest.fixture
+def events(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(RequestEvent, 'emit', lambda self, level=None: emitted.append((self.name, dict(self.fields))))
+    return emitted
+
+
+def test_bucket_runs_out(limited, events):
+    app, limiter = limited
+    client = app.test_client()
+    assert client.get('/ping').status_code == 200
+    assert client.get('/ping').status_code == 200
+    response = client.get('/ping')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert events == [('ping.rejected', {'outcome': 'rate_limited', 'reason': 'rate_limit',
+                                         'endpoint': 'ping', 'user_id': None})]
+
+
+def test_clients_have_separate_buckets(limited, events):
+    app, limiter = limited
+    client = app.test_client()
+    for _ in range(2):
+        client.get('/ping', environ_base={'REMOTE_ADDR': '198.51.100.1'})
+    assert client.get('/ping', environ_base={'REMOTE_ADDR': '198.51.100.1'}).status_code == 429
+    assert client.get('/ping', environ_base={'REMOTE_ADDR': '198.51.100.2'}).status_code == 200
+
+
+def test_shed_request_keeps_its_token(limited, events):
+    app, limiter = limited
+    client = app.test_client()
+    assert limiter.acquire_slot()
+    try:
+        response = client.get('/ping')
+        assert response.status_code == 429
+        assert events[-1][1]['reason'] == 'overloaded'
+    finally:
+        limiter.release_slot()
+    # Neither token was spent on the shed request
+    assert client.get('/ping').status_code == 200
+    assert client.get('/ping').status_code == 200
+
+
+def test_rejection_frees_the_slot(limited, events):
+    app, limiter = limited
+    client = app.test_client()
+    for _ in range(3):
+        client.get('/ping')
+    assert limiter.acquire_slot()
+    limiter.release_slot()
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteBucketStore(str(tmp_path / 'buckets.db'))
+    return MemoryBucketStore()
+
+
+def _bucket_keys(store):
+    if isinstance(store, SQLiteBucketStore):
+        return {key for (key,) in store._connect().execute('SELECT key FROM rate_limit_buckets')}
+    return set(store._buckets)
+
+
+def test_buckets_refilled_while_idle_are_evicted(store):
+    # Two tokens, one per second: a bucket is full again two seconds after its last use
+    store.take('idle', 2, 1.0, now=1000)
+    store.take('busy', 2, 1.0, now=1059.5)
+    assert _bucket_keys(store) == {'idle', 'busy'}
+    # The next sweep is due a minute after the first
+    store.take('new', 2, 1.0, now=1061)
+    assert _bucket_keys(store) == {'busy', 'new'}
+
+
+def test_buckets_that_never_refill_are_kept(store):
+    store.take('spent', 2, 0.0, now=1000)
+    store.take('other', 2, 0.0, now=5000)
+    assert _bucket_keys(store) == {'spent', 'other'}
+
+
+def test_forwarded_address_is_not_trusted_by_default(app):
+    from werkzeug.middleware.proxy_fix import ProxyFix
+
+    assert not isinstance(app.wsgi_app, ProxyFix)
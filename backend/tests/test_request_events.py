@@ -0,0 +1,94 @@
+"""Structured request events: stage timings, sampling and the JSON line format."""
+
+import json
+import logging
+import queue
+import time
+
+import pytest
+
+import utils.request_events as request_events
+from utils.request_events import (
+    DroppingQueueHandler, JSONEventFormatter, RequestEvent, current_event, event_logger, start_event
+)
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def captured(app, monkeypatch):
+    # The app has run init_event_logging(), which enables INFO on the event logger
+    handler = _Capture()
+    event_logger.addHandler(handler)
+    monkeypatch.setitem(request_events._settings, 'sample_rate', 1.0)
+    yield handler.records
+    event_logger.removeHandler(handler)
+
+
+def test_stage_timings_are_recorded_and_accumulate():
+    event = RequestEvent('chatbot.query')
+    with event.stage('classify'):
+        time.sleep(0.01)
+    with event.stage('classify'):
+        time.sleep(0.01)
+    with pytest.raises(ValueError):
+        with event.stage('lookup'):
+            raise ValueError('boom')
+
+    assert event.stages['classify'] >= 20
+    assert 'lookup' in event.stages
+
+
+def test_emit_logs_fields_timings_and_cache(captured):
+    event = RequestEvent('chatbot.query')
+    event.set(intent='case_status', sections=['379'])
+    with event.stage('respond'):
+        pass
+    event.cache_hit()
+    event.cache_miss(2)
+    event.emit()
+
+    [record] = captured
+    assert record.getMessage() == 'chatbot.query'
+    assert record.fields['intent'] == 'case_status'
+    assert set(record.fields['stages_ms']) == {'respond'}
+    assert record.fields['cache'] == {'hits': 1, 'misses': 2}
+    assert record.fields['duration_ms'] >= 0
+
+    line = json.loads(JSONEventFormatter().format(record))
+    assert line['event'] == 'chatbot.query'
+    assert line['level'] == 'INFO'
+    assert line['stages_ms'] == record.fields['stages_ms']
+
+
+def test_sampling_never_drops_warnings(captured, monkeypatch):
+    monkeypatch.setitem(request_events._settings, 'sample_rate', 0.0)
+    RequestEvent('sampled.out').emit()
+    RequestEvent('kept').emit(logging.WARNING)
+    assert [record.getMessage() for record in captured] == ['kept']
+
+
+def test_events_bind_to_the_request(app, captured):
+    assert isinstance(current_event(), request_events._NullEvent)
+    with app.test_request_context('/'):
+        event = start_event('chatbot.query')
+        assert current_event() is event
+    # Outside a request nothing is recorded or logged
+    current_event().set(intent='ignored')
+    current_event().emit()
+    assert captured == []
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord('fir.events', logging.INFO, __file__, 1, 'event', None, None)
+    handler.handle(record)
+    handler.handle(record)
+    assert handler.dropped == 1
@@ -0,0 +1,64 @@
+"""Officer scoping of the admin FIR search."""
+
+import pytest
+
+from conftest import login, make_fir, user_id
+
+
+@pytest.fixture(scope='module')
+def firs(app):
+    from extensions import db
+    from models import Role, User
+
+    with app.app_context():
+        other = User.query.filter_by(username='other_officer').first()
+        if other is None:
+            other = User(username='other_officer', email='other_officer@example.com',
+                         full_name='Other Officer', role=Role.POLICE)
+            other.set_password('password')
+            db.session.add(other)
+            db.session.commit()
+        other_id = other.id
+
+    own = make_fir(app, incident_description='Bicycle theft near the market',
+                   processing_officer_id=user_id(app, 'police'))
+    foreign = make_fir(app, incident_description='Phone theft at the bus stand',
+                       processing_officer_id=other_id)
+    return own, foreign
+
+
+def _result_ids(response):
+    assert response.status_code == 200
+    return {item['id'] for item in response.get_json()['results']}
+
+
+def test_police_only_find_their_own_cases(client, firs):
+    own, foreign = firs
+    login(client, 'police')
+    ids = _result_ids(client.get('/admin/api/search?q=theft'))
+    assert own in ids
+    assert foreign not in ids
+
+
+def test_invalid_date_keeps_officer_scope(client, firs):
+    own, foreign = firs
+    login(client, 'police')
+    response = client.get('/admin/search?q=theft&date_from=bad')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert 'Invalid date from' in page
+    assert 'Bicycle' in page
+    assert 'Phone' not in page
+
+
+def test_api_rejects_invalid_date(client, firs):
+    login(client, 'police')
+    response = client.get('/admin/api/search?q=theft&date_to=2024-13-40')
+    assert response.status_code == 400
+
+
+def test_admin_sees_every_case(client, firs):
+    own, foreign = firs
+    login(client, 'admin')
+    ids = _result_ids(client.get('/admin/api/search?q=theft'))
+    assert {own, foreign} <= ids
@@ -0,0 +1,106 @@
+"""Dashboard counters kept by mapper events, and their reconciliation."""
+
+from collections import Counter
+
+from sqlalchemy import update
+
+from conftest import make_fir, user_id
+
+
+def _counts():
+    from extensions import db
+    from models import StatCounter
+
+    db.session.expire_all()
+    return Counter({(row.dimension, row.key): row.count for row in StatCounter.query.all()})
+
+
+def _change(before):
+    after = _counts()
+    after.subtract(before)
+    return {key: delta for key, delta in after.items() if delta}
+
+
+def _update_fir(fir_id, **values):
+    from extensions import db
+    from models import FIR
+
+    fir = db.session.get(FIR, fir_id)
+    for name, value in values.items():
+        setattr(fir, name, value)
+    db.session.commit()
+
+
+def test_insert_counts_the_new_fir(app, app_context):
+    before = _counts()
+    make_fir(app, urgency_level='high')
+    assert _change(before) == {
+        ('total', 'all'): 1,
+        ('status', 'filed'): 1,
+        ('urgency', 'high'): 1,
+        ('status_urgency', 'filed:high'): 1,
+    }
+
+
+def test_status_change_moves_the_fir_between_counters(app, app_context):
+    fir_id = make_fir(app, urgency_level='low')
+    before = _counts()
+    _update_fir(fir_id, status='under_investigation')
+    assert _change(before) == {
+        ('status', 'filed'): -1,
+        ('status', 'under_investigation'): 1,
+        ('status_urgency', 'filed:low'): -1,
+        ('status_urgency', 'under_investigation:low'): 1,
+    }
+
+
+def test_officer_reassignment_moves_the_fir_between_officers(app, app_context):
+    police, admin = user_id(app, 'police'), user_id(app, 'admin')
+    fir_id = make_fir(app, processing_officer_id=police)
+    before = _counts()
+    _update_fir(fir_id, processing_officer_id=admin)
+    assert _change(before) == {('officer', str(police)): -1, ('officer', str(admin)): 1}
+
+    before = _counts()
+    _update_fir(fir_id, processing_officer_id=None)
+    assert _change(before) == {('officer', str(admin)): -1}
+
+
+def test_delete_uncounts_the_fir(app, app_context):
+    from extensions import db
+    from models import FIR
+
+    police = user_id(app, 'police')
+    fir_id = make_fir(app, urgency_level='medium', processing_officer_id=police)
+    before = _counts()
+    db.session.delete(db.session.get(FIR, fir_id))
+    db.session.commit()
+    assert _change(before) == {
+        ('total', 'all'): -1,
+        ('status', 'filed'): -1,
+        ('urgency', 'medium'): -1,
+        ('status_urgency', 'filed:medium'): -1,
+        ('officer', str(police)): -1,
+    }
+
+
+def test_reconcile_repairs_drift_from_bulk_updates(app, app_context):
+    from extensions import db
+    from models import FIR
+    from utils.stats import _compute_counters, get_counters, reconcile_counters
+
+    fir_id = make_fir(app, urgency_level='high')
+    reconcile_counters()
+    stale = get_counters()['status']['filed']
+
+    # A bulk UPDATE skips the mapper events, so the counters fall behind
+    db.session.execute(update(FIR).where(FIR.id == fir_id).values(status='closed'))
+    db.session.commit()
+    assert _counts()[('status', 'closed')] == _compute_counters()[('status', 'closed')] - 1
+
+    drift = reconcile_counters()
+    assert drift[('status', 'filed')] == (stale, stale - 1)
+    assert ('status', 'closed') in drift
+    assert +_counts() == +_compute_counters()
+    assert get_counters()['status']['filed'] == stale - 1
+    assert reconcile_counters() == {}
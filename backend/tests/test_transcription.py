@@ -0,0 +1,132 @@
+"""Transcription service failure handling and the endpoint's fallbacks."""
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import utils.transcription as transcription
+from conftest import login
+from utils.transcription import (
+    TranscriptionQueueFull, TranscriptionService, TranscriptionUnavailable, get_transcription_service
+)
+
+
+class FakeModel:
+    """Whisper-shaped model; fails on files containing b'garbled', blocks while `hold` is clear."""
+
+    def __init__(self):
+        self.hold = threading.Event()
+        self.hold.set()
+
+    def transcribe(self, audio_path, **options):
+        self.hold.wait(5)
+        with open(audio_path, 'rb') as f:
+            if b'garbled' in f.read():
+                raise RuntimeError('could not decode audio')
+        return {'text': ' heard it ', 'language': options.get('language', 'en'), 'segments': []}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = FakeModel()
+    # The pool runs in threads of this process, so they see this model
+    monkeypatch.setattr(transcription, '_worker_model', model)
+    return model
+
+
+@pytest.fixture
+def service(model):
+    service = TranscriptionService(workers=1, queue_size=1)
+    service._executor = ThreadPoolExecutor(max_workers=1)
+    yield service
+    model.hold.set()
+    service.shutdown(wait=True)
+
+
+def _audio(tmp_path, content=b'speech'):
+    path = tmp_path / f"recording_{len(os.listdir(tmp_path))}.webm"
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_disabled_or_missing_whisper_is_unavailable(app, app_context, monkeypatch):
+    with pytest.raises(TranscriptionUnavailable, match='disabled'):
+        get_transcription_service()
+
+    monkeypatch.setitem(app.config, 'TRANSCRIBE_WORKERS', 1)
+    monkeypatch.setattr(transcription, 'WHISPER_AVAILABLE', False)
+    with pytest.raises(TranscriptionUnavailable, match='not installed'):
+        get_transcription_service()
+
+
+def test_endpoint_answers_503_so_the_browser_falls_back(client):
+    login(client, 'user')
+    response = client.post('/fir/transcribe_whisper', data={'audio': (io.BytesIO(b'speech'), 'clip.webm')})
+    assert response.status_code == 503
+    assert response.get_json()['success'] is False
+
+
+def test_failed_job_records_the_error_and_removes_the_audio(service, tmp_path):
+    finished = []
+    path = _audio(tmp_path, b'garbled')
+    job = service.submit(path, user_id=1, on_done=finished.append)
+
+    assert service.wait(job, 5)
+    assert job.status == 'failed'
+    assert job.to_dict()['error'] == 'could not decode audio'
+    assert finished == [job]
+    assert not os.path.exists(path)
+    assert service.stats()['completed'] == 0
+
+
+def test_full_queue_pushes_back_until_a_slot_frees(service, model, tmp_path):
+    model.hold.clear()
+    first = service.submit(_audio(tmp_path))
+    with pytest.raises(TranscriptionQueueFull) as excinfo:
+        service.submit(_audio(tmp_path))
+    assert excinfo.value.depth == 1
+    assert excinfo.value.retry_after >= 1
+
+    model.hold.set()
+    assert service.wait(first, 5)
+    second = service.submit(_audio(tmp_path), language='hi-IN')
+    assert service.wait(second, 5)
+    assert (second.text, second.detected_language) == ('heard it', 'hi')
+
+
+def test_broken_pool_is_replaced_on_submit(service, tmp_path, monkeypatch):
+    class BrokenPool:
+        def submit(self, *args):
+            raise BrokenProcessPool('a worker died')
+
+    working = service._executor
+    service._executor = BrokenPool()
+    monkeypatch.setattr(service, '_get_executor', lambda: service._executor or working)
+
+    job = service.submit(_audio(tmp_path))
+    assert service.wait(job, 5)
+    assert job.status == 'succeeded'
+    assert service._executor is None
+
+
+def test_endpoint_reports_a_failed_job_and_a_full_queue(client, service, model, monkeypatch):
+    import routes.fir
+
+    login(client, 'user')
+    monkeypatch.setattr(routes.fir, 'get_transcription_service', lambda: service)
+
+    response = client.post('/fir/transcribe_whisper',
+                           data={'audio': (io.BytesIO(b'garbled'), 'clip.webm'), 'wait': '5'})
+    assert response.status_code == 500
+    assert response.get_json()['error'] == 'could not decode audio'
+
+    model.hold.clear()
+    assert client.post('/fir/transcribe_whisper', data={'audio': (io.BytesIO(b'speech'), 'a.webm')}).status_code == 202
+    response = client.post('/fir/transcribe_whisper', data={'audio': (io.BytesIO(b'speech'), 'b.webm')})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['queue']['depth'] == 1
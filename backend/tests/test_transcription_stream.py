@@ -0,0 +1,37 @@
+"""Idle streaming-transcription sessions are dropped on lookup."""
+
+import os
+import time
+
+import pytest
+
+import utils.transcription_stream as transcription_stream
+from utils.transcription_stream import get_stream, start_stream
+
+CONFIG = {'TRANSCRIBE_STREAM_IDLE_TTL': 60}
+
+
+@pytest.fixture(autouse=True)
+def sessions(monkeypatch):
+    monkeypatch.setattr(transcription_stream, '_sessions', {})
+    monkeypatch.setattr(transcription_stream, '_next_eviction', 0.0)
+
+
+def test_lookup_evicts_idle_sessions(monkeypatch):
+    idle = start_stream(None, CONFIG, user_id=1)
+    active = start_stream(None, CONFIG, user_id=1)
+    idle.last_active = time.time() - 120
+    monkeypatch.setattr(transcription_stream, '_next_eviction', 0.0)
+
+    assert get_stream(CONFIG, active.id, 1) is active
+    assert get_stream(CONFIG, idle.id, 1) is None
+    assert not os.path.exists(idle.directory)
+    active.close()
+
+
+def test_sweeps_are_rate_limited():
+    session = start_stream(None, CONFIG, user_id=1)
+    session.last_active = time.time() - 120
+    # The sweep in start_stream just ran, so the next lookup does not sweep again
+    assert get_stream(CONFIG, session.id, 1) is session
+    session.close()
@@ -0,0 +1,444 @@
+"""
+Bulk FIR import and legal-section re-analysis.
+
+Legacy complaints are migrated from a CSV or JSONL file with
+
+    flask --app app:create_app import-firs complaints.csv --complainant legacy
+
+The file is streamed and handled in chunks, so memory use stays flat however
+large the file is. Each chunk becomes one transaction: a multi-row INSERT of
+the FIRs, one batched classifier run over their descriptions (see
+ml_analyzer.predict_ipc_sections_batch), bulk writes of the sections, and the
+import checkpoint. The checkpoint commits with the data, so an interrupted
+import resumes at the first uncommitted record when it is run again.
+
+Recognized fields (CSV header or JSON keys): incident_description (required),
+incident_location, incident_date, filed_at, status, urgency_level,
+complainant_id, processing_officer_id, transcription and fir_number. Rows
+without a fir_number get one allocated for their filing date. Rows whose
+fir_number already exists are skipped, so re-importing a file is harmless.
+
+`flask reanalyze-firs` re-runs the batched section mapping over FIRs already
+in the database. By default it only covers FIRs that have no sections.
+
+The import inserts with bulk statements, which bypass the ORM events that
+keep the dashboard counters current, so it reconciles the counters when it
+finishes.
+"""
+
+import csv
+import gzip
+import itertools
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import click
+from sqlalchemy import bindparam, insert, update
+
+from extensions import db
+from models import FIR, FIRLegalSection, ImportCheckpoint, LegalSection, User
+from utils.fir_numbers import next_fir_number
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+STATUSES = ('draft', 'filed', 'under_investigation', 'closed')
+URGENCY_LEVELS = ('low', 'normal', 'high', 'critical')
+DATE_FORMATS = ('%d-%m-%Y %H:%M', '%d-%m-%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+
+class RecordError(ValueError):
+    """A source record that cannot be imported."""
+
+
+def _open_source(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _iter_csv(path):
+    with _open_source(path) as f:
+        yield from csv.DictReader(f)
+
+
+def _iter_jsonl(path):
+    with _open_source(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield RecordError(f"line {line_number}: invalid JSON ({e})")
+                continue
+            if not isinstance(record, dict):
+                yield RecordError(f"line {line_number}: expected a JSON object")
+                continue
+            yield record
+
+
+def iter_records(path):
+    """
+    Stream the records of a .csv or .jsonl file (optionally gzipped).
+
+    Yields one dict per record, or a RecordError for a line that is not valid
+    JSON, so every record keeps its position for checkpointing.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+        return _iter_csv(path)
+    if name.endswith(('.jsonl', '.ndjson')):
+        return _iter_jsonl(path)
+    raise click.UsageError("Import files must be .csv or .jsonl (optionally .gz)")
+
+
+def _parse_datetime(value, field):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        value = str(value).strip()
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            for date_format in DATE_FORMATS:
+                try:
+                    parsed = datetime.strptime(value, date_format)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise RecordError(f"{field}: unrecognized date {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_int(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RecordError(f"{field}: expected an integer, got {value!r}")
+
+
+def _choice(value, field, choices, default):
+    value = (str(value).strip().lower() if value not in (None, '') else default)
+    if value not in choices:
+        raise RecordError(f"{field}: expected one of {', '.join(choices)}, got {value!r}")
+    return value
+
+
+def _fir_row(record, default_complainant_id):
+    """Column values for one source record."""
+    description = str(record.get('incident_description') or '').strip()
+    if not description:
+        raise RecordError("incident_description is empty")
+
+    filed_at = _parse_datetime(record.get('filed_at'), 'filed_at')
+    complainant_id = _parse_int(record.get('complainant_id'), 'complainant_id') or default_complainant_id
+    if complainant_id is None:
+        raise RecordError("no complainant_id and no --complainant default")
+
+    return {
+        'fir_number': str(record.get('fir_number') or '').strip().upper() or None,
+        'complainant_id': complainant_id,
+        'processing_officer_id': _parse_int(record.get('processing_officer_id'), 'processing_officer_id'),
+        'status': _choice(record.get('status'), 'status', STATUSES, 'filed' if filed_at else 'draft'),
+        'urgency_level': _choice(record.get('urgency_level'), 'urgency_level', URGENCY_LEVELS, 'normal'),
+        'incident_description': description,
+        'incident_location': str(record.get('incident_location') or '').strip() or None,
+        'incident_date': _parse_datetime(record.get('incident_date'), 'incident_date'),
+        'filed_at': filed_at,
+        'created_at': filed_at or datetime.now(timezone.utc),
+        'transcription': record.get('transcription') or None,
+        'legal_sections': None,
+    }
+
+
+def _section_entry(section):
+    """ml_analyzer section result -> the dict FIR.legal_sections stores."""
+    return {
+        'code': section.get('section_code'),
+        'name': section.get('section_name'),
+        'description': section.get('section_description', ''),
+        'relevance': section.get('relevance', ''),
+        'confidence': section.get('confidence', 0.5),
+    }
+
+
+def _section_ids(entry_lists):
+    """LegalSection ids by code for every cited section, creating unknown ones."""
+    entries = {entry['code']: entry for entries in entry_lists for entry in entries
+               if entry['code'] not in (None, 'N/A', 'ERR')}
+    if not entries:
+        return {}
+    section_ids = dict(
+        db.session.query(LegalSection.code, LegalSection.id)
+        .filter(LegalSection.code.in_(entries))
+        .all()
+    )
+    missing = [
+        {'code': code, 'name': entry['name'] or f"Section {code}", 'description': entry['description']}
+        for code, entry in entries.items() if code not in section_ids
+    ]
+    if missing:
+        # Same as get_legal_sections_for_fir(): sections the classifier knows but the table lacks
+        db.session.execute(insert(LegalSection), missing)
+        section_ids.update(
+            db.session.query(LegalSection.code, LegalSection.id)
+            .filter(LegalSection.code.in_([row['code'] for row in missing]))
+            .all()
+        )
+    return section_ids
+
+
+def analyze_firs(fir_ids, descriptions, replace=False):
+    """
+    Map legal sections for a batch of FIRs and bulk-write them.
+
+    Runs the classifier once over all descriptions, then stores the JSON copy
+    with one executemany UPDATE and the FIRLegalSection links with one
+    INSERT. With replace, existing links of these FIRs are deleted first.
+    Does not commit.
+
+    Returns:
+        int: section links created
+    """
+    # Imported here so importing this module does not load the classifier
+    from utils.chatbot import case_cache
+    from utils.ml_analyzer import predict_ipc_sections_batch
+
+    if not fir_ids:
+        return 0
+    entry_lists = [[_section_entry(section) for section in sections]
+                   for sections in predict_ipc_sections_batch(descriptions)]
+    section_ids = _section_ids(entry_lists)
+
+    if replace:
+        FIRLegalSection.query.filter(FIRLegalSection.fir_id.in_(fir_ids)).delete(synchronize_session=False)
+
+    firs = FIR.__table__
+    db.session.execute(
+        update(firs).where(firs.c.id == bindparam('fir_id')).values(legal_sections=bindparam('sections_json')),
+        [{'fir_id': fir_id, 'sections_json': json.dumps(entries)} for fir_id, entries in zip(fir_ids, entry_lists)]
+    )
+    # The Core UPDATE fires no ORM events, so drop the chatbot's copies here
+    case_cache.invalidate_firs(fir_ids)
+
+    links = []
+    for fir_id, entries in zip(fir_ids, entry_lists):
+        seen = set()
+        for entry in entries:
+            section_id = section_ids.get(entry['code'])
+            if section_id is None or section_id in seen:
+                continue
+            seen.add(section_id)
+            links.append({
+                'fir_id': fir_id,
+                'legal_section_id': section_id,
+                'confidence': float(entry['confidence'] or 0),
+                'relevance': entry['relevance'] or None,
+            })
+    if links:
+        db.session.execute(FIRLegalSection.__table__.insert(), links)
+    return len(links)
+
+
+def _import_chunk(chunk, default_complainant_id, analyze):
+    """Insert one chunk of records. Returns (imported, skipped, links)."""
+    rows = []
+    skipped = 0
+    for record in chunk:
+        try:
+            if isinstance(record, RecordError):
+                raise record
+            rows.append(_fir_row(record, default_complainant_id))
+        except RecordError as e:
+            logger.warning(f"Skipping record: {e}")
+            skipped += 1
+
+    # Drop records whose FIR number is taken, in the database or earlier in the chunk
+    numbers = {row['fir_number'] for row in rows if row['fir_number']}
+    taken = {number for (number,) in db.session.query(FIR.fir_number).filter(FIR.fir_number.in_(numbers))} if numbers else set()
+    user_ids = {row['complainant_id'] for row in rows} | {row['processing_officer_id'] for row in rows if row['processing_officer_id']}
+    known_users = {user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(user_ids))} if user_ids else set()
+
+    accepted = []
+    for row in rows:
+        if row['fir_number'] in taken:
+            logger.warning(f"Skipping record: FIR number {row['fir_number']} already exists")
+            skipped += 1
+            continue
+        if row['complainant_id'] not in known_users or (row['processing_officer_id'] and row['processing_officer_id'] not in known_users):
+            logger.warning(f"Skipping record: unknown user in {row['complainant_id']}/{row['processing_officer_id']}")
+            skipped += 1
+            continue
+        if row['fir_number']:
+            taken.add(row['fir_number'])
+        else:
+            # Allocated for the filing date so imported numbers sort with the rest
+            row['fir_number'] = next_fir_number(row['filed_at'] or row['created_at'])
+        accepted.append(row)
+
+    if not accepted:
+        return 0, skipped, 0
+
+    fir_ids = db.session.execute(
+        FIR.__table__.insert().returning(FIR.__table__.c.id, sort_by_parameter_order=True),
+        accepted
+    ).scalars().all()
+
+    links = analyze_firs(fir_ids, [row['incident_description'] for row in accepted]) if analyze else 0
+    return len(accepted), skipped, links
+
+
+def import_firs(path, default_complainant_id=None, chunk_size=1000, analyze=True, restart=False, progress=None):
+    """
+    Import FIRs from a CSV or JSONL file, resuming from its checkpoint.
+
+    Args:
+        path: Source file (.csv, .jsonl, optionally .gz)
+        default_complainant_id: Complainant for records without complainant_id
+        chunk_size: Records per transaction
+        analyze: Map legal sections for the imported FIRs
+        restart: Ignore the checkpoint and start from the first record
+        progress: Optional callable(rows_done, imported, skipped, rows_per_second)
+
+    Returns:
+        tuple: (rows_read, imported, skipped, links_created)
+    """
+    records = iter_records(path)
+    source = os.path.realpath(path)
+    checkpoint = db.session.get(ImportCheckpoint, source)
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(source=source, rows_done=0)
+        db.session.add(checkpoint)
+    if restart:
+        checkpoint.rows_done = 0
+    db.session.commit()
+
+    records = itertools.islice(records, checkpoint.rows_done, None)
+    if checkpoint.rows_done:
+        logger.info(f"Resuming {path} after record {checkpoint.rows_done}")
+
+    rows_read = imported = skipped = links = 0
+    started = time.perf_counter()
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        try:
+            chunk_imported, chunk_skipped, chunk_links = _import_chunk(chunk, default_complainant_id, analyze)
+            checkpoint.rows_done += len(chunk)
+            checkpoint.updated_at = datetime.now(timezone.utc)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        rows_read += len(chunk)
+        imported += chunk_imported
+        skipped += chunk_skipped
+        links += chunk_links
+        if progress:
+            progress(checkpoint.rows_done, imported, skipped, rows_read / max(time.perf_counter() - started, 1e-9))
+
+    if imported:
+        _reconcile_counters()
+    return rows_read, imported, skipped, links
+
+
+def reanalyze_firs(batch_size=500, all_firs=False, progress=None):
+    """
+    Re-run legal-section mapping over existing FIRs in id-ordered batches.
+
+    Only FIRs without sections are covered unless all_firs is set. Each batch
+    commits on its own, so an interrupted run can simply be started again.
+
+    Returns:
+        tuple: (firs_analyzed, links_created)
+    """
+    last_id = 0
+    analyzed = links = 0
+    started = time.perf_counter()
+    while True:
+        query = db.session.query(FIR.id, FIR.incident_description).filter(
+            FIR.id > last_id, FIR.incident_description.isnot(None), FIR.incident_description != ''
+        )
+        if not all_firs:
+            query = query.filter(FIR.legal_sections.is_(None))
+        batch = query.order_by(FIR.id).limit(batch_size).all()
+        if not batch:
+            break
+
+        fir_ids = [fir_id for fir_id, _ in batch]
+        try:
+            links += analyze_firs(fir_ids, [description for _, description in batch], replace=True)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        last_id = fir_ids[-1]
+        analyzed += len(batch)
+        if progress:
+            progress(analyzed, analyzed / max(time.perf_counter() - started, 1e-9))
+    return analyzed, links
+
+
+def _reconcile_counters():
+    from utils.stats import reconcile_counters
+    drift = reconcile_counters()
+    if drift:
+        logger.info(f"Reconciled dashboard counters after bulk import: {len(drift)} counters changed")
+
+
+def register_import_commands(app):
+    """Register the bulk import CLI commands on the app."""
+
+    @app.cli.command('import-firs')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--complainant', help='Username owning records without complainant_id')
+    @click.option('--chunk-size', default=1000, show_default=True, help='Records per transaction')
+    @click.option('--analyze/--no-analyze', default=True, show_default=True, help='Map legal sections while importing')
+    @click.option('--restart', is_flag=True, help='Ignore the checkpoint and import from the first record')
+    def import_firs_command(path, complainant, chunk_size, analyze, restart):
+        """Import legacy FIRs from a CSV or JSONL file."""
+        default_complainant_id = None
+        if complainant:
+            user = User.query.filter_by(username=complainant).first()
+            if user is None:
+                raise click.BadParameter(f"no user named {complainant!r}", param_hint='--complainant')
+            default_complainant_id = user.id
+
+        def progress(rows_done, imported, skipped, rate):
+            click.echo(f"{rows_done} records done: {imported} imported, {skipped} skipped ({rate:.0f} rows/s)")
+
+        started = time.perf_counter()
+        rows_read, imported, skipped, links = import_firs(
+            path, default_complainant_id, chunk_size, analyze, restart, progress
+        )
+        elapsed = time.perf_counter() - started
+        if not rows_read:
+            click.echo("Nothing to import (use --restart to import the file again)")
+            return
+        click.echo(f"Read {rows_read} records in {elapsed:.1f}s ({rows_read / max(elapsed, 1e-9):.0f} rows/s): "
+                   f"{imported} imported, {skipped} skipped, {links} section links")
+
+    @app.cli.command('reanalyze-firs')
+    @click.option('--batch-size', default=500, show_default=True, help='FIRs per classifier batch and transaction')
+    @click.option('--all', 'all_firs', is_flag=True, help='Re-map every FIR, not only those without sections')
+    def reanalyze_firs_command(batch_size, all_firs):
+        """Map legal sections for existing FIRs in batches."""
+        def progress(analyzed, rate):
+            click.echo(f"{analyzed} FIRs analyzed ({rate:.0f} rows/s)")
+
+        analyzed, links = reanalyze_firs(batch_size, all_firs, progress)
+        click.echo(f"Analyzed {analyzed} FIRs, created {links} section links")
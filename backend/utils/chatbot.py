@@ -6,9 +6,15 @@ This module provides functionality to answer user queries about cases and IPC se
 import json
 import logging
 import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import event as sa_event
 from extensions import db
 from models import FIR, User, LegalSection
+from utils.request_events import current_event
 # Try to import ML analyzer, but handle the case when it's not available
 try:
     from utils.ml_analyzer import analyze_complaint
@@ -32,6 +38,125 @@ except ImportError:
 # Configure logging
 logger = logging.getLogger(__name__)
 
+class CaseSnapshot:
+    """Read-only copy of the FIR fields the chatbot reports on."""
+
+    def __init__(self, fir):
+        self.id = fir.id
+        self.fir_number = fir.fir_number
+        self.status = fir.status
+        self.status_label = fir.get_status_label()
+        self.complainant_id = fir.complainant_id
+        self.complainant_name = fir.complainant.full_name if fir.complainant else None
+        self.officer_name = fir.processing_officer.full_name if fir.processing_officer else None
+        self.filed_at = fir.filed_at
+        self.incident_date = fir.incident_date
+        self.incident_location = fir.incident_location
+        self.incident_description = fir.incident_description
+        self._legal_sections = fir.legal_sections
+        self._parsed_sections = None
+
+    def get_legal_sections(self):
+        """
+        Parsed legal sections, parsed once per snapshot.
+
+        Returns None when none are mapped; raises ValueError on invalid JSON.
+        """
+        if not self._legal_sections:
+            return None
+        if self._parsed_sections is None:
+            self._parsed_sections = json.loads(self._legal_sections)
+        return self._parsed_sections
+
+
+class CaseContextCache:
+    """
+    Short-lived, per-user cache of case lookups for multi-turn conversations.
+
+    Entries are keyed by (user_id, fir_number) and hold the CaseSnapshot and
+    the access decision, so follow-up questions about the same case do not
+    touch the database. Entries expire after CHATBOT_CASE_CACHE_TTL seconds
+    and are dropped as soon as the FIR (or the asking user) is updated or
+    deleted in this process; the TTL bounds staleness for writes made by other
+    workers.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _ttl(self):
+        if has_app_context():
+            return current_app.config.get('CHATBOT_CASE_CACHE_TTL', 300)
+        return 300
+
+    def get(self, user_id, fir_number):
+        """Return (snapshot, has_access) or None if not cached."""
+        key = (user_id, fir_number)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, snapshot, has_access = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot, has_access
+
+    def put(self, user_id, fir_number, snapshot, has_access):
+        ttl = self._ttl()
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(user_id, fir_number)] = (time.monotonic() + ttl, snapshot, has_access)
+            self._entries.move_to_end((user_id, fir_number))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_fir(self, fir_number=None, fir_id=None):
+        """Drop every cached entry for a FIR, matched by number or id."""
+        with self._lock:
+            for key in [k for k, (_, snapshot, _) in self._entries.items()
+                        if k[1] == fir_number or (fir_id is not None and snapshot.id == fir_id)]:
+                del self._entries[key]
+
+    def invalidate_firs(self, fir_ids):
+        """Drop every cached entry for any of these FIR ids, e.g. after a Core bulk UPDATE."""
+        fir_ids = set(fir_ids)
+        with self._lock:
+            for key in [k for k, (_, snapshot, _) in self._entries.items() if snapshot.id in fir_ids]:
+                del self._entries[key]
+
+    def invalidate_user(self, user_id):
+        """Drop every cached entry looked up by a user (e.g. after a role change)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+case_cache = CaseContextCache()
+
+
+# Core UPDATEs (utils/bulk_import.analyze_firs) bypass these and call
+# case_cache.invalidate_firs() themselves
+@sa_event.listens_for(FIR, 'after_update')
+@sa_event.listens_for(FIR, 'after_delete')
+def _invalidate_cached_fir(mapper, connection, target):
+    case_cache.invalidate_fir(target.fir_number, target.id)
+
+
+@sa_event.listens_for(User, 'after_update')
+@sa_event.listens_for(User, 'after_delete')
+def _invalidate_cached_user(mapper, connection, target):
+    case_cache.invalidate_user(target.id)
+
+
 class FIRChatbot:
     """
     Chatbot for handling FIR-related queries.
@@ -90,7 +215,7 @@ class FIRChatbot:
             "I'm here to help with information about your FIR and legal sections. You can ask about case status, details, specific IPC sections, or describe a case for legal analysis.",
             "I don't understand that query. You can ask about case status, case details, information about specific IPC sections, or describe a situation to get relevant IPC sections.",
             "Please provide a valid FIR number to get information about your case.",
-            "You can ask questions like 'What is the status of my case FIR20230101123456?', 'What is IPC section 302?', or 'Someone stole my phone yesterday, which sections apply?'"
+            "You can ask questions like 'What is the status of my case FIR20230101HQ000123?', 'What is IPC section 302?', or 'Someone stole my phone yesterday, which sections apply?'"
         ]
 
     def process_query(self, query, user_id=None):
@@ -108,14 +233,11 @@ class FIRChatbot:
             return self._create_response("Please ask a question about your case or IPC sections.")
 
         query = query.strip().lower()
-
-        # Log the query for debugging
-        logger.info(f"Processing query: {query}")
-        logger.info(f"Query type: {type(query)}")
-        logger.info(f"Query length: {len(query)}")
+        event = current_event()
 
         # Check for greetings
         if self._is_greeting(query):
+            event.set(intent='greeting')
             return self._create_response("Hello! I'm your FIR assistant. How can I help you today?")
 
         # Check for direct IPC section queries (e.g., "1", "76", "302", "IPC 376")
@@ -123,36 +245,30 @@ class FIRChatbot:
         ipc_direct_match = re.match(r'^(?:ipc\s*)?([0-9]{1,3}[A-Za-z]?|[0-9]{1,3})$', query)
         if ipc_direct_match:
             section_code = ipc_direct_match.group(1)
-            logger.info(f"Direct IPC section query detected: {section_code}")
+            event.set(intent='section_info')
             return self._get_section_info(section_code)
 
         # Check for "IPC section X" format
         ipc_section_match = re.match(r'^(?:ipc|indian penal code)?\s*section\s*([0-9]{1,3}[A-Za-z]?)$', query)
         if ipc_section_match:
             section_code = ipc_section_match.group(1)
-            logger.info(f"IPC section query detected: {section_code}")
+            event.set(intent='section_info')
             return self._get_section_info(section_code)
 
         # Try to match the query against known patterns
-        logger.info("Trying to match query against patterns")
         for intent, patterns in self.patterns.items():
-            logger.info(f"Checking intent: {intent} with {len(patterns)} patterns")
             for pattern in patterns:
-                logger.info(f"Trying pattern: {pattern}")
                 match = re.search(pattern, query, re.IGNORECASE)
                 if match:
-                    logger.info(f"Pattern matched: {pattern} for intent: {intent}")
-                    logger.info(f"Match groups: {match.groups()}")
+                    event.set(intent=intent)
 
                     # Check if this is a list_sections intent (which doesn't have a capture group)
                     if intent == 'list_sections':
-                        logger.info("List sections intent matched")
                         return self._list_common_sections()
 
                     # For other intents, extract the captured group
                     try:
                         captured_value = match.group(1)
-                        logger.info(f"Captured value: {captured_value}")
 
                         if intent == 'case_status':
                             return self._get_case_status(captured_value, user_id)
@@ -168,7 +284,6 @@ class FIRChatbot:
                                 section_match = re.search(r'section\s+([0-9A-Za-z]+)', captured_value, re.IGNORECASE)
                                 if section_match:
                                     captured_value = section_match.group(1)
-                                    logger.info(f"Extracted section number: {captured_value}")
 
                             return self._get_section_info(captured_value)
                         elif intent == 'analyze_complaint':
@@ -182,10 +297,11 @@ class FIRChatbot:
 
         # If no pattern matches, check for keywords
         if 'help' in query or 'assist' in query:
+            event.set(intent='help')
             return self._create_response(
                 "I can help you with the following:\n\n"
-                "1️⃣ Check the status of your FIR\n   Example: 'What is the status of my case FIR20230101123456?'\n\n"
-                "2️⃣ Get details about your case\n   Example: 'Tell me about my case FIR20230101123456'\n\n"
+                "1️⃣ Check the status of your FIR\n   Example: 'What is the status of my case FIR20230101HQ000123?'\n\n"
+                "2️⃣ Get details about your case\n   Example: 'Tell me about my case FIR20230101HQ000123'\n\n"
                 "3️⃣ Get information about IPC sections\n   Example: 'What is IPC section 302?'\n\n"
                 "4️⃣ Analyze a case description to find applicable IPC sections\n   Examples:\n"
                 "   - 'Analyze this complaint: My phone was stolen yesterday'\n"
@@ -199,8 +315,8 @@ class FIRChatbot:
         if 'ipc' in query or 'section' in query or 'penal code' in query:
             # Extract potential section numbers - allow for 1-3 digits followed by optional letter
             section_matches = re.findall(r'([0-9]{1,3}[A-Za-z]?)', query)
+            event.set(intent='section_info')
             if section_matches:
-                logger.info(f"Found potential IPC section in query: {section_matches[0]}")
                 return self._get_section_info(section_matches[0])
             else:
                 # If they're asking about IPC but no specific section, give general info
@@ -212,6 +328,7 @@ class FIRChatbot:
                 )
 
         # Default response if no intent is matched
+        event.set(intent='unknown')
         return self._create_response(self.generic_responses[1])
 
     def _is_greeting(self, query):
@@ -219,24 +336,46 @@ class FIRChatbot:
         greetings = ['hello', 'hi', 'hey', 'greetings', 'good morning', 'good afternoon', 'good evening', 'howdy']
         return any(greeting in query for greeting in greetings)
 
+    def _lookup_case(self, fir_number, user_id):
+        """
+        Resolve a FIR for the user, from the session cache when possible.
+
+        Returns:
+            tuple: (snapshot, error_response); exactly one of them is None
+        """
+        cached = case_cache.get(user_id, fir_number)
+        if cached is not None:
+            current_event().cache_hit()
+            snapshot, has_access = cached
+        else:
+            current_event().cache_miss()
+            fir = FIR.query.filter_by(fir_number=fir_number).first()
+
+            if not fir:
+                return None, self._create_response(f"I couldn't find any case with FIR number {fir_number}. Please check the number and try again.")
+
+            snapshot = CaseSnapshot(fir)
+            has_access = not user_id or self._user_has_access(user_id, fir)
+            case_cache.put(user_id, fir_number, snapshot, has_access)
+
+        # Check if the user has access to this FIR
+        if not has_access:
+            return None, self._create_response("You don't have permission to access information about this case.")
+
+        return snapshot, None
+
     def _get_case_status(self, fir_number, user_id):
         """Get the status of a case by FIR number."""
         try:
             # Clean the FIR number
             fir_number = fir_number.strip().upper()
 
-            # Query the database
-            fir = FIR.query.filter_by(fir_number=fir_number).first()
-
-            if not fir:
-                return self._create_response(f"I couldn't find any case with FIR number {fir_number}. Please check the number and try again.")
-
-            # Check if the user has access to this FIR
-            if user_id and not self._user_has_access(user_id, fir):
-                return self._create_response("You don't have permission to access information about this case.")
+            fir, error_response = self._lookup_case(fir_number, user_id)
+            if error_response:
+                return error_response
 
             # Get status information
-            status_label = fir.get_status_label()
+            status_label = fir.status_label
 
             # Create a response based on the status
             if fir.status == 'draft':
@@ -245,7 +384,7 @@ class FIRChatbot:
                 filed_date = fir.filed_at.strftime('%d-%m-%Y') if fir.filed_at else 'recently'
                 response = f"FIR #{fir_number} was filed on {filed_date} and is awaiting assignment to an investigating officer."
             elif fir.status == 'under_investigation':
-                officer_name = fir.processing_officer.full_name if fir.processing_officer else 'an officer'
+                officer_name = fir.officer_name or 'an officer'
                 response = f"FIR #{fir_number} is currently under investigation by {officer_name}."
             elif fir.status == 'closed':
                 response = f"FIR #{fir_number} has been closed."
@@ -264,22 +403,16 @@ class FIRChatbot:
             # Clean the FIR number
             fir_number = fir_number.strip().upper()
 
-            # Query the database
-            fir = FIR.query.filter_by(fir_number=fir_number).first()
-
-            if not fir:
-                return self._create_response(f"I couldn't find any case with FIR number {fir_number}. Please check the number and try again.")
-
-            # Check if the user has access to this FIR
-            if user_id and not self._user_has_access(user_id, fir):
-                return self._create_response("You don't have permission to access information about this case.")
+            fir, error_response = self._lookup_case(fir_number, user_id)
+            if error_response:
+                return error_response
 
             # Create a detailed response
-            complainant_name = fir.complainant.full_name if fir.complainant else 'Unknown'
+            complainant_name = fir.complainant_name or 'Unknown'
             filed_date = fir.filed_at.strftime('%d-%m-%Y') if fir.filed_at else 'Not yet filed'
             incident_date = fir.incident_date.strftime('%d-%m-%Y') if fir.incident_date else 'Not specified'
             incident_location = fir.incident_location or 'Not specified'
-            status = fir.get_status_label()
+            status = fir.status_label
 
             response = f"Details for FIR #{fir_number}:\n\n"
             response += f"Status: {status}\n"
@@ -288,8 +421,8 @@ class FIRChatbot:
             response += f"Incident date: {incident_date}\n"
             response += f"Incident location: {incident_location}\n"
 
-            if fir.processing_officer:
-                response += f"Investigating Officer: {fir.processing_officer.full_name}\n"
+            if fir.officer_name:
+                response += f"Investigating Officer: {fir.officer_name}\n"
 
             # Add a summary of the incident
             if fir.incident_description:
@@ -309,24 +442,14 @@ class FIRChatbot:
             # Clean the FIR number
             fir_number = fir_number.strip().upper()
 
-            # Query the database
-            fir = FIR.query.filter_by(fir_number=fir_number).first()
-
-            if not fir:
-                return self._create_response(f"I couldn't find any case with FIR number {fir_number}. Please check the number and try again.")
-
-            # Check if the user has access to this FIR
-            if user_id and not self._user_has_access(user_id, fir):
-                return self._create_response("You don't have permission to access information about this case.")
+            fir, error_response = self._lookup_case(fir_number, user_id)
+            if error_response:
+                return error_response
 
-            # Check if legal sections are available
-            if not fir.legal_sections:
-                return self._create_response(f"No legal sections have been mapped for FIR #{fir_number} yet.")
-
-            # Parse the legal sections JSON
+            # Parse the legal sections JSON (once per cached snapshot)
             try:
-                sections = json.loads(fir.legal_sections)
-            except:
+                sections = fir.get_legal_sections()
+            except ValueError:
                 return self._create_response(f"There was an error parsing the legal sections for FIR #{fir_number}.")
 
             if not sections:
@@ -360,9 +483,6 @@ class FIRChatbot:
             if section_code.startswith('IPC'):
                 section_code = section_code[3:].strip()
 
-            # Log the query for debugging
-            logger.info(f"Searching for IPC section: {section_code}")
-
             # Query the database
             section = None
 
@@ -371,12 +491,10 @@ class FIRChatbot:
 
             # If no exact match, try a more flexible search
             if not section:
-                logger.info(f"No exact match for {section_code}, trying flexible search")
                 section = LegalSection.query.filter(LegalSection.code.like(f"%{section_code}%")).first()
 
             # If still no match, try searching by name
             if not section:
-                logger.info(f"No code match for {section_code}, trying name search")
                 section = LegalSection.query.filter(LegalSection.name.ilike(f"%{section_code}%")).first()
 
             if not section:
@@ -0,0 +1,226 @@
+"""
+Append-only chain of custody.
+
+Custody events used to live in a JSON array on the evidence row, loaded,
+extended and written back whole on every edit, verification or analysis, so
+two officers acting at once could each drop the other's event. They are now
+rows of custody_events: Evidence.add_custody_event() inserts one row, and
+pages read a slice of the trail (custody_page()) through the
+(evidence_id, timestamp, id) index.
+
+With CUSTODY_HASH_CHAIN on (the default), each event stores the hash of the
+event before it and a SHA-256 over its own content and that hash:
+
+    hash = SHA-256(prev_hash | evidence_id | user_id | action | notes | timestamp)
+
+Editing, deleting or reordering an event breaks every hash after it, which
+verify_chain() and `flask verify-custody` report. Removing the last events
+breaks no hash, so each append also records the new head of the chain on the
+evidence row (Evidence.custody_head), and verify_chain() checks that the
+chain still ends there. The next event links to that recorded head, so
+appending to a cut chain does not hide the cut. Chains last appended to before that column existed
+get their head with their next event; until then a removed tail goes
+unnoticed. None of this stops someone with write access to the database from
+rewriting a whole chain and its head.
+
+Appends to one evidence item are serialised by locking its row (PostgreSQL);
+the unique (evidence_id, prev_hash) constraint stops a race from forking the
+chain on databases without row locks.
+
+Events still in the old JSON column are moved on the evidence item's next
+custody event, or all at once with `flask backfill-custody-events`.
+"""
+
+import hashlib
+import json
+import logging
+
+import click
+from flask import current_app, has_app_context
+from sqlalchemy import event as sa_event, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import CustodyEvent, Evidence
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# prev_hash of the first event in a chain
+GENESIS_HASH = '0' * 64
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# session.info key: evidence_id -> hash of the last event linked in the current flush
+_HEADS_KEY = 'custody_chain_heads'
+
+
+def chaining_enabled():
+    if not has_app_context():
+        return True
+    return bool(current_app.config.get('CUSTODY_HASH_CHAIN', True))
+
+
+def _timestamp_text(timestamp):
+    # Naive UTC with microseconds, as every supported database returns it
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.replace(tzinfo=None) - timestamp.utcoffset()
+    return timestamp.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+
+def event_hash(prev_hash, evidence_id, user_id, action, notes, timestamp):
+    """SHA-256 linking one custody event to the one before it."""
+    payload = json.dumps(
+        [prev_hash, evidence_id, user_id, action, notes, _timestamp_text(timestamp)],
+        ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _chain_head(connection, evidence_id):
+    """Hash of the evidence item's latest chained event, locking the item against other appends."""
+    evidence = Evidence.__table__
+    table = CustodyEvent.__table__
+    # Held until commit; a no-op on SQLite, which allows one writer at a time anyway
+    head = connection.execute(
+        select(evidence.c.custody_head).where(evidence.c.id == evidence_id).with_for_update()
+    ).scalar()
+    if head is not None:
+        # The recorded head, not the last row: appending after a removed tail keeps the break
+        return head
+    # Events written with chaining off have no hash; the chain carries on past them
+    head = connection.execute(
+        select(table.c.hash).where(table.c.evidence_id == evidence_id, table.c.hash.isnot(None))
+        .order_by(table.c.id.desc()).limit(1)
+    ).scalar()
+    return head or GENESIS_HASH
+
+
+@sa_event.listens_for(CustodyEvent, 'before_update')
+def _refuse_update(mapper, connection, target):
+    raise ValueError('Custody events are append-only')
+
+
+@sa_event.listens_for(CustodyEvent, 'before_insert')
+def _link_event(mapper, connection, target):
+    if target.prev_hash is not None or not chaining_enabled():
+        return
+    # All rows of a flush get their before_insert before any is written, so
+    # later events for the same item chain onto the earlier ones through this
+    heads = Session.object_session(target).info.setdefault(_HEADS_KEY, {})
+    prev_hash = heads.get(target.evidence_id) or _chain_head(connection, target.evidence_id)
+    target.prev_hash = prev_hash
+    target.hash = event_hash(prev_hash, target.evidence_id, target.user_id,
+                             target.action, target.notes, target.timestamp)
+    heads[target.evidence_id] = target.hash
+    evidence = Evidence.__table__
+    connection.execute(update(evidence).where(evidence.c.id == target.evidence_id).values(custody_head=target.hash))
+
+
+@sa_event.listens_for(Session, 'after_flush')
+def _forget_heads(session, flush_context):
+    session.info.pop(_HEADS_KEY, None)
+
+
+@sa_event.listens_for(Session, 'after_soft_rollback')
+def _forget_heads_after_rollback(session, previous_transaction):
+    session.info.pop(_HEADS_KEY, None)
+
+
+@sa_event.listens_for(Evidence, 'after_delete')
+def _delete_trail(mapper, connection, target):
+    # The foreign key cascades on PostgreSQL; SQLite does not enforce it by default
+    table = CustodyEvent.__table__
+    connection.execute(table.delete().where(table.c.evidence_id == target.id))
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE."""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+def custody_page(evidence_id, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of an evidence item's custody events, oldest first.
+
+    Args:
+        evidence_id: The ID of the evidence
+        after: ID of the last event of the previous page, or None
+        limit: Page size
+
+    Returns:
+        tuple: (events, next_after) where next_after is None on the last page
+    """
+    query = CustodyEvent.query.filter(CustodyEvent.evidence_id == evidence_id)
+    if after is not None:
+        position = select(CustodyEvent.timestamp).where(CustodyEvent.id == after).scalar_subquery()
+        query = query.filter(tuple_(CustodyEvent.timestamp, CustodyEvent.id) > tuple_(position, after))
+    events = query.order_by(CustodyEvent.timestamp, CustodyEvent.id).limit(limit + 1).all()
+    if len(events) > limit:
+        events = events[:limit]
+        return events, events[-1].id
+    return events, None
+
+
+def verify_chain(evidence_id, batch_size=1000):
+    """
+    Recompute the hash chain of one evidence item, streaming its events, and
+    check that it ends at the head recorded on the evidence row.
+
+    Returns:
+        tuple: (intact, events_checked, id of the first bad event or None).
+            A chain cut short is not intact but has no bad event. Events
+            written with chaining off are skipped.
+    """
+    table = CustodyEvent.__table__
+    head = db.session.execute(select(Evidence.custody_head).where(Evidence.id == evidence_id)).scalar()
+    expected_prev = GENESIS_HASH
+    checked = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table).where(table.c.evidence_id == evidence_id, table.c.id > last_id)
+            .order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return head is None or head == expected_prev, checked, None
+        for row in rows:
+            last_id = row.id
+            if row.hash is None:
+                continue
+            checked += 1
+            if row.prev_hash != expected_prev or row.hash != event_hash(
+                    row.prev_hash, row.evidence_id, row.user_id, row.action, row.notes, row.timestamp):
+                return False, checked, row.id
+            expected_prev = row.hash
+
+
+def register_custody_commands(app):
+    """Register the chain of custody CLI commands on the app."""
+
+    @app.cli.command('verify-custody')
+    @click.option('--evidence-id', type=int, default=None, help='Check one evidence item only')
+    def verify_custody_command(evidence_id):
+        """Recompute custody hash chains and report any that were altered."""
+        if evidence_id is not None:
+            evidence_ids = [evidence_id]
+        else:
+            # Items with a head but no events left count too
+            evidence_ids = sorted(
+                set(db.session.execute(select(CustodyEvent.evidence_id).distinct()).scalars())
+                | set(db.session.execute(select(Evidence.id).where(Evidence.custody_head.isnot(None))).scalars())
+            )
+        problems = 0
+        for item_id in evidence_ids:
+            intact, checked, bad_id = verify_chain(item_id)
+            if not intact:
+                problems += 1
+                if bad_id is None:
+                    click.echo(f"BROKEN evidence {item_id}: events after the {checked} left are missing", err=True)
+                else:
+                    click.echo(f"BROKEN evidence {item_id}: event {bad_id} does not match its hash chain", err=True)
+        click.echo(f"{problems} broken chain(s) found")
+        if problems:
+            raise SystemExit(1)
@@ -0,0 +1,430 @@
+"""
+Background evidence analysis.
+
+Analyzing evidence used to run inside the request, one item at a time. Now
+the analyze routes enqueue an EvidenceAnalysisJob row, one per request,
+covering one item or every item of a FIR. A dispatcher thread claims queued
+jobs from the database, as utils/fir_jobs.py does for FIR submissions. The
+per-file work (hashing, EXIF, image statistics, the analyzers) goes to a
+process pool, so it uses every core without holding up the web workers.
+
+Results are keyed on the content hash:
+
+- An item whose stored analysis was made by the current ANALYSIS_VERSION for
+  its current content is skipped.
+- Items with the same content, in this job or already analyzed elsewhere,
+  share one analysis. Evidence deduplicated by the store is analyzed once.
+
+Results are written back in batches, one commit per EVIDENCE_ANALYSIS_BATCH_SIZE
+items or every FLUSH_INTERVAL seconds, whichever comes first. Each commit
+also advances the job's progress counters, which the pages poll, and
+refreshes its lock so a long job is not taken for a crashed one. Jobs
+whose lock has gone stale are requeued by the dispatcher loop.
+
+EVIDENCE_ANALYSIS_WORKERS sets the pool size. With 0 no dispatcher runs;
+queued jobs then wait for `flask analyze-evidence`.
+"""
+
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+
+from extensions import db
+from models import FIR, Evidence, EvidenceAnalysisJob
+from utils.evidence_analyzer import analyze_evidence_file
+from utils.evidence_derivatives import evidence_file_path
+from utils.fir_jobs import REQUEUE_INTERVAL
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bump when the analyzers change, so existing results are redone
+ANALYSIS_VERSION = 1
+DEFAULT_BATCH_SIZE = 25
+# Seconds between progress commits while results trickle in
+FLUSH_INTERVAL = 2.0
+# Errors kept in the job's error column
+MAX_RECORDED_ERRORS = 5
+ACTIVE_STATUSES = ('queued', 'running')
+
+_wakeup = threading.Event()
+_workers = []
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def enqueue_analysis(fir, evidence_ids, user_id):
+    """
+    Queue analysis of some of a FIR's evidence. The caller commits and then
+    calls notify_analysis_workers().
+
+    Returns:
+        EvidenceAnalysisJob: The new job, or the queued or running job that
+            already covers all of these items
+    """
+    ids = sorted({int(evidence_id) for evidence_id in evidence_ids})
+    active = (
+        EvidenceAnalysisJob.query
+        .filter(EvidenceAnalysisJob.fir_id == fir.id, EvidenceAnalysisJob.status.in_(ACTIVE_STATUSES))
+        .order_by(EvidenceAnalysisJob.id.desc())
+        .all()
+    )
+    for job in active:
+        if set(ids) <= set(job.get_evidence_ids()):
+            return job
+
+    job = EvidenceAnalysisJob(fir_id=fir.id, requested_by=user_id, status='queued',
+                              evidence_ids=json.dumps(ids), total=len(ids))
+    db.session.add(job)
+    return job
+
+
+def notify_analysis_workers():
+    """Wake the idle dispatcher after a job has been committed."""
+    _wakeup.set()
+
+
+def active_job(fir_id, evidence_id=None):
+    """The newest queued or running job of a FIR, optionally only one covering this evidence."""
+    jobs = (
+        EvidenceAnalysisJob.query
+        .filter(EvidenceAnalysisJob.fir_id == fir_id, EvidenceAnalysisJob.status.in_(ACTIVE_STATUSES))
+        .order_by(EvidenceAnalysisJob.id.desc())
+        .all()
+    )
+    for job in jobs:
+        if evidence_id is None or evidence_id in job.get_evidence_ids():
+            return job
+    return None
+
+
+def job_state(job):
+    """JSON-friendly progress of a job."""
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'total': job.total,
+        'completed': job.completed,
+        'reused': job.reused,
+        'failed': job.failed,
+        'percent': round(100 * job.completed / job.total) if job.total else 100,
+        'error': job.error,
+    }
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically move the oldest queued job to 'running' for this worker.
+
+    Returns:
+        EvidenceAnalysisJob or None
+    """
+    candidates = (
+        db.session.query(EvidenceAnalysisJob.id)
+        .filter(EvidenceAnalysisJob.status == 'queued')
+        .order_by(EvidenceAnalysisJob.id)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        now = datetime.now(timezone.utc)
+        claimed = (
+            EvidenceAnalysisJob.query
+            .filter(EvidenceAnalysisJob.id == job_id, EvidenceAnalysisJob.status == 'queued')
+            .update({
+                'status': 'running',
+                'locked_by': worker_id,
+                'locked_at': now,
+                'updated_at': now,
+                'attempts': EvidenceAnalysisJob.attempts + 1
+            }, synchronize_session=False)
+        )
+        db.session.commit()
+        if claimed:
+            return db.session.get(EvidenceAnalysisJob, job_id)
+    return None
+
+
+def requeue_stale_jobs(stale_after_seconds):
+    """Requeue jobs whose dispatcher died mid-run. Returns the number requeued."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=stale_after_seconds)
+    count = (
+        EvidenceAnalysisJob.query
+        .filter(EvidenceAnalysisJob.status == 'running', EvidenceAnalysisJob.locked_at < cutoff)
+        .update({'status': 'queued', 'locked_by': None, 'locked_at': None}, synchronize_session=False)
+    )
+    db.session.commit()
+    if count:
+        logger.warning(f"Requeued {count} stale evidence analysis job(s)")
+    return count
+
+
+# Running a job
+
+def _is_current(analysis, content_hash):
+    return bool(content_hash) and analysis.get('analysis_version') == ANALYSIS_VERSION \
+        and analysis.get('sha256') == content_hash
+
+
+def _stored_analyses(content_hashes):
+    """Current analyses already stored for any of these hashes: hash -> analysis."""
+    found = {}
+    if not content_hashes:
+        return found
+    rows = (
+        db.session.query(Evidence.content_hash, Evidence.analysis_result)
+        .filter(Evidence.content_hash.in_(content_hashes), Evidence.analysis_result.isnot(None))
+    )
+    for content_hash, analysis_result in rows:
+        if content_hash in found:
+            continue
+        try:
+            analysis = json.loads(analysis_result)
+        except ValueError:
+            continue
+        if isinstance(analysis, dict) and _is_current(analysis, content_hash):
+            found[content_hash] = analysis
+    return found
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: the web process has threads and open database connections
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _submit(workers, *args):
+    """Run analyze_evidence_file on the pool, or right here with no pool."""
+    global _executor
+    if workers <= 0:
+        future = Future()
+        try:
+            future.set_result(analyze_evidence_file(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    try:
+        return _get_executor(workers).submit(analyze_evidence_file, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed while decoding a huge image); start a fresh pool
+        logger.error("Evidence analysis pool was broken; restarting it")
+        with _executor_lock:
+            _executor = None
+        return _get_executor(workers).submit(analyze_evidence_file, *args)
+
+
+def _flush(job, results, failures):
+    """Write a batch of results and the job's progress in one commit."""
+    if results:
+        rows = {
+            evidence.id: evidence
+            for evidence in Evidence.query.filter(Evidence.id.in_([evidence_id for evidence_id, _, _ in results]))
+        }
+        for evidence_id, result, reused in results:
+            job.completed += 1
+            evidence = rows.get(evidence_id)
+            if evidence is None:
+                continue
+            if reused:
+                job.reused += 1
+            analysis = dict(result['analysis'])
+            analysis['analysis_version'] = ANALYSIS_VERSION
+            evidence.set_analysis(analysis)
+
+            # Add new tags that aren't already in the list
+            current_tags = evidence.get_tags()
+            for tag in analysis.get('tags') or []:
+                if tag not in current_tags:
+                    current_tags.append(tag)
+            evidence.set_tags(current_tags)
+            if not evidence.file_metadata and result.get('metadata'):
+                evidence.set_metadata(result['metadata'])
+
+            notes = "Result reused from identical content" if reused else f"SHA-256 {analysis.get('sha256')}"
+            if analysis.get('hash_matches') is False:
+                notes = "Stored file no longer matches its recorded SHA-256"
+            evidence.add_custody_event(user_id=job.requested_by, action="Evidence analyzed", notes=notes)
+
+    for evidence_ids, error in failures:
+        job.completed += len(evidence_ids)
+        job.failed += len(evidence_ids)
+        errors = job.error.split('\n') if job.error else []
+        if len(errors) < MAX_RECORDED_ERRORS:
+            errors.append(f"Evidence {', '.join(map(str, evidence_ids))}: {error}")
+            job.error = '\n'.join(errors)
+
+    now = datetime.now(timezone.utc)
+    job.updated_at = now
+    job.locked_at = now
+    db.session.commit()
+    results.clear()
+    failures.clear()
+
+
+def run_analysis_job(job, workers=0, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Analyze a job's evidence and mark it finished.
+
+    Args:
+        job: A claimed EvidenceAnalysisJob
+        workers: Process pool size; 0 runs the analysis in this thread
+        batch_size: Results per commit
+    """
+    # Progress is recounted on a retry; finished items are skipped as current
+    job.completed = job.reused = job.failed = 0
+    job.error = None
+    evidence_ids = job.get_evidence_ids()
+    items = Evidence.query.filter(Evidence.id.in_(evidence_ids)).all() if evidence_ids else []
+    # Items deleted since the job was queued
+    job.completed = len(evidence_ids) - len(items)
+
+    results = []
+    failures = []
+    stored = _stored_analyses({evidence.content_hash for evidence in items if evidence.content_hash})
+    groups = {}
+    tasks = {}
+    for evidence in items:
+        if _is_current(evidence.get_analysis(), evidence.content_hash):
+            job.completed += 1
+            job.reused += 1
+        elif evidence.content_hash in stored:
+            results.append((evidence.id, {'analysis': stored[evidence.content_hash]}, True))
+        else:
+            # Files saved before the content-addressed store have no hash yet
+            key = evidence.content_hash or f"evidence:{evidence.id}"
+            groups.setdefault(key, []).append(evidence.id)
+            if key not in tasks:
+                tasks[key] = (evidence_file_path(evidence), evidence.type, evidence.content_hash)
+    _flush(job, results, failures)
+
+    futures = {_submit(workers, *args): key for key, args in tasks.items()}
+    pending = set(futures)
+    last_flush = time.monotonic()
+    while pending:
+        done, pending = wait(pending, timeout=FLUSH_INTERVAL, return_when=FIRST_COMPLETED)
+        for future in done:
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Analysis of evidence {groups[key]} failed: {str(e)}")
+                failures.append((groups[key], str(e)))
+                continue
+            first, *others = groups[key]
+            results.append((first, result, False))
+            results.extend((evidence_id, result, True) for evidence_id in others)
+        if len(results) + len(failures) >= batch_size or time.monotonic() - last_flush >= FLUSH_INTERVAL \
+                or not pending:
+            _flush(job, results, failures)
+            last_flush = time.monotonic()
+
+    job.status = 'failed' if job.failed and job.failed == job.total else 'succeeded'
+    job.finished_at = datetime.now(timezone.utc)
+    job.locked_by = None
+    db.session.commit()
+    logger.info(f"Evidence analysis job {job.id}: {job.completed} item(s), "
+                f"{job.reused} reused, {job.failed} failed")
+
+
+def _run_claimed(job, workers, batch_size):
+    try:
+        run_analysis_job(job, workers, batch_size)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"Evidence analysis job {job.id} crashed")
+        job = db.session.get(EvidenceAnalysisJob, job.id)
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+
+def _dispatcher_loop(app, worker_id, poll_interval, stale_after):
+    next_requeue = 0.0
+    while True:
+        with app.app_context():
+            try:
+                if time.monotonic() >= next_requeue:
+                    next_requeue = time.monotonic() + REQUEUE_INTERVAL
+                    requeue_stale_jobs(stale_after)
+                job = claim_next_job(worker_id)
+                if job is not None:
+                    _run_claimed(job, int(app.config.get('EVIDENCE_ANALYSIS_WORKERS', 2)),
+                                 int(app.config.get('EVIDENCE_ANALYSIS_BATCH_SIZE', DEFAULT_BATCH_SIZE)))
+                    continue
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Evidence analysis dispatcher error: {str(e)}")
+            finally:
+                db.session.remove()
+
+        _wakeup.wait(poll_interval)
+        _wakeup.clear()
+
+
+def start_analysis_workers(app):
+    """
+    Start the dispatcher thread feeding queued analysis jobs to the pool.
+
+    Reads EVIDENCE_ANALYSIS_WORKERS (0 disables background analysis),
+    FIR_JOB_POLL_INTERVAL and FIR_JOB_STALE_AFTER. Safe to call more than once.
+    """
+    if _workers or int(app.config.get('EVIDENCE_ANALYSIS_WORKERS', 2)) <= 0:
+        return
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:analysis"
+    thread = threading.Thread(
+        target=_dispatcher_loop,
+        args=(app, worker_id, float(app.config.get('FIR_JOB_POLL_INTERVAL', 2.0)),
+              int(app.config.get('FIR_JOB_STALE_AFTER', 900))),
+        name='evidence-analysis-dispatcher',
+        daemon=True
+    )
+    thread.start()
+    _workers.append(thread)
+
+
+def register_analysis_commands(app):
+    """Register the evidence analysis CLI command on the app."""
+
+    @app.cli.command('analyze-evidence')
+    @click.option('--fir-id', type=int, default=None, help="Queue analysis of all of this FIR's evidence first")
+    @click.option('--workers', type=int, default=None, help='Process pool size (default EVIDENCE_ANALYSIS_WORKERS)')
+    def analyze_evidence_command(fir_id, workers):
+        """Run queued evidence analysis jobs in this process."""
+        if fir_id is not None:
+            fir = db.session.get(FIR, fir_id)
+            if fir is None:
+                raise click.ClickException(f"FIR {fir_id} not found")
+            ids = [evidence_id for (evidence_id,) in db.session.query(Evidence.id).filter(Evidence.fir_id == fir.id)]
+            enqueue_analysis(fir, ids, None)
+            db.session.commit()
+
+        if workers is None:
+            workers = int(current_app.config.get('EVIDENCE_ANALYSIS_WORKERS', 2))
+        batch_size = int(current_app.config.get('EVIDENCE_ANALYSIS_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:cli"
+        count = 0
+        while True:
+            job = claim_next_job(worker_id)
+            if job is None:
+                break
+            _run_claimed(job, workers, batch_size)
+            click.echo(f"Job {job.id}: {job.completed}/{job.total} item(s), {job.reused} reused, {job.failed} failed")
+            count += 1
+        click.echo(f"Ran {count} evidence analysis job(s)")
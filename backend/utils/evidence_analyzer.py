@@ -2,9 +2,11 @@
 import os
 import logging
 import datetime
-from PIL import Image, ExifTags
+from PIL import Image, ExifTags, ImageStat
 import hashlib
-import mimetypes
+import json
+
+from utils.file_types import detect_file_mime_type, detect_mime_type
 
 # Configure logging first to ensure logger is available
 logger = logging.getLogger(__name__)
@@ -14,67 +16,74 @@ logger = logging.getLogger(__name__)
 # Define constants
 EVIDENCE_TYPES = ['image', 'document', 'video', 'audio', 'other']
 CATEGORIES = ['Physical Evidence', 'Digital Evidence', 'Documentary Evidence', 'Testimonial Evidence', 'Other Evidence']
+# Bytes read per block when hashing or copying evidence files
+BLOCK_SIZE = 1024 * 1024
+
+def sniff_mime_type(head, file_name='', sha256=None):
+    """
+    Determine the MIME type from the first bytes of a file
 
-def get_file_type(file_path):
+    Args:
+        head: Leading bytes of the file
+        file_name: Original file name, for ambiguous formats and the fallback
+        sha256: Content hash, if known; the result is memoized under it
+
+    Returns:
+        str: MIME type
+    """
+    return detect_mime_type(head, file_name, sha256)
+
+def evidence_type_for_mime(mime_type):
+    """
+    Map a MIME type to one of the EVIDENCE_TYPES
+
+    Args:
+        mime_type: MIME type
+
+    Returns:
+        str: One of the EVIDENCE_TYPES
+    """
+    if mime_type and mime_type.startswith('image/'):
+        return 'image'
+    elif mime_type and mime_type.startswith('video/'):
+        return 'video'
+    elif mime_type and mime_type.startswith('audio/'):
+        return 'audio'
+    elif mime_type and (mime_type in ['application/pdf', 'application/msword',
+                      'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+                      'text/plain', 'application/rtf', 'text/rtf', 'text/csv', 'application/vnd.ms-excel',
+                      'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                      'application/vnd.oasis.opendocument.text']):
+        return 'document'
+    else:
+        return 'other'
+
+def get_file_type(file_path, file_hash=None):
     """
     Determine the type of file based on its MIME type
 
     Args:
         file_path: Path to the file
+        file_hash: SHA-256 of the file, if known, to reuse an earlier detection
 
     Returns:
         str: One of the EVIDENCE_TYPES
     """
     try:
-        # Try to use python-magic if available
-        try:
-            import magic
-            mime = magic.Magic(mime=True)
-            mime_type = mime.from_file(file_path)
-            logger.debug(f"Using python-magic to determine file type: {mime_type}")
-        except (ImportError, AttributeError, TypeError) as e:
-            logger.debug(f"python-magic not available or error: {str(e)}")
-            # Use mimetypes as fallback
-            mime_type, _ = mimetypes.guess_type(file_path)
-            logger.debug(f"Using mimetypes to determine file type: {mime_type}")
-
-            if mime_type is None:
-                # If mimetypes can't determine the type, use file extension
-                ext = os.path.splitext(file_path)[1].lower()
-                if ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']:
-                    mime_type = 'image/jpeg'  # Default to image/jpeg for image files
-                elif ext in ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv']:
-                    mime_type = 'video/mp4'  # Default to video/mp4 for video files
-                elif ext in ['.mp3', '.wav', '.ogg', '.flac', '.aac']:
-                    mime_type = 'audio/mp3'  # Default to audio/mp3 for audio files
-                elif ext in ['.pdf', '.doc', '.docx', '.txt', '.rtf']:
-                    mime_type = 'application/pdf'  # Default to application/pdf for document files
-                else:
-                    mime_type = 'application/octet-stream'  # Default to binary for unknown types
-                logger.debug(f"Using file extension to determine file type: {mime_type}")
-
-        if mime_type and mime_type.startswith('image/'):
-            return 'image'
-        elif mime_type and mime_type.startswith('video/'):
-            return 'video'
-        elif mime_type and mime_type.startswith('audio/'):
-            return 'audio'
-        elif mime_type and (mime_type in ['application/pdf', 'application/msword',
-                          'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                          'text/plain', 'application/rtf']):
-            return 'document'
-        else:
-            return 'other'
+        return evidence_type_for_mime(detect_file_mime_type(file_path, file_hash))
     except Exception as e:
         logger.error(f"Error determining file type: {str(e)}")
         return 'other'
 
-def extract_metadata(file_path):
+def extract_metadata(file_path, file_hash=None, file_type=None):
     """
     Extract metadata from a file
 
     Args:
         file_path: Path to the file
+        file_hash: SHA-256 already computed while the file was written;
+            the file is hashed here if not given
+        file_type: Evidence type already determined; detected if not given
 
     Returns:
         dict: Metadata information
@@ -82,23 +91,25 @@ def extract_metadata(file_path):
     try:
         # Basic file info
         file_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
+        stat = os.stat(file_path)
         file_extension = os.path.splitext(file_name)[1].lower()
-        last_modified = datetime.datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
+        last_modified = datetime.datetime.fromtimestamp(stat.st_mtime).isoformat()
 
         # Calculate file hash
-        file_hash = calculate_file_hash(file_path)
+        if file_hash is None:
+            file_hash = calculate_file_hash(file_path)
 
         metadata = {
             'file_name': file_name,
-            'file_size': file_size,
+            'file_size': stat.st_size,
             'file_extension': file_extension,
             'last_modified': last_modified,
             'hash': file_hash
         }
 
         # Extract specific metadata based on file type
-        file_type = get_file_type(file_path)
+        if file_type is None:
+            file_type = get_file_type(file_path, file_hash)
 
         if file_type == 'image':
             try:
@@ -232,8 +243,8 @@ def calculate_file_hash(file_path):
     try:
         sha256_hash = hashlib.sha256()
         with open(file_path, "rb") as f:
-            # Read and update hash in chunks of 4K
-            for byte_block in iter(lambda: f.read(4096), b""):
+            # Read and update hash in large blocks
+            for byte_block in iter(lambda: f.read(BLOCK_SIZE), b""):
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
     except Exception as e:
@@ -282,6 +293,59 @@ def analyze_evidence(file_path, file_type):
             'tags': []
         }
 
+def extract_image_stats(file_path, sample_size=512):
+    """
+    Colour statistics of an image, from a reduced copy
+
+    Args:
+        file_path: Path to the image file
+        sample_size: Longest side of the copy the statistics are taken from
+
+    Returns:
+        dict: Per-band mean and standard deviation, and overall brightness
+    """
+    try:
+        with Image.open(file_path) as img:
+            # JPEG decodes straight at a fraction of full size
+            img.draft('RGB', (sample_size, sample_size))
+            img = img.convert('RGB')
+            img.thumbnail((sample_size, sample_size))
+            stat = ImageStat.Stat(img)
+            return {
+                'mean': [round(value, 1) for value in stat.mean],
+                'stddev': [round(value, 1) for value in stat.stddev],
+                'brightness': round(sum(stat.mean) / len(stat.mean), 1)
+            }
+    except Exception as e:
+        logger.error(f"Error extracting image statistics: {str(e)}")
+        return {}
+
+def analyze_evidence_file(file_path, file_type, expected_hash=None):
+    """
+    Hash, metadata and analysis of one evidence file. Runs in an analysis
+    pool worker (utils/evidence_analysis.py), so it only uses the file.
+
+    Args:
+        file_path: Path to the evidence file
+        file_type: Type of the evidence file
+        expected_hash: SHA-256 recorded at upload, if any
+
+    Returns:
+        dict: sha256, analysis and metadata, all JSON-serialisable
+    """
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"Evidence file not found: {os.path.basename(file_path)}")
+    sha256 = calculate_file_hash(file_path)
+    analysis = analyze_evidence(file_path, file_type)
+    metadata = extract_metadata(file_path, file_hash=sha256, file_type=file_type)
+    if file_type == 'image':
+        analysis['image_stats'] = extract_image_stats(file_path)
+    analysis['sha256'] = sha256
+    if expected_hash:
+        analysis['hash_matches'] = sha256 == expected_hash
+    # EXIF values include Pillow rationals and bytes
+    return json.loads(json.dumps({'sha256': sha256, 'analysis': analysis, 'metadata': metadata}, default=str))
+
 def analyze_image(_):
     """
     Analyze an image file
@@ -0,0 +1,161 @@
+"""
+Serving evidence files with HTTP range support.
+
+Seeking in a CCTV recording makes the browser ask for a byte range. Serving
+evidence as plain static files re-sent the recording from the start.
+send_evidence_file() answers conditional and range requests itself: ETag
+(the content hash where there is one), Last-Modified, 304, 206 and 416.
+It then hands the bytes off, so a worker thread does not copy them through
+Python:
+
+- EVIDENCE_SENDFILE=x-accel-redirect: nginx serves the file. Map
+  EVIDENCE_ACCEL_PREFIX to the static folder with an internal location,
+  and keep the public static location away from the uploads:
+
+      location /protected-static/ {
+          internal;
+          alias /srv/app/frontend/static/;
+      }
+      location /static/uploads/ {
+          return 404;
+      }
+
+- EVIDENCE_SENDFILE=x-sendfile: Apache mod_xsendfile or lighttpd serve it.
+- Unset: the open file, positioned at the range start, goes to the WSGI
+  server's wsgi.file_wrapper. gunicorn and waitress send it with
+  sendfile() and stop at Content-Length. Other servers get a reader bounded
+  to the range.
+
+The store lives under static/uploads, but evidence is only ever reached
+through the login-checked evidence routes: init_evidence_delivery() makes
+Flask's own static route refuse anything under uploads/.
+"""
+
+import os
+import posixpath
+from datetime import datetime, timezone
+
+from flask import abort, current_app, request
+from werkzeug.datastructures import ContentRange
+from werkzeug.http import is_resource_modified
+from werkzeug.wrappers import Response
+
+from utils.evidence_analyzer import BLOCK_SIZE
+from utils.file_types import guess_mime_type
+
+SENDFILE_MODES = ('x-accel-redirect', 'x-sendfile')
+DEFAULT_ACCEL_PREFIX = '/protected-static/'
+# WSGI servers whose file_wrapper stops at Content-Length (and uses sendfile)
+_RANGE_SAFE_SERVERS = ('gunicorn', 'waitress')
+# Static folder prefix holding evidence blobs, derivatives and upload staging
+PROTECTED_STATIC_PREFIX = 'uploads/'
+
+
+def init_evidence_delivery(app):
+    """Refuse static requests for uploaded files; they go through the evidence routes."""
+
+    @app.before_request
+    def _block_static_uploads():
+        if request.endpoint != 'static':
+            return None
+        # Normalise first: the static route resolves "css/../uploads/..." too
+        filename = posixpath.normpath((request.view_args or {}).get('filename', '')).lstrip('/')
+        if filename + '/' == PROTECTED_STATIC_PREFIX or filename.startswith(PROTECTED_STATIC_PREFIX):
+            abort(404)
+        return None
+
+
+def _read_range(file, length):
+    try:
+        while length > 0:
+            data = file.read(min(BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def _file_body(file, length):
+    """The response iterable for `length` bytes from the file's current position."""
+    environ = request.environ
+    file_wrapper = environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None and environ.get('SERVER_SOFTWARE', '').lower().startswith(_RANGE_SAFE_SERVERS):
+        return file_wrapper(file, BLOCK_SIZE)
+    return _read_range(file, length)
+
+
+def _if_range_matches(etag, last_modified):
+    """Whether an If-Range header (if any) still names this version of the file."""
+    if_range = request.if_range
+    if if_range.etag is None and if_range.date is None:
+        return True
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    return if_range.date == last_modified
+
+
+def send_evidence_file(path, mime_type=None, etag=None, download_name=None, as_attachment=False):
+    """
+    Response for an evidence file, honouring conditional and Range requests.
+
+    Args:
+        path: Absolute path of the file
+        mime_type: Content-Type; guessed from the file name if not given
+        etag: Strong validator, e.g. the SHA-256; derived from mtime and size if not given
+        download_name: File name offered to the browser
+        as_attachment: Ask the browser to save rather than display it
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+    etag = etag or f"{int(stat.st_mtime)}-{size}"
+
+    response = Response(mimetype=mime_type or guess_mime_type(path), direct_passthrough=True)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Accept-Ranges'] = 'bytes'
+    # Never let the browser reinterpret an inline file (e.g. uploaded HTML) as another type
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    # Evidence is per-user: browsers may keep it but must revalidate, proxies must not
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    if download_name or as_attachment:
+        disposition = 'attachment' if as_attachment else 'inline'
+        response.headers.set('Content-Disposition', disposition, filename=download_name or os.path.basename(path))
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response.status_code = 304
+        return response
+
+    mode = (current_app.config.get('EVIDENCE_SENDFILE') or '').lower()
+    if mode == 'x-accel-redirect':
+        prefix = current_app.config.get('EVIDENCE_ACCEL_PREFIX') or DEFAULT_ACCEL_PREFIX
+        relative = os.path.relpath(path, current_app.static_folder).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + relative
+        return response
+    if mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = path
+        return response
+
+    start, length = 0, size
+    byte_range = request.range
+    # Several ranges in one request are rare; answering with the whole file is allowed
+    if byte_range is not None and len(byte_range.ranges) == 1 and _if_range_matches(etag, last_modified):
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            response.status_code = 416
+            response.content_range = ContentRange('bytes', None, None, size)
+            response.content_length = 0
+            return response
+        start, stop = bounds
+        length = stop - start
+        response.status_code = 206
+        response.content_range = ContentRange('bytes', start, stop, size)
+
+    file = open(path, 'rb')
+    file.seek(start)
+    response.response = _file_body(file, length)
+    response.content_length = length
+    return response
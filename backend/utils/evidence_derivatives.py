@@ -0,0 +1,239 @@
+"""
+Thumbnails and previews for image and video evidence.
+
+List pages used to load every evidence photo at full resolution. When an
+image or video is uploaded, a background process pool now derives WebP
+versions from it:
+
+    <name>.thumb.webp     at most THUMBNAIL_SIZE px on the long side, for grids
+    <name>.preview.webp   at most PREVIEW_SIZE px, for the evidence page
+    <name>.poster.webp    videos only: a frame grabbed with ffmpeg, from which
+                          the thumbnail and preview are made
+
+They sit next to the original (3f/a2/3fa2...e9.jpg gives
+3f/a2/3fa2...e9.thumb.webp), so they share its content address. They are
+served by the evidence.derived route, after the same permission check as the
+evidence page, with a one-year immutable cache lifetime.
+
+EVIDENCE_DERIVATIVE_WORKERS sets the pool size. With 0 there is no pool,
+and derivatives are made the first time they are requested, as they are for
+files uploaded before this existed. Videos get a poster only if ffmpeg is
+installed (FFMPEG_BINARY, else found on the PATH).
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = 320
+PREVIEW_SIZE = 1280
+VARIANTS = ('thumb', 'preview', 'poster')
+DERIVABLE_TYPES = ('image', 'video')
+# Seconds a request waits for a missing derivative to be made
+DERIVE_WAIT = 20
+# Seconds ffmpeg may take to grab a poster frame
+FFMPEG_TIMEOUT = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+# Absolute original path -> future, so an upload is only derived once at a time
+_in_flight = {}
+
+
+def derivative_path(original_path, variant):
+    """Path of a derivative next to its original: photo.jpg -> photo.thumb.webp."""
+    return f"{os.path.splitext(original_path)[0]}.{variant}.webp"
+
+
+def _save_webp(image, target, quality):
+    # Write then rename, so a reader never sees half a file
+    fd, temp_path = tempfile.mkstemp(suffix='.webp', dir=os.path.dirname(target))
+    os.close(fd)
+    try:
+        image.save(temp_path, 'WEBP', quality=quality, method=4)
+        os.replace(temp_path, target)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _grab_poster(ffmpeg, video_path, target):
+    """Save one frame of the video as a WebP poster. Returns False if ffmpeg cannot."""
+    fd, frame_path = tempfile.mkstemp(suffix='.png', dir=os.path.dirname(target))
+    os.close(fd)
+    try:
+        # One second in skips black lead-in frames; very short clips use the first frame
+        for seek in (['-ss', '1'], []):
+            command = [ffmpeg, '-v', 'error', '-y', *seek, '-i', video_path, '-frames:v', '1',
+                       '-vf', f"scale='min({PREVIEW_SIZE},iw)':-2", frame_path]
+            result = subprocess.run(command, capture_output=True, timeout=FFMPEG_TIMEOUT)
+            if result.returncode == 0 and os.path.getsize(frame_path):
+                with Image.open(frame_path) as frame:
+                    _save_webp(frame.convert('RGB'), target, quality=80)
+                return True
+        logger.warning(f"ffmpeg could not grab a frame from {video_path}: {result.stderr.decode(errors='replace')[:200]}")
+        return False
+    finally:
+        os.remove(frame_path)
+
+
+def generate_derivatives(original_path, file_type, ffmpeg=None):
+    """
+    Make the missing derivatives of one file. Runs in a pool worker.
+
+    Returns:
+        list: Paths of the derivatives created
+    """
+    created = []
+    source = original_path
+    if file_type == 'video':
+        poster = derivative_path(original_path, 'poster')
+        if not os.path.exists(poster):
+            if not ffmpeg or not _grab_poster(ffmpeg, original_path, poster):
+                return created
+            created.append(poster)
+        source = poster
+
+    targets = [(variant, size) for variant, size in (('preview', PREVIEW_SIZE), ('thumb', THUMBNAIL_SIZE))
+               if not os.path.exists(derivative_path(original_path, variant))]
+    if not targets:
+        return created
+
+    with Image.open(source) as image:
+        # JPEG can decode straight at a fraction of full size, far faster than decode-then-shrink
+        image.draft('RGB', (PREVIEW_SIZE, PREVIEW_SIZE))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        # Preview first, then the thumbnail from the preview
+        for variant, size in targets:
+            image.thumbnail((size, size), Image.LANCZOS)
+            target = derivative_path(original_path, variant)
+            _save_webp(image, target, quality=80 if variant == 'preview' else 75)
+            created.append(target)
+    return created
+
+
+def ffmpeg_binary():
+    configured = current_app.config.get('FFMPEG_BINARY')
+    return configured or shutil.which('ffmpeg')
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: the web process has threads and open database connections
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _forget(original_path, future):
+    with _executor_lock:
+        if _in_flight.get(original_path) is future:
+            del _in_flight[original_path]
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Deriving previews of {original_path} failed: {future.exception()}")
+
+
+def schedule_derivatives(original_path, file_type):
+    """
+    Queue the derivatives of a stored file on the pool.
+
+    Returns:
+        Future or None: None if the type has no derivatives or the pool is disabled
+    """
+    global _executor
+    if file_type not in DERIVABLE_TYPES or not os.path.exists(original_path):
+        return None
+    workers = int(current_app.config.get('EVIDENCE_DERIVATIVE_WORKERS', 2))
+    if workers <= 0:
+        return None
+
+    with _executor_lock:
+        future = _in_flight.get(original_path)
+        if future is not None:
+            return future
+    try:
+        future = _get_executor(workers).submit(generate_derivatives, original_path, file_type, ffmpeg_binary())
+    except BrokenProcessPool:
+        # A worker died (e.g. killed while decoding a huge image); start a fresh pool
+        logger.error("Evidence derivative pool was broken; restarting it")
+        with _executor_lock:
+            _executor = None
+        future = _get_executor(workers).submit(generate_derivatives, original_path, file_type, ffmpeg_binary())
+    with _executor_lock:
+        _in_flight[original_path] = future
+    future.add_done_callback(lambda done: _forget(original_path, done))
+    return future
+
+
+def evidence_file_path(evidence):
+    """Absolute path of an evidence file under the static folder."""
+    return os.path.join(current_app.static_folder, (evidence.file_path or '').replace('static/', '', 1))
+
+
+def schedule_evidence_derivatives(evidence_items):
+    """Queue derivatives for newly stored evidence; call after the commit."""
+    for evidence in evidence_items:
+        if evidence.file_path:
+            schedule_derivatives(evidence_file_path(evidence), evidence.type)
+
+
+def ensure_derivative(evidence, variant):
+    """
+    Path of one derivative of an evidence file, making it first if needed.
+
+    Returns:
+        str or None: None if it cannot be made (not an image or video, no
+            ffmpeg for a video, or the original is unreadable)
+    """
+    original = evidence_file_path(evidence)
+    path = derivative_path(original, variant)
+    if os.path.exists(path):
+        return path
+    if evidence.type not in DERIVABLE_TYPES or not os.path.exists(original):
+        return None
+
+    future = schedule_derivatives(original, evidence.type)
+    try:
+        if future is not None:
+            future.result(timeout=DERIVE_WAIT)
+        else:
+            generate_derivatives(original, evidence.type, ffmpeg_binary())
+    except Exception as e:
+        logger.error(f"Could not derive {variant} of evidence {evidence.id}: {str(e)}")
+    return path if os.path.exists(path) else None
+
+
+def derivative_url(evidence, variant='thumb'):
+    """
+    URL of a derivative for templates, or None when the page should show an
+    icon instead (documents, audio, videos without ffmpeg or a poster).
+    """
+    if evidence.type not in DERIVABLE_TYPES or not evidence.file_path:
+        return None
+    if evidence.type == 'video' and not ffmpeg_binary() and \
+            not os.path.exists(derivative_path(evidence_file_path(evidence), 'poster')):
+        return None
+    # The content hash in the URL makes it safe to cache for good
+    version = (evidence.content_hash or str(evidence.id))[:16]
+    return url_for('evidence.derived', evidence_id=evidence.id, variant=variant, v=version)
+
+
+def init_derivatives(app):
+    """Make derivative_url() available to templates."""
+    app.jinja_env.globals['evidence_derivative_url'] = derivative_url
@@ -0,0 +1,128 @@
+"""
+Single-pass evidence ingest.
+
+Saving an upload with file.save() and then calling extract_metadata() read
+the file back from disk three times: once to hash it, once to detect its type
+and once for the image EXIF. ingest_upload() makes one pass over the upload
+stream instead. It copies the stream to its destination in BLOCK_SIZE blocks
+and updates the SHA-256 digest from the same buffer. It also sniffs the MIME
+type from the first block. The file is opened again only for image metadata,
+and only when the upload is an image.
+"""
+
+import hashlib
+import logging
+import os
+from collections import namedtuple
+
+from utils.evidence_analyzer import BLOCK_SIZE, evidence_type_for_mime, extract_metadata, sniff_mime_type
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Leading bytes handed to the MIME sniffer
+SNIFF_BYTES = 4096
+
+IngestResult = namedtuple('IngestResult', ['path', 'size', 'sha256', 'mime_type', 'file_type'])
+
+
+def _read_blocks(stream, buffer_size):
+    """Yield memoryviews over one reused buffer, each filled from the stream."""
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    readinto = getattr(stream, 'readinto', None)
+    while True:
+        if readinto is not None:
+            count = readinto(buffer)
+            if not count:
+                return
+            yield view[:count]
+        else:
+            data = stream.read(buffer_size)
+            if not data:
+                return
+            yield memoryview(data)
+
+
+def ingest_stream(stream, file_path, file_name='', buffer_size=BLOCK_SIZE):
+    """
+    Copy a binary stream to file_path, hashing and sniffing it on the way.
+
+    Args:
+        stream: Readable binary stream, e.g. FileStorage.stream
+        file_path: Destination; removed again if the copy fails
+        file_name: Original file name, the MIME fallback without python-magic
+        buffer_size: Bytes read and written per block
+
+    Returns:
+        IngestResult
+    """
+    digest = hashlib.sha256()
+    head = bytearray()
+    size = 0
+    try:
+        # Blocks larger than the file buffer are written straight through
+        with open(file_path, 'wb') as out:
+            for block in _read_blocks(stream, buffer_size):
+                if len(head) < SNIFF_BYTES:
+                    head += block[:SNIFF_BYTES - len(head)]
+                digest.update(block)
+                out.write(block)
+                size += len(block)
+    except BaseException:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        raise
+
+    sha256 = digest.hexdigest()
+    mime_type = sniff_mime_type(head, file_name, sha256) if head else 'application/octet-stream'
+    return IngestResult(file_path, size, sha256, mime_type, evidence_type_for_mime(mime_type))
+
+
+def ingest_upload(file_storage, file_path, buffer_size=BLOCK_SIZE):
+    """
+    Save an uploaded file in one pass and collect its metadata.
+
+    Args:
+        file_storage: werkzeug FileStorage from request.files
+        file_path: Destination path
+        buffer_size: Bytes read and written per block
+
+    Returns:
+        tuple: (IngestResult, metadata dict as from extract_metadata)
+    """
+    result = ingest_stream(file_storage.stream, file_path, file_storage.filename or '', buffer_size)
+    metadata = extract_metadata(file_path, file_hash=result.sha256, file_type=result.file_type)
+    metadata['mime_type'] = result.mime_type
+    return result, metadata
+
+
+def ingest_file(file_path, file_name='', sha256=None):
+    """
+    Collect the hash, type and metadata of a file already on disk, such as
+    an assembled chunked upload.
+
+    Args:
+        file_path: Path of the file
+        file_name: Original file name, the MIME fallback without python-magic
+        sha256: Hash if the caller already computed it while writing; the
+            file is then only opened for its first SNIFF_BYTES
+
+    Returns:
+        tuple: (IngestResult, metadata dict as from extract_metadata)
+    """
+    with open(file_path, 'rb') as file:
+        head = file.read(SNIFF_BYTES)
+        if sha256 is None:
+            digest = hashlib.sha256(head)
+            for block in _read_blocks(file, BLOCK_SIZE):
+                digest.update(block)
+            sha256 = digest.hexdigest()
+    size = os.path.getsize(file_path)
+    mime_type = sniff_mime_type(head, file_name, sha256) if head else 'application/octet-stream'
+    result = IngestResult(file_path, size, sha256, mime_type, evidence_type_for_mime(mime_type))
+    metadata = extract_metadata(file_path, file_hash=sha256, file_type=result.file_type)
+    metadata['mime_type'] = mime_type
+    return result, metadata
@@ -0,0 +1,471 @@
+"""
+Content-addressed evidence store.
+
+Evidence files are stored once per distinct content, named by their SHA-256
+and sharded by the first two byte pairs of the hash:
+
+    static/uploads/evidence/blobs/3f/a2/3fa2...e9.jpg
+
+Thumbnails and previews (utils/evidence_derivatives.py) sit beside it as
+3fa2...e9.thumb.webp and so on, and go with it.
+
+Each file has an evidence_blobs row. Evidence rows point at it through
+content_hash, and the row's ref_count says how many do. The same CCTV clip
+attached to five FIRs therefore takes the disk space of one. The stored hash
+also lets anyone re-check that a file is byte-for-byte what was uploaded
+(verify_blob), which is what the chain of custody relies on.
+
+Mapper events adjust ref_count in the same transaction as the Evidence
+insert, update or delete, as utils/stats.py does for the dashboard counters.
+Deleting evidence, or a FIR with its evidence, only drops the count. Files
+are removed later by the offline collector, which first recomputes every
+count from the evidence table. It also clears out abandoned chunked uploads
+(utils/evidence_uploads.py), which are staged in the store's uploads/
+directory:
+
+    flask --app app:create_app gc-evidence --grace-hours 24
+
+Files uploaded before the store existed can be moved into it with
+`flask dedupe-evidence`; `flask verify-evidence` re-hashes every blob.
+"""
+
+import logging
+import os
+import re
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import wait
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from sqlalchemy import event as sa_event, func, select
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Evidence, EvidenceBlob, EvidenceUpload
+from utils.evidence_analyzer import calculate_file_hash, evidence_type_for_mime
+from utils.evidence_derivatives import VARIANTS, derivative_path
+from utils.evidence_ingest import ingest_file, ingest_upload
+from utils.executors import submit_cpu_bound
+from utils.file_types import guess_mime_type
+from utils.orm_helpers import previous_value, track_previous_values, upsert_insert
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_EXTENSION_RE = re.compile(r'\.[a-z0-9]{1,10}')
+
+StoredFile = namedtuple('StoredFile', ['blob', 'ingest', 'metadata', 'deduplicated', 'file_path'])
+
+
+def store_root():
+    """Directory holding the blobs, under the static uploads folder (not served as static)."""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'evidence', 'blobs')
+
+
+def blob_path(sha256, extension=''):
+    """Sharded path of a blob relative to store_root(), e.g. 3f/a2/3fa2...jpg."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def web_path(blob):
+    """Evidence.file_path for a blob: relative to the static folder."""
+    absolute = os.path.join(store_root(), blob.path)
+    return os.path.relpath(absolute, current_app.static_folder).replace(os.sep, '/')
+
+
+def _extension(file_name):
+    extension = os.path.splitext(file_name or '')[1].lower()
+    return extension if _EXTENSION_RE.fullmatch(extension) else ''
+
+
+# Reference counting
+
+def _adjust_ref_count(connection, sha256, delta):
+    if not sha256 or not delta:
+        return
+    table = EvidenceBlob.__table__
+    values = {'ref_count': table.c.ref_count + delta}
+    if delta < 0:
+        values['released_at'] = datetime.now(timezone.utc)
+    connection.execute(table.update().where(table.c.sha256 == sha256).values(**values))
+
+
+# The update handler needs the old hash to know which blob to release
+track_previous_values(Evidence.content_hash)
+
+
+@sa_event.listens_for(Evidence, 'after_insert')
+def _reference_blob(mapper, connection, target):
+    _adjust_ref_count(connection, target.content_hash, 1)
+
+
+@sa_event.listens_for(Evidence, 'after_update')
+def _rereference_blob(mapper, connection, target):
+    previous = previous_value(target, 'content_hash')
+    if previous != target.content_hash:
+        _adjust_ref_count(connection, previous, -1)
+        _adjust_ref_count(connection, target.content_hash, 1)
+
+
+@sa_event.listens_for(Evidence, 'after_delete')
+def _release_blob(mapper, connection, target):
+    _adjust_ref_count(connection, previous_value(target, 'content_hash'), -1)
+
+
+def _ensure_blob_row(sha256, path, size, mime_type):
+    """
+    Create the blob row with no references yet, or touch the existing one.
+
+    Reusing a blob sets its released_at and write-locks its row until the
+    caller commits, so the collector can neither remove it in the meantime
+    nor count an unreferenced blob as past its grace period right after.
+    """
+    table = EvidenceBlob.__table__
+    now = datetime.now(timezone.utc)
+    values = {'sha256': sha256, 'path': path, 'size': size, 'mime_type': mime_type, 'ref_count': 0}
+    insert = upsert_insert(db.engine.dialect.name)
+    if insert is not None:
+        db.session.execute(
+            insert(table).values(**values)
+            .on_conflict_do_update(index_elements=[table.c.sha256], set_={'released_at': now})
+        )
+        return db.session.get(EvidenceBlob, sha256, populate_existing=True)
+
+    touch = table.update().where(table.c.sha256 == sha256).values(released_at=now)
+    if db.session.execute(touch).rowcount == 0:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(**values))
+        except IntegrityError:
+            # Another upload of the same content created it first
+            db.session.execute(touch)
+    return db.session.get(EvidenceBlob, sha256, populate_existing=True)
+
+
+# Storing and checking files
+
+def _place(source, blob):
+    """Move source into the store as blob's file, or drop it if the content is already there."""
+    target = os.path.join(store_root(), blob.path)
+    if os.path.exists(target) and os.path.getsize(target) == blob.size:
+        os.remove(source)
+        return True
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Same filesystem, so this is an atomic rename
+    os.replace(source, target)
+    return False
+
+
+def _store(temp_path, extension, ingest, metadata, discard_on_error=True):
+    """Create the blob row for an ingested temporary file and move the file into place."""
+    try:
+        blob = _ensure_blob_row(ingest.sha256, blob_path(ingest.sha256, extension), ingest.size, ingest.mime_type)
+        deduplicated = _place(temp_path, blob)
+    except BaseException:
+        if discard_on_error and os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if deduplicated:
+        logger.info(f"Evidence upload {ingest.sha256[:12]} is already stored; reusing it")
+    return StoredFile(blob, ingest, metadata, deduplicated, web_path(blob))
+
+
+def store_upload(file_storage):
+    """
+    Ingest an uploaded file into the store.
+
+    The upload is written once to a temporary file next to the blobs, hashed
+    on the way (utils/evidence_ingest.py), then renamed into place, or
+    discarded if a blob with the same hash already exists. The blob row is
+    created in the current session; the caller's Evidence row, with
+    content_hash set, takes the reference when it is flushed.
+
+    Returns:
+        StoredFile: blob, ingest result, metadata, whether the content was
+            already stored, and the Evidence.file_path to use
+    """
+    return _store(*_ingest_to_temp(file_storage, _temp_dir()))
+
+
+def store_uploads(file_storages):
+    """
+    Ingest several uploaded files into the store at once, such as the
+    evidence attached to a new FIR.
+
+    Writing each upload to its temporary file, hashing it, detecting its type
+    and extracting its metadata (EXIF, GPS) run for all of them together on
+    the CPU pool (utils/executors.py), so the request takes about as long as
+    its largest file rather than the sum. The blob rows are then created and
+    the files renamed into place in the calling thread, which owns the
+    session.
+
+    Returns:
+        list: StoredFile per upload, in the order given
+    """
+    temp_dir = _temp_dir()
+    futures = [submit_cpu_bound(_ingest_to_temp, file_storage, temp_dir) for file_storage in file_storages]
+    wait(futures)
+    ingested = [future.result() for future in futures if future.exception() is None]
+    stored = []
+    try:
+        for future in futures:
+            # Re-raises the first upload that could not be read
+            future.result()
+        for item in ingested:
+            stored.append(_store(*item))
+    except BaseException:
+        for temp_path, _, _, _ in ingested[len(stored):]:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+    return stored
+
+
+def _temp_dir():
+    temp_dir = os.path.join(store_root(), 'tmp')
+    os.makedirs(temp_dir, exist_ok=True)
+    return temp_dir
+
+
+def _ingest_to_temp(file_storage, temp_dir):
+    """Write an upload to a temporary file in temp_dir, collecting its hash, type and metadata."""
+    extension = _extension(file_storage.filename)
+    temp_path = os.path.join(temp_dir, uuid.uuid4().hex + extension)
+
+    ingest, metadata = ingest_upload(file_storage, temp_path)
+    metadata['file_name'] = os.path.basename(file_storage.filename or '') or metadata.get('file_name')
+    return temp_path, extension, ingest, metadata
+
+
+def store_staged_file(file_path, file_name, sha256=None):
+    """
+    Ingest a file already written inside the store, such as an assembled
+    chunked upload, as store_upload() does for a request upload. The file is
+    renamed into place, never copied, so it must be under store_root().
+
+    Args:
+        file_path: The staged file; moved or removed, but left in place if
+            storing it fails so the caller can try again
+        file_name: Original file name
+        sha256: Hash computed while the file was written, if known
+
+    Returns:
+        StoredFile
+    """
+    ingest, metadata = ingest_file(file_path, file_name, sha256)
+    metadata['file_name'] = os.path.basename(file_name or '') or metadata.get('file_name')
+    return _store(file_path, _extension(file_name), ingest, metadata, discard_on_error=False)
+
+
+def stored_blob_file(sha256, file_name):
+    """
+    StoredFile for content already in the store, such as a chunked upload
+    whose evidence row could not be created the first time.
+
+    Returns:
+        StoredFile, or None if the blob or its file is gone
+    """
+    blob = db.session.get(EvidenceBlob, sha256)
+    if blob is None:
+        return None
+    path = os.path.join(store_root(), blob.path)
+    if not os.path.exists(path):
+        return None
+    ingest, metadata = ingest_file(path, file_name, sha256)
+    metadata['file_name'] = os.path.basename(file_name or '') or metadata.get('file_name')
+    return StoredFile(blob, ingest, metadata, True, web_path(blob))
+
+
+def verify_blob(blob):
+    """
+    Re-hash a blob's file.
+
+    Returns:
+        bool: True if the file matches its SHA-256, False if it differs,
+            None if the file is missing
+    """
+    path = os.path.join(store_root(), blob.path)
+    if not os.path.exists(path):
+        return None
+    return calculate_file_hash(path) == blob.sha256
+
+
+# Maintenance
+
+def reconcile_ref_counts():
+    """
+    Recompute every blob's ref_count from the evidence table.
+
+    Returns:
+        int: Number of blobs whose count had drifted
+    """
+    actual = dict(db.session.execute(
+        select(Evidence.content_hash, func.count()).where(Evidence.content_hash.isnot(None))
+        .group_by(Evidence.content_hash)
+    ).all())
+    drifted = 0
+    for blob in EvidenceBlob.query.all():
+        count = actual.get(blob.sha256, 0)
+        if blob.ref_count != count:
+            if count < blob.ref_count:
+                blob.released_at = datetime.now(timezone.utc)
+            blob.ref_count = count
+            drifted += 1
+    db.session.commit()
+    if drifted:
+        logger.warning(f"Reconciled {drifted} drifted evidence blob reference count(s)")
+    return drifted
+
+
+def collect_garbage(grace_seconds=86400, dry_run=False):
+    """
+    Remove blobs no evidence refers to, abandoned chunked uploads, and stray
+    files in the store.
+
+    A blob is only removed once it has had no references, and no upload has
+    reused it, for grace_seconds; a chunked upload once no chunk has arrived
+    for that long, and a file without a blob row once it is that old, so
+    uploads and deletions in flight are never raced.
+
+    Returns:
+        dict: blobs, uploads and files removed (or that would be, with
+            dry_run) and bytes freed
+    """
+    reconcile_ref_counts()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    root = store_root()
+    summary = {'blobs': 0, 'uploads': 0, 'files': 0, 'bytes': 0}
+
+    # Their staging files go with the stray files below
+    stale_uploads = EvidenceUpload.query.filter(EvidenceUpload.updated_at < cutoff.replace(tzinfo=None))
+    summary['uploads'] = stale_uploads.count()
+    if not dry_run and summary['uploads']:
+        stale_uploads.delete(synchronize_session=False)
+        db.session.commit()
+
+    candidates = [
+        (blob.sha256, blob.path, blob.size, blob.released_at or blob.created_at)
+        for blob in EvidenceBlob.query.filter(EvidenceBlob.ref_count <= 0)
+    ]
+    table = EvidenceBlob.__table__
+    for sha256, path, size, released in candidates:
+        if released is not None and released.tzinfo is None:
+            released = released.replace(tzinfo=timezone.utc)
+        if released is not None and released > cutoff:
+            continue
+        summary['blobs'] += 1
+        summary['bytes'] += size or 0
+        if dry_run:
+            continue
+        # Conditional, in case an upload reused or referenced the blob since it was read
+        result = db.session.execute(table.delete().where(
+            table.c.sha256 == sha256,
+            table.c.ref_count <= 0,
+            table.c.released_at.is_(None) | (table.c.released_at <= cutoff.replace(tzinfo=None))
+        ))
+        if result.rowcount:
+            # Before committing, while the row is locked: an upload of the
+            # same content waits for the delete, then stores its own copy
+            original = os.path.join(root, path)
+            for file_path in [original] + [derivative_path(original, variant) for variant in VARIANTS]:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+        db.session.commit()
+
+    # Blobs and their derivatives (<sha256>.thumb.webp) are named by the hash
+    known = {sha256 for (sha256,) in db.session.execute(select(EvidenceBlob.sha256))}
+    stale = time.time() - grace_seconds
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if name.split('.', 1)[0] in known or os.path.getmtime(path) > stale:
+                continue
+            summary['files'] += 1
+            summary['bytes'] += os.path.getsize(path)
+            if not dry_run:
+                os.remove(path)
+    return summary
+
+
+def adopt_legacy_files(batch_size=100):
+    """
+    Move evidence saved before the store existed into it.
+
+    Each file is hashed and either renamed into the store or, if identical
+    content is already stored, deleted. Rows whose file is missing are left
+    alone.
+
+    Returns:
+        dict: files adopted, duplicates removed, rows skipped
+    """
+    summary = {'adopted': 0, 'duplicates': 0, 'missing': 0}
+    last_id = 0
+    while True:
+        rows = (
+            Evidence.query.filter(Evidence.content_hash.is_(None), Evidence.id > last_id)
+            .order_by(Evidence.id).limit(batch_size).all()
+        )
+        if not rows:
+            break
+        for evidence in rows:
+            last_id = evidence.id
+            path = os.path.join(current_app.static_folder, (evidence.file_path or '').replace('static/', '', 1))
+            if not evidence.file_path or not os.path.isfile(path):
+                summary['missing'] += 1
+                continue
+            sha256 = calculate_file_hash(path)
+            mime_type = guess_mime_type(path)
+            blob = _ensure_blob_row(
+                sha256, blob_path(sha256, _extension(path)), os.path.getsize(path), mime_type
+            )
+            if _place(path, blob):
+                summary['duplicates'] += 1
+            summary['adopted'] += 1
+            evidence.content_hash = sha256
+            evidence.file_path = web_path(blob)
+            if not evidence.type:
+                evidence.type = evidence_type_for_mime(mime_type)
+        db.session.commit()
+    return summary
+
+
+def register_evidence_store_commands(app):
+    """Register the evidence store maintenance commands on the app."""
+
+    @app.cli.command('gc-evidence')
+    @click.option('--grace-hours', default=24.0, show_default=True,
+                  help='Keep unreferenced blobs and stray files younger than this')
+    @click.option('--dry-run', is_flag=True, help='Report what would be removed without removing it')
+    def gc_evidence_command(grace_hours, dry_run):
+        """Remove evidence files no evidence row refers to."""
+        summary = collect_garbage(grace_hours * 3600, dry_run)
+        verb = 'Would remove' if dry_run else 'Removed'
+        click.echo(f"{verb} {summary['blobs']} unreferenced blob(s), {summary['uploads']} abandoned upload(s) "
+                   f"and {summary['files']} stray file(s), "
+                   f"{summary['bytes'] / (1024 * 1024):.1f} MB")
+
+    @app.cli.command('dedupe-evidence')
+    @click.option('--batch-size', default=100, show_default=True, help='Evidence rows per transaction')
+    def dedupe_evidence_command(batch_size):
+        """Move evidence files saved before the content-addressed store into it."""
+        summary = adopt_legacy_files(batch_size)
+        click.echo(f"Moved {summary['adopted']} file(s) into the evidence store "
+                   f"({summary['duplicates']} duplicate(s) removed, {summary['missing']} missing)")
+
+    @app.cli.command('verify-evidence')
+    def verify_evidence_command():
+        """Re-hash every stored evidence file and report any that changed or are missing."""
+        problems = 0
+        for blob in EvidenceBlob.query.order_by(EvidenceBlob.sha256):
+            result = verify_blob(blob)
+            if result is not True:
+                problems += 1
+                click.echo(f"{'MISSING' if result is None else 'MODIFIED'} {blob.sha256} {blob.path}", err=True)
+        click.echo(f"{problems} problem(s) found")
+        if problems:
+            raise SystemExit(1)
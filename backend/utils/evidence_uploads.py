@@ -0,0 +1,335 @@
+"""
+Resumable chunked evidence uploads.
+
+A CCTV export can run to gigabytes, more than one request may carry
+(MAX_CONTENT_LENGTH) and more than a police station's connection reliably
+delivers in one go. The browser therefore sends such a file in chunks:
+
+    POST  /evidence/uploads/<fir_id>          file name, size and form fields;
+                                              answers with the upload id
+    HEAD  /evidence/uploads/<id>              Upload-Offset: bytes stored so far
+    PATCH /evidence/uploads/<id>?offset=N     the next chunk as the raw body,
+                                              optionally with X-Chunk-SHA256
+    POST  /evidence/uploads/<id>/complete     assembles the evidence
+
+Chunks are appended to a staging file in the store's uploads/ directory,
+streamed from the request in BLOCK_SIZE blocks, so memory use does not grow
+with the file. A chunk only counts once it is on disk and, if the client sent
+its SHA-256, matches it; the offset in the evidence_uploads row is then
+advanced. After a dropped connection the client asks for the offset and
+carries on from there. Anything past it is a partial chunk and is cut off
+before the next one is written.
+
+While the chunks arrive in one process, the hash of the whole file is kept up
+to date, so completing a gigabyte upload does not read it back. Completing
+renames the staging file into the content-addressed store
+(utils/evidence_store.py) and records the blob's hash on the upload, so a
+retry after the evidence row could not be created finishes from the blob.
+Uploads nobody finishes are removed by `flask gc-evidence`.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import update
+
+from extensions import db
+from models import EvidenceUpload
+from utils.evidence_analyzer import BLOCK_SIZE
+from utils.evidence_ingest import _read_blocks
+from utils.evidence_store import _extension, store_root, store_staged_file, stored_blob_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: the offset check in the database still applies
+    fcntl = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+# Upload id -> (bytes hashed, sha256 object) for uploads whose chunks this
+# process has seen in order
+_running_hashes = {}
+_running_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """A chunk or request the upload cannot accept, with the HTTP status to answer."""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def staging_path(upload):
+    """Where an upload's chunks are written, inside the store so completing is a rename."""
+    return os.path.join(store_root(), 'uploads', upload.id + _extension(upload.file_name))
+
+
+def chunk_size():
+    """Chunk size offered to clients; kept under MAX_CONTENT_LENGTH."""
+    size = int(current_app.config.get('EVIDENCE_UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+    limit = current_app.config.get('MAX_CONTENT_LENGTH')
+    return min(size, limit) if limit else size
+
+
+def create_upload(fir, user_id, file_name, size, fields=None):
+    """
+    Start a chunked upload.
+
+    Args:
+        fir: FIR the evidence is for
+        user_id: Uploading user; the only one allowed to continue it
+        file_name: Original file name
+        size: Total size in bytes
+        fields: Upload form fields (description, category, tags, ...)
+
+    Returns:
+        EvidenceUpload: the committed row
+    """
+    max_bytes = int(current_app.config.get('EVIDENCE_UPLOAD_MAX_BYTES', DEFAULT_MAX_BYTES))
+    if size <= 0:
+        raise UploadError('The file is empty.')
+    if size > max_bytes:
+        raise UploadError('The file is too large.', 413, max_bytes=max_bytes)
+
+    upload = EvidenceUpload(
+        id=uuid.uuid4().hex,
+        fir_id=fir.id,
+        user_id=user_id,
+        file_name=os.path.basename(file_name)[:255],
+        size=size,
+        received=0,
+        fields=json.dumps(fields or {}),
+    )
+    path = staging_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    with _running_lock:
+        _running_hashes[upload.id] = (0, hashlib.sha256())
+    return upload
+
+
+def get_upload(upload_id, user_id):
+    """The upload with this id if it belongs to the user, else None."""
+    upload = db.session.get(EvidenceUpload, upload_id)
+    if upload is None or upload.user_id != user_id:
+        return None
+    return upload
+
+
+@contextmanager
+def _locked_staging_file(upload):
+    """Open the staging file with an exclusive lock, so one request writes it at a time."""
+    path = staging_path(upload)
+    if not os.path.exists(path):
+        if upload.received >= upload.size:
+            raise UploadError('The upload is already being completed.', 409)
+        raise UploadError('The upload has expired; start it again.', 410)
+    with open(path, 'r+b') as file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadError('Another chunk of this upload is being written.', 409)
+        yield file
+
+
+def _take_running_hash(upload_id, offset):
+    """A copy of the whole-file hash up to offset, or None if this process does not have it."""
+    with _running_lock:
+        entry = _running_hashes.get(upload_id)
+    if entry is None or entry[0] != offset:
+        return None
+    return entry[1].copy()
+
+
+def write_chunk(upload, offset, stream, expected_sha256=None):
+    """
+    Append one chunk to an upload.
+
+    Args:
+        upload: EvidenceUpload
+        offset: Where the client says the chunk starts; must be upload.received
+        stream: Readable binary stream with the chunk, e.g. request.stream
+        expected_sha256: Hex SHA-256 of the chunk, if the client sent one
+
+    Returns:
+        int: The new offset
+    """
+    if upload.evidence_id is not None:
+        raise UploadError('The upload is already complete.', 409, evidence_id=upload.evidence_id)
+    if offset != upload.received:
+        raise UploadError('Chunk does not start at the upload offset.', 409, offset=upload.received)
+
+    with _locked_staging_file(upload) as file:
+        # Another request may have written a chunk while this one waited
+        db.session.refresh(upload)
+        start = upload.received
+        if offset != start:
+            raise UploadError('Chunk does not start at the upload offset.', 409, offset=start)
+
+        chunk_digest = hashlib.sha256() if expected_sha256 else None
+        file_digest = _take_running_hash(upload.id, start)
+        remaining = upload.size - start
+        written = 0
+        # Drop what a broken earlier request left past the offset
+        file.truncate(start)
+        file.seek(start)
+        for block in _read_blocks(stream, BLOCK_SIZE):
+            written += len(block)
+            if written > remaining:
+                file.truncate(start)
+                raise UploadError('The chunk runs past the end of the file.', 400, offset=start)
+            if chunk_digest is not None:
+                chunk_digest.update(block)
+            if file_digest is not None:
+                file_digest.update(block)
+            file.write(block)
+
+        if chunk_digest is not None and chunk_digest.hexdigest() != expected_sha256.lower():
+            file.truncate(start)
+            raise UploadError('The chunk checksum does not match; send it again.', 400, offset=start)
+        # The offset must never point past what is safely on disk
+        file.flush()
+        os.fsync(file.fileno())
+
+        table = EvidenceUpload.__table__
+        result = db.session.execute(
+            update(table)
+            .where(table.c.id == upload.id, table.c.received == start)
+            .values(received=start + written, updated_at=datetime.now(timezone.utc))
+        )
+        db.session.commit()
+        if not result.rowcount:
+            db.session.refresh(upload)
+            raise UploadError('The upload changed while the chunk was written.', 409, offset=upload.received)
+
+    with _running_lock:
+        if file_digest is not None:
+            _running_hashes[upload.id] = (start + written, file_digest)
+        else:
+            _running_hashes.pop(upload.id, None)
+    db.session.refresh(upload)
+    return upload.received
+
+
+def assemble_upload(upload):
+    """
+    Move a fully received upload into the evidence store.
+
+    The blob row and upload.sha256 are committed before returning, so if the
+    caller then fails to create the Evidence row, the next attempt picks the
+    file up from the store instead of the (now gone) staging file. The caller
+    creates the Evidence row from the result, sets upload.evidence_id and
+    commits.
+
+    Returns:
+        StoredFile: as from store_upload()
+    """
+    if upload.received != upload.size:
+        raise UploadError('The upload is not complete yet.', 409, offset=upload.received)
+    if upload.sha256:
+        stored = stored_blob_file(upload.sha256, upload.file_name)
+        if stored is None:
+            raise UploadError('The assembled file is no longer stored; start the upload again.', 410)
+        return stored
+
+    sha256 = _take_running_hash(upload.id, upload.size)
+    path = staging_path(upload)
+    with _locked_staging_file(upload):
+        stored = store_staged_file(path, upload.file_name, sha256.hexdigest() if sha256 is not None else None)
+        blob_file = os.path.join(store_root(), stored.blob.path)
+        try:
+            upload.sha256 = stored.blob.sha256
+            upload.updated_at = datetime.now(timezone.utc)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            _restore_staging_file(blob_file, path, stored.deduplicated)
+            raise
+    discard_running_hash(upload)
+    return stored
+
+
+def _restore_staging_file(blob_file, path, deduplicated):
+    """Put the bytes back in staging after the store move could not be committed."""
+    try:
+        if not deduplicated:
+            os.replace(blob_file, path)
+            return
+        # The blob is shared with other evidence: link (or copy) it instead
+        try:
+            os.link(blob_file, path)
+        except OSError:
+            shutil.copyfile(blob_file, path)
+    except OSError as e:
+        logger.error(f"Could not restore staging file {path}: {str(e)}")
+
+
+def claim_upload(upload, evidence_id):
+    """
+    Record the evidence created from an assembled upload, in the caller's
+    transaction.
+
+    Returns:
+        bool: False if another request already recorded one
+    """
+    table = EvidenceUpload.__table__
+    result = db.session.execute(
+        update(table)
+        .where(table.c.id == upload.id, table.c.evidence_id.is_(None))
+        .values(evidence_id=evidence_id, updated_at=datetime.now(timezone.utc))
+    )
+    return bool(result.rowcount)
+
+
+def discard_running_hash(upload):
+    with _running_lock:
+        _running_hashes.pop(upload.id, None)
+
+
+def cancel_upload(upload):
+    """Remove an unfinished upload and its staging file."""
+    discard_running_hash(upload)
+    try:
+        os.remove(staging_path(upload))
+    except OSError:
+        pass
+    db.session.delete(upload)
+    db.session.commit()
+
+
+def upload_state(upload):
+    """JSON-friendly state of an upload for the client."""
+    return {
+        'upload_id': upload.id,
+        'file_name': upload.file_name,
+        'size': upload.size,
+        'offset': upload.received,
+        'chunk_size': chunk_size(),
+        'complete': upload.evidence_id is not None,
+        'evidence_id': upload.evidence_id,
+    }
+
+
+def upload_fields(upload):
+    """The form fields given when the upload was started."""
+    try:
+        return json.loads(upload.fields or '{}')
+    except ValueError:
+        return {}
@@ -0,0 +1,109 @@
+"""
+Shared executors for async views.
+
+Async views await slow I/O directly, but classification, keyword matching and
+database lookups are blocking. run_cpu_bound() moves that work onto a fixed
+size thread pool, so at most CPU_EXECUTOR_WORKERS such jobs run at once per
+process no matter how many requests are waiting. Synchronous views fan work
+out onto the same pool with submit_cpu_bound(). try_acquire_llm_slot()
+bounds how many outbound LLM calls may be in flight; callers that cannot get
+a slot skip the optional LLM step instead of queueing for it.
+"""
+
+import asyncio
+import atexit
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import copy_current_request_context, g, has_request_context
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_cpu_executor = None
+_llm_slots = None
+
+
+def init_executors(app):
+    """
+    Create the CPU thread pool and the LLM call limit from the app config.
+
+    Reads CPU_EXECUTOR_WORKERS and LLM_MAX_CONCURRENT_CALLS. Safe to call more
+    than once: the first call sizes both, later calls keep them, so slots
+    taken earlier can still be released.
+    """
+    global _cpu_executor, _llm_slots
+
+    if _llm_slots is None:
+        _llm_slots = threading.BoundedSemaphore(max(1, int(app.config.get('LLM_MAX_CONCURRENT_CALLS', 4))))
+
+    if _cpu_executor is not None:
+        return
+
+    _cpu_executor = ThreadPoolExecutor(
+        max_workers=max(1, int(app.config.get('CPU_EXECUTOR_WORKERS', 4))),
+        thread_name_prefix='cpu-bound'
+    )
+    atexit.register(_cpu_executor.shutdown, wait=False)
+
+
+async def run_cpu_bound(func, *args, **kwargs):
+    """
+    Run a blocking function on the CPU pool and await its result.
+
+    Inside a request the call runs with a copy of the request context, and the
+    request globals (current user, the request event) are carried over, so the
+    function can use the database and flask_login as usual.
+    """
+    call = functools.partial(func, *args, **kwargs)
+    if has_request_context():
+        request_globals = dict(vars(g._get_current_object()))
+        bound = call
+
+        @copy_current_request_context
+        def call_in_request():
+            vars(g._get_current_object()).update(request_globals)
+            return bound()
+
+        call = call_in_request
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_cpu_executor(), call)
+
+
+def submit_cpu_bound(func, *args, **kwargs):
+    """
+    Start a blocking function on the CPU pool from synchronous code.
+
+    Unlike run_cpu_bound() no request context is carried over, so the
+    function must not need the app, the database or the current user.
+
+    Returns:
+        concurrent.futures.Future
+    """
+    return _get_cpu_executor().submit(func, *args, **kwargs)
+
+
+def _get_cpu_executor():
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cpu-bound')
+    return _cpu_executor
+
+
+def try_acquire_llm_slot():
+    """Claim an LLM call slot without waiting. Returns False when all are busy."""
+    return _get_llm_slots().acquire(blocking=False)
+
+
+def release_llm_slot():
+    _get_llm_slots().release()
+
+
+def _get_llm_slots():
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = threading.BoundedSemaphore(4)
+    return _llm_slots
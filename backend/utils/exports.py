@@ -0,0 +1,186 @@
+"""
+Streaming case exports for court and statistical reporting.
+
+Rows are read with yield_per, so the database driver hands them over in
+batches (a server-side cursor where the driver has one). Each batch is
+serialized to CSV or JSONL and, optionally, gzipped before the next batch is
+read. Memory use therefore stays flat however many FIRs are exported. Only
+plain columns are selected, with the complainant and officer usernames
+joined in, so no ORM objects pile up in the session.
+
+The same generator backs the /admin/export download and
+
+    flask --app app:create_app export-firs cases.csv.gz --status closed
+"""
+
+import csv
+import io
+import json
+import sys
+import zlib
+
+import click
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import FIR, User
+from utils.queries import filter_cases
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+EXPORT_COLUMNS = (
+    'id', 'fir_number', 'status', 'urgency_level', 'filed_at', 'incident_date', 'incident_location',
+    'complainant', 'processing_officer', 'legal_sections', 'incident_description',
+)
+EXPORT_BATCH_SIZE = 1000
+
+# Spreadsheet apps run cells starting with these as formulas
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _export_statement(status=None, urgency=None, officer_id=None):
+    complainant = aliased(User)
+    officer = aliased(User)
+    stmt = (
+        select(
+            FIR.id, FIR.fir_number, FIR.status, FIR.urgency_level, FIR.filed_at, FIR.incident_date,
+            FIR.incident_location, complainant.username.label('complainant'),
+            officer.username.label('processing_officer'), FIR.legal_sections, FIR.incident_description,
+        )
+        .outerjoin(complainant, complainant.id == FIR.complainant_id)
+        .outerjoin(officer, officer.id == FIR.processing_officer_id)
+    )
+    return filter_cases(stmt, status, urgency, officer_id).order_by(FIR.id)
+
+
+def _section_codes(legal_sections):
+    try:
+        sections = json.loads(legal_sections) if legal_sections else []
+    except (TypeError, ValueError):
+        return []
+    return [s.get('code') for s in sections if isinstance(s, dict) and s.get('code') not in (None, 'N/A', 'ERR')]
+
+
+def _export_record(row):
+    return {
+        'id': row.id,
+        'fir_number': row.fir_number,
+        'status': row.status,
+        'urgency_level': row.urgency_level,
+        'filed_at': row.filed_at.isoformat() if row.filed_at else None,
+        'incident_date': row.incident_date.isoformat() if row.incident_date else None,
+        'incident_location': row.incident_location,
+        'complainant': row.complainant,
+        'processing_officer': row.processing_officer,
+        'legal_sections': _section_codes(row.legal_sections),
+        'incident_description': row.incident_description,
+    }
+
+
+def iter_export_batches(status=None, urgency=None, officer_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of up to batch_size export records, filtered like admin.cases."""
+    stmt = _export_statement(status, urgency, officer_id).execution_options(yield_per=batch_size)
+    result = db.session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            yield [_export_record(row) for row in partition]
+    finally:
+        result.close()
+
+
+def _csv_cell(value):
+    if isinstance(value, list):
+        value = '; '.join(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for records in batches:
+        writer.writerows([_csv_cell(record[column]) for column in EXPORT_COLUMNS] for record in records)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _jsonl_chunks(batches):
+    for records in batches:
+        yield ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+
+def _gzip_chunks(chunks):
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(export_format, compress=False, status=None, urgency=None, officer_id=None,
+                  batch_size=EXPORT_BATCH_SIZE):
+    """
+    Serialize filtered FIRs as a stream of bytes chunks.
+
+    Args:
+        export_format: 'csv' or 'jsonl'
+        compress: Gzip the stream on the fly
+        status, urgency, officer_id: Filters, as on the admin cases page
+        batch_size: Rows fetched and serialized per chunk
+
+    Raises:
+        ValueError: for an unknown export_format
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}; use {' or '.join(EXPORT_FORMATS)}")
+    batches = iter_export_batches(status, urgency, officer_id, batch_size)
+    text_chunks = _csv_chunks(batches) if export_format == 'csv' else _jsonl_chunks(batches)
+    chunks = (chunk.encode('utf-8') for chunk in text_chunks)
+    return _gzip_chunks(chunks) if compress else chunks
+
+
+def export_filename(export_format, compress=False, status=None, urgency=None):
+    """Download name such as cases-closed-high.csv.gz."""
+    parts = ['cases'] + [value for value in (status, urgency) if value]
+    return '-'.join(parts) + f".{export_format}" + ('.gz' if compress else '')
+
+
+def register_export_commands(app):
+    """Register the export CLI command on the app."""
+
+    @app.cli.command('export-firs')
+    @click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+    @click.option('--format', 'export_format', type=click.Choice(list(EXPORT_FORMATS)),
+                  help='Defaults to the output file extension, else csv')
+    @click.option('--gzip', 'compress', is_flag=True, help='Gzip the output (implied by a .gz file name)')
+    @click.option('--status', help='Only FIRs with this status')
+    @click.option('--urgency', help='Only FIRs with this urgency level')
+    @click.option('--officer-id', type=int, help='Only FIRs assigned to this officer')
+    @click.option('--batch-size', default=EXPORT_BATCH_SIZE, show_default=True, help='Rows fetched per batch')
+    def export_firs_command(output, export_format, compress, status, urgency, officer_id, batch_size):
+        """Stream FIRs to a CSV or JSONL file ('-' for stdout)."""
+        compress = compress or output.endswith('.gz')
+        name = output[:-3] if output.endswith('.gz') else output
+        if export_format is None:
+            export_format = 'jsonl' if name.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+        chunks = export_chunks(export_format, compress, status, urgency, officer_id, batch_size)
+        out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        if output != '-':
+            click.echo(f"Exported to {output}", err=True)
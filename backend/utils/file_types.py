@@ -0,0 +1,259 @@
+"""
+File type detection for evidence.
+
+detect_mime_type() looks at the first SNIFF_BYTES of a file:
+
+1. A built-in magic-number sniffer recognises every format evidence uploads
+   accept (routes/evidence.allowed_file) from its signature.
+2. Anything else goes to libmagic, through python-magic when it is
+   installed. The libmagic handle is opened once per process and shared
+   behind a lock, instead of being constructed on every call.
+3. Failing both, the type is guessed from the file name.
+
+Results are memoized per SHA-256, so content seen before (a deduplicated
+upload, or a re-analysis) is not sniffed again.
+"""
+
+import importlib.util
+import logging
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAGIC_AVAILABLE = importlib.util.find_spec('magic') is not None
+SNIFF_BYTES = 512
+DEFAULT_MIME_TYPE = 'application/octet-stream'
+# Content hashes whose type is remembered
+CACHE_SIZE = 4096
+
+_magic = None
+_magic_failed = False
+_magic_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# BMP DIB header sizes: BITMAPCOREHEADER, BITMAPINFOHEADER, BITMAPV4HEADER, BITMAPV5HEADER
+_BMP_DIB_HEADER_SIZES = (12, 40, 108, 124)
+
+# Zip containers (docx, xlsx, odt) and OLE compound files (doc, xls) are
+# told apart by extension; their headers do not say which they hold
+_ZIP_TYPES = {
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.odt': 'application/vnd.oasis.opendocument.text',
+}
+_OLE_TYPES = {
+    '.doc': 'application/msword',
+    '.xls': 'application/vnd.ms-excel',
+}
+_MP4_BRANDS = {
+    b'qt  ': 'video/quicktime',
+    b'M4A ': 'audio/mp4',
+    b'M4B ': 'audio/mp4',
+}
+
+
+def guess_mime_type(file_name):
+    """
+    Guess a MIME type from a file name alone
+
+    Args:
+        file_name: File name or path
+
+    Returns:
+        str: MIME type, application/octet-stream if unknown
+    """
+    mime_type, _ = mimetypes.guess_type(file_name)
+    logger.debug(f"Using mimetypes to determine file type: {mime_type}")
+
+    if mime_type is None:
+        # If mimetypes can't determine the type, use file extension
+        ext = os.path.splitext(file_name)[1].lower()
+        if ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']:
+            mime_type = 'image/jpeg'  # Default to image/jpeg for image files
+        elif ext in ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.mkv']:
+            mime_type = 'video/mp4'  # Default to video/mp4 for video files
+        elif ext in ['.mp3', '.wav', '.ogg', '.flac', '.aac']:
+            mime_type = 'audio/mp3'  # Default to audio/mp3 for audio files
+        elif ext in ['.pdf', '.doc', '.docx', '.txt', '.rtf']:
+            mime_type = 'application/pdf'  # Default to application/pdf for document files
+        else:
+            mime_type = DEFAULT_MIME_TYPE  # Default to binary for unknown types
+        logger.debug(f"Using file extension to determine file type: {mime_type}")
+    return mime_type
+
+
+def _looks_like_text(head):
+    if b'\x00' in head:
+        return False
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is fine
+        if e.start < len(head) - 3:
+            return False
+    return True
+
+
+def sniff_signature(head, file_name=''):
+    """
+    Recognise the accepted evidence formats from their magic numbers.
+
+    Args:
+        head: The first bytes of the file; SNIFF_BYTES is enough
+        file_name: Separates formats sharing a container (docx/xlsx, doc/xls, txt/csv)
+
+    Returns:
+        str or None: MIME type, None if the signature is not one of them
+    """
+    head = bytes(head[:SNIFF_BYTES])
+    ext = os.path.splitext(file_name or '')[1].lower()
+
+    # Images
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    # "BM" alone also starts plain text; the DIB header size must be a known one
+    if head.startswith(b'BM') and int.from_bytes(head[14:18], 'little') in _BMP_DIB_HEADER_SIZES:
+        return 'image/bmp'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'image/tiff'
+
+    # RIFF containers: WebP, AVI, WAV
+    if head.startswith(b'RIFF') and len(head) >= 12:
+        return {b'WEBP': 'image/webp', b'AVI ': 'video/x-msvideo', b'WAVE': 'audio/wav'}.get(head[8:12])
+
+    # Documents
+    if head.startswith(b'%PDF-'):
+        return 'application/pdf'
+    if head.startswith(b'{\\rtf'):
+        return 'application/rtf'
+    if head.startswith(b'PK\x03\x04'):
+        if b'mimetypeapplication/vnd.oasis.opendocument.text' in head:
+            return 'application/vnd.oasis.opendocument.text'
+        return _ZIP_TYPES.get(ext, 'application/zip')
+    if head.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        return _OLE_TYPES.get(ext, 'application/x-ole-storage')
+
+    # Video: ISO base media (mp4, mov, m4a), Matroska/WebM, ASF, FLV
+    if head[4:8] == b'ftyp':
+        return _MP4_BRANDS.get(head[8:12], 'audio/mp4' if ext == '.m4a' else 'video/mp4')
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'video/webm' if b'webm' in head else 'video/x-matroska'
+    if head.startswith(b'\x30\x26\xb2\x75\x8e\x66\xcf\x11'):
+        return 'video/x-ms-wmv'
+    if head.startswith(b'FLV\x01'):
+        return 'video/x-flv'
+
+    # Audio
+    if head.startswith(b'ID3'):
+        return 'audio/mpeg'
+    if head.startswith(b'OggS'):
+        return 'audio/ogg'
+    if head.startswith(b'fLaC'):
+        return 'audio/flac'
+    if len(head) >= 2 and head[0] == 0xff:
+        if head[1] & 0xf6 == 0xf0:
+            return 'audio/aac'  # ADTS
+        if head[1] & 0xe0 == 0xe0 and head[1] & 0x06:
+            return 'audio/mpeg'  # MPEG audio frame, layer I-III
+
+    # Plain text has no signature
+    if head and _looks_like_text(head):
+        return 'text/csv' if ext == '.csv' else 'text/plain'
+    return None
+
+
+def _libmagic():
+    """The shared libmagic handle, opened on first use; None if unavailable."""
+    global _magic, _magic_failed
+    if _magic is not None or _magic_failed or not MAGIC_AVAILABLE:
+        return _magic
+    with _magic_lock:
+        if _magic is None and not _magic_failed:
+            try:
+                import magic
+                _magic = magic.Magic(mime=True)
+            except Exception as e:
+                # python-magic is installed but libmagic itself is missing or broken
+                _magic_failed = True
+                logger.warning(f"libmagic unavailable, using built-in file type detection only: {str(e)}")
+    return _magic
+
+
+def _libmagic_mime_type(head):
+    handle = _libmagic()
+    if handle is None:
+        return None
+    try:
+        # A libmagic handle is not safe to use from several threads at once
+        with _magic_lock:
+            mime_type = handle.from_buffer(bytes(head))
+    except Exception as e:
+        logger.debug(f"libmagic could not identify the file: {str(e)}")
+        return None
+    return None if mime_type in (None, '', DEFAULT_MIME_TYPE) else mime_type
+
+
+def _remember(sha256, mime_type):
+    with _cache_lock:
+        _cache[sha256] = mime_type
+        _cache.move_to_end(sha256)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def cached_mime_type(sha256):
+    """The type detected before for this content, or None."""
+    with _cache_lock:
+        mime_type = _cache.get(sha256)
+        if mime_type is not None:
+            _cache.move_to_end(sha256)
+        return mime_type
+
+
+def detect_mime_type(head, file_name='', sha256=None):
+    """
+    Determine the MIME type from the first bytes of a file
+
+    Args:
+        head: Leading bytes of the file; only SNIFF_BYTES are needed, more
+            can help libmagic with formats the sniffer does not know
+        file_name: Original file name, for ambiguous containers and the fallback
+        sha256: Content hash, to reuse and remember the result
+
+    Returns:
+        str: MIME type
+    """
+    if sha256:
+        mime_type = cached_mime_type(sha256)
+        if mime_type is not None:
+            return mime_type
+
+    mime_type = None
+    if head:
+        mime_type = sniff_signature(head, file_name) or _libmagic_mime_type(head)
+    if mime_type is None:
+        mime_type = guess_mime_type(file_name) if file_name else DEFAULT_MIME_TYPE
+
+    if sha256:
+        _remember(sha256, mime_type)
+    return mime_type
+
+
+def detect_file_mime_type(file_path, sha256=None):
+    """detect_mime_type() for a file on disk; reads only its first SNIFF_BYTES."""
+    if sha256:
+        mime_type = cached_mime_type(sha256)
+        if mime_type is not None:
+            return mime_type
+    with open(file_path, 'rb') as file:
+        head = file.read(SNIFF_BYTES)
+    return detect_mime_type(head, file_path, sha256)
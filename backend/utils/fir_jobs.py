@@ -0,0 +1,258 @@
+"""
+Background pipeline for FIR submission.
+
+submit_fir only marks the FIR as filed and enqueues a FIRJob row. Worker
+threads claim queued jobs from the database and run the slow stages (legal
+section mapping, urgency analysis, PDF generation), committing the status of
+every stage as they go so the job status API can report progress.
+
+The job table lives in the application database, so jobs survive restarts
+and work the same on SQLite as on Postgres. Claiming is a conditional UPDATE,
+so several workers (or several processes) never run the same job. Each
+stage refreshes the job's lock; jobs left 'running' by a crashed worker are
+requeued once their lock goes stale, checked every REQUEUE_INTERVAL seconds
+by the running workers. A job that has already been claimed
+FIR_JOB_MAX_ATTEMPTS times is failed instead, so one that kills its worker
+every time (a poisoned FIR) is not retried forever.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from extensions import db
+from models import FIR, FIRJob
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for jobs whose worker died
+REQUEUE_INTERVAL = 60
+DEFAULT_MAX_ATTEMPTS = 3
+
+_wakeup = threading.Event()
+_workers = []
+
+
+def enqueue_submit_job(fir, language_code=None):
+    """
+    Create a queued job for a just-filed FIR. The caller commits.
+
+    Returns:
+        FIRJob: The new job
+    """
+    job = FIRJob(fir_id=fir.id, status='queued', language_code=language_code)
+    for stage in FIRJob.STAGES:
+        job.set_stage(stage, 'pending')
+    db.session.add(job)
+    return job
+
+
+def notify_workers():
+    """Wake idle workers after a job has been committed."""
+    _wakeup.set()
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically move the oldest queued job to 'running' for this worker.
+
+    Returns:
+        FIRJob or None
+    """
+    candidates = (
+        db.session.query(FIRJob.id)
+        .filter(FIRJob.status == 'queued')
+        .order_by(FIRJob.id)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        now = datetime.now(timezone.utc)
+        claimed = (
+            FIRJob.query
+            .filter(FIRJob.id == job_id, FIRJob.status == 'queued')
+            .update({
+                'status': 'running',
+                'locked_by': worker_id,
+                'locked_at': now,
+                'updated_at': now,
+                'attempts': FIRJob.attempts + 1
+            }, synchronize_session=False)
+        )
+        db.session.commit()
+        if claimed:
+            return db.session.get(FIRJob, job_id)
+    return None
+
+
+def requeue_stale_jobs(stale_after_seconds, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Requeue jobs whose worker died mid-run, or fail them once they have been
+    claimed max_attempts times.
+
+    Returns:
+        int: The number requeued
+    """
+    now = datetime.now(timezone.utc)
+    stale = (FIRJob.status == 'running', FIRJob.locked_at < now - timedelta(seconds=stale_after_seconds))
+    failed = (
+        FIRJob.query
+        .filter(*stale, FIRJob.attempts >= max_attempts)
+        .update({
+            'status': 'failed',
+            'error': f"Worker stopped during each of {max_attempts} attempts",
+            'locked_by': None,
+            'finished_at': now,
+            'updated_at': now,
+        }, synchronize_session=False)
+    )
+    count = (
+        FIRJob.query
+        .filter(*stale)
+        .update({'status': 'queued', 'locked_by': None, 'locked_at': None}, synchronize_session=False)
+    )
+    db.session.commit()
+    if failed:
+        logger.error(f"Failed {failed} FIR job(s) after {max_attempts} attempts")
+    if count:
+        logger.warning(f"Requeued {count} stale FIR job(s)")
+    return count
+
+
+def _describe_error(e):
+    error_msg = str(e)
+    if "quota" in error_msg.lower() or "insufficient" in error_msg.lower():
+        return "API quota limitations; relevant legal sections may need to be added manually"
+    return error_msg
+
+
+def _run_stage(job, stage, func):
+    """Run one stage, recording its status. Stage failures do not fail the job."""
+    started = datetime.now(timezone.utc)
+    job.set_stage(stage, 'running', started_at=started.isoformat())
+    # Heartbeat: a job that is still making progress is not stale
+    job.locked_at = started
+    db.session.commit()
+    try:
+        result = func()
+        status = 'skipped' if result is False else 'succeeded'
+        job.set_stage(stage, status, finished_at=datetime.now(timezone.utc).isoformat())
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"FIR job {job.id} stage {stage} failed: {str(e)}")
+        job.set_stage(stage, 'failed', error=_describe_error(e),
+                      finished_at=datetime.now(timezone.utc).isoformat())
+    db.session.commit()
+
+
+def run_submit_job(job):
+    """Run every stage of a submit job and mark it finished."""
+    # Imported here to avoid circular imports (routes import this module)
+    from utils.openai_helper import map_legal_sections
+    from utils.legal_mapper import get_legal_sections_for_fir
+    from utils.ml_analyzer import analyze_complaint, AnalysisContext
+    from utils.pdf_generator import generate_and_store_fir_pdf
+
+    fir = db.session.get(FIR, job.fir_id)
+    if fir is None:
+        job.status = 'failed'
+        job.error = 'FIR no longer exists'
+        job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+        return
+
+    # One analysis pass shared by the legal mapper and the urgency analysis
+    context = AnalysisContext(fir.incident_description or '')
+
+    def map_sections():
+        if fir.legal_sections or not fir.incident_description:
+            return False
+        legal_mapping = map_legal_sections(fir.incident_description, context=context)
+        fir.set_legal_sections(get_legal_sections_for_fir(legal_mapping))
+
+    def analyze_urgency():
+        if not fir.incident_description:
+            return False
+        complaint_analysis = analyze_complaint(fir.incident_description, job.language_code, context=context)
+        if complaint_analysis and 'urgency_level' in complaint_analysis:
+            fir.urgency_level = complaint_analysis['urgency_level']
+
+    def generate_pdf():
+        pdf_path = generate_and_store_fir_pdf(fir.id)
+        if not pdf_path:
+            raise Exception("PDF generation returned no file")
+        logger.info(f"Generated and stored PDF for FIR {fir.fir_number}: {pdf_path}")
+
+    _run_stage(job, 'legal_sections', map_sections)
+    _run_stage(job, 'urgency', analyze_urgency)
+    _run_stage(job, 'pdf', generate_pdf)
+
+    failed = [name for name, stage in job.get_stages().items() if stage.get('status') == 'failed']
+    job.status = 'succeeded'
+    job.error = f"Stages with errors: {', '.join(failed)}" if failed else None
+    job.finished_at = datetime.now(timezone.utc)
+    job.locked_by = None
+    db.session.commit()
+
+
+def _worker_loop(app, worker_id, poll_interval, stale_after, max_attempts):
+    next_requeue = 0.0
+    while True:
+        with app.app_context():
+            try:
+                if time.monotonic() >= next_requeue:
+                    next_requeue = time.monotonic() + REQUEUE_INTERVAL
+                    requeue_stale_jobs(stale_after, max_attempts)
+                job = claim_next_job(worker_id)
+                if job is not None:
+                    try:
+                        run_submit_job(job)
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.exception(f"FIR job {job.id} crashed")
+                        job = db.session.get(FIRJob, job.id)
+                        job.status = 'failed'
+                        job.error = str(e)
+                        job.finished_at = datetime.now(timezone.utc)
+                        db.session.commit()
+                    continue
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"FIR job worker error: {str(e)}")
+            finally:
+                db.session.remove()
+
+        _wakeup.wait(poll_interval)
+        _wakeup.clear()
+
+
+def start_job_workers(app):
+    """
+    Start FIR_JOB_WORKERS daemon threads processing the job table.
+
+    Reads FIR_JOB_WORKERS (0 disables the workers, e.g. for scripts),
+    FIR_JOB_POLL_INTERVAL, FIR_JOB_STALE_AFTER and FIR_JOB_MAX_ATTEMPTS. Safe
+    to call more than once.
+    """
+    if _workers:
+        return
+
+    count = int(app.config.get('FIR_JOB_WORKERS', 2))
+    poll_interval = float(app.config.get('FIR_JOB_POLL_INTERVAL', 2.0))
+    stale_after = int(app.config.get('FIR_JOB_STALE_AFTER', 900))
+    max_attempts = int(app.config.get('FIR_JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+
+    for index in range(count):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+        thread = threading.Thread(
+            target=_worker_loop,
+            args=(app, worker_id, poll_interval, stale_after, max_attempts),
+            name=f"fir-job-worker-{index}",
+            daemon=True
+        )
+        thread.start()
+        _workers.append(thread)
@@ -0,0 +1,150 @@
+"""
+FIR number allocation.
+
+FIR numbers look like FIR20260101HQ000042: the UTC filing date, the station
+code (FIR_STATION_CODE) and a per-station, per-day sequence number. They sort
+by date as plain strings and contain only letters and digits, so they survive
+being read back over the phone or typed into the chatbot.
+
+The sequence lives in the shared database (the fir_sequences table for
+SQLAlchemy, the fir_sequences collection for MongoDB), so every process and
+node filing for a station draws from the same counter. To keep that off the
+hot path, each process reserves FIR_NUMBER_BLOCK_SIZE numbers at a time with
+one atomic increment and hands them out from memory. Two consequences:
+numbers within a day are unique but not strictly in filing order across
+processes, and a process that exits leaves the rest of its block unused.
+"""
+
+import os
+import re
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import FIRSequence
+
+DEFAULT_STATION_CODE = 'HQ'
+DEFAULT_BLOCK_SIZE = 50
+SEQUENCE_DIGITS = 6
+MAX_OPEN_BLOCKS = 64
+
+_STATION_CODE_RE = re.compile(r'[A-Z0-9]{1,8}')
+# Reserving a block can race with another process creating the day's row
+_RESERVE_ATTEMPTS = 3
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return os.environ.get(name, default)
+
+
+def station_code():
+    """This deployment's station code, upper-cased and validated."""
+    code = str(_setting('FIR_STATION_CODE', DEFAULT_STATION_CODE) or DEFAULT_STATION_CODE).upper()
+    if not _STATION_CODE_RE.fullmatch(code):
+        raise ValueError(f"FIR_STATION_CODE must be 1-8 letters or digits, got {code!r}")
+    return code
+
+
+def format_fir_number(station, day, sequence):
+    """FIR number for a station code, a YYYYMMDD day and a sequence number."""
+    return f"FIR{day}{station}{sequence:0{SEQUENCE_DIGITS}d}"
+
+
+def _reserve_sql(scope, size):
+    """Atomically take the next `size` numbers for scope from fir_sequences."""
+    table = FIRSequence.__table__
+    for _ in range(_RESERVE_ATTEMPTS):
+        # A connection of its own: the block stays reserved even if the
+        # request that asked for it rolls back, so no number is handed out twice
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                update(table)
+                .where(table.c.scope == scope)
+                .values(next_value=table.c.next_value + size)
+            )
+            if result.rowcount:
+                end = conn.execute(select(table.c.next_value).where(table.c.scope == scope)).scalar_one()
+                return end - size, end
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(table).values(scope=scope, next_value=1 + size))
+            return 1, 1 + size
+        except IntegrityError:
+            # Another process created the row first; increment it instead
+            continue
+    raise RuntimeError(f"Could not reserve FIR numbers for {scope}")
+
+
+def _reserve_mongo(scope, size):
+    """Atomically take the next `size` numbers for scope from Mongo."""
+    from pymongo import ReturnDocument
+    from pymongo.errors import DuplicateKeyError
+
+    from extensions import mongo_db
+
+    for _ in range(_RESERVE_ATTEMPTS):
+        try:
+            doc = mongo_db.fir_sequences.find_one_and_update(
+                {'_id': scope},
+                {'$inc': {'last_value': size}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Two upserts raced to create the day's document; retry the increment
+            continue
+        end = doc['last_value'] + 1
+        return end - size, end
+    raise RuntimeError(f"Could not reserve FIR numbers for {scope}")
+
+
+class FIRNumberAllocator:
+    """Hands out FIR numbers from blocks reserved in a shared sequence store."""
+
+    def __init__(self, reserve):
+        self._reserve = reserve
+        self._lock = threading.Lock()
+        # scope -> [next sequence, end of block (exclusive)], oldest first
+        self._blocks = {}
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker must not hand out the rest of its parent's block
+            os.register_at_fork(after_in_child=self._blocks.clear)
+
+    def allocate(self, now=None):
+        """Allocate the next FIR number for this station."""
+        station = station_code()
+        day = (now or datetime.now(timezone.utc)).strftime('%Y%m%d')
+        scope = f"{station}:{day}"
+        with self._lock:
+            block = self._blocks.get(scope)
+            if block is None or block[0] >= block[1]:
+                size = max(1, int(_setting('FIR_NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)))
+                block = list(self._reserve(scope, size))
+                self._blocks.pop(scope, None)
+                self._blocks[scope] = block
+                # Bulk imports allocate for many past days; keep only the recent scopes
+                while len(self._blocks) > MAX_OPEN_BLOCKS:
+                    del self._blocks[next(iter(self._blocks))]
+            sequence = block[0]
+            block[0] += 1
+        return format_fir_number(station, day, sequence)
+
+
+sql_allocator = FIRNumberAllocator(_reserve_sql)
+mongo_allocator = FIRNumberAllocator(_reserve_mongo)
+
+
+def next_fir_number(now=None):
+    """Allocate a FIR number from the SQL sequence table."""
+    return sql_allocator.allocate(now)
+
+
+def next_mongo_fir_number(now=None):
+    """Allocate a FIR number from the MongoDB sequence collection."""
+    return mongo_allocator.allocate(now)
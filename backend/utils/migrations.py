@@ -0,0 +1,205 @@
+"""
+Lightweight schema upgrades and data backfills.
+
+The app creates its tables with db.create_all(), which never alters an
+existing table. ensure_schema() runs at startup and adds the columns and
+indexes newer code expects. Data backfills can take a while on large
+databases, so they are Flask CLI commands instead of startup steps:
+
+    flask --app app:create_app backfill-legal-sections
+    flask --app app:create_app backfill-custody-events
+"""
+
+import json
+import logging
+
+import click
+from sqlalchemy import inspect, text
+
+from extensions import db
+from models import FIR, Evidence, FIRLegalSection, LegalSection
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def _add_missing_columns(inspector, table, columns):
+    existing = {column['name'] for column in inspector.get_columns(table)}
+    for name, ddl_type in columns:
+        if name not in existing:
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl_type}'))
+            logger.info(f"Added column {table}.{name}")
+
+
+def _create_missing_indexes(inspector, table, indexes):
+    existing = {index['name'] for index in inspector.get_indexes(table)}
+    for name, columns in indexes:
+        if name not in existing:
+            db.session.execute(text(f'CREATE INDEX {name} ON {table} ({", ".join(columns)})'))
+            logger.info(f"Created index {name}")
+
+
+def ensure_schema():
+    """Bring tables created by older versions up to the current models."""
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+
+    if 'fir_legal_sections' in tables:
+        # Older databases have the bare (fir_id, legal_section_id) table
+        _add_missing_columns(inspector, 'fir_legal_sections', [
+            ('confidence', 'FLOAT'),
+            ('relevance', 'TEXT'),
+        ])
+        _create_missing_indexes(inspector, 'fir_legal_sections', [
+            ('ix_fir_legal_sections_section_confidence_fir', ['legal_section_id', 'confidence', 'fir_id']),
+        ])
+
+    if 'firs' in tables:
+        _add_missing_columns(inspector, 'firs', [
+            ('transcription', 'TEXT'),
+        ])
+        _create_missing_indexes(inspector, 'firs', [
+            ('ix_firs_filed_at_id', ['filed_at', 'id']),
+            ('ix_firs_status_filed_at_id', ['status', 'filed_at', 'id']),
+            ('ix_firs_urgency_filed_at_id', ['urgency_level', 'filed_at', 'id']),
+            ('ix_firs_officer_filed_at_id', ['processing_officer_id', 'filed_at', 'id']),
+            ('ix_firs_complainant_filed_at_id', ['complainant_id', 'filed_at', 'id']),
+        ])
+
+    if 'evidence' in tables:
+        _add_missing_columns(inspector, 'evidence', [
+            ('content_hash', 'VARCHAR(64)'),
+            ('custody_head', 'VARCHAR(64)'),
+        ])
+        _create_missing_indexes(inspector, 'evidence', [
+            ('ix_evidence_content_hash', ['content_hash']),
+        ])
+
+    if 'evidence_uploads' in tables:
+        _add_missing_columns(inspector, 'evidence_uploads', [
+            ('sha256', 'VARCHAR(64)'),
+        ])
+
+    if 'legal_sections' in tables:
+        _create_missing_indexes(inspector, 'legal_sections', [
+            ('ix_legal_sections_code', ['code']),
+        ])
+
+    db.session.commit()
+
+
+def backfill_fir_legal_sections(batch_size=1000):
+    """
+    Create FIRLegalSection rows from the legacy FIR.legal_sections JSON.
+
+    Walks FIRs in id order in batches, skipping FIRs that already have links,
+    so it can be stopped and re-run safely.
+
+    Returns:
+        tuple: (firs_processed, links_created)
+    """
+    section_ids = dict(db.session.query(LegalSection.code, LegalSection.id).all())
+    linked = db.session.query(FIRLegalSection.fir_id).filter(FIRLegalSection.fir_id == FIR.id).exists()
+
+    last_id = 0
+    firs_processed = 0
+    links_created = 0
+    while True:
+        batch = (
+            db.session.query(FIR.id, FIR.legal_sections)
+            .filter(FIR.id > last_id, FIR.legal_sections.isnot(None), ~linked)
+            .order_by(FIR.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+
+        rows = []
+        for fir_id, legal_sections in batch:
+            try:
+                sections = json.loads(legal_sections)
+            except (json.JSONDecodeError, TypeError):
+                logger.warning(f"Skipping FIR {fir_id}: invalid legal_sections JSON")
+                continue
+
+            seen = set()
+            for section in sections if isinstance(sections, list) else []:
+                if not isinstance(section, dict):
+                    continue
+                section_id = section_ids.get(section.get('code'))
+                if section_id is None or section_id in seen:
+                    continue
+                seen.add(section_id)
+                rows.append({
+                    'fir_id': fir_id,
+                    'legal_section_id': section_id,
+                    'confidence': float(section.get('confidence') or 0),
+                    'relevance': section.get('relevance') or None
+                })
+
+        if rows:
+            db.session.execute(FIRLegalSection.__table__.insert(), rows)
+        db.session.commit()
+
+        last_id = batch[-1][0]
+        firs_processed += len(batch)
+        links_created += len(rows)
+        logger.info(f"Backfilled legal sections up to FIR {last_id} ({firs_processed} FIRs, {links_created} links)")
+
+    return firs_processed, links_created
+
+
+def backfill_custody_events(batch_size=500):
+    """
+    Move custody events from the legacy Evidence.chain_of_custody JSON into
+    custody_events.
+
+    Each evidence item's events are inserted in their original order and its
+    JSON column is cleared in the same transaction, so it can be stopped
+    and re-run safely.
+
+    Returns:
+        tuple: (evidence_processed, events_moved)
+    """
+    last_id = 0
+    evidence_processed = 0
+    events_moved = 0
+    while True:
+        batch = (
+            Evidence.query.filter(Evidence.id > last_id, Evidence.chain_of_custody.isnot(None))
+            .order_by(Evidence.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+
+        for evidence in batch:
+            events_moved += evidence.move_legacy_custody()
+        db.session.commit()
+
+        last_id = batch[-1].id
+        evidence_processed += len(batch)
+        logger.info(f"Backfilled custody events up to evidence {last_id} "
+                    f"({evidence_processed} items, {events_moved} events)")
+
+    return evidence_processed, events_moved
+
+
+def register_commands(app):
+    """Register the migration CLI commands on the app."""
+
+    @app.cli.command('backfill-legal-sections')
+    @click.option('--batch-size', default=1000, show_default=True, help='FIRs per transaction')
+    def backfill_legal_sections_command(batch_size):
+        """Populate fir_legal_sections from the FIR.legal_sections JSON column."""
+        firs_processed, links_created = backfill_fir_legal_sections(batch_size)
+        click.echo(f"Processed {firs_processed} FIRs, created {links_created} section links")
+
+    @app.cli.command('backfill-custody-events')
+    @click.option('--batch-size', default=500, show_default=True, help='Evidence items per transaction')
+    def backfill_custody_events_command(batch_size):
+        """Move chain of custody events from the Evidence JSON column into custody_events."""
+        evidence_processed, events_moved = backfill_custody_events(batch_size)
+        click.echo(f"Processed {evidence_processed} evidence items, moved {events_moved} custody events")
@@ -492,6 +492,132 @@ def preprocess_text(text):
         # Return simplified text as fallback
         return text.lower()
 
+_WORD_RE = re.compile(r'\w+')
+
+def _build_keyword_index():
+    """
+    Split IPC_KEYWORDS into plain words (matched by token lookup) and phrases
+    (matched by a precompiled regex once all of their words are present).
+    """
+    words = set()
+    phrases = {}
+    for keywords in IPC_KEYWORDS.values():
+        for keyword in keywords:
+            if _WORD_RE.fullmatch(keyword):
+                words.add(keyword)
+            elif keyword not in phrases:
+                phrases[keyword] = (
+                    set(_WORD_RE.findall(keyword)),
+                    re.compile(r'\b' + re.escape(keyword) + r'\b')
+                )
+    return words, phrases
+
+_KEYWORD_WORDS, _KEYWORD_PHRASES = _build_keyword_index()
+
+class AnalysisContext:
+    """
+    Tokenized and normalized view of one complaint text, computed once and
+    shared by the chatbot, the ML classifier and the keyword fallback.
+
+    Attributes:
+        text: The original text
+        text_lower: Lowercased text used for keyword matching
+        tokens: Word tokens of text_lower
+        preprocessed: Output of preprocess_text() (spelling fixes, stopwords, lemmas),
+            computed lazily along with preprocessed_tokens and preprocessed_token_set
+        keyword_hits: Every IPC keyword that occurs in the text
+        keyword_tokens, keyword_token_set: preprocessed tokens plus any added
+            with add_keyword_token(); only keyword matching sees the extras
+    """
+
+    def __init__(self, text, sections=None):
+        self.text = text or ""
+        self.text_lower = self.text.lower()
+        self.tokens = _WORD_RE.findall(self.text_lower)
+        self._token_set = set(self.tokens)
+        self.keyword_hits = self._match_keywords()
+        self.result = None  # Memoized analyze_complaint() sections
+
+        self._preprocessed = None
+        self._keyword_tokens = None
+        self._keyword_token_set = None
+        # LegalSection rows by code; batch analysis shares one dict across contexts
+        self._sections = sections if sections is not None else {}
+        self.section_hits = 0
+        self.section_misses = 0
+
+    def _ensure_preprocessed(self):
+        # Computed on first use; the keyword fallback alone never needs it
+        if self._preprocessed is None:
+            self._preprocessed = preprocess_text(self.text)
+            self._preprocessed_tokens = self._preprocessed.split()
+            self._preprocessed_token_set = set(self._preprocessed_tokens)
+            self._keyword_tokens = list(self._preprocessed_tokens)
+            self._keyword_token_set = set(self._preprocessed_token_set)
+
+    @property
+    def preprocessed(self):
+        self._ensure_preprocessed()
+        return self._preprocessed
+
+    @property
+    def preprocessed_tokens(self):
+        self._ensure_preprocessed()
+        return self._preprocessed_tokens
+
+    @property
+    def preprocessed_token_set(self):
+        self._ensure_preprocessed()
+        return self._preprocessed_token_set
+
+    @property
+    def keyword_tokens(self):
+        self._ensure_preprocessed()
+        return self._keyword_tokens
+
+    @property
+    def keyword_token_set(self):
+        self._ensure_preprocessed()
+        return self._keyword_token_set
+
+    def add_keyword_token(self, token):
+        """
+        Add a normalized token (e.g. a corrected misspelling) for keyword
+        matching only; preprocessed, which the classifier sees, is unchanged.
+        """
+        self._ensure_preprocessed()
+        self._keyword_tokens.append(token)
+        self._keyword_token_set.add(token)
+
+    def _match_keywords(self):
+        hits = self._token_set & _KEYWORD_WORDS
+        for phrase, (parts, pattern) in _KEYWORD_PHRASES.items():
+            if parts <= self._token_set and pattern.search(self.text_lower):
+                hits.add(phrase)
+        return hits
+
+    def section_keywords(self, section_code):
+        """Keywords of a section found in the text, in IPC_KEYWORDS order."""
+        return [k for k in IPC_KEYWORDS.get(section_code, []) if k in self.keyword_hits]
+
+    def load_sections(self, section_codes):
+        """Fetch LegalSection rows for any codes not yet seen, in a single query."""
+        missing = [code for code in set(section_codes) if code not in self._sections]
+        if missing:
+            rows = LegalSection.query.filter(LegalSection.code.in_(missing)).all()
+            found = {row.code: row for row in rows}
+            for code in missing:
+                self._sections[code] = found.get(code)
+
+    def get_section(self, section_code):
+        """Return the LegalSection for a code (or None), querying at most once."""
+        if section_code in self._sections:
+            self.section_hits += 1
+        else:
+            self.section_misses += 1
+            self.load_sections([section_code])
+        return self._sections[section_code]
+
 def extract_features(text):
     """Extract features from the text using TF-IDF vectorization"""
     try:
@@ -514,12 +640,17 @@ def extract_features(text):
         logger.error(f"Error extracting features: {str(e)}")
         return None
 
-def keyword_based_analysis(text):
+def keyword_based_analysis(text, context=None):
     """
     Analyze the complaint text using keyword matching to identify potential IPC sections.
     This is a fallback method when ML model is not available.
+
+    Args:
+        text: The complaint text
+        context: Optional AnalysisContext for text, reused instead of re-scanning
     """
-    text = text.lower()
+    if context is None:
+        context = AnalysisContext(text)
     matches = {}
 
     # Common words to ignore (to reduce false positives)
@@ -538,7 +669,7 @@ def keyword_based_analysis(text):
                 continue
 
             # Check for exact word match with word boundaries
-            if re.search(r'\b' + re.escape(keyword) + r'\b', text):
+            if keyword in context.keyword_hits:
                 # Give higher weight to multi-word keywords
                 keyword_weight = 1.0
                 if ' ' in keyword:
@@ -780,184 +911,206 @@ def train_model(training_data=None):
         logger.error(f"Error training model: {str(e)}")
         return False
 
-def predict_ipc_sections(complaint_text):
-    """
-    Predict IPC sections for a given complaint text.
+def _build_section_results(complaint_text, section_probs, matched_keywords_dict, context):
+    """Turn (section, confidence) pairs into result dicts, loading all sections in one query."""
+    context.load_sections([section_code for section_code, _ in section_probs])
 
-    Args:
-        complaint_text: The text of the complaint
+    results = []
+    for section_code, confidence in section_probs:
+        # Get section details from database
+        section = context.get_section(section_code)
 
-    Returns:
-        A list of dictionaries with section codes and confidence scores
-    """
-    try:
-        # Check if model exists
-        if not (os.path.exists(VECTORIZER_PATH) and
-                os.path.exists(CLASSIFIER_PATH) and
-                os.path.exists(BINARIZER_PATH)):
-            logger.warning("ML model not found. Training a new model...")
-            train_model()
+        # Get matched keywords for this section
+        keywords_matched = matched_keywords_dict.get(section_code, [])
 
-        # Load model components
-        with open(VECTORIZER_PATH, 'rb') as f:
-            vectorizer = pickle.load(f)
+        # Generate a more detailed explanation of relevance
+        relevance_explanation = generate_relevance_explanation(
+            complaint_text, section_code, confidence, keywords_matched, context
+        )
 
-        with open(CLASSIFIER_PATH, 'rb') as f:
-            classifier = pickle.load(f)
+        if section:
+            results.append({
+                "section_code": section.code,
+                "section_name": section.name,
+                "section_description": section.description,
+                "confidence": float(confidence),
+                "relevance": relevance_explanation,
+                "keywords_matched": context.section_keywords(section_code)
+            })
+        else:
+            # If section not in database, provide basic info
+            results.append({
+                "section_code": section_code,
+                "section_name": f"IPC Section {section_code}",
+                "section_description": "Description not available",
+                "confidence": float(confidence),
+                "relevance": relevance_explanation,
+                "keywords_matched": context.section_keywords(section_code)
+            })
+
+    return results
+
+def _load_model():
+    """Load the vectorizer, classifier and label binarizer, training them first if missing."""
+    if not (os.path.exists(VECTORIZER_PATH) and
+            os.path.exists(CLASSIFIER_PATH) and
+            os.path.exists(BINARIZER_PATH)):
+        logger.warning("ML model not found. Training a new model...")
+        train_model()
+
+    with open(VECTORIZER_PATH, 'rb') as f:
+        vectorizer = pickle.load(f)
+
+    with open(CLASSIFIER_PATH, 'rb') as f:
+        classifier = pickle.load(f)
+
+    with open(BINARIZER_PATH, 'rb') as f:
+        mlb = pickle.load(f)
+
+    return vectorizer, classifier, mlb
+
+def _class_probabilities(classifier, mlb, X):
+    """For each row of X, a list of (section, probability) tuples over every class."""
+    # Get the classes (IPC sections)
+    classes = mlb.classes_
+
+    # Try to get prediction probabilities if available
+    try:
+        y_pred_proba = classifier.predict_proba(X)
+        return [list(zip(classes, row)) for row in y_pred_proba]
+    except AttributeError:
+        # If predict_proba is not available, use decision_function or predict
+        logger.info("predict_proba not available, using alternative method")
 
-        with open(BINARIZER_PATH, 'rb') as f:
-            mlb = pickle.load(f)
+    try:
+        # Try decision_function first (for SVM models)
+        y_pred_decision = classifier.decision_function(X)
 
-        # Preprocess and vectorize the text
-        processed_text = preprocess_text(complaint_text)
-        X = vectorizer.transform([processed_text])
+        # Convert decision values to probabilities using sigmoid function
+        y_pred_proba_values = 1 / (1 + np.exp(-y_pred_decision))
+        return [list(zip(classes, row)) for row in y_pred_proba_values]
+    except AttributeError:
+        # If decision_function is not available, use predict
+        logger.info("decision_function not available, using predict")
 
-        # Try to get prediction probabilities if available
-        try:
-            y_pred_proba = classifier.predict_proba(X)
+    y_pred = classifier.predict(X)
 
-            # Get the classes (IPC sections)
-            classes = mlb.classes_
+    # Binary predictions become fixed high/low confidences
+    return [[(section, 0.85 if pred else 0.15) for section, pred in zip(classes, row)] for row in y_pred]
 
-            # Create a list of (section, probability) tuples
-            section_probs = [(section, prob) for section, prob in zip(classes, y_pred_proba[0])]
-        except AttributeError:
-            # If predict_proba is not available, use decision_function or predict
-            logger.info("predict_proba not available, using alternative method")
+def _keyword_sections(complaint_text, context):
+    """Section results from keyword analysis alone."""
+    keyword_results = keyword_based_analysis(complaint_text, context)
 
-            try:
-                # Try decision_function first (for SVM models)
-                y_pred_decision = classifier.decision_function(X)
+    # Convert the new format to the old format for compatibility
+    section_probs = [(section, confidence) for section, confidence, _ in keyword_results]
 
-                # Convert decision values to probabilities using sigmoid function
-                import numpy as np
-                def sigmoid(x):
-                    return 1 / (1 + np.exp(-x))
+    # Store matched keywords for later use
+    matched_keywords_dict = {section: keywords for section, _, keywords in keyword_results}
 
-                y_pred_proba_values = sigmoid(y_pred_decision[0])
+    return _build_section_results(complaint_text, section_probs, matched_keywords_dict, context)
 
-                # Get the classes (IPC sections)
-                classes = mlb.classes_
+def _sections_from_probabilities(complaint_text, section_probs, context):
+    """Keep the confident classifier predictions, falling back to keyword analysis."""
+    # Sort by probability (descending) and filter those with probability > 0.3 (increased threshold)
+    section_probs = sorted([(s, p) for s, p in section_probs if p > 0.3], key=lambda x: x[1], reverse=True)
 
-                # Create a list of (section, probability) tuples
-                section_probs = [(section, prob) for section, prob in zip(classes, y_pred_proba_values)]
-            except AttributeError:
-                # If decision_function is not available, use predict
-                logger.info("decision_function not available, using predict")
+    # Limit to top 3 sections from ML model
+    section_probs = section_probs[:3]
 
-                y_pred = classifier.predict(X)
+    # If ML model doesn't find good matches, fall back to keyword-based analysis
+    if not section_probs:
+        logger.info("ML model didn't find strong matches, using keyword analysis")
+        return _keyword_sections(complaint_text, context)
 
-                # Get the classes (IPC sections)
-                classes = mlb.classes_
+    # For ML results, find matching keywords
+    matched_keywords_dict = {}
+    for section_code, _ in section_probs:
+        matched_keywords_dict[section_code] = context.section_keywords(section_code)
 
-                # Create a list of (section, probability) tuples with binary values
-                section_probs = [(section, 0.85 if pred else 0.15) for section, pred in zip(classes, y_pred[0])]
+    # Convert to the expected format with better explanations
+    return _build_section_results(complaint_text, section_probs, matched_keywords_dict, context)
 
-        # Sort by probability (descending) and filter those with probability > 0.3 (increased threshold)
-        section_probs = sorted([(s, p) for s, p in section_probs if p > 0.3], key=lambda x: x[1], reverse=True)
+def predict_ipc_sections(complaint_text, context=None):
+    """
+    Predict IPC sections for a given complaint text.
 
-        # Limit to top 3 sections from ML model
-        section_probs = section_probs[:3]
+    Args:
+        complaint_text: The text of the complaint
+        context: Optional AnalysisContext for complaint_text, so tokenizing,
+            preprocessing and keyword matching happen only once
 
-        # If ML model doesn't find good matches, fall back to keyword-based analysis
-        if not section_probs:
-            logger.info("ML model didn't find strong matches, using keyword analysis")
-            keyword_results = keyword_based_analysis(complaint_text)
+    Returns:
+        A list of dictionaries with section codes and confidence scores
+    """
+    if context is None:
+        context = AnalysisContext(complaint_text)
 
-            # Convert the new format to the old format for compatibility
-            section_probs = [(section, confidence) for section, confidence, _ in keyword_results]
+    try:
+        vectorizer, classifier, mlb = _load_model()
 
-            # Store matched keywords for later use
-            matched_keywords_dict = {section: keywords for section, _, keywords in keyword_results}
-        else:
-            # For ML results, find matching keywords
-            matched_keywords_dict = {}
-            for section_code, _ in section_probs:
-                matched_keywords_dict[section_code] = find_matching_keywords(complaint_text, section_code)
-
-        # Convert to the expected format with better explanations
-        results = []
-        for section_code, confidence in section_probs:
-            # Get section details from database
-            section = LegalSection.query.filter_by(code=section_code).first()
-
-            # Get matched keywords for this section
-            keywords_matched = matched_keywords_dict.get(section_code, [])
-
-            # Generate a more detailed explanation of relevance
-            relevance_explanation = generate_relevance_explanation(complaint_text, section_code, confidence, keywords_matched)
-
-            if section:
-                results.append({
-                    "section_code": section.code,
-                    "section_name": section.name,
-                    "section_description": section.description,
-                    "confidence": float(confidence),
-                    "relevance": relevance_explanation,
-                    "keywords_matched": find_matching_keywords(complaint_text, section_code)
-                })
-            else:
-                # If section not in database, provide basic info
-                results.append({
-                    "section_code": section_code,
-                    "section_name": f"IPC Section {section_code}",
-                    "section_description": "Description not available",
-                    "confidence": float(confidence),
-                    "relevance": relevance_explanation,
-                    "keywords_matched": find_matching_keywords(complaint_text, section_code)
-                })
-
-        return results
+        # Preprocess and vectorize the text
+        X = vectorizer.transform([context.preprocessed])
+
+        section_probs = _class_probabilities(classifier, mlb, X)[0]
+        return _sections_from_probabilities(complaint_text, section_probs, context)
     except Exception as e:
         logger.error(f"Error predicting IPC sections: {str(e)}")
         # Fall back to keyword-based analysis
-        keyword_results = keyword_based_analysis(complaint_text)
-
-        # Convert the new format to the old format for compatibility
-        section_probs = [(section, confidence) for section, confidence, _ in keyword_results]
-
-        # Store matched keywords for later use
-        matched_keywords_dict = {section: keywords for section, _, keywords in keyword_results}
-
-        results = []
-        for section_code, confidence in section_probs:
-            # Get section details from database
-            section = LegalSection.query.filter_by(code=section_code).first()
-
-            # Get matched keywords for this section
-            keywords_matched = matched_keywords_dict.get(section_code, [])
-
-            # Generate a more detailed explanation of relevance
-            relevance_explanation = generate_relevance_explanation(complaint_text, section_code, confidence, keywords_matched)
-
-            if section:
-                results.append({
-                    "section_code": section.code,
-                    "section_name": section.name,
-                    "section_description": section.description,
-                    "confidence": float(confidence),
-                    "relevance": relevance_explanation,
-                    "keywords_matched": find_matching_keywords(complaint_text, section_code)
-                })
+        return _keyword_sections(complaint_text, context)
+
+def predict_ipc_sections_batch(complaint_texts):
+    """
+    Predict IPC sections for many complaints at once.
+
+    The model is loaded once and every text is vectorized and classified in a
+    single call, and the contexts share one LegalSection lookup cache, which
+    makes this much faster per complaint than predict_ipc_sections() in a loop.
+
+    Args:
+        complaint_texts: List of complaint texts
+
+    Returns:
+        A list with one list of section dictionaries per text, in order
+    """
+    sections = {}
+    contexts = [AnalysisContext(text, sections=sections) for text in complaint_texts]
+    if not contexts:
+        return []
+
+    section_codes = set(IPC_KEYWORDS)
+    try:
+        vectorizer, classifier, mlb = _load_model()
+        section_codes.update(mlb.classes_)
+        X = vectorizer.transform([context.preprocessed for context in contexts])
+        batch_probs = _class_probabilities(classifier, mlb, X)
+    except Exception as e:
+        logger.error(f"Error predicting IPC sections for a batch: {str(e)}")
+        batch_probs = [None] * len(contexts)
+
+    # Every section any row may cite, in one query
+    contexts[0].load_sections(section_codes)
+
+    results = []
+    for context, section_probs in zip(contexts, batch_probs):
+        try:
+            if section_probs is None:
+                results.append(_keyword_sections(context.text, context))
             else:
-                results.append({
-                    "section_code": section_code,
-                    "section_name": f"IPC Section {section_code}",
-                    "section_description": "Description not available",
-                    "confidence": float(confidence),
-                    "relevance": relevance_explanation,
-                    "keywords_matched": find_matching_keywords(complaint_text, section_code)
-                })
-
-        return results
-
-def find_matching_keywords(text, section_code):
+                results.append(_sections_from_probabilities(context.text, section_probs, context))
+        except Exception as e:
+            logger.error(f"Error predicting IPC sections: {str(e)}")
+            results.append(_keyword_sections(context.text, context))
+    return results
+
+def find_matching_keywords(text, section_code, context=None):
     """
     Find keywords in the text that match the given IPC section
 
     Args:
         text: The complaint text
         section_code: The IPC section code
+        context: Optional AnalysisContext for text
 
     Returns:
         list: Matching keywords
@@ -965,17 +1118,12 @@ def find_matching_keywords(text, section_code):
     if not text or section_code not in IPC_KEYWORDS:
         return []
 
-    text = text.lower()
-    matching_keywords = []
+    if context is None:
+        context = AnalysisContext(text)
 
-    for keyword in IPC_KEYWORDS.get(section_code, []):
-        # Check for exact word match with word boundaries
-        if re.search(r'\b' + re.escape(keyword) + r'\b', text):
-            matching_keywords.append(keyword)
+    return context.section_keywords(section_code)
 
-    return matching_keywords
-
-def generate_relevance_explanation(text, section_code, confidence, matching_keywords=None):
+def generate_relevance_explanation(text, section_code, confidence, matching_keywords=None, context=None):
     """
     Generate a detailed explanation of why a section is relevant to the complaint
 
@@ -984,16 +1132,20 @@ def generate_relevance_explanation(text, section_code, confidence, matching_keyw
         section_code: The IPC section code
         confidence: The confidence score
         matching_keywords: Optional list of matching keywords (if already computed)
+        context: Optional AnalysisContext for text
 
     Returns:
         str: Explanation of relevance
     """
     # Get matching keywords if not provided
     if matching_keywords is None:
-        matching_keywords = find_matching_keywords(text, section_code)
+        matching_keywords = find_matching_keywords(text, section_code, context)
 
     # Get section information
-    section = LegalSection.query.filter_by(code=section_code).first()
+    if context is not None:
+        section = context.get_section(section_code)
+    else:
+        section = LegalSection.query.filter_by(code=section_code).first()
     section_name = section.name if section else f"Section {section_code}"
 
     # Generate explanation based on confidence level
@@ -1047,7 +1199,7 @@ def generate_relevance_explanation(text, section_code, confidence, matching_keyw
 
     return explanation
 
-def analyze_complaint(complaint_text, language_code=None):
+def analyze_complaint(complaint_text, language_code=None, context=None):
     """
     Analyze a complaint text and return relevant IPC sections.
     This is the main function to be called from other modules.
@@ -1055,6 +1207,9 @@ def analyze_complaint(complaint_text, language_code=None):
     Args:
         complaint_text: The text of the complaint
         language_code: Optional language code for non-English complaints
+        context: Optional AnalysisContext shared with the caller. The section
+            predictions are memoized on it, so analyzing the same context twice
+            does not re-run the classifier.
 
     Returns:
         A dictionary with sections and analysis
@@ -1062,6 +1217,9 @@ def analyze_complaint(complaint_text, language_code=None):
     if not complaint_text:
         return {"sections": []}
 
+    if context is None:
+        context = AnalysisContext(complaint_text)
+
     # Log the complaint for debugging
     logger.info(f"Analyzing complaint: {complaint_text[:100]}...")
     if language_code:
@@ -1081,7 +1239,10 @@ def analyze_complaint(complaint_text, language_code=None):
             logger.error(f"Error translating text: {str(e)}")
 
     # Get IPC section predictions
-    sections = predict_ipc_sections(translated_text)
+    if context.result is None:
+        context.result = predict_ipc_sections(translated_text, context)
+    # Callers annotate the returned dicts, so hand out copies
+    sections = [dict(section) for section in context.result]
 
     # Add information about original language if translated
     result = {
@@ -4,6 +4,7 @@ from typing import Any, Dict, List, Optional
 from flask_login import current_user
 
 from extensions import mongo_db
+from utils.fir_numbers import next_mongo_fir_number
 
 
 def users_col():
@@ -42,7 +43,7 @@ def create_fir(complainant_id: int, description: str, location: str, incident_da
         'incident_date': incident_date,
         'filed_at': None,
         'created_at': datetime.utcnow(),
-        'fir_number': f"FIR{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
+        'fir_number': next_mongo_fir_number(),
         'legal_sections': [],
     }
     result = firs_col().insert_one(doc)
@@ -1,10 +1,11 @@
 
+import asyncio
 import json
 import os
 import base64
 import time
 import logging
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 
 
@@ -163,7 +164,106 @@ def analyze_complaint(complaint_text):
                 logger.error(f"Error analyzing complaint: {error_msg}")
                 raise Exception(f"Failed to analyze complaint: {error_msg}")
 
-def map_legal_sections(complaint_text):
+LEGAL_SECTIONS_SYSTEM_PROMPT = """You are a legal expert specializing in Indian criminal law. Based on the complaint text, identify the relevant sections of the Indian Penal Code (IPC) that may apply.
+
+Be very specific and accurate with the IPC section numbers. Focus on the most relevant sections (maximum 5) that directly apply to the complaint.
+
+Return a JSON array with objects containing the following fields:
+- section_code: The IPC section number (e.g., '302', '376', '420')
+- section_name: The official name of the section
+- section_description: Brief description of the section
+- relevance: Brief explanation of how this section applies to the complaint
+- confidence: A number between 0 and 1 indicating your confidence in this section's applicability
+
+Example response format:
+{
+  "sections": [
+    {
+      "section_code": "302",
+      "section_name": "Murder",
+      "section_description": "Punishment for murder",
+      "relevance": "The complaint describes an intentional killing with premeditation",
+      "confidence": 0.95
+    },
+    {
+      "section_code": "120B",
+      "section_name": "Criminal Conspiracy",
+      "section_description": "Punishment of criminal conspiracy",
+      "relevance": "Multiple persons planned the crime together as evidenced by...",
+      "confidence": 0.85
+    }
+  ]
+}"""
+
+def _manual_review_sections(section_name, section_description):
+    """Placeholder result telling the user to review the complaint manually."""
+    return {
+        "sections": [
+            {
+                "section_code": "N/A",
+                "section_name": section_name,
+                "section_description": section_description,
+                "relevance": "Please manually review the complaint to identify applicable sections",
+                "confidence": 0
+            }
+        ]
+    }
+
+def _legal_sections_request(complaint_text):
+    """Keyword arguments for the chat completion that maps a complaint to IPC sections."""
+    return {
+        "model": "gpt-4o",
+        "messages": [
+            {"role": "system", "content": LEGAL_SECTIONS_SYSTEM_PROMPT},
+            {"role": "user", "content": complaint_text}
+        ],
+        "response_format": {"type": "json_object"}
+    }
+
+def _legal_sections_retry(error_msg, retry_count):
+    """
+    Decide how to handle a failed legal section mapping attempt.
+
+    Returns:
+        tuple: (wait_time, fallback). Retry after wait_time seconds when fallback
+        is None, otherwise return fallback. Raises for errors retrying won't fix.
+    """
+    # Check if it's a rate limit error
+    if "429" in error_msg or "rate limit" in error_msg.lower():
+        wait_time = INITIAL_BACKOFF * (2 ** (retry_count - 1))  # Exponential backoff
+        logger.warning(f"Rate limit exceeded. Retrying in {wait_time} seconds. Attempt {retry_count}/{MAX_RETRIES}")
+
+        if retry_count >= MAX_RETRIES:
+            if "insufficient_quota" in error_msg:
+                # Special case for quota issues
+                logger.error("OpenAI API quota exceeded. Please check your billing details.")
+                return None, _manual_review_sections(
+                    "Unable to determine - API quota exceeded",
+                    "The system could not analyze the complaint due to API quota limitations"
+                )
+            raise Exception("OpenAI API rate limit exceeded. Please try again later.")
+
+        return wait_time, None
+    # If it's some other API error that might be transient
+    elif "5" in error_msg[:3] or "timeout" in error_msg.lower():  # 5xx errors or timeouts
+        wait_time = INITIAL_BACKOFF * (2 ** (retry_count - 1))
+        logger.warning(f"API error: {error_msg}. Retrying in {wait_time} seconds. Attempt {retry_count}/{MAX_RETRIES}")
+
+        if retry_count >= MAX_RETRIES:
+            # If we've exhausted our retries, return a fallback response
+            logger.error(f"Failed after {MAX_RETRIES} attempts: {error_msg}")
+            return None, _manual_review_sections(
+                "Unable to determine - Service unavailable",
+                "The system could not analyze the complaint due to service unavailability"
+            )
+
+        return wait_time, None
+    else:
+        # If it's a different kind of error that won't be fixed by retrying
+        logger.error(f"Error mapping legal sections: {error_msg}")
+        raise Exception(f"Failed to map legal sections: {error_msg}")
+
+def map_legal_sections(complaint_text, context=None):
     """
     Map complaint text to relevant Indian legal sections using ML and AI
 
@@ -171,6 +271,9 @@ def map_legal_sections(complaint_text):
     1. First tries the ML-based analyzer for faster and more reliable results
     2. Falls back to OpenAI GPT-4 if the ML analyzer fails or returns no results
 
+    An optional ml_analyzer.AnalysisContext can be passed so the ML step shares
+    its tokenization and predictions with the caller.
+
     Returns a JSON object with sections and their relevance to the complaint
     """
     # Import here to avoid circular imports
@@ -179,7 +282,7 @@ def map_legal_sections(complaint_text):
     try:
         # First try the ML-based analyzer
         logger.info("Analyzing complaint using ML-based analyzer")
-        ml_results = ml_analyze_complaint(complaint_text)
+        ml_results = ml_analyze_complaint(complaint_text, context=context)
 
         # If ML analyzer returned results, use them
         if ml_results and ml_results.get("sections") and len(ml_results["sections"]) > 0:
@@ -198,114 +301,49 @@ def map_legal_sections(complaint_text):
 
     client = get_openai_client()
     if client is None:
-        return {
-            "sections": [
-                {
-                    "section_code": "N/A",
-                    "section_name": "AI mapping unavailable - API key not configured",
-                    "section_description": "The system could not analyze the complaint because the OpenAI API key is missing.",
-                    "relevance": "Please manually review the complaint to identify applicable sections",
-                    "confidence": 0
-                }
-            ]
-        }
+        return _manual_review_sections(
+            "AI mapping unavailable - API key not configured",
+            "The system could not analyze the complaint because the OpenAI API key is missing."
+        )
 
     while retry_count < MAX_RETRIES:
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are a legal expert specializing in Indian criminal law. Based on the complaint text, identify the relevant sections of the Indian Penal Code (IPC) that may apply.
-
-Be very specific and accurate with the IPC section numbers. Focus on the most relevant sections (maximum 5) that directly apply to the complaint.
-
-Return a JSON array with objects containing the following fields:
-- section_code: The IPC section number (e.g., '302', '376', '420')
-- section_name: The official name of the section
-- section_description: Brief description of the section
-- relevance: Brief explanation of how this section applies to the complaint
-- confidence: A number between 0 and 1 indicating your confidence in this section's applicability
-
-Example response format:
-{
-  "sections": [
-    {
-      "section_code": "302",
-      "section_name": "Murder",
-      "section_description": "Punishment for murder",
-      "relevance": "The complaint describes an intentional killing with premeditation",
-      "confidence": 0.95
-    },
-    {
-      "section_code": "120B",
-      "section_name": "Criminal Conspiracy",
-      "section_description": "Punishment of criminal conspiracy",
-      "relevance": "Multiple persons planned the crime together as evidenced by...",
-      "confidence": 0.85
-    }
-  ]
-}"""
-                    },
-                    {"role": "user", "content": complaint_text}
-                ],
-                response_format={"type": "json_object"}
-            )
+            response = client.chat.completions.create(**_legal_sections_request(complaint_text))
             return json.loads(response.choices[0].message.content)
         except Exception as e:
-            error_msg = str(e)
             retry_count += 1
+            wait_time, fallback = _legal_sections_retry(str(e), retry_count)
+            if fallback is not None:
+                return fallback
+            time.sleep(wait_time)
 
-            # Check if it's a rate limit error
-            if "429" in error_msg or "rate limit" in error_msg.lower():
-                wait_time = INITIAL_BACKOFF * (2 ** (retry_count - 1))  # Exponential backoff
-                logger.warning(f"Rate limit exceeded. Retrying in {wait_time} seconds. Attempt {retry_count}/{MAX_RETRIES}")
-
-                if retry_count >= MAX_RETRIES:
-                    if "insufficient_quota" in error_msg:
-                        # Special case for quota issues
-                        logger.error("OpenAI API quota exceeded. Please check your billing details.")
-                        return {
-                            "sections": [
-                                {
-                                    "section_code": "N/A",
-                                    "section_name": "Unable to determine - API quota exceeded",
-                                    "section_description": "The system could not analyze the complaint due to API quota limitations",
-                                    "relevance": "Please manually review the complaint to identify applicable sections",
-                                    "confidence": 0
-                                }
-                            ]
-                        }
-                    else:
-                        raise Exception("OpenAI API rate limit exceeded. Please try again later.")
-
-                time.sleep(wait_time)
-            # If it's some other API error that might be transient
-            elif "5" in error_msg[:3] or "timeout" in error_msg.lower():  # 5xx errors or timeouts
-                wait_time = INITIAL_BACKOFF * (2 ** (retry_count - 1))
-                logger.warning(f"API error: {error_msg}. Retrying in {wait_time} seconds. Attempt {retry_count}/{MAX_RETRIES}")
+async def map_legal_sections_llm_async(complaint_text):
+    """
+    Awaitable OpenAI legal section mapping, without the ML step.
 
-                if retry_count >= MAX_RETRIES:
-                    # If we've exhausted our retries, return a fallback response
-                    logger.error(f"Failed after {MAX_RETRIES} attempts: {error_msg}")
-                    return {
-                        "sections": [
-                            {
-                                "section_code": "N/A",
-                                "section_name": "Unable to determine - Service unavailable",
-                                "section_description": "The system could not analyze the complaint due to service unavailability",
-                                "relevance": "Please manually review the complaint to identify applicable sections",
-                                "confidence": 0
-                            }
-                        ]
-                    }
+    Used by async views once the ML analyzer has come up empty. Retries back
+    off with asyncio.sleep, so waiting never holds a thread. A fresh client is
+    opened per call because async HTTP connections are bound to the event loop
+    they were created on. OPENAI_BASE_URL can point it at a local stand-in.
+    """
+    if not OPENAI_API_KEY:
+        return _manual_review_sections(
+            "AI mapping unavailable - API key not configured",
+            "The system could not analyze the complaint because the OpenAI API key is missing."
+        )
 
-                time.sleep(wait_time)
-            else:
-                # If it's a different kind of error that won't be fixed by retrying
-                logger.error(f"Error mapping legal sections: {error_msg}")
-                raise Exception(f"Failed to map legal sections: {error_msg}")
+    retry_count = 0
+    async with AsyncOpenAI(api_key=OPENAI_API_KEY) as client:
+        while retry_count < MAX_RETRIES:
+            try:
+                response = await client.chat.completions.create(**_legal_sections_request(complaint_text))
+                return json.loads(response.choices[0].message.content)
+            except Exception as e:
+                retry_count += 1
+                wait_time, fallback = _legal_sections_retry(str(e), retry_count)
+                if fallback is not None:
+                    return fallback
+                await asyncio.sleep(wait_time)
 
 def analyze_image(image_path):
     """
@@ -0,0 +1,43 @@
+"""
+Helpers for modules that keep derived rows in step with mapper events, such
+as the dashboard counters (utils/stats.py) and the evidence blob reference
+counts (utils/evidence_store.py).
+"""
+
+from sqlalchemy import event as sa_event, inspect as sa_inspect
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# INSERT constructs supporting ON CONFLICT, by dialect name
+_UPSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+
+def upsert_insert(dialect_name):
+    """The dialect's insert() with on_conflict_do_nothing/do_update, or None if it has none."""
+    return _UPSERTS.get(dialect_name)
+
+
+def _load_previous_value(*args):
+    pass
+
+
+def track_previous_values(*attributes):
+    """
+    Load the old value of these attributes before they are overwritten, even
+    when a commit expired them, so after_update and after_delete handlers can
+    read it with previous_value().
+    """
+    for attribute in attributes:
+        if not sa_event.contains(attribute, 'set', _load_previous_value):
+            sa_event.listen(attribute, 'set', _load_previous_value, active_history=True)
+
+
+def previous_value(target, attr):
+    """The value an attribute had before this flush's changes."""
+    history = sa_inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
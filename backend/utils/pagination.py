@@ -0,0 +1,146 @@
+"""
+Keyset (seek) pagination for FIR listings.
+
+Listings are ordered newest first on (filed_at, id). A page is fetched with a
+"WHERE (filed_at, id) < (cursor)" seek instead of OFFSET, so every page costs
+the same no matter how deep the caller has scrolled, and the composite
+(<filter>, filed_at, id) indexes on firs serve both the filter and the order.
+
+Drafts have no filed_at; they follow the filed FIRs, newest id first. The
+cursor is an opaque URL-safe token holding the last row's filed_at and id.
+
+The FIRs citing a legal section are paged the same way, best match first on
+(confidence, fir_id) through the fir_legal_sections
+(legal_section_id, confidence, fir_id) index.
+"""
+
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import FIR, FIRLegalSection
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+Cursor = namedtuple('Cursor', ['filed_at', 'id'])
+LinkCursor = namedtuple('LinkCursor', ['confidence', 'fir_id'])
+
+
+def _encode_token(payload):
+    token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    return token.decode('ascii').rstrip('=')
+
+
+def _decode_token(token):
+    padded = token + '=' * (-len(token) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+
+def encode_cursor(fir):
+    """Build the cursor pointing just after this FIR."""
+    return _encode_token([fir.filed_at.isoformat() if fir.filed_at else None, fir.id])
+
+
+def decode_cursor(token):
+    """
+    Parse a cursor token. Returns None for an empty token.
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    if not token:
+        return None
+    try:
+        filed_at, fir_id = _decode_token(token)
+        return Cursor(datetime.fromisoformat(filed_at) if filed_at else None, int(fir_id))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+
+def encode_link_cursor(link):
+    """Build the cursor pointing just after this FIRLegalSection row."""
+    return _encode_token([link.confidence or 0, link.fir_id])
+
+
+def decode_link_cursor(token):
+    """
+    Parse a cursor from encode_link_cursor(). Returns None for an empty token.
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    if not token:
+        return None
+    try:
+        confidence, fir_id = _decode_token(token)
+        return LinkCursor(float(confidence), int(fir_id))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Clamp a requested page size to 1..MAX_PAGE_SIZE."""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+def paginate_firs(query, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page of a filtered FIR query, newest first.
+
+    Args:
+        query: FIR query with the listing's filters applied
+        cursor (Cursor): Position returned by the previous page, or None
+        limit (int): Page size
+
+    Returns:
+        tuple: (firs, next_cursor) where next_cursor is None on the last page
+    """
+    firs = []
+    if cursor is None or cursor.filed_at is not None:
+        filed = query.filter(FIR.filed_at.isnot(None))
+        if cursor is not None:
+            filed = filed.filter(tuple_(FIR.filed_at, FIR.id) < tuple_(cursor.filed_at, cursor.id))
+        firs = filed.order_by(FIR.filed_at.desc(), FIR.id.desc()).limit(limit + 1).all()
+
+    if len(firs) <= limit:
+        drafts = query.filter(FIR.filed_at.is_(None))
+        if cursor is not None and cursor.filed_at is None:
+            drafts = drafts.filter(FIR.id < cursor.id)
+        firs += drafts.order_by(FIR.id.desc()).limit(limit + 1 - len(firs)).all()
+
+    if len(firs) > limit:
+        firs = firs[:limit]
+        return firs, encode_cursor(firs[-1])
+    return firs, None
+
+
+def paginate_section_links(query, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page of the FIRs citing a legal section, best match first.
+
+    Args:
+        query: Query over FIRLegalSection, optionally with joined entities
+            after it, filtered to one legal_section_id
+        cursor (LinkCursor): Position returned by the previous page, or None
+        limit (int): Page size
+
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is None on the last page
+    """
+    if cursor is not None:
+        query = query.filter(
+            tuple_(FIRLegalSection.confidence, FIRLegalSection.fir_id) < tuple_(cursor.confidence, cursor.fir_id)
+        )
+    rows = query.order_by(FIRLegalSection.confidence.desc(), FIRLegalSection.fir_id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_link_cursor(last if isinstance(last, FIRLegalSection) else last[0])
+    return rows, None
@@ -0,0 +1,42 @@
+"""
+FIR query builders with the eager loading each view needs.
+
+Templates walk fir.complainant, fir.processing_officer, fir.evidence and
+fir.investigation_notes (and note.officer). Left lazy, each of those is one
+more query per FIR rendered. These builders load them up front: many-to-one
+users with joinedload (same query, no row multiplication) and collections
+with selectinload (one extra IN query per collection, however many FIRs).
+"""
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import FIR, InvestigationNote
+
+
+def filter_cases(query, status=None, urgency=None, officer_id=None):
+    """The case-list filters shared by the admin cases page and the exports."""
+    if status:
+        query = query.filter(FIR.status == status)
+    if urgency:
+        query = query.filter(FIR.urgency_level == urgency)
+    if officer_id is not None:
+        query = query.filter(FIR.processing_officer_id == officer_id)
+    return query
+
+
+def fir_list_query():
+    """FIRs for listings that show the complainant and assigned officer."""
+    return FIR.query.options(
+        joinedload(FIR.complainant),
+        joinedload(FIR.processing_officer)
+    )
+
+
+def fir_detail_query():
+    """A FIR for the detail page, with evidence and notes."""
+    return FIR.query.options(
+        joinedload(FIR.complainant),
+        joinedload(FIR.processing_officer),
+        selectinload(FIR.evidence),
+        selectinload(FIR.investigation_notes).joinedload(InvestigationNote.officer)
+    )
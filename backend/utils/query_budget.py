@@ -0,0 +1,81 @@
+"""
+Per-request SQL query counting and query budgets.
+
+Every statement executed through SQLAlchemy during a request is counted.
+Views declare how many queries they should need with @query_budget(n). When
+QUERY_BUDGET_ENFORCE is on (it defaults to on under app.testing), a request
+that runs more queries than its view's budget raises QueryBudgetExceeded, so
+an N+1 regression fails the test that renders the page. Otherwise overruns
+are only logged. Enforced responses also carry an X-Query-Count header.
+"""
+
+import logging
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more SQL queries than its view's budget allows."""
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of SQL queries a view may run per request."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def query_count():
+    """Queries run so far in the current request."""
+    counter = g.get('_query_counter') if has_request_context() else None
+    return counter[0] if counter else 0
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    # A one-item list rather than an int, so run_cpu_bound(), which copies
+    # the request globals into its worker thread, keeps adding to this count
+    counter = g.get('_query_counter')
+    if counter is None:
+        counter = g._query_counter = [0]
+    counter[0] += 1
+
+
+def _enforced():
+    enforce = current_app.config.get('QUERY_BUDGET_ENFORCE')
+    return current_app.testing if enforce is None else bool(enforce)
+
+
+def _check_budget(response):
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    count = query_count()
+    enforced = _enforced()
+
+    if enforced:
+        response.headers['X-Query-Count'] = str(count)
+
+    if budget is not None and count > budget:
+        message = f"{request.endpoint} ran {count} SQL queries, over its budget of {budget}"
+        if enforced:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+def init_query_budget(app):
+    """
+    Count SQL queries per request and check view budgets after each request.
+
+    Reads QUERY_BUDGET_ENFORCE (None follows app.testing).
+    """
+    if not sa_event.contains(Engine, 'before_cursor_execute', _count_query):
+        sa_event.listen(Engine, 'before_cursor_execute', _count_query)
+    app.after_request(_check_budget)
@@ -0,0 +1,278 @@
+"""
+Per-user token-bucket rate limiting and admission control for the CPU-heavy
+analysis APIs.
+
+Every client (the logged-in user, or the remote address for anonymous
+callers) gets a bucket of RATE_LIMIT_BURST tokens that refills at
+RATE_LIMIT_PER_MINUTE tokens per minute. Each request takes one token.
+Independently, at most RATE_LIMIT_MAX_CONCURRENT limited requests may run at
+once in a worker process; anything above that is shed with a 429 straight
+away instead of queueing behind the analyzers, without costing the client a
+token. Every rejection is logged as a structured event.
+
+Behind a reverse proxy, the remote address of anonymous callers is only the
+client's if the proxy's X-Forwarded-For is trusted (TRUSTED_PROXIES in
+app.py); otherwise they would all share the proxy's bucket.
+
+Bucket state lives in a pluggable store. The default in-memory store is per
+process; RATE_LIMIT_BACKEND=sqlite keeps the buckets in a shared SQLite file
+so several workers on one host enforce one budget. A bucket left alone long
+enough to refill completely is no different from a new one, so both stores
+periodically drop such buckets instead of keeping one per client ever seen.
+"""
+
+import inspect
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_login import current_user
+
+from utils.request_events import start_event
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps for idle buckets
+EVICT_INTERVAL = 60
+
+
+def _full_after(capacity, refill_per_second):
+    """Seconds an untouched bucket takes to refill completely; None if it never does."""
+    if refill_per_second <= 0:
+        return None
+    return capacity / refill_per_second
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process, guarded by a lock."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_eviction = 0.0
+
+    def take(self, key, capacity, refill_per_second, now=None):
+        """
+        Take one token from the bucket for key.
+
+        Returns:
+            tuple: (allowed, retry_after_seconds)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if now >= self._next_eviction:
+                self._next_eviction = now + EVICT_INTERVAL
+                self._evict_idle(now, capacity, refill_per_second)
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, allowed, retry_after = _refill_and_take(tokens, updated, now, capacity, refill_per_second)
+            self._buckets[key] = (tokens, now)
+            return allowed, retry_after
+
+    def _evict_idle(self, now, capacity, refill_per_second):
+        full_after = _full_after(capacity, refill_per_second)
+        if full_after is None:
+            return
+        cutoff = now - full_after
+        for key in [key for key, (_, updated) in self._buckets.items() if updated <= cutoff]:
+            del self._buckets[key]
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file shared by all workers on the host.
+
+    Each take() runs in an IMMEDIATE transaction, so concurrent workers
+    serialize on the row update and never hand out the same token twice.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._next_eviction = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_updated ON rate_limit_buckets (updated)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, refill_per_second, now=None):
+        now = time.time() if now is None else now
+        conn = self._connect()
+        full_after = _full_after(capacity, refill_per_second)
+        # Per process; another worker's sweep is just as good
+        evict = full_after is not None and now >= self._next_eviction
+        if evict:
+            self._next_eviction = now + EVICT_INTERVAL
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if evict:
+                conn.execute('DELETE FROM rate_limit_buckets WHERE updated <= ?', (now - full_after,))
+            row = conn.execute(
+                'SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, allowed, retry_after = _refill_and_take(tokens, updated, now, capacity, refill_per_second)
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+
+def _refill_and_take(tokens, updated, now, capacity, refill_per_second):
+    """Refill a bucket for the time elapsed since updated, then try to take a token."""
+    tokens = min(capacity, tokens + max(0.0, now - updated) * refill_per_second)
+    if tokens >= 1:
+        return tokens - 1, True, 0
+    if refill_per_second <= 0:
+        return tokens, False, 60
+    return tokens, False, math.ceil((1 - tokens) / refill_per_second)
+
+
+class RateLimiter:
+    """Token-bucket limiter plus a global cap on concurrently running requests."""
+
+    def __init__(self, store, capacity, per_minute, max_concurrent, enabled=True):
+        self.store = store
+        self.capacity = capacity
+        self.refill_per_second = per_minute / 60.0
+        self.enabled = enabled
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent > 0 else None
+
+    def take(self, key):
+        return self.store.take(key, self.capacity, self.refill_per_second)
+
+    def acquire_slot(self):
+        """Claim a concurrency slot without waiting. Returns False when full."""
+        return self._slots is None or self._slots.acquire(blocking=False)
+
+    def release_slot(self):
+        if self._slots is not None:
+            self._slots.release()
+
+
+def init_rate_limiter(app):
+    """
+    Create the rate limiter from the app config and store it on the app.
+
+    Reads RATE_LIMIT_ENABLED, RATE_LIMIT_BACKEND ('memory' or 'sqlite'),
+    RATE_LIMIT_SQLITE_PATH, RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST and
+    RATE_LIMIT_MAX_CONCURRENT.
+    """
+    backend = app.config.get('RATE_LIMIT_BACKEND', 'memory')
+    if backend == 'sqlite':
+        path = app.config.get('RATE_LIMIT_SQLITE_PATH') or os.path.join(app.instance_path, 'rate_limits.db')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        store = SQLiteBucketStore(path)
+    else:
+        if backend != 'memory':
+            logger.warning(f"Unknown RATE_LIMIT_BACKEND '{backend}', using in-memory buckets")
+        store = MemoryBucketStore()
+
+    app.extensions['rate_limiter'] = RateLimiter(
+        store,
+        capacity=max(1, int(app.config.get('RATE_LIMIT_BURST', 10))),
+        per_minute=float(app.config.get('RATE_LIMIT_PER_MINUTE', 30)),
+        max_concurrent=int(app.config.get('RATE_LIMIT_MAX_CONCURRENT', 8)),
+        enabled=bool(app.config.get('RATE_LIMIT_ENABLED', True))
+    )
+
+
+def _client_key(scope):
+    if current_user.is_authenticated:
+        return f"{scope}:user:{current_user.id}"
+    return f"{scope}:ip:{request.remote_addr or 'unknown'}"
+
+
+def _too_many_requests(scope, message, retry_after, reason):
+    # The view never runs, so its own event is never started; log this one
+    event = start_event(f'{scope}.rejected')
+    event.set(outcome='rate_limited', reason=reason, endpoint=request.endpoint,
+              user_id=current_user.id if current_user.is_authenticated else None)
+    event.emit(logging.WARNING)
+    response = jsonify({'error': message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, int(retry_after)))
+    return response
+
+
+def rate_limited(scope):
+    """
+    Decorator applying the per-client token bucket and the global concurrency
+    cap to a view. Buckets are keyed by scope: views given the same scope
+    share one budget, as the two legal section analysis endpoints do with
+    'analyze'. Works for both sync and async views; an async view holds its
+    concurrency slot until it has finished awaiting.
+    """
+    def admit():
+        """Return (limiter, rejection); limiter is None when limiting is off."""
+        limiter = current_app.extensions.get('rate_limiter')
+        if limiter is None or not limiter.enabled:
+            return None, None
+
+        # Shedding for load first, so a shed request does not use up a token
+        if not limiter.acquire_slot():
+            return None, _too_many_requests(
+                scope, 'The server is busy analyzing other requests. Please try again shortly.', 1, 'overloaded'
+            )
+
+        try:
+            allowed, retry_after = limiter.take(_client_key(scope))
+        except Exception as e:
+            # A broken shared store must not take the API down with it
+            logger.error(f"Rate limit store error: {str(e)}")
+            allowed, retry_after = True, 0
+
+        if not allowed:
+            limiter.release_slot()
+            return None, _too_many_requests(
+                scope, 'Too many requests. Please wait a moment and try again.', retry_after, 'rate_limit'
+            )
+        return limiter, None
+
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                limiter, rejection = admit()
+                if rejection is not None:
+                    return rejection
+                try:
+                    return await view(*args, **kwargs)
+                finally:
+                    if limiter is not None:
+                        limiter.release_slot()
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter, rejection = admit()
+            if rejection is not None:
+                return rejection
+            try:
+                return view(*args, **kwargs)
+            finally:
+                if limiter is not None:
+                    limiter.release_slot()
+        return wrapper
+    return decorator
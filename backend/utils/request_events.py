@@ -0,0 +1,181 @@
+"""
+Structured, sampled request events for the hot API paths.
+
+Instead of logging every step of a request line by line, a handler opens a
+RequestEvent, annotates it with fields (intent, matched sections, cache hits)
+and per-stage timings, and emits it once at the end. Events are written as
+single JSON lines through a QueueHandler so the request thread never blocks on
+log formatting or I/O, and successful requests can be sampled.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from flask import g, has_request_context
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+EVENT_LOGGER_NAME = 'fir.events'
+event_logger = logging.getLogger(EVENT_LOGGER_NAME)
+
+# Module level settings, overridden by init_event_logging()
+_settings = {
+    'sample_rate': 1.0,
+}
+_listener = None
+
+
+class JSONEventFormatter(logging.Formatter):
+    """Format an event record as one JSON object per line."""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        payload.update(getattr(record, 'fields', {}))
+        return json.dumps(payload, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops events instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # The listener thread does the formatting; only make the record picklable-safe
+        record.exc_text = None
+        return record
+
+
+def init_event_logging(app):
+    """
+    Attach the non-blocking event pipeline to the 'fir.events' logger.
+
+    Reads EVENT_LOG_SAMPLE_RATE, EVENT_LOG_QUEUE_SIZE and EVENT_LOG_FILE from
+    the app config. Safe to call more than once.
+    """
+    global _listener
+
+    _settings['sample_rate'] = max(0.0, min(1.0, float(app.config.get('EVENT_LOG_SAMPLE_RATE', 1.0))))
+
+    if _listener is not None:
+        return
+
+    log_file = app.config.get('EVENT_LOG_FILE')
+    if log_file:
+        target = logging.FileHandler(log_file, encoding='utf-8')
+    else:
+        target = logging.StreamHandler()
+    target.setFormatter(JSONEventFormatter())
+
+    log_queue = queue.Queue(maxsize=int(app.config.get('EVENT_LOG_QUEUE_SIZE', 10000)))
+    event_logger.addHandler(DroppingQueueHandler(log_queue))
+    event_logger.setLevel(logging.INFO)
+    event_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, target)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class RequestEvent:
+    """
+    Collects the fields and stage timings of a single request.
+
+    Use stage() as a context manager around each expensive step and emit()
+    once when the response is ready.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.fields = {}
+        self.stages = {}
+        self.cache = {'hits': 0, 'misses': 0}
+        self._started = time.perf_counter()
+
+    def set(self, **fields):
+        """Add or overwrite event fields."""
+        self.fields.update(fields)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block and record its duration in milliseconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stages[name] = round(self.stages.get(name, 0) + elapsed, 3)
+
+    def cache_hit(self, count=1):
+        self.cache['hits'] += count
+
+    def cache_miss(self, count=1):
+        self.cache['misses'] += count
+
+    def emit(self, level=logging.INFO):
+        """Emit the event. Warnings and errors are never sampled out."""
+        if level < logging.WARNING and random.random() >= _settings['sample_rate']:
+            return
+        if not event_logger.isEnabledFor(level):
+            return
+
+        fields = dict(self.fields)
+        fields['duration_ms'] = round((time.perf_counter() - self._started) * 1000, 3)
+        fields['stages_ms'] = self.stages
+        fields['cache'] = self.cache
+        event_logger.log(level, self.name, extra={'fields': fields})
+
+
+class _NullEvent(RequestEvent):
+    """Event used outside a request; records nothing."""
+
+    def __init__(self):
+        super().__init__('null')
+
+    def set(self, **fields):
+        pass
+
+    def cache_hit(self, count=1):
+        pass
+
+    def cache_miss(self, count=1):
+        pass
+
+    def emit(self, level=logging.INFO):
+        pass
+
+
+def start_event(name):
+    """Create a RequestEvent and bind it to the current request."""
+    event = RequestEvent(name)
+    if has_request_context():
+        g.request_event = event
+    return event
+
+
+def current_event():
+    """Return the event bound to the current request, or a no-op event."""
+    if has_request_context():
+        event = g.get('request_event')
+        if event is not None:
+            return event
+    return _NullEvent()
@@ -0,0 +1,385 @@
+"""
+Full-text search over FIRs.
+
+One search document per FIR covers incident_description, transcription,
+incident_location and the FIR's investigation notes. The database keeps the
+document in sync with triggers, so every write path (ORM, bulk inserts, raw
+SQL) is covered:
+
+- SQLite: an FTS5 table, fir_search, whose rowid is the FIR id. Results are
+  ranked with bm25() and snippets come from snippet().
+- PostgreSQL: a fir_search table holding a weighted tsvector per FIR with a
+  GIN index. Results are ranked with ts_rank_cd() and snippets come from
+  ts_headline().
+
+Other databases fall back to unranked LIKE matching. init_search() creates
+the index at startup and fills it from existing rows; `flask
+rebuild-search-index` rebuilds it from scratch.
+"""
+
+import logging
+import re
+from collections import namedtuple
+
+import click
+from markupsafe import Markup, escape
+from sqlalchemy import DateTime, bindparam, or_, text
+
+from extensions import db
+from models import FIR
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Snippet highlight markers, replaced with <mark> after HTML-escaping the text
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+SearchHit = namedtuple('SearchHit', ['fir', 'rank', 'snippet'])
+SearchResults = namedtuple('SearchResults', ['hits', 'page', 'per_page', 'has_next'])
+
+_SQLITE_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS fir_search USING fts5(
+        incident_description, transcription, incident_location, notes,
+        tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fir_search_fir_insert AFTER INSERT ON firs BEGIN
+        INSERT INTO fir_search (rowid, incident_description, transcription, incident_location, notes)
+        VALUES (new.id, new.incident_description, new.transcription, new.incident_location, '');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fir_search_fir_update
+    AFTER UPDATE OF incident_description, transcription, incident_location ON firs BEGIN
+        UPDATE fir_search
+        SET incident_description = new.incident_description,
+            transcription = new.transcription,
+            incident_location = new.incident_location
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fir_search_fir_delete AFTER DELETE ON firs BEGIN
+        DELETE FROM fir_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fir_search_note_insert AFTER INSERT ON investigation_notes BEGIN
+        UPDATE fir_search
+        SET notes = (SELECT group_concat(content, ' ') FROM investigation_notes WHERE fir_id = new.fir_id)
+        WHERE rowid = new.fir_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fir_search_note_update AFTER UPDATE ON investigation_notes BEGIN
+        UPDATE fir_search
+        SET notes = (SELECT group_concat(content, ' ') FROM investigation_notes WHERE fir_id = old.fir_id)
+        WHERE rowid = old.fir_id;
+        UPDATE fir_search
+        SET notes = (SELECT group_concat(content, ' ') FROM investigation_notes WHERE fir_id = new.fir_id)
+        WHERE rowid = new.fir_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS fir_search_note_delete AFTER DELETE ON investigation_notes BEGIN
+        UPDATE fir_search
+        SET notes = (SELECT group_concat(content, ' ') FROM investigation_notes WHERE fir_id = old.fir_id)
+        WHERE rowid = old.fir_id;
+    END
+    """,
+]
+
+_SQLITE_REBUILD = [
+    "DELETE FROM fir_search",
+    """
+    INSERT INTO fir_search (rowid, incident_description, transcription, incident_location, notes)
+    SELECT f.id, f.incident_description, f.transcription, f.incident_location,
+           (SELECT group_concat(n.content, ' ') FROM investigation_notes n WHERE n.fir_id = f.id)
+    FROM firs f
+    """,
+]
+
+# Description weighs most, then transcription and notes, then location
+_POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce(f.incident_description, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(f.transcription, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(f.incident_location, '')), 'C') ||
+    setweight(to_tsvector('english', coalesce(
+        (SELECT string_agg(n.content, ' ') FROM investigation_notes n WHERE n.fir_id = f.id), ''
+    )), 'B')
+"""
+
+_POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS fir_search (
+        fir_id integer PRIMARY KEY REFERENCES firs (id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_fir_search_document ON fir_search USING GIN (document)",
+    f"""
+    CREATE OR REPLACE FUNCTION fir_search_refresh(target_id integer) RETURNS void AS $$
+    BEGIN
+        INSERT INTO fir_search (fir_id, document)
+        SELECT f.id, {_POSTGRES_DOCUMENT} FROM firs f WHERE f.id = target_id
+        ON CONFLICT (fir_id) DO UPDATE SET document = EXCLUDED.document;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION fir_search_fir_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM fir_search_refresh(NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION fir_search_note_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM fir_search_refresh(OLD.fir_id);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM fir_search_refresh(NEW.fir_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS fir_search_fir_changed ON firs",
+    """
+    CREATE TRIGGER fir_search_fir_changed
+    AFTER INSERT OR UPDATE OF incident_description, transcription, incident_location ON firs
+    FOR EACH ROW EXECUTE FUNCTION fir_search_fir_changed()
+    """,
+    "DROP TRIGGER IF EXISTS fir_search_note_changed ON investigation_notes",
+    """
+    CREATE TRIGGER fir_search_note_changed
+    AFTER INSERT OR UPDATE OR DELETE ON investigation_notes
+    FOR EACH ROW EXECUTE FUNCTION fir_search_note_changed()
+    """,
+]
+
+_POSTGRES_REBUILD = [
+    "TRUNCATE fir_search",
+    f"INSERT INTO fir_search (fir_id, document) SELECT f.id, {_POSTGRES_DOCUMENT} FROM firs f",
+]
+
+
+def _backend():
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        return dialect
+    return None
+
+
+def _execute_all(statements):
+    for statement in statements:
+        db.session.execute(text(statement))
+
+
+def _index_exists(backend):
+    if backend == 'sqlite':
+        sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'fir_search'"
+    else:
+        sql = "SELECT 1 FROM pg_class WHERE relname = 'fir_search' AND relkind = 'r'"
+    return db.session.execute(text(sql)).first() is not None
+
+
+def rebuild_search_index():
+    """Recreate every search document from the FIR and note tables."""
+    backend = _backend()
+    if backend is None:
+        return
+    _execute_all(_SQLITE_SCHEMA if backend == 'sqlite' else _POSTGRES_SCHEMA)
+    _execute_all(_SQLITE_REBUILD if backend == 'sqlite' else _POSTGRES_REBUILD)
+    db.session.commit()
+
+
+def init_search(app):
+    """
+    Register the rebuild-search-index command and create the search index,
+    filling it from existing FIRs the first time. Call inside an app context.
+    """
+    if 'rebuild-search-index' not in app.cli.commands:
+        @app.cli.command('rebuild-search-index')
+        def rebuild_search_index_command():
+            """Rebuild the FIR full-text search index."""
+            rebuild_search_index()
+            click.echo("Rebuilt the FIR search index")
+
+    backend = _backend()
+    if backend is None:
+        logger.warning(f"Full-text search is not supported on {db.engine.dialect.name}; using LIKE matching")
+        return
+
+    try:
+        if _index_exists(backend):
+            # Triggers and functions are idempotent, so upgrades pick up changes
+            _execute_all(_SQLITE_SCHEMA if backend == 'sqlite' else _POSTGRES_SCHEMA)
+            db.session.commit()
+        else:
+            logger.info("Building the FIR search index")
+            rebuild_search_index()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Could not initialize the FIR search index: {str(e)}")
+
+
+def _fts5_query(query_text):
+    """
+    Turn free text into an FTS5 query in which every term must match. Terms
+    are quoted so user input can never be parsed as FTS5 operators. (No
+    prefix matching: the porter tokenizer stems partial words too, so
+    prefixes would rarely match.)
+    """
+    terms = _TERM_RE.findall(query_text)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def _highlight(snippet):
+    """HTML-escape a snippet and turn the highlight markers into <mark> tags."""
+    if not snippet:
+        return Markup('')
+    escaped = str(escape(snippet))
+    return Markup(escaped.replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>'))
+
+
+def _filter_clauses(filters, params):
+    """SQL conditions on the firs table (aliased f) for the search filters."""
+    clauses = []
+    if filters.get('status'):
+        clauses.append('f.status = :status')
+        params['status'] = filters['status']
+    if filters.get('urgency'):
+        clauses.append('f.urgency_level = :urgency')
+        params['urgency'] = filters['urgency']
+    if filters.get('date_from'):
+        clauses.append('f.filed_at >= :date_from')
+        params['date_from'] = filters['date_from']
+    if filters.get('date_to'):
+        clauses.append('f.filed_at < :date_to')
+        params['date_to'] = filters['date_to']
+    if filters.get('officer_id') is not None:
+        clauses.append('f.processing_officer_id = :officer_id')
+        params['officer_id'] = filters['officer_id']
+    return clauses
+
+
+def _statement(sql, params):
+    """Build a text() statement, binding the date filters as DateTime."""
+    statement = text(sql)
+    for name in ('date_from', 'date_to'):
+        if name in params:
+            statement = statement.bindparams(bindparam(name, type_=DateTime()))
+    return statement
+
+
+def _ranked_ids(backend, query_text, filters, limit, offset):
+    """Return [(fir_id, rank, snippet)] for one page, best match first."""
+    params = {'limit': limit, 'offset': offset}
+    clauses = _filter_clauses(filters, params)
+
+    if backend == 'sqlite':
+        params['query'] = _fts5_query(query_text)
+        if params['query'] is None:
+            return []
+        sql = f"""
+            SELECT f.id, bm25(fir_search, 10.0, 5.0, 2.0, 5.0) AS rank,
+                   snippet(fir_search, -1, char(2), char(3), '…', 16) AS snippet
+            FROM fir_search
+            JOIN firs f ON f.id = fir_search.rowid
+            WHERE fir_search MATCH :query {''.join(' AND ' + c for c in clauses)}
+            ORDER BY rank, f.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+        # bm25() is lower-is-better; report higher-is-better like Postgres
+        return [(fir_id, -rank, snippet) for fir_id, rank, snippet in db.session.execute(_statement(sql, params), params)]
+
+    params['query'] = query_text
+    sql = f"""
+        SELECT f.id, ts_rank_cd(s.document, q.query) AS rank,
+               ts_headline('english',
+                           concat_ws(' ', f.incident_description, f.transcription, f.incident_location),
+                           q.query,
+                           'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxFragments=2, MaxWords=30')
+                   AS snippet
+        FROM fir_search s
+        JOIN firs f ON f.id = s.fir_id
+        CROSS JOIN websearch_to_tsquery('english', :query) AS q(query)
+        WHERE s.document @@ q.query {''.join(' AND ' + c for c in clauses)}
+        ORDER BY rank DESC, f.id DESC
+        LIMIT :limit OFFSET :offset
+    """
+    return list(db.session.execute(_statement(sql, params), params))
+
+
+def _like_ids(query_text, filters, limit, offset):
+    """Unranked fallback for databases without full-text search."""
+    query = FIR.query
+    for term in _TERM_RE.findall(query_text):
+        pattern = f"%{term}%"
+        query = query.filter(or_(
+            FIR.incident_description.ilike(pattern),
+            FIR.transcription.ilike(pattern),
+            FIR.incident_location.ilike(pattern)
+        ))
+    if filters.get('status'):
+        query = query.filter(FIR.status == filters['status'])
+    if filters.get('urgency'):
+        query = query.filter(FIR.urgency_level == filters['urgency'])
+    if filters.get('date_from'):
+        query = query.filter(FIR.filed_at >= filters['date_from'])
+    if filters.get('date_to'):
+        query = query.filter(FIR.filed_at < filters['date_to'])
+    if filters.get('officer_id') is not None:
+        query = query.filter(FIR.processing_officer_id == filters['officer_id'])
+    rows = query.with_entities(FIR.id, FIR.incident_description).order_by(FIR.id.desc()).limit(limit).offset(offset)
+    return [(fir_id, 0.0, (description or '')[:200]) for fir_id, description in rows]
+
+
+def search_firs(query_text, filters=None, page=1, per_page=20):
+    """
+    Search FIRs, best match first.
+
+    Args:
+        query_text (str): Free text typed by the user
+        filters (dict): Optional status, urgency, date_from, date_to
+            (filed_at range, end exclusive) and officer_id
+        page (int): 1-based page number
+        per_page (int): Results per page
+
+    Returns:
+        SearchResults: hits are SearchHit(fir, rank, snippet) with snippet as
+        safe HTML
+    """
+    filters = filters or {}
+    page = max(1, page)
+    if not query_text or not query_text.strip():
+        return SearchResults([], page, per_page, False)
+
+    offset = (page - 1) * per_page
+    backend = _backend()
+    if backend is None:
+        rows = _like_ids(query_text, filters, per_page + 1, offset)
+    else:
+        rows = _ranked_ids(backend, query_text, filters, per_page + 1, offset)
+
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    firs = {fir.id: fir for fir in FIR.query.filter(FIR.id.in_([row[0] for row in rows]))} if rows else {}
+    hits = [
+        SearchHit(firs[fir_id], float(rank or 0), _highlight(snippet))
+        for fir_id, rank, snippet in rows
+        if fir_id in firs
+    ]
+    return SearchResults(hits, page, per_page, has_next)
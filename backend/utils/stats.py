@@ -0,0 +1,246 @@
+"""
+Materialized dashboard counters.
+
+Instead of running COUNT(*) over firs and users on every dashboard load, the
+stat_counters table keeps one row per (dimension, key):
+
+    total           all             every FIR
+    status          <status>        FIRs per status
+    urgency         <urgency>       FIRs per urgency level
+    status_urgency  <status>:<urg>  FIRs per status and urgency level
+    officer         <user id>       FIRs assigned to each officer
+    user_role       <role>          users per role
+
+Mapper events adjust the counters with the same connection (and therefore in
+the same transaction) as the FIR or user insert, update or delete, so a
+rolled back change never touches them. Reads fetch the whole table in one
+query and cache it for STATS_CACHE_TTL seconds.
+
+Bulk UPDATE/DELETE statements and raw SQL bypass the mapper events, so
+reconcile_counters() recomputes everything from the source tables. It runs
+when the counter table is empty, every STATS_RECONCILE_INTERVAL seconds in
+the background, and on demand with `flask reconcile-stats`.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+
+import click
+from flask import current_app
+from sqlalchemy import event as sa_event, func
+
+from extensions import db
+from models import FIR, StatCounter, User
+from utils.orm_helpers import previous_value, track_previous_values, upsert_insert
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_cache_lock = threading.Lock()
+_cache = {'expires': 0.0, 'counters': None}
+_reconciler = []
+
+
+def _fir_keys(status, urgency_level, officer_id):
+    """Counter rows a FIR with these values contributes one to."""
+    status = status or ''
+    urgency_level = urgency_level or ''
+    keys = [
+        ('total', 'all'),
+        ('status', status),
+        ('urgency', urgency_level),
+        ('status_urgency', f"{status}:{urgency_level}"),
+    ]
+    if officer_id is not None:
+        keys.append(('officer', str(officer_id)))
+    return keys
+
+
+# The update handlers need the old values to know which counter to decrement
+track_previous_values(FIR.status, FIR.urgency_level, FIR.processing_officer_id, User.role)
+
+
+def _apply_deltas(connection, deltas):
+    """Add each non-zero delta to its counter row, creating missing rows."""
+    table = StatCounter.__table__
+    insert = upsert_insert(connection.dialect.name)
+
+    for (dimension, key), delta in deltas.items():
+        if not delta:
+            continue
+        if insert is not None:
+            stmt = insert(table).values(dimension=dimension, key=key, count=delta)
+            connection.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.dimension, table.c.key],
+                set_={'count': table.c.count + delta}
+            ))
+            continue
+
+        result = connection.execute(
+            table.update()
+            .where(table.c.dimension == dimension, table.c.key == key)
+            .values(count=table.c.count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(dimension=dimension, key=key, count=delta))
+
+
+@sa_event.listens_for(FIR, 'after_insert')
+def _count_new_fir(mapper, connection, target):
+    _apply_deltas(connection, Counter(_fir_keys(target.status, target.urgency_level, target.processing_officer_id)))
+
+
+@sa_event.listens_for(FIR, 'after_update')
+def _count_updated_fir(mapper, connection, target):
+    deltas = Counter(_fir_keys(target.status, target.urgency_level, target.processing_officer_id))
+    deltas.subtract(_fir_keys(
+        previous_value(target, 'status'),
+        previous_value(target, 'urgency_level'),
+        previous_value(target, 'processing_officer_id')
+    ))
+    _apply_deltas(connection, deltas)
+
+
+@sa_event.listens_for(FIR, 'after_delete')
+def _count_deleted_fir(mapper, connection, target):
+    deltas = Counter()
+    deltas.subtract(_fir_keys(
+        previous_value(target, 'status'),
+        previous_value(target, 'urgency_level'),
+        previous_value(target, 'processing_officer_id')
+    ))
+    _apply_deltas(connection, deltas)
+
+
+@sa_event.listens_for(User, 'after_insert')
+def _count_new_user(mapper, connection, target):
+    _apply_deltas(connection, {('user_role', target.role or ''): 1})
+
+
+@sa_event.listens_for(User, 'after_update')
+def _count_updated_user(mapper, connection, target):
+    previous = previous_value(target, 'role')
+    if previous != target.role:
+        _apply_deltas(connection, {('user_role', target.role or ''): 1, ('user_role', previous or ''): -1})
+
+
+@sa_event.listens_for(User, 'after_delete')
+def _count_deleted_user(mapper, connection, target):
+    _apply_deltas(connection, {('user_role', previous_value(target, 'role') or ''): -1})
+
+
+def invalidate_counters_cache():
+    with _cache_lock:
+        _cache['counters'] = None
+        _cache['expires'] = 0.0
+
+
+def get_counters():
+    """
+    All counters as {dimension: {key: count}}, read in one query and cached
+    for STATS_CACHE_TTL seconds.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        if _cache['counters'] is not None and now < _cache['expires']:
+            return _cache['counters']
+
+    counters = {}
+    for dimension, key, count in db.session.query(StatCounter.dimension, StatCounter.key, StatCounter.count):
+        counters.setdefault(dimension, {})[key] = count
+
+    ttl = float(current_app.config.get('STATS_CACHE_TTL', 5))
+    with _cache_lock:
+        _cache['counters'] = counters
+        _cache['expires'] = now + ttl
+    return counters
+
+
+def _compute_counters():
+    """Recompute every counter from the source tables."""
+    counts = Counter()
+    rows = db.session.query(FIR.status, FIR.urgency_level, func.count(FIR.id)).group_by(FIR.status, FIR.urgency_level)
+    for status, urgency_level, count in rows:
+        for key in _fir_keys(status, urgency_level, None):
+            counts[key] += count
+
+    rows = (
+        db.session.query(FIR.processing_officer_id, func.count(FIR.id))
+        .filter(FIR.processing_officer_id.isnot(None))
+        .group_by(FIR.processing_officer_id)
+    )
+    for officer_id, count in rows:
+        counts[('officer', str(officer_id))] = count
+
+    for role, count in db.session.query(User.role, func.count(User.id)).group_by(User.role):
+        counts[('user_role', role or '')] += count
+
+    return counts
+
+
+def reconcile_counters():
+    """
+    Rewrite the counter table from the source tables.
+
+    Returns:
+        dict: {(dimension, key): (stored, actual)} for every counter that drifted
+    """
+    actual = _compute_counters()
+    stored = {(row.dimension, row.key): row for row in StatCounter.query.all()}
+
+    drift = {}
+    for key in set(actual) | set(stored):
+        row = stored.get(key)
+        count = actual.get(key, 0)
+        if row is None:
+            if count:
+                db.session.add(StatCounter(dimension=key[0], key=key[1], count=count))
+                drift[key] = (0, count)
+        elif row.count != count:
+            drift[key] = (row.count, count)
+            row.count = count
+
+    db.session.commit()
+    invalidate_counters_cache()
+
+    if drift and stored:
+        logger.warning(f"Reconciled {len(drift)} drifted dashboard counter(s): {drift}")
+    return drift
+
+
+def _reconcile_loop(app, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                reconcile_counters()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Dashboard counter reconciliation failed: {str(e)}")
+            finally:
+                db.session.remove()
+
+
+def init_stats(app):
+    """
+    Register the reconcile-stats command, fill the counters if the table is
+    empty, and start the periodic reconciler (STATS_RECONCILE_INTERVAL
+    seconds, 0 disables it). Call inside an app context.
+    """
+    if 'reconcile-stats' not in app.cli.commands:
+        @app.cli.command('reconcile-stats')
+        def reconcile_stats_command():
+            """Recompute the dashboard counters from the FIR and user tables."""
+            drift = reconcile_counters()
+            click.echo(f"Reconciled dashboard counters ({len(drift)} changed)")
+
+    if db.session.query(StatCounter.dimension).first() is None:
+        reconcile_counters()
+
+    interval = float(app.config.get('STATS_RECONCILE_INTERVAL', 3600))
+    if interval > 0 and not _reconciler:
+        thread = threading.Thread(target=_reconcile_loop, args=(app, interval), name='stats-reconciler', daemon=True)
+        thread.start()
+        _reconciler.append(thread)
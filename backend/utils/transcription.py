@@ -0,0 +1,313 @@
+"""
+Whisper transcription service.
+
+Loading a Whisper model takes seconds and hundreds of MB, and transcribing
+on the CPU takes longer than a request should block. Instead, a fixed pool of
+TRANSCRIBE_WORKERS processes each load the model once, when they start, and
+keep it resident. Requests hand audio files to the pool and get a job back.
+
+Submitting never blocks: when TRANSCRIBE_QUEUE_SIZE jobs are already waiting
+or running, submit() raises TranscriptionQueueFull and the caller should
+answer 429 with a Retry-After. Callers may wait for a job up to a timeout, or
+return its id and let the client poll.
+
+The pool and the job registry belong to the web process that accepted the
+upload. With several web worker processes, polling requests need to reach the
+same process (sticky sessions), or clients should use the wait option.
+
+TRANSCRIBE_MODEL_LOADER names the function that builds the model in each
+worker, as "module:function". It is called with WHISPER_MODEL and must
+return an object with a whisper-style transcribe(path, **options) method.
+benchmark_transcription.py uses this to measure the pool with a stand-in
+model, without Whisper installed.
+"""
+
+import atexit
+import importlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Whisper (and torch) are heavy; only check that they are installed here
+WHISPER_AVAILABLE = importlib.util.find_spec('whisper') is not None
+
+DEFAULT_LOADER = 'utils.transcription:load_whisper_model'
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_service = None
+_service_lock = threading.Lock()
+
+# Set in each worker process by _init_worker()
+_worker_model = None
+
+
+class TranscriptionQueueFull(Exception):
+    """Every transcription slot is taken; try again later."""
+
+    def __init__(self, depth, retry_after):
+        super().__init__(f"Transcription queue is full ({depth} jobs)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class TranscriptionUnavailable(Exception):
+    """Transcription is disabled or Whisper is not installed."""
+
+
+def load_whisper_model(model_name):
+    """Default model loader: an openai-whisper model."""
+    import whisper
+    return whisper.load_model(model_name)
+
+
+def _resolve_loader(path):
+    module_name, _, attr = path.partition(':')
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _init_worker(loader_path, model_name):
+    global _worker_model
+    started = time.perf_counter()
+    _worker_model = _resolve_loader(loader_path)(model_name)
+    logger.info(f"Transcription worker {os.getpid()} loaded {model_name} in {time.perf_counter() - started:.1f}s")
+
+
+def _transcribe(audio_path, options):
+    """Runs in a worker process, with the model loaded by _init_worker()."""
+    result = _worker_model.transcribe(audio_path, **options)
+    segments = [
+        {'start': float(segment['start']), 'end': float(segment['end']), 'text': (segment.get('text') or '').strip()}
+        for segment in result.get('segments') or []
+    ]
+    return {'text': (result.get('text') or '').strip(), 'language': result.get('language'), 'segments': segments}
+
+
+def whisper_language(language):
+    """Whisper language code for a UI locale such as 'hi-IN' (None for auto)."""
+    if not language or language == 'auto':
+        return None
+    return language.split('-')[0].lower()
+
+
+class TranscriptionJob:
+    """One queued audio file and, once finished, its transcript or error."""
+
+    def __init__(self, user_id, audio_path, language):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.audio_path = audio_path
+        self.language = language
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.text = None
+        self.detected_language = None
+        self.segments = []
+        self.error = None
+        self.future = None
+        self.done = threading.Event()
+
+    @property
+    def status(self):
+        if self.finished_at is not None:
+            return 'failed' if self.error else 'succeeded'
+        if self.future is not None and self.future.running():
+            return 'running'
+        return 'queued'
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at,
+        }
+        if self.finished_at is not None:
+            data['seconds'] = round(self.finished_at - self.submitted_at, 3)
+        if self.status == 'succeeded':
+            data['text'] = self.text
+            data['language'] = self.detected_language
+        elif self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class TranscriptionService:
+    """A process pool with a resident model, a bounded queue and a job registry."""
+
+    def __init__(self, workers, queue_size, model_name='base', loader=DEFAULT_LOADER, job_ttl=600):
+        self.workers = max(1, int(workers))
+        self.queue_size = max(self.workers, int(queue_size))
+        self.model_name = model_name
+        self.loader = loader
+        self.job_ttl = job_ttl
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._completed = 0
+        self._busy_seconds = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn, not fork: the web process has threads and open database connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.loader, self.model_name)
+            )
+        return self._executor
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.job_ttl
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.finished_at is None or job.finished_at > cutoff:
+                break
+            self._jobs.popitem(last=False)
+
+    def _retry_after(self):
+        """Rough seconds until a slot frees: the mean time recent jobs took."""
+        mean = self._busy_seconds / self._completed if self._completed else 5.0
+        return max(1, int(mean))
+
+    def submit(self, audio_path, user_id=None, language=None, options=None, delete_audio=True, on_done=None):
+        """
+        Queue an audio file.
+
+        Args:
+            audio_path: File to transcribe; deleted when the job finishes
+                unless delete_audio is False
+            user_id: Owner, checked when the job is looked up
+            language: UI locale or Whisper language code; None or 'auto' detects it
+            options: Extra keyword arguments for the model's transcribe()
+            on_done: Optional callable(job), called once the job has finished
+
+        Raises:
+            TranscriptionQueueFull: when queue_size jobs are already pending
+        """
+        options = {'task': 'transcribe', **(options or {})}
+        if whisper_language(language):
+            options['language'] = whisper_language(language)
+
+        with self._lock:
+            self._evict_expired()
+            if self._pending >= self.queue_size:
+                raise TranscriptionQueueFull(self._pending, self._retry_after())
+
+            job = TranscriptionJob(user_id, audio_path, language)
+            try:
+                job.future = self._get_executor().submit(_transcribe, audio_path, options)
+            except BrokenProcessPool:
+                # A worker died (e.g. the model failed to load); start a fresh pool
+                logger.error("Transcription pool was broken; restarting it")
+                self._executor = None
+                job.future = self._get_executor().submit(_transcribe, audio_path, options)
+            self._pending += 1
+            self._jobs[job.id] = job
+
+        job.future.add_done_callback(lambda future: self._finish(job, future, delete_audio, on_done))
+        return job
+
+    def _finish(self, job, future, delete_audio=True, on_done=None):
+        try:
+            result = future.result()
+            job.text = result['text']
+            job.detected_language = result['language']
+            job.segments = result.get('segments') or []
+        except Exception as e:
+            logger.error(f"Transcription job {job.id} failed: {str(e)}")
+            job.error = str(e) or e.__class__.__name__
+        job.finished_at = time.time()
+
+        with self._lock:
+            self._pending -= 1
+            if not job.error:
+                self._completed += 1
+                self._busy_seconds += job.finished_at - job.submitted_at
+            # Keep finished jobs in finish order so eviction can stop at the first young one
+            self._jobs.move_to_end(job.id)
+
+        if delete_audio:
+            try:
+                os.remove(job.audio_path)
+            except OSError:
+                pass
+        job.done.set()
+        if on_done is not None:
+            try:
+                on_done(job)
+            except Exception as e:
+                logger.error(f"Transcription job {job.id} callback failed: {str(e)}", exc_info=True)
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict_expired()
+            return self._jobs.get(job_id)
+
+    def wait(self, job, timeout):
+        """Wait up to timeout seconds for a job. Returns True if it finished."""
+        return job.done.wait(timeout)
+
+    def stats(self):
+        """Queue depth and capacity, for monitoring and client backoff."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        pending = sum(1 for job in jobs if job.finished_at is None)
+        # The pool hands a job or so beyond its worker count to the workers' call queue early
+        running = min(pending, self.workers)
+        queued = pending - running
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'running': running,
+            'queued': queued,
+            'depth': running + queued,
+            'available': max(0, self.queue_size - running - queued),
+            'completed': self._completed,
+        }
+
+    def shutdown(self, wait=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+def get_transcription_service():
+    """
+    The process-wide service, created from the app config on first use.
+
+    Raises:
+        TranscriptionUnavailable: if TRANSCRIBE_WORKERS is 0, or the default
+            Whisper loader is configured but Whisper is not installed
+    """
+    global _service
+    from flask import current_app
+
+    config = current_app.config
+    if int(config.get('TRANSCRIBE_WORKERS', 1)) <= 0:
+        raise TranscriptionUnavailable("Server-side transcription is disabled")
+    loader = config.get('TRANSCRIBE_MODEL_LOADER') or DEFAULT_LOADER
+    if loader == DEFAULT_LOADER and not WHISPER_AVAILABLE:
+        raise TranscriptionUnavailable("Whisper is not installed on the server")
+
+    with _service_lock:
+        if _service is None:
+            _service = TranscriptionService(
+                workers=config.get('TRANSCRIBE_WORKERS', 1),
+                queue_size=config.get('TRANSCRIBE_QUEUE_SIZE', 8),
+                model_name=config.get('WHISPER_MODEL', 'base'),
+                loader=loader,
+                job_ttl=config.get('TRANSCRIBE_JOB_TTL', 600)
+            )
+            atexit.register(_service.shutdown)
+        return _service
@@ -0,0 +1,265 @@
+"""
+Incremental transcription of recordings uploaded while the user speaks.
+
+The browser sends the recording in short chunks (MediaRecorder timeslices).
+Each chunk is appended to the session's audio file on disk. Once
+TRANSCRIBE_STREAM_STEP seconds of new audio have arrived, a window pass goes
+to the transcription pool (utils/transcription.py). It covers the audio from
+the end of the committed transcript to the end of the buffer.
+
+Segments that end more than TRANSCRIBE_STREAM_HOLDBACK seconds before the
+end of the buffer are committed: their text is final and the next window
+starts after them. The rest is a provisional tail that the next pass
+transcribes again with more context. The window therefore slides along
+behind the speaker. When recording stops, only the audio after the last
+committed segment is left to transcribe, roughly one step plus the holdback,
+not the whole clip.
+
+Window passes use Whisper's clip_timestamps option to start part way into the
+buffer, and pass the committed text as the initial prompt.
+
+Like transcription jobs, sessions live in the web process that created them.
+Sessions idle for TRANSCRIBE_STREAM_IDLE_TTL seconds are dropped, checked at
+most every EVICT_INTERVAL seconds when a session is started or looked up.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from utils.transcription import TranscriptionQueueFull
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+AUDIO_SUFFIXES = {
+    'audio/webm': '.webm',
+    'audio/ogg': '.ogg',
+    'audio/mp4': '.mp4',
+    'audio/wav': '.wav',
+}
+# Whisper decodes 30 second windows; past that, commit all but the last segment
+MAX_WINDOW_SECONDS = 30
+# Characters of committed text passed to the next window as its prompt
+PROMPT_CHARS = 200
+DEFAULT_IDLE_TTL = 900
+# Seconds between sweeps for idle sessions
+EVICT_INTERVAL = 60
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_next_eviction = 0.0
+
+
+class StreamError(Exception):
+    """A chunk or request the session cannot accept, with the HTTP status to answer."""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class TranscriptStream:
+    """One recording: its audio buffer on disk and its transcript so far."""
+
+    def __init__(self, service, user_id, language, mime_type, step, holdback, max_bytes):
+        self.id = uuid.uuid4().hex
+        self.service = service
+        self.user_id = user_id
+        self.language = language
+        self.step = step
+        self.holdback = holdback
+        self.max_bytes = max_bytes
+        self.directory = tempfile.mkdtemp(prefix='transcribe_stream_')
+        suffix = AUDIO_SUFFIXES.get((mime_type or '').split(';')[0].strip().lower(), '.webm')
+        self.audio_path = os.path.join(self.directory, 'audio' + suffix)
+
+        self.next_seq = 0
+        self.bytes = 0
+        self.duration = 0.0
+        self.committed_text = ''
+        self.committed_until = 0.0
+        self.partial_text = ''
+        self.submitted_until = 0.0
+        self.window_pending = False
+        self.finish_requested = False
+        self.finished = False
+        self.error = None
+        self.version = 0
+        self.last_active = time.time()
+        # Reentrant, so a window that finishes inside submit() can update the session
+        self.changed = threading.Condition(threading.RLock())
+
+    @property
+    def text(self):
+        return ' '.join(part for part in (self.committed_text, self.partial_text) if part)
+
+    def state(self):
+        with self.changed:
+            return {
+                'session_id': self.id,
+                'text': self.text,
+                'committed': self.committed_text,
+                'partial': self.partial_text,
+                'final': self.finished,
+                'version': self.version,
+                'next_seq': self.next_seq,
+                'duration': round(self.duration, 2),
+                'error': self.error,
+            }
+
+    def append(self, seq, data, duration=None):
+        """
+        Append chunk number seq to the buffer.
+
+        A chunk that was already stored (a retried upload) is acknowledged
+        without being written again; one that skips ahead is refused, so the
+        buffer always holds the recording in order.
+        """
+        with self.changed:
+            self.last_active = time.time()
+            if self.finish_requested:
+                raise StreamError('The recording has already been finished.', 409)
+            if seq < self.next_seq:
+                return False
+            if seq > self.next_seq:
+                raise StreamError('Chunk out of order.', 409, expected_seq=self.next_seq)
+            if self.bytes + len(data) > self.max_bytes:
+                raise StreamError('The recording is too long.', 413)
+
+            with open(self.audio_path, 'ab') as f:
+                f.write(data)
+            self.bytes += len(data)
+            self.next_seq += 1
+            self.duration = max(self.duration, float(duration)) if duration is not None else self.duration + 1.0
+        self.schedule()
+        return True
+
+    def finish(self):
+        """Mark the recording complete; the final window covers the rest."""
+        with self.changed:
+            self.last_active = time.time()
+            self.finish_requested = True
+        self.schedule()
+
+    def schedule(self):
+        """Start the next window pass if one is due and none is running."""
+        with self.changed:
+            if self.finished or self.window_pending:
+                return
+            final = self.finish_requested
+            if not final and self.duration - self.submitted_until < self.step:
+                return
+            if final and not self.bytes:
+                self.finished = True
+                self._changed()
+                return
+
+            start, end = self.committed_until, self.duration
+            options = {}
+            if start > 0:
+                options['clip_timestamps'] = f"{start:.2f}"
+            if self.committed_text:
+                options['initial_prompt'] = self.committed_text[-PROMPT_CHARS:]
+
+            self.window_pending = True
+            try:
+                self.service.submit(
+                    self.audio_path, self.user_id, self.language, options, delete_audio=False,
+                    on_done=lambda job: self._window_done(job, end, final)
+                )
+            except TranscriptionQueueFull:
+                # Retried on the next chunk, poll or finish
+                self.window_pending = False
+                return
+            self.submitted_until = end
+
+    def _window_done(self, job, end, final):
+        with self.changed:
+            self.window_pending = False
+            if job.error:
+                self.error = job.error
+                if final:
+                    self.finished = True
+            else:
+                self.error = None
+                segments = [segment for segment in job.segments if segment['text']]
+                if not job.segments and job.text:
+                    # A model without timestamps: the whole window is one segment
+                    segments = [{'start': self.committed_until, 'end': end, 'text': job.text}]
+
+                cutoff = end if final else end - self.holdback
+                commit = 0
+                while commit < len(segments) and segments[commit]['end'] <= cutoff:
+                    commit += 1
+                if not final and end - self.committed_until > MAX_WINDOW_SECONDS:
+                    commit = max(commit, len(segments) - 1)
+
+                if commit:
+                    self.committed_text = ' '.join(
+                        part for part in [self.committed_text] + [s['text'] for s in segments[:commit]] if part
+                    )
+                    self.committed_until = segments[commit - 1]['end']
+                self.partial_text = ' '.join(s['text'] for s in segments[commit:])
+                if final:
+                    self.finished = True
+            self._changed()
+        self.schedule()
+
+    def _changed(self):
+        self.version += 1
+        self.changed.notify_all()
+
+    def wait(self, since_version, timeout):
+        """Block until the transcript moves past since_version, finishes, or timeout passes."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version > since_version or self.finished, timeout)
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _evict_idle(config):
+    """Drop sessions nobody has touched for the idle TTL, at most every EVICT_INTERVAL."""
+    global _next_eviction
+    cutoff = time.time() - float(config.get('TRANSCRIBE_STREAM_IDLE_TTL', DEFAULT_IDLE_TTL))
+    with _sessions_lock:
+        now = time.monotonic()
+        if now < _next_eviction:
+            return
+        _next_eviction = now + EVICT_INTERVAL
+        idle = [s for s in _sessions.values() if s.last_active < cutoff and not s.window_pending]
+        for session in idle:
+            del _sessions[session.id]
+    for session in idle:
+        session.close()
+
+
+def start_stream(service, config, user_id, language=None, mime_type=None):
+    """Create a session for a new recording."""
+    _evict_idle(config)
+    session = TranscriptStream(
+        service, user_id, language, mime_type,
+        step=float(config.get('TRANSCRIBE_STREAM_STEP', 4)),
+        holdback=float(config.get('TRANSCRIBE_STREAM_HOLDBACK', 2)),
+        max_bytes=int(config.get('TRANSCRIBE_STREAM_MAX_BYTES', 50 * 1024 * 1024)),
+    )
+    with _sessions_lock:
+        _sessions[session.id] = session
+    return session
+
+
+def get_stream(config, session_id, user_id):
+    """The user's session with this id, or None."""
+    _evict_idle(config)
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+    if session is None or session.user_id != user_id:
+        return None
+    session.last_active = time.time()
+    return session
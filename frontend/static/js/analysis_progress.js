@@ -0,0 +1,41 @@
+// Background evidence analysis progress
+// Usage: an element with data-analysis-status-url (the job status endpoint),
+// containing a .progress-bar and an .analysis-progress-text element. The page
+// reloads once the job has finished, to show the results.
+
+(function() {
+    const POLL_MS = 2000;
+
+    document.querySelectorAll('[data-analysis-status-url]').forEach(function(container) {
+        const url = container.dataset.analysisStatusUrl;
+        const bar = container.querySelector('.progress-bar');
+        const text = container.querySelector('.analysis-progress-text');
+
+        function show(state) {
+            if (bar) bar.style.width = state.percent + '%';
+            if (text) {
+                text.textContent = state.status === 'queued'
+                    ? 'Waiting to start…'
+                    : state.completed + ' of ' + state.total + ' analyzed' + (state.failed ? ', ' + state.failed + ' failed' : '');
+            }
+        }
+
+        async function poll() {
+            try {
+                const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+                if (!response.ok) return;
+                const state = await response.json();
+                show(state);
+                if (state.status !== 'queued' && state.status !== 'running') {
+                    window.location.reload();
+                    return;
+                }
+            } catch (err) {
+                console.error('Error checking analysis progress:', err);
+            }
+            setTimeout(poll, POLL_MS);
+        }
+
+        setTimeout(poll, POLL_MS);
+    });
+})();
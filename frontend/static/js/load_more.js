@@ -0,0 +1,47 @@
+/**
+ * Incremental loading for paginated FIR listings
+ *
+ * A ".load-more" button carries the listing API URL (data-url), the cursor of
+ * the next page (data-next-cursor) and the element new rows go into
+ * (data-target). Each click fetches the next page as rendered HTML and appends
+ * it; the button disappears after the last page.
+ */
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.load-more').forEach(button => {
+        button.addEventListener('click', async function() {
+            const target = document.querySelector(this.getAttribute('data-target'));
+            const cursor = this.getAttribute('data-next-cursor');
+            if (!target || !cursor) return;
+
+            const url = new URL(this.getAttribute('data-url'), window.location.origin);
+            url.searchParams.set('cursor', cursor);
+            url.searchParams.set('format', 'html');
+
+            const originalHtml = this.innerHTML;
+            this.disabled = true;
+            this.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i> Loading...';
+
+            try {
+                const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+                if (!response.ok) {
+                    throw new Error(`Failed to load more cases (${response.status})`);
+                }
+                const data = await response.json();
+
+                target.insertAdjacentHTML('beforeend', data.html || '');
+
+                if (data.next_cursor) {
+                    this.setAttribute('data-next-cursor', data.next_cursor);
+                    this.innerHTML = originalHtml;
+                    this.disabled = false;
+                } else {
+                    this.parentElement.remove();
+                }
+            } catch (error) {
+                console.error('Error loading more cases:', error);
+                this.innerHTML = originalHtml;
+                this.disabled = false;
+            }
+        });
+    });
+});
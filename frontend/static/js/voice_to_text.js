@@ -1,5 +1,10 @@
 // Voice to Text (Experimental) - Standalone JS for use in any page
 // Usage: see templates/fir/new.html for HTML structure
+//
+// Records with MediaRecorder and uploads the audio in short chunks to the
+// server's Whisper service (/fir/transcribe_stream), which transcribes while
+// the user speaks. Falls back to the browser's SpeechRecognition when the
+// server has transcription disabled or the browser cannot record.
 
 (function() {
     // Elements must exist in the DOM
@@ -11,9 +16,26 @@
 
     if (!voiceInput || !startBtn || !stopBtn || !langSelect) return;
 
+    // Milliseconds of audio per uploaded chunk
+    const CHUNK_MS = 2000;
+    const RECORDER_TYPES = ['audio/webm;codecs=opus', 'audio/webm', 'audio/ogg;codecs=opus', 'audio/mp4'];
+
     let recognition;
     let recognizing = false;
+    let recorder = null;
+    let session = null;
+    let uploads = Promise.resolve();
+    // Recorded chunks the server has not acknowledged yet, by seq
+    let unsent = new Map();
+    let streamError = null;
+
+    function appendToDescription(text) {
+        if (incidentDesc && text) {
+            incidentDesc.value += (incidentDesc.value ? '\n' : '') + text;
+        }
+    }
 
+    // Browser speech recognition (fallback)
     if ('webkitSpeechRecognition' in window || 'SpeechRecognition' in window) {
         const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
 
@@ -43,10 +65,7 @@
                 transcript += event.results[i][0].transcript;
             }
             voiceInput.value = transcript;
-            // Optionally append to incident description
-            if (incidentDesc) {
-                incidentDesc.value += (incidentDesc.value ? '\n' : '') + transcript;
-            }
+            appendToDescription(transcript);
         };
         recognition.onerror = function(event) {
             voiceInput.value = 'Error: ' + event.error;
@@ -55,20 +74,174 @@
             recognizing = false;
             startBtn.disabled = false;
             stopBtn.disabled = true;
-            // Optionally finalize transcript here if needed
         };
+    }
+
+    // Server-side streaming transcription
+    function showState(state) {
+        if (state && typeof state.text === 'string') {
+            voiceInput.value = state.text;
+        }
+    }
+
+    async function postChunk(seq) {
+        const chunk = unsent.get(seq);
+        const url = session.chunk_url + '?seq=' + seq + '&duration=' + chunk.duration.toFixed(2);
+        // One retry covers a dropped connection; the server ignores a chunk it already has
+        for (let attempt = 0; attempt < 2; attempt++) {
+            try {
+                const response = await fetch(url, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: chunk.blob
+                });
+                const state = await response.json().catch(function() { return {}; });
+                return { ok: response.ok, status: response.status, state: state };
+            } catch (err) {
+                console.error('Error uploading audio chunk:', err);
+            }
+        }
+        return { ok: false, status: 0, state: { error: 'the audio could not be uploaded' } };
+    }
+
+    async function sendChunk(seq) {
+        if (streamError) return;
+        let next = seq;
+        let resends = 0;
+        while (next <= seq) {
+            const result = await postChunk(next);
+            if (result.ok) {
+                showState(result.state);
+                unsent.delete(next);
+                next++;
+                continue;
+            }
+            // A gap: the server names the chunk it expects, so send again from there
+            const expected = result.state.expected_seq;
+            if (result.status === 409 && typeof expected === 'number') {
+                if (expected > seq) return;
+                if (unsent.has(expected) && resends++ < 3) {
+                    next = expected;
+                    continue;
+                }
+            }
+            failStream(result.state.error || 'the audio could not be uploaded');
+            return;
+        }
+    }
+
+    // Stop recording rather than transcribe a recording with a hole in it
+    function failStream(message) {
+        streamError = message;
+        voiceInput.value = 'Error: ' + message;
+        if (recorder && recorder.state !== 'inactive') recorder.stop();
+    }
+
+    function endStream() {
+        session = null;
+        recorder = null;
+        unsent = new Map();
+        startBtn.disabled = false;
+        stopBtn.disabled = true;
+    }
 
-        startBtn.onclick = function() {
-            if (!recognizing) recognition.start();
+    async function finishStream() {
+        if (streamError) {
+            voiceInput.value = 'Error: ' + streamError;
+            endStream();
+            return;
+        }
+        let state = null;
+        try {
+            let response = await fetch(session.finish_url + '?wait=30', { method: 'POST' });
+            state = await response.json();
+            while (response.ok && !state.final) {
+                response = await fetch(session.status_url + '?wait=30&since=' + state.version);
+                state = await response.json();
+            }
+        } catch (err) {
+            console.error('Error finishing transcription:', err);
+        }
+        if (state && state.final && !state.error) {
+            showState(state);
+            appendToDescription(state.text);
+        } else {
+            voiceInput.value = 'Error: ' + ((state && state.error) || 'transcription failed');
+        }
+        endStream();
+    }
+
+    async function startStreaming() {
+        if (!window.MediaRecorder || !navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) return false;
+
+        const mimeType = RECORDER_TYPES.find(function(type) { return MediaRecorder.isTypeSupported(type); }) || '';
+        const response = await fetch('/fir/transcribe_stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ language: langSelect.value, mime_type: mimeType })
+        });
+        if (!response.ok) return false;
+
+        const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+        session = await response.json();
+        recorder = new MediaRecorder(stream, mimeType ? { mimeType: mimeType } : undefined);
+
+        let seq = 0;
+        const startedAt = performance.now();
+        uploads = Promise.resolve();
+        unsent = new Map();
+        streamError = null;
+        recorder.ondataavailable = function(event) {
+            if (!event.data || !event.data.size || streamError) return;
+            const chunkSeq = seq++;
+            unsent.set(chunkSeq, { blob: event.data, duration: (performance.now() - startedAt) / 1000 });
+            // Upload in order, one at a time
+            uploads = uploads.then(function() { return sendChunk(chunkSeq); });
         };
-        stopBtn.onclick = function() {
-            if (recognizing) recognition.stop();
+        recorder.onstop = function() {
+            stream.getTracks().forEach(function(track) { track.stop(); });
+            if (!streamError) voiceInput.value = (voiceInput.value ? voiceInput.value + ' ' : '') + '…';
+            uploads = uploads.then(finishStream);
         };
-    } else {
+
+        recorder.start(CHUNK_MS);
+        voiceInput.value = '';
+        stopBtn.disabled = false;
+        return true;
+    }
+
+    if (!recognition && !window.MediaRecorder) {
         startBtn.disabled = true;
         stopBtn.disabled = true;
         voiceInput.value = 'Speech recognition not supported in this browser.';
+        return;
     }
-})();
-
 
+    startBtn.onclick = async function() {
+        if (recognizing || recorder) return;
+        startBtn.disabled = true;
+        let streaming = false;
+        try {
+            streaming = await startStreaming();
+        } catch (err) {
+            console.error('Server transcription unavailable:', err);
+            const warning = document.getElementById('mic-permission-warning');
+            if (warning && err.name === 'NotAllowedError') warning.classList.remove('d-none');
+        }
+        if (streaming) return;
+        if (recognition) {
+            recognition.start();
+        } else {
+            startBtn.disabled = false;
+            voiceInput.value = 'Speech recognition not supported in this browser.';
+        }
+    };
+    stopBtn.onclick = function() {
+        if (recorder && recorder.state !== 'inactive') {
+            stopBtn.disabled = true;
+            recorder.stop();
+        } else if (recognizing) {
+            recognition.stop();
+        }
+    };
+})();